@@ -48,6 +48,7 @@ async def admin_panel(message: Message):
 /broadcast - إرسال إذاعة جماعية
 /min_subscribers - تحديد الحد الأدنى لعدد المشتركين
 /add_forward - إنشاء مهام توجيه سريعة
+/profile - تحليل أداء البوت بالعينات (مثال: /profile 30)
 
 📝 <b>مثال الاستخدام:</b>
 <code>/upgrade_user</code>
@@ -1737,3 +1738,59 @@ async def process_min_subscribers(message: Message, state: FSMContext):
         
     except ValueError:
         await message.answer("❌ يرجى إدخال رقم صحيح")
+
+@router.message(Command("profile"))
+async def profile_bot(message: Message):
+    """تحليل أداء العملية الحية بالعينات وإرسال collapsed stacks كملف (flamegraph.pl / speedscope)"""
+    if message.from_user.id != ADMIN_ID:
+        await message.answer("❌ ليس لديك صلاحية لهذا الأمر")
+        return
+    
+    import math
+    from html import escape
+    from aiogram.types import BufferedInputFile
+    from sampling_profiler import ProfilerBusy, sampling_profiler
+    
+    parts = message.text.split()
+    try:
+        seconds = float(parts[1]) if len(parts) > 1 else 10
+    except ValueError:
+        seconds = math.nan
+    # nan و inf ليست مدة (nan يتجاوز الحدود التالية بدون تغيير)
+    if not math.isfinite(seconds):
+        await message.answer("❌ المدة يجب أن تكون رقماً بالثواني\n\nمثال: <code>/profile 30</code>", parse_mode="HTML")
+        return
+    seconds = min(max(seconds, 1), sampling_profiler.max_seconds)
+    
+    await message.answer(f"🔬 <b>جاري تحليل الأداء لمدة {seconds:.0f} ثانية...</b>", parse_mode="HTML")
+    
+    try:
+        result = await sampling_profiler.run(seconds)
+    except ProfilerBusy:
+        await message.answer("⏳ يوجد تحليل آخر قيد التشغيل، حاول بعد انتهائه")
+        return
+    
+    summary = result.summary()
+    # أسماء مختصرة حتى يبقى التعليق ضمن حد Telegram (1024 حرفاً)
+    top_lines = "\n".join(
+        f"{count * 100 / max(result.samples, 1):.1f}% <code>{escape(function[:60])}</code>"
+        for function, count in result.top_functions(8)
+    )
+    caption = (
+        f"✅ <b>انتهى تحليل الأداء</b>\n\n"
+        f"⏱️ المدة: {summary['seconds']:.0f}s | العينات: {summary['samples']}\n"
+        f"📉 تكلفة التحليل: {summary['overhead'] * 100:.2f}%\n\n"
+        f"🔥 <b>أكثر الدوال استهلاكاً:</b>\n{top_lines or 'لا توجد عينات (البوت في وضع الانتظار)'}"
+    )
+    
+    if not result.stacks:
+        await message.answer(caption, parse_mode="HTML")
+        return
+    
+    from datetime import datetime
+    filename = f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.collapsed.txt"
+    await message.answer_document(
+        document=BufferedInputFile(result.collapsed().encode('utf-8'), filename=filename),
+        caption=caption,
+        parse_mode="HTML"
+    )
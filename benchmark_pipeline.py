@@ -0,0 +1,366 @@
+"""
+قياس أداء مسار معالجة النصوص والـ entities
+يشغّل كل مرحلة على مجموعة منشورات واقعية (عربي/إنجليزي/إيموجي مع entities كثيفة)
+ويُخرج عدد العمليات في الثانية والذاكرة المخصصة لكل عملية، مع حفظ خط أساس
+ومقارنته لاكتشاف أي تراجع في الأداء
+
+الاستخدام:
+    python benchmark_pipeline.py                          # تشغيل وعرض النتائج
+    python benchmark_pipeline.py --save-baseline          # حفظ خط الأساس
+    python benchmark_pipeline.py --compare --threshold 0.15
+    python benchmark_pipeline.py --only entities_to_html --min-time 2
+"""
+import atexit
+import os
+import sys
+import tempfile
+
+# مجلد بيانات مؤقت حتى لا تلمس إعدادات المستخدم الحقيقية (يجب قبل استيراد config)،
+# ويُحذف عند الخروج
+if 'DATA_DIR' not in os.environ:
+    _bench_data_dir = tempfile.TemporaryDirectory(prefix='newsposter_bench_')
+    atexit.register(_bench_data_dir.cleanup)
+    os.environ['DATA_DIR'] = _bench_data_dir.name
+
+import argparse
+import json
+import logging
+import random
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+from aiogram.types import Chat, Message
+from entity_handler import EntityHandler
+from text_filters import TextFilters
+from link_filters import LinkFilters
+from language_filters import LanguageFilters
+from text_formatter import TextFormatter
+from message_envelope import Envelope
+
+DEFAULT_BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+BENCH_USER_ID = 900000001
+BENCH_TASK_ID = 1
+
+# ========== مجموعة المنشورات ==========
+
+ARABIC_SENTENCES = [
+    "انطلاق فعاليات المؤتمر الدولي للتقنية في الرياض بمشاركة واسعة من الشركات الناشئة",
+    "ارتفاع أسعار النفط مع تراجع المخزونات الأمريكية للأسبوع الثالث على التوالي",
+    "وزارة التعليم تعلن مواعيد الاختبارات النهائية للفصل الدراسي الثاني",
+    "فريق الهلال يحقق فوزاً ثميناً على منافسه في الدقائق الأخيرة من المباراة",
+    "تحذير من موجة حر شديدة تضرب المناطق الساحلية خلال عطلة نهاية الأسبوع",
+]
+ENGLISH_SENTENCES = [
+    "Markets rally as the central bank holds interest rates steady for another quarter",
+    "New open-source release brings faster builds and a redesigned plugin system",
+    "Officials confirm the summit will proceed despite the weather warnings",
+    "Researchers publish results from a decade-long climate observation study",
+]
+EMOJIS = ["🔴", "📢", "✨", "🌡️", "📈", "⚽", "🇸🇦", "👇", "🔥", "✅"]
+LINKS = [
+    "https://example.com/news/2024/article?id=42",
+    "t.me/example_channel",
+    "www.example.org/path/to/page",
+    "@example_channel",
+]
+HASHTAGS = ["#عاجل", "#أخبار", "#news", "#tech", "#رياضة"]
+ENTITY_TYPES = ['bold', 'italic', 'underline', 'strikethrough', 'spoiler', 'code']
+
+
+class _PostBuilder:
+    """بناء نص مع entities بإزاحات UTF-16 صحيحة"""
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.utf16_len = 0
+        self.entities: List[Dict] = []
+
+    def add(self, text: str, *entity_types: str, url: str = None):
+        length = len(text.encode('utf-16-le')) // 2
+        for entity_type in entity_types:
+            entity = {'type': entity_type, 'offset': self.utf16_len, 'length': length}
+            if entity_type == 'text_link':
+                entity['url'] = url or 'https://example.com'
+            self.entities.append(entity)
+        self.parts.append(text)
+        self.utf16_len += length
+
+    def build(self) -> Tuple[str, List[Dict]]:
+        return ''.join(self.parts), sorted(self.entities, key=lambda e: (e['offset'], -e['length']))
+
+
+def build_corpus(size: int = 40, seed: int = 1234) -> List[Tuple[str, List[Dict]]]:
+    """منشورات متنوعة قابلة للتكرار (نفس البذرة = نفس المجموعة)"""
+    rng = random.Random(seed)
+    corpus = []
+    for index in range(size):
+        builder = _PostBuilder()
+        primary = ARABIC_SENTENCES if index % 3 else ENGLISH_SENTENCES
+        secondary = ENGLISH_SENTENCES if primary is ARABIC_SENTENCES else ARABIC_SENTENCES
+
+        builder.add(rng.choice(EMOJIS) + " ")
+        builder.add(rng.choice(primary), 'bold')
+        builder.add("\n\n")
+
+        for _ in range(rng.randint(2, 5)):
+            sentence = rng.choice(primary if rng.random() < 0.8 else secondary)
+            words = sentence.split(' ')
+            # entities متداخلة ومتجاورة على مستوى الكلمات
+            for word_index, word in enumerate(words):
+                roll = rng.random()
+                if roll < 0.15:
+                    builder.add(word, rng.choice(ENTITY_TYPES))
+                elif roll < 0.22:
+                    builder.add(word, 'bold', 'italic')
+                elif roll < 0.26:
+                    builder.add(word, 'text_link', url=rng.choice(LINKS[:1]))
+                else:
+                    builder.add(word)
+                builder.add(' ' if word_index < len(words) - 1 else '')
+            builder.add(" " + rng.choice(EMOJIS) + "\n")
+
+        if rng.random() < 0.6:
+            link = rng.choice(LINKS)
+            builder.add("🔗 ")
+            builder.add(link, 'mention' if link.startswith('@') else 'url')
+            builder.add("\n")
+
+        builder.add(' '.join(rng.sample(HASHTAGS, 2)), 'hashtag')
+        corpus.append(builder.build())
+    return corpus
+
+
+# ========== إعداد مستخدم القياس ==========
+
+def _prepare_processor_settings() -> Dict:
+    """إعدادات مهمة premium مع تفعيل جميع مراحل النص"""
+    from subscription_manager import SubscriptionManager
+    from task_settings_manager import TaskSettingsManager
+
+    SubscriptionManager(BENCH_USER_ID).activate_subscription('premium', 30)
+    settings_manager = TaskSettingsManager(BENCH_USER_ID, BENCH_TASK_ID, force_new=True)
+    settings = settings_manager.load_settings()
+    settings['whitelist_words'] = {'enabled': True, 'words': ['the', 'في', 'من', 'على', 'a']}
+    settings['blacklist_words'] = {'enabled': True, 'words': ['spam', 'إعلان ممول', 'casino']}
+    settings['language_filter'] = {'enabled': True, 'mode': 'allow', 'languages': ['ar', 'en'], 'sensitivity': 'partial'}
+    settings['link_management'] = {'enabled': True, 'mode': 'remove'}
+    settings['replacements'] = {'enabled': True, 'pairs': REPLACEMENT_PAIRS}
+    settings['header'] = {'enabled': True, 'text': '📰 نشرة الأخبار', 'entities': [{'type': 'bold', 'offset': 0, 'length': 14}]}
+    settings['footer'] = {'enabled': True, 'text': 'تابعونا ✨', 'entities': [{'type': 'italic', 'offset': 0, 'length': 10}]}
+    settings['text_format'] = {'enabled': True, 'format_type': 'bold', 'text_link_url': ''}
+    settings_manager.save_settings(settings)
+    return settings
+
+
+REPLACEMENT_PAIRS = [
+    {'old': 'المؤتمر', 'new': 'الملتقى', 'old_entities': [], 'new_entities': []},
+    {'old': 'Markets', 'new': 'Stocks', 'old_entities': [], 'new_entities': []},
+    {'old': 'الأسبوع', 'new': 'الاسبوع', 'old_entities': [], 'new_entities': []},
+    {'old': 'release', 'new': 'version', 'old_entities': [], 'new_entities': []},
+]
+
+
+def _build_message(text: str, entities: List[Dict]) -> Message:
+    return Message(
+        message_id=1,
+        date=datetime.now(),
+        chat=Chat(id=-1001234567890, type='channel', title='bench'),
+        text=text,
+        entities=EntityHandler.dict_to_entities(entities)
+    )
+
+
+# ========== تعريف الحالات ==========
+
+def build_cases(corpus: List[Tuple[str, List[Dict]]]) -> Dict[str, Callable[[int], object]]:
+    """كل حالة دالة تأخذ رقم العنصر وتنفذ عملية واحدة على منشور من المجموعة"""
+    size = len(corpus)
+    texts = [text for text, _ in corpus]
+    entity_lists = [entities for _, entities in corpus]
+    aiogram_entities = [EntityHandler.dict_to_entities(entities) for entities in entity_lists]
+    # نص معدّل قليلاً (إزالة أول سطر) لقياس إعادة مطابقة entities
+    edited_texts = [text.split('\n', 1)[-1] for text in texts]
+
+    _prepare_processor_settings()
+    from message_processor import MessageProcessor
+    processor = MessageProcessor(BENCH_USER_ID, BENCH_TASK_ID)
+    messages = [_build_message(text, entities) for text, entities in corpus]
+    # الغلاف يُبنى مرة واحدة في الموزع ويُشارك بين جميع الأهداف
+    envelopes = [Envelope(message) for message in messages]
+
+    whitelist = ['the', 'في', 'من', 'على']
+    blacklist = ['spam', 'إعلان ممول', 'casino']
+
+    return {
+        'entities_to_html': lambda i: EntityHandler.entities_to_html(texts[i % size], entity_lists[i % size]),
+        # نفس التحويل بدون LRU (زمن العرض الفعلي لأول هدف)
+        'render_html_uncached': lambda i: EntityHandler._render_html(texts[i % size], entity_lists[i % size]),
+        'preserve_entities': lambda i: EntityHandler.preserve_entities(
+            texts[i % size], aiogram_entities[i % size], edited_texts[i % size]
+        ),
+        'apply_replacements': lambda i: TextFilters.apply_replacements(
+            texts[i % size], REPLACEMENT_PAIRS, [dict(e) for e in entity_lists[i % size]]
+        ),
+        'apply_whitelist': lambda i: TextFilters.apply_whitelist(texts[i % size], whitelist),
+        'apply_blacklist': lambda i: TextFilters.apply_blacklist(texts[i % size], blacklist),
+        'apply_link_filter': lambda i: LinkFilters.apply_link_filter(
+            texts[i % size], 'remove', [dict(e) for e in entity_lists[i % size]]
+        ),
+        'apply_language_filter': lambda i: LanguageFilters.apply_language_filter(
+            texts[i % size], 'allow', ['ar', 'en'], 'partial'
+        ),
+        'apply_format': lambda i: TextFormatter.apply_format(
+            texts[i % size], [dict(e) for e in entity_lists[i % size]], 'bold'
+        ),
+        'process_message_text': lambda i: processor.process_message_text(messages[i % size]),
+        # زمن كل هدف إضافي عند مشاركة الغلاف
+        'process_text_envelope': lambda i: processor.process_message_text(
+            messages[i % size], envelopes[i % size]
+        ),
+        'build_envelope': lambda i: Envelope(messages[i % size]),
+    }
+
+
+# ========== التشغيل والقياس ==========
+
+def measure_throughput(func: Callable[[int], object], min_time: float, warmup: int) -> Dict:
+    """تكرار العملية حتى min_time على الأقل وحساب العمليات في الثانية"""
+    for i in range(warmup):
+        func(i)
+
+    iterations = 0
+    batch = 1
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        for _ in range(batch):
+            func(iterations)
+            iterations += 1
+        elapsed = time.perf_counter() - start
+        # مضاعفة الدفعة لتقليل تكلفة قراءة الساعة
+        if batch < 1024:
+            batch *= 2
+
+    return {
+        'iterations': iterations,
+        'seconds': elapsed,
+        'ops_per_sec': iterations / elapsed if elapsed else 0.0,
+        'us_per_op': elapsed / iterations * 1e6 if iterations else 0.0,
+    }
+
+
+def measure_allocations(func: Callable[[int], object], iterations: int) -> Dict:
+    """قياس الذاكرة بـ tracemalloc: أعلى ذروة مؤقتة لعملية واحدة + عدد الكتل المتبقية"""
+    tracemalloc.start()
+    try:
+        peak_per_op = 0
+        before_blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+        for i in range(iterations):
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            func(i)
+            _, peak = tracemalloc.get_traced_memory()
+            peak_per_op = max(peak_per_op, peak - current)
+        after_blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'peak_bytes_per_op': peak_per_op,
+        'retained_blocks_per_op': max(0, after_blocks - before_blocks) / iterations if iterations else 0.0,
+    }
+
+
+def run_benchmarks(only: List[str] = None, min_time: float = 1.0, corpus_size: int = 40,
+                   alloc_iterations: int = 50) -> Dict[str, Dict]:
+    corpus = build_corpus(corpus_size)
+    cases = build_cases(corpus)
+    results = {}
+    for name, func in cases.items():
+        if only and name not in only:
+            continue
+        result = measure_throughput(func, min_time, warmup=min(corpus_size, 20))
+        result.update(measure_allocations(func, alloc_iterations))
+        results[name] = result
+        print(f"  {name:<24} {result['ops_per_sec']:>12,.0f} ops/s  {result['us_per_op']:>10,.1f} µs/op  "
+              f"peak {result['peak_bytes_per_op'] / 1024:>8,.1f} KiB")
+    return results
+
+
+def compare_with_baseline(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """إرجاع قائمة المراحل التي تراجعت أكثر من العتبة"""
+    regressions = []
+    print(f"\n📊 مقارنة مع خط الأساس (عتبة التراجع {threshold * 100:.0f}%)")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or not base.get('ops_per_sec'):
+            print(f"  {name:<24} (لا يوجد خط أساس)")
+            continue
+        change = result['ops_per_sec'] / base['ops_per_sec'] - 1.0
+        marker = '✅'
+        if change < -threshold:
+            marker = '❌'
+            regressions.append(name)
+        print(f"  {marker} {name:<24} {change * 100:+7.1f}%  ({base['ops_per_sec']:,.0f} → {result['ops_per_sec']:,.0f} ops/s)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='قياس أداء مسار النصوص والـ entities')
+    parser.add_argument('--only', action='append', default=None, help='تشغيل حالة محددة (يمكن تكرارها)')
+    parser.add_argument('--min-time', type=float, default=1.0, help='أقل مدة قياس لكل حالة بالثواني')
+    parser.add_argument('--corpus-size', type=int, default=40)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_FILE, help='ملف خط الأساس')
+    parser.add_argument('--save-baseline', action='store_true', help='حفظ النتائج كخط أساس')
+    parser.add_argument('--compare', action='store_true', help='المقارنة مع خط الأساس')
+    parser.add_argument('--threshold', type=float, default=0.15, help='نسبة التراجع المسموحة قبل الفشل')
+    parser.add_argument('--with-logging', action='store_true', help='إبقاء السجلات أثناء القياس')
+    args = parser.parse_args()
+
+    # السجلات المفصلة تطغى على زمن المعالجة نفسه - تُعطَّل افتراضياً
+    logging.basicConfig(level=logging.INFO)
+    if not args.with_logging:
+        logging.disable(logging.WARNING)
+
+    print(f"🏁 قياس أداء مسار النصوص (Python {sys.version.split()[0]}, {args.corpus_size} منشور)")
+    results = run_benchmarks(args.only, args.min_time, args.corpus_size)
+
+    exit_code = 0
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"⚠️ ملف خط الأساس غير موجود: {args.baseline}")
+            exit_code = 2
+        else:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f).get('results', {})
+            regressions = compare_with_baseline(results, baseline, args.threshold)
+            if regressions:
+                print(f"\n❌ تراجع في الأداء: {', '.join(regressions)}")
+                exit_code = 1
+            else:
+                print("\n✅ لا يوجد تراجع في الأداء")
+
+    if args.save_baseline:
+        baseline_results = results
+        if args.only and os.path.exists(args.baseline):
+            # تحديث الحالات المحددة فقط مع الإبقاء على البقية
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline_results = json.load(f).get('results', {})
+            baseline_results.update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                'created_at': datetime.now().isoformat(),
+                'python': sys.version.split()[0],
+                'corpus_size': args.corpus_size,
+                'results': baseline_results
+            }, f, ensure_ascii=False, indent=2)
+        print(f"💾 تم حفظ خط الأساس في {args.baseline}")
+
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
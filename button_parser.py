@@ -1,7 +1,136 @@
 
-from typing import List, Dict
+import hashlib
+import json
+import urllib.parse
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Dict, NamedTuple, Optional, Tuple, Union
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+# عدد قوالب الأزرار المحفوظة (قالب لكل نسخة من إعدادات الأزرار)
+TEMPLATE_CACHE_SIZE = 256
+
+
+class ShareContent(NamedTuple):
+    """نص المشاركة المُرمَّز مرة واحدة لكل رسالة (مشترك بين كل أزرار المشاركة)"""
+    post_url: str
+    clean_text: str
+    share_content: str
+    encoded_content: str
+    encoded_url: str
+    encoded_text: str
+
+
+@lru_cache(maxsize=256)
+def _encode_share_content(post_url: str, message_text: str) -> ShareContent:
+    # تنظيف النص وإزالة الـ HTML tags
+    clean_text = message_text.strip() if message_text else ''
+
+    # تجهيز النص للمشاركة
+    if clean_text and post_url:
+        share_content = f"{clean_text}\n\n{post_url}"
+    elif clean_text:
+        share_content = clean_text
+    else:
+        share_content = post_url
+
+    return ShareContent(
+        post_url=post_url,
+        clean_text=clean_text,
+        share_content=share_content,
+        encoded_content=urllib.parse.quote(share_content),
+        encoded_url=urllib.parse.quote(post_url) if post_url else '',
+        encoded_text=urllib.parse.quote(clean_text) if clean_text else '',
+    )
+
+
+def _format_share_url(platform: str, share: ShareContent) -> str:
+    if platform == 'facebook':
+        # Facebook يفضل URL فقط في sharer
+        return f"https://www.facebook.com/sharer/sharer.php?u={share.encoded_url}&quote={share.encoded_text}" if share.clean_text else f"https://www.facebook.com/sharer/sharer.php?u={share.encoded_url}"
+    elif platform == 'twitter':
+        # Twitter يدعم النص مع الرابط
+        return f"https://twitter.com/intent/tweet?text={share.encoded_content}"
+    elif platform == 'whatsapp':
+        # WhatsApp يدعم النص مع الرابط
+        return f"https://wa.me/?text={share.encoded_content}"
+    elif platform == 'telegram':
+        # Telegram يدعم النص مع الرابط
+        if share.clean_text:
+            return f"https://t.me/share/url?url={share.encoded_url}&text={share.encoded_text}"
+        else:
+            return f"https://t.me/share/url?url={share.encoded_url}"
+    elif platform == 'instagram':
+        # Instagram لا يدعم مشاركة مباشرة عبر URL
+        return share.post_url if share.post_url else share.share_content
+
+    return share.share_content
+
+
+def _template_cache_key(buttons: List[List[Dict]]) -> bytes:
+    """بصمة إعدادات الأزرار بدون رقم نسخة (إعدادات محفوظة قبل النسخ أو أزرار المعاينة)"""
+    data = json.dumps(buttons, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class KeyboardTemplate:
+    """أزرار مُجمَّعة مسبقاً: الأزرار الثابتة تُبنى مرة واحدة وتُعاد استخدامها،
+    وخلايا المشاركة فقط تُملأ لكل رسالة
+    """
+    __slots__ = ('rows', 'is_static', 'static_markup')
+
+    def __init__(self, buttons: List[List[Dict]]):
+        rows: List[Tuple[Union[InlineKeyboardButton, Tuple[str, str]], ...]] = []
+        is_static = True
+
+        for row in buttons:
+            cells = []
+            for button in row:
+                if button['type'] == 'url':
+                    cells.append(InlineKeyboardButton(
+                        text=button['text'],
+                        url=button['url']
+                    ))
+                elif button['type'] == 'share':
+                    # خلية مشاركة: (النص, المنصة) تُملأ عند الإرسال
+                    cells.append((button['text'], button['platform']))
+                    is_static = False
+                elif button['type'] == 'popup':
+                    cells.append(InlineKeyboardButton(
+                        text=button['text'],
+                        callback_data=f"popup:{button['popup_text'][:60]}"
+                    ))
+
+            if cells:
+                rows.append(tuple(cells))
+
+        self.rows = tuple(rows)
+        self.is_static = is_static
+        self.static_markup = (
+            InlineKeyboardMarkup(inline_keyboard=[list(row) for row in self.rows])
+            if is_static else None
+        )
+
+    def render(self, post_url: str = '', message_text: str = '') -> InlineKeyboardMarkup:
+        if self.is_static:
+            return self.static_markup
+
+        share = _encode_share_content(post_url, message_text)
+        keyboard = [
+            [
+                cell if isinstance(cell, InlineKeyboardButton)
+                else InlineKeyboardButton(text=cell[0], url=_format_share_url(cell[1], share))
+                for cell in row
+            ]
+            for row in self.rows
+        ]
+        return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+# {نسخة الأزرار أو بصمتها: القالب} بترتيب آخر استخدام
+_template_cache: 'OrderedDict[bytes, KeyboardTemplate]' = OrderedDict()
+
+
 class ButtonParser:
     @staticmethod
     def parse_buttons_from_text(text: str) -> List[List[Dict]]:
@@ -88,73 +217,33 @@ class ButtonParser:
             }
     
     @staticmethod
-    def buttons_to_markup(buttons: List[List[Dict]], post_url: str = None, message_text: str = None) -> InlineKeyboardMarkup:
-        keyboard = []
-        
-        for row in buttons:
-            keyboard_row = []
-            for button in row:
-                if button['type'] == 'url':
-                    keyboard_row.append(InlineKeyboardButton(
-                        text=button['text'],
-                        url=button['url']
-                    ))
-                elif button['type'] == 'share':
-                    share_url = ButtonParser._get_share_url(button['platform'], post_url or '', message_text or '')
-                    keyboard_row.append(InlineKeyboardButton(
-                        text=button['text'],
-                        url=share_url
-                    ))
-                elif button['type'] == 'popup':
-                    keyboard_row.append(InlineKeyboardButton(
-                        text=button['text'],
-                        callback_data=f"popup:{button['popup_text'][:60]}"
-                    ))
-            
-            if keyboard_row:
-                keyboard.append(keyboard_row)
-        
-        return InlineKeyboardMarkup(inline_keyboard=keyboard)
-    
+    def buttons_to_markup(buttons: List[List[Dict]], post_url: str = None, message_text: str = None,
+                          version: Optional[str] = None) -> InlineKeyboardMarkup:
+        return ButtonParser.compile_buttons(buttons, version).render(post_url or '', message_text or '')
+
+    @staticmethod
+    def compile_buttons(buttons: List[List[Dict]], version: Optional[str] = None) -> 'KeyboardTemplate':
+        """القالب المُجمَّع للأزرار (مرة واحدة لكل نسخة من إعدادات الأزرار)
+
+        version: رقم النسخة المحفوظ مع الأزرار (يتغير في set_inline_buttons) - البحث بدون قراءة الأزرار؛
+        بدونه تُحسب بصمة المحتوى
+        """
+        key = version.encode('ascii') if version else _template_cache_key(buttons)
+        template = _template_cache.get(key)
+        if template is not None:
+            _template_cache.move_to_end(key)
+            return template
+
+        template = KeyboardTemplate(buttons)
+        _template_cache[key] = template
+        if len(_template_cache) > TEMPLATE_CACHE_SIZE:
+            _template_cache.popitem(last=False)
+        return template
+
     @staticmethod
     def _get_share_url(platform: str, post_url: str, message_text: str = '') -> str:
-        import urllib.parse
-        
-        # تنظيف النص وإزالة الـ HTML tags
-        clean_text = message_text.strip() if message_text else ''
-        
-        # تجهيز النص للمشاركة
-        if clean_text and post_url:
-            share_content = f"{clean_text}\n\n{post_url}"
-        elif clean_text:
-            share_content = clean_text
-        else:
-            share_content = post_url
-        
-        encoded_content = urllib.parse.quote(share_content)
-        encoded_url = urllib.parse.quote(post_url) if post_url else ''
-        
-        if platform == 'facebook':
-            # Facebook يفضل URL فقط في sharer
-            return f"https://www.facebook.com/sharer/sharer.php?u={encoded_url}&quote={urllib.parse.quote(clean_text)}" if clean_text else f"https://www.facebook.com/sharer/sharer.php?u={encoded_url}"
-        elif platform == 'twitter':
-            # Twitter يدعم النص مع الرابط
-            return f"https://twitter.com/intent/tweet?text={encoded_content}"
-        elif platform == 'whatsapp':
-            # WhatsApp يدعم النص مع الرابط
-            return f"https://wa.me/?text={encoded_content}"
-        elif platform == 'telegram':
-            # Telegram يدعم النص مع الرابط
-            if clean_text:
-                return f"https://t.me/share/url?url={encoded_url}&text={urllib.parse.quote(clean_text)}"
-            else:
-                return f"https://t.me/share/url?url={encoded_url}"
-        elif platform == 'instagram':
-            # Instagram لا يدعم مشاركة مباشرة عبر URL
-            return post_url if post_url else share_content
-        
-        return share_content
-    
+        return _format_share_url(platform, _encode_share_content(post_url or '', message_text or ''))
+
     @staticmethod
     def create_preview_markup(buttons: List[List[Dict]]) -> InlineKeyboardMarkup:
         return ButtonParser.buttons_to_markup(buttons, "https://t.me/example/123")
@@ -7,6 +7,9 @@ WEBHOOK_PATH = '/webhook'
 WEB_SERVER_HOST = '0.0.0.0'
 WEB_SERVER_PORT = 5000
 
+# خادم Bot API مخصص (مثل خادم محلي أو fake_telegram_server.py لاختبارات الحمل)
+TELEGRAM_API_SERVER = os.getenv('TELEGRAM_API_SERVER', '').rstrip('/')
+
 # معالجة ADMIN_ID الفارغ أو غير الموجود
 admin_id_str = os.getenv('ADMIN_ID', '0').strip()
 ADMIN_ID = int(admin_id_str) if admin_id_str else 0
@@ -38,7 +41,106 @@ NOTIFICATIONS_CONFIG_FILE = os.path.join(ADMIN_DATA_DIR, 'notifications_config.j
 EVENT_LOGS_FILE = os.path.join(ADMIN_DATA_DIR, 'event_logs.jsonl')
 STATS_SNAPSHOT_FILE = os.path.join(ADMIN_DATA_DIR, 'stats_snapshot.json')
 WELCOME_MESSAGE_FILE = os.path.join(ADMIN_DATA_DIR, 'welcome_message.json')
+DEFERRED_DELIVERIES_FILE = os.path.join(ADMIN_DATA_DIR, 'deferred_deliveries.jsonl')
+
+# إعدادات تتبع مسار الرسائل (نسبة العينات 0.0 - 1.0)
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.05'))
+TRACE_KEEP_SLOWEST = int(os.getenv('TRACE_KEEP_SLOWEST', '50'))
+
+# حدود معدل الإرسال المشتركة لـ Bot API (رسائل/ثانية للبوت كاملاً، ورسائل/دقيقة لكل قناة)
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '25'))
+TELEGRAM_CHAT_RATE_PER_MINUTE = float(os.getenv('TELEGRAM_CHAT_RATE_PER_MINUTE', '20'))
+# أقصى انتظار (بالثواني) لدور الإرسال في التوجيه الفوري؛ الرسائل التي تحتاج أكثر تُؤجل لطابور التوصيل المؤجل
+TELEGRAM_MAX_SEND_WAIT_SECONDS = float(os.getenv('TELEGRAM_MAX_SEND_WAIT_SECONDS', '60'))
+
+# أقصى فاصل (بالثواني) بين الرسائل المؤجلة عند توزيعها على نافذة النشر
+DEFER_MAX_SPACING_SECONDS = float(os.getenv('DEFER_MAX_SPACING_SECONDS', '60'))
+
+# إعادة محاولة الرسائل المؤجلة التي فشل إرسالها: تأخير أولي يتضاعف مع كل محاولة، وحد أقصى للمحاولات
+DEFER_RETRY_BASE_SECONDS = float(os.getenv('DEFER_RETRY_BASE_SECONDS', '30'))
+DEFER_RETRY_MAX_ATTEMPTS = int(os.getenv('DEFER_RETRY_MAX_ATTEMPTS', '5'))
+
+# منع تكرار المحتوى: مدة النافذة بالثواني وأقصى عدد بصمات لكل مهمة
+DEDUP_WINDOW_SECONDS = float(os.getenv('DEDUP_WINDOW_SECONDS', '21600'))
+DEDUP_MAX_ENTRIES = int(os.getenv('DEDUP_MAX_ENTRIES', '10000'))
 
 # فحص المسار للتأكد أثناء التشغيل (اختياري)
 print(f"📂 DATA_DIR in use: {DATA_DIR}")
 print(f"🔍 Exists: {os.path.exists(DATA_DIR)} | Contents: {os.listdir(DATA_DIR) if os.path.exists(DATA_DIR) else 'Not Found'}")
+
+# وضع العمليات المتعددة: عدد عمليات التوجيه (0 أو 1 = التوجيه داخل عملية الـ webhook)
+# ومسار Unix socket للاتصال المحلي بينها وبين عملية الـ webhook
+FORWARDING_SHARDS = int(os.getenv('FORWARDING_SHARDS', '0'))
+SHARD_SOCKET_PATH = os.getenv('SHARD_SOCKET_PATH', os.path.join(DATA_DIR, 'forwarding_shards.sock'))
+
+# تنفيذ مراحل تحويل النص الثقيلة (روابط، استبدالات، هيدر/فوتر، تنسيق) في عمليات منفصلة:
+# عدد العمليات (0 = التنفيذ داخل حلقة الأحداث دائماً) وأقل تكلفة تقديرية للنقل إليها
+PIPELINE_OFFLOAD_WORKERS = int(os.getenv('PIPELINE_OFFLOAD_WORKERS', '0'))
+PIPELINE_OFFLOAD_MIN_COST = int(os.getenv('PIPELINE_OFFLOAD_MIN_COST', '50000'))
+
+# منفذات الخيوط المسماة لكل نوع عمل حاجز: عدد الخيوط وأقصى عدد مهام منتظرة
+# (منفذ القرص بخيط واحد حتى تبقى تحديثات ملفات الإحصائيات متسلسلة)
+TRANSLATION_EXECUTOR_WORKERS = int(os.getenv('TRANSLATION_EXECUTOR_WORKERS', '8'))
+TRANSLATION_EXECUTOR_QUEUE = int(os.getenv('TRANSLATION_EXECUTOR_QUEUE', '64'))
+DETECTION_EXECUTOR_WORKERS = int(os.getenv('DETECTION_EXECUTOR_WORKERS', '2'))
+DETECTION_EXECUTOR_QUEUE = int(os.getenv('DETECTION_EXECUTOR_QUEUE', '32'))
+DISK_EXECUTOR_QUEUE = int(os.getenv('DISK_EXECUTOR_QUEUE', '1024'))
+PIPELINE_OFFLOAD_QUEUE = int(os.getenv('PIPELINE_OFFLOAD_QUEUE', '64'))
+# سجلات المسار الساخن (hot.ingest، hot.delivery، hot.text، hot.translation): المستوى الافتراضي،
+# ومستويات لكل نظام فرعي (مثال: delivery=DEBUG,text=INFO) تُغيّر أيضاً من لوحة Console،
+# وعدد مرات تسجيل نفس التكرار في كل نافذة، ومدة نافذة الملخص الدوري لكل مهمة
+HOT_LOG_DEFAULT_LEVEL = os.getenv('HOT_LOG_DEFAULT_LEVEL', 'WARNING')
+HOT_LOG_LEVELS = os.getenv('HOT_LOG_LEVELS', '')
+HOT_LOG_REPEAT_BURST = int(os.getenv('HOT_LOG_REPEAT_BURST', '5'))
+HOT_LOG_SUMMARY_SECONDS = float(os.getenv('HOT_LOG_SUMMARY_SECONDS', '30'))
+
+# لوحة Console: عدد السجلات المحفوظة للسجل، وحد الحلقة لكل عميل بث (الأقدم يُحذف عند بطء العميل)،
+# وحجم صفحة /console/history الافتراضي
+CONSOLE_HISTORY_SIZE = int(os.getenv('CONSOLE_HISTORY_SIZE', '5000'))
+CONSOLE_CLIENT_BUFFER = int(os.getenv('CONSOLE_CLIENT_BUFFER', '1000'))
+CONSOLE_HISTORY_PAGE_SIZE = int(os.getenv('CONSOLE_HISTORY_PAGE_SIZE', '200'))
+
+# عدد نتائج كشف اللغة المحفوظة (مفتاحها blake2b للنص)
+LANGUAGE_DETECTION_CACHE_SIZE = int(os.getenv('LANGUAGE_DETECTION_CACHE_SIZE', '4096'))
+
+# بوابة الترجمة: المزود (google أو stub للاختبار المحلي) ومهلة كل ترجمة (أقل من مهلة الـ 30 ثانية لكل هدف)
+TRANSLATION_PROVIDER = os.getenv('TRANSLATION_PROVIDER', 'google')
+TRANSLATION_TIMEOUT_SECONDS = float(os.getenv('TRANSLATION_TIMEOUT_SECONDS', '10'))
+# أقصى عدد طلبات متزامنة للمزود، وحجم cache الترجمات (النص الكامل والأجزاء)
+TRANSLATION_PROVIDER_CONCURRENCY = int(os.getenv('TRANSLATION_PROVIDER_CONCURRENCY', '4'))
+TRANSLATION_CACHE_SIZE = int(os.getenv('TRANSLATION_CACHE_SIZE', '2048'))
+# قاطع الدائرة: يُفتح عندما تتجاوز نسبة الفشل (الأخطاء + الطلبات الأبطأ من الحد) النسبة المحددة
+# في آخر WINDOW طلب، ويبقى مفتوحاً OPEN_SECONDS ثم يسمح بطلب تجريبي
+TRANSLATION_BREAKER_WINDOW = int(os.getenv('TRANSLATION_BREAKER_WINDOW', '20'))
+TRANSLATION_BREAKER_MIN_CALLS = int(os.getenv('TRANSLATION_BREAKER_MIN_CALLS', '5'))
+TRANSLATION_BREAKER_FAILURE_RATE = float(os.getenv('TRANSLATION_BREAKER_FAILURE_RATE', '0.5'))
+TRANSLATION_BREAKER_SLOW_SECONDS = float(os.getenv('TRANSLATION_BREAKER_SLOW_SECONDS', '5'))
+TRANSLATION_BREAKER_OPEN_SECONDS = float(os.getenv('TRANSLATION_BREAKER_OPEN_SECONDS', '30'))
+# طلب ثانٍ احتياطي بعد زمن p95 للطلبات الناجحة الأخيرة (1 = مفعل)
+TRANSLATION_HEDGE = os.getenv('TRANSLATION_HEDGE', '0') == '1'
+# عند تعذر الترجمة: untranslated (إرسال النص الأصلي) أو defer (تأجيل الرسالة حتى يعود المزود،
+# بحد أقصى لعمر الرسالة ثم تُرسل بدون ترجمة)
+TRANSLATION_FALLBACK = os.getenv('TRANSLATION_FALLBACK', 'untranslated')
+TRANSLATION_DEFER_MAX_SECONDS = float(os.getenv('TRANSLATION_DEFER_MAX_SECONDS', '3600'))
+# زمن الاستجابة ونسبة الفشل للمزود التجريبي (stub)
+TRANSLATION_STUB_LATENCY_SECONDS = float(os.getenv('TRANSLATION_STUB_LATENCY_SECONDS', '0.05'))
+TRANSLATION_STUB_FAILURE_RATE = float(os.getenv('TRANSLATION_STUB_FAILURE_RATE', '0'))
+
+# مسارات /debug/* (فحص الذاكرة وتحليل الأداء): تتطلب هذا الرمز في ترويسة X-Debug-Token أو ?token=، وتُعطل إذا كان فارغاً
+DEBUG_TOKEN = os.getenv('DEBUG_TOKEN', '')
+# عدد العناصر المقاسة من كل حاوية كبيرة لتقدير حجمها (الباقي يُقدّر بالتناسب)
+MEMORY_SIZE_SAMPLE = int(os.getenv('MEMORY_SIZE_SAMPLE', '200'))
+# عدد الإطارات المحفوظة لكل تخصيص أثناء مقارنة tracemalloc (أكثر = تجميع حسب traceback بتكلفة أعلى)
+TRACEMALLOC_FRAMES = int(os.getenv('TRACEMALLOC_FRAMES', '1'))
+
+# مراقبة تأخر event loop: فاصل نبضة القياس، والتأخر الذي يُعتبر توقفاً (يُلتقط عنده stack الخيط الرئيسي)،
+# وعدد مواقع التوقف المعروضة في لوحة Console والمقاييس
+LOOP_LAG_INTERVAL_SECONDS = float(os.getenv('LOOP_LAG_INTERVAL_SECONDS', '0.1'))
+LOOP_LAG_THRESHOLD_SECONDS = float(os.getenv('LOOP_LAG_THRESHOLD_SECONDS', '0.25'))
+LOOP_LAG_TOP = int(os.getenv('LOOP_LAG_TOP', '20'))
+
+# محلل الأداء بالعينات (/debug/profile وأمر /profile للمشرف): الفاصل بين العينات، وأقصى نسبة
+# من الوقت لخيط العينات (الفاصل يُمدد تلقائياً إذا كانت العينات أغلى)، وأقصى مدة للتحليل الواحد
+PROFILE_INTERVAL_SECONDS = float(os.getenv('PROFILE_INTERVAL_SECONDS', '0.01'))
+PROFILE_MAX_OVERHEAD = float(os.getenv('PROFILE_MAX_OVERHEAD', '0.02'))
+PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', '60'))
@@ -1,7 +1,7 @@
 import logging
 from datetime import datetime
 from typing import Dict, List, Tuple
-from zoneinfo import ZoneInfo
+from timezone_manager import get_zoneinfo
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +30,33 @@ class DayFilter:
         6: 'Sunday'
     }
     
+    @staticmethod
+    def evaluate_day(settings: Dict, current_day: int) -> Tuple[bool, str]:
+        """
+        الحكم على يوم محدد (0 = الاثنين) بدون قراءة الوقت الحالي
+        
+        Returns:
+            (مسموح, سبب الرفض)
+        """
+        mode = settings.get('mode', 'allow')
+        allowed_days = settings.get('days', [])
+        
+        day_name_ar = DayFilter.DAYS_AR.get(current_day, 'غير معروف')
+        
+        # وضع السماح: اليوم يجب أن يكون في القائمة
+        if mode == 'allow':
+            if current_day not in allowed_days:
+                return False, f"اليوم ({day_name_ar}) غير مسموح بالنشر فيه"
+            return True, ""
+        
+        # وضع الحظر: اليوم يجب ألا يكون في القائمة
+        elif mode == 'block':
+            if current_day in allowed_days:
+                return False, f"اليوم ({day_name_ar}) محظور من النشر"
+            return True, ""
+        
+        return True, ""
+    
     @staticmethod
     def check_day_allowed(settings: Dict, timezone: str = 'UTC') -> Tuple[bool, str]:
         """
@@ -47,36 +74,8 @@ class DayFilter:
         
         try:
             # الحصول على اليوم الحالي حسب المنطقة الزمنية
-            tz = ZoneInfo(timezone)
-            now = datetime.now(tz)
-            current_day = now.weekday()  # 0 = Monday, 6 = Sunday
-            
-            mode = settings.get('mode', 'allow')
-            allowed_days = settings.get('days', [])
-            
-            day_name_ar = DayFilter.DAYS_AR.get(current_day, 'غير معروف')
-            
-            # وضع السماح: اليوم يجب أن يكون في القائمة
-            if mode == 'allow':
-                is_allowed = current_day in allowed_days
-                
-                if not is_allowed:
-                    return False, f"اليوم ({day_name_ar}) غير مسموح بالنشر فيه"
-                
-                logger.info(f"✅ اليوم ({day_name_ar}) مسموح بالنشر")
-                return True, ""
-            
-            # وضع الحظر: اليوم يجب ألا يكون في القائمة
-            elif mode == 'block':
-                is_blocked = current_day in allowed_days
-                
-                if is_blocked:
-                    return False, f"اليوم ({day_name_ar}) محظور من النشر"
-                
-                logger.info(f"✅ اليوم ({day_name_ar}) غير محظور")
-                return True, ""
-            
-            return True, ""
+            now = datetime.now(get_zoneinfo(timezone))
+            return DayFilter.evaluate_day(settings, now.weekday())
             
         except Exception as e:
             logger.error(f"❌ خطأ في فلتر الأيام: {e}")
@@ -0,0 +1,110 @@
+"""
+مسارات التشخيص /debug/* للمشرفين: تتطلب DEBUG_TOKEN (ترويسة X-Debug-Token أو ?token=)
+وتُعطل بالكامل إذا لم يُضبط الرمز
+"""
+import functools
+import hmac
+import logging
+import math
+
+from aiohttp import web
+
+from config import DEBUG_TOKEN
+from memory_introspection import TracemallocDiff, collect_memory_report, tracemalloc_diff
+from sampling_profiler import ProfilerBusy, sampling_profiler
+
+logger = logging.getLogger(__name__)
+
+_MAX_DIFF_SECONDS = 300
+_MAX_TOP = 200
+
+
+def _authorized(request) -> bool:
+    token = request.headers.get('X-Debug-Token') or request.query.get('token', '')
+    return hmac.compare_digest(token.encode('utf-8'), DEBUG_TOKEN.encode('utf-8'))
+
+
+def debug_only(handler):
+    """التحقق من الرمز قبل المعالج (بدون middleware يمر عليه مسار الـ webhook)"""
+    @functools.wraps(handler)
+    async def wrapper(request):
+        if not DEBUG_TOKEN:
+            return web.json_response({'error': 'debug routes disabled (DEBUG_TOKEN not set)'}, status=404)
+        if not _authorized(request):
+            return web.json_response({'error': 'invalid debug token'}, status=403)
+        return await handler(request)
+    return wrapper
+
+
+def _query_number(request, name: str, default: float, low: float, high: float) -> float:
+    try:
+        value = float(request.query.get(name, default))
+    except ValueError:
+        raise web.HTTPBadRequest(text=f"invalid {name}")
+    # nan يتجاوز min/max بدون تغيير (asyncio.sleep(nan) لا ينتهي)، و inf لا يصلح كعدد
+    if not math.isfinite(value):
+        raise web.HTTPBadRequest(text=f"invalid {name}")
+    return min(max(value, low), high)
+
+
+@debug_only
+async def debug_memory(request):
+    """البنى طويلة العمر في هذه العملية، ولكل عملية توجيه في وضع العمليات المتعددة (الأعداد فقط)"""
+    import parallel_forwarding_system
+
+    report = collect_memory_report(deep=request.query.get('deep', '1') != '0')
+    system = parallel_forwarding_system.parallel_system
+    shard_stats = getattr(system, 'shard_stats', None)
+    if shard_stats is not None:
+        report['shards'] = [stats.get('memory') for stats in shard_stats]
+    return web.json_response(report)
+
+
+@debug_only
+async def debug_memory_diff(request):
+    """أكثر المواقع زيادة في الذاكرة بين لقطتي tracemalloc بفاصل ?seconds=N"""
+    group_by = request.query.get('group_by', 'lineno')
+    if group_by not in TracemallocDiff.GROUPINGS:
+        raise web.HTTPBadRequest(text=f"group_by must be one of {', '.join(TracemallocDiff.GROUPINGS)}")
+    if tracemalloc_diff.busy:
+        return web.json_response({'error': 'another tracemalloc diff is running'}, status=409)
+
+    seconds = _query_number(request, 'seconds', 10, 1, _MAX_DIFF_SECONDS)
+    top = int(_query_number(request, 'top', 20, 1, _MAX_TOP))
+    logger.info(f"🧠 بدء مقارنة tracemalloc لمدة {seconds:.0f}s")
+    return web.json_response(await tracemalloc_diff.run(seconds, top, group_by))
+
+
+@debug_only
+async def debug_profile(request):
+    """تحليل بالعينات لمدة ?seconds=N: collapsed stacks نصية (flamegraph.pl / speedscope)
+
+    ?format=json للملخص وأكثر الدوال استهلاكاً، ?idle=1 لتضمين الخيوط المنتظرة، ?lines=1 لأرقام الأسطر
+    """
+    seconds = _query_number(request, 'seconds', 10, 0.1, sampling_profiler.max_seconds)
+    try:
+        result = await sampling_profiler.run(
+            seconds, include_idle=request.query.get('idle') == '1', lines=request.query.get('lines') == '1'
+        )
+    except ProfilerBusy:
+        return web.json_response({'error': 'another profile is running'}, status=409)
+
+    if request.query.get('format') == 'json':
+        return web.json_response({
+            **result.summary(),
+            'top_functions': [{'function': function, 'samples': count} for function, count in result.top_functions(20)],
+        })
+    summary = result.summary()
+    return web.Response(
+        text=result.collapsed(),
+        content_type='text/plain',
+        headers={'X-Profile-Samples': str(summary['samples']), 'X-Profile-Overhead': str(summary['overhead'])}
+    )
+
+
+def setup_debug_routes(app):
+    if not DEBUG_TOKEN:
+        logger.info("🔒 مسارات /debug معطلة (DEBUG_TOKEN غير مضبوط)")
+    app.router.add_get('/debug/memory', debug_memory)
+    app.router.add_get('/debug/memory/diff', debug_memory_diff)
+    app.router.add_get('/debug/profile', debug_profile)
@@ -0,0 +1,116 @@
+"""
+منع تكرار المحتوى عبر قنوات المصدر: بصمة المحتوى (النص المُطبَّع + file_unique_id للوسائط)
+تُحفظ لكل مهمة في مجموعة LRU محدودة الحجم ومحدودة بنافذة زمنية،
+والنسخ المكررة داخل النافذة تُحذف قبل التوزيع على الأهداف
+"""
+import hashlib
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from config import DEDUP_WINDOW_SECONDS, DEDUP_MAX_ENTRIES
+from metrics import DUPLICATES_SUPPRESSED
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+# أحرف غير مرئية تختلف بين القنوات لنفس الخبر (zero-width و BOM وعلامات الاتجاه)
+_INVISIBLE_PATTERN = re.compile('[\u200b-\u200f\u202a-\u202e\u2060-\u2064\ufeff]')
+# التطويل العربي (ـ) لا يغير المعنى
+_TATWEEL = '\u0640'
+
+
+def normalize_text(text: str) -> str:
+    """تطبيع النص للمقارنة: NFKC + casefold + حذف الأحرف غير المرئية + دمج المسافات"""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKC', text)
+    text = _INVISIBLE_PATTERN.sub('', text).replace(_TATWEEL, '')
+    return _WHITESPACE_PATTERN.sub(' ', text).strip().casefold()
+
+
+def fingerprint_content(text: str, media_unique_id: str) -> Optional[bytes]:
+    """بصمة المحتوى من النص و file_unique_id، أو None للرسائل بدون نص أو وسائط (لا تُفحص)"""
+    text = normalize_text(text)
+    media_unique_id = media_unique_id or ''
+    if not text and not media_unique_id:
+        return None
+    data = f"{media_unique_id}\x00{text}".encode('utf-8')
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class TimedLRUSet:
+    """مجموعة بصمات مرتبة حسب وقت أول ظهور: الأقدم يُحذف عند انتهاء النافذة أو تجاوز الحجم"""
+    __slots__ = ('window', 'max_entries', 'items')
+
+    def __init__(self, window: float, max_entries: int):
+        self.window = window
+        self.max_entries = max_entries
+        self.items: 'OrderedDict[bytes, float]' = OrderedDict()
+
+    def _expire(self, now: float):
+        items = self.items
+        cutoff = now - self.window
+        while items:
+            oldest_key = next(iter(items))
+            if items[oldest_key] > cutoff:
+                break
+            del items[oldest_key]
+
+    def seen_or_add(self, key: bytes, now: float) -> bool:
+        """True إذا ظهرت البصمة داخل النافذة، وإلا تُضاف وتُرجع False"""
+        self._expire(now)
+        if key in self.items:
+            return True
+        self.items[key] = now
+        if len(self.items) > self.max_entries:
+            self.items.popitem(last=False)
+        return False
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+class DedupFilter:
+    """مجموعة بصمات لكل مهمة + عدادات الرسائل المكررة المحذوفة"""
+
+    def __init__(self, window: float = DEDUP_WINDOW_SECONDS, max_entries: int = DEDUP_MAX_ENTRIES):
+        self.window = window
+        self.max_entries = max_entries
+        self.task_sets: Dict[int, TimedLRUSet] = {}
+        self.suppressed: Dict[int, int] = {}
+
+    def is_duplicate(self, task_id: int, fingerprint: Optional[bytes]) -> bool:
+        """فحص بصمة (محسوبة مرة واحدة للرسالة في Envelope.content_hash) لمهمة واحدة"""
+        if fingerprint is None:
+            return False
+
+        seen = self.task_sets.get(task_id)
+        if seen is None:
+            seen = self.task_sets[task_id] = TimedLRUSet(self.window, self.max_entries)
+
+        if seen.seen_or_add(fingerprint, time.time()):
+            self.suppressed[task_id] = self.suppressed.get(task_id, 0) + 1
+            DUPLICATES_SUPPRESSED.inc(task_id)
+            return True
+        return False
+
+    def forget_task(self, task_id: int):
+        self.task_sets.pop(task_id, None)
+
+    def get_stats(self) -> Dict:
+        return {
+            'window_seconds': self.window,
+            'total_suppressed': sum(self.suppressed.values()),
+            'tasks': {
+                task_id: {'suppressed': self.suppressed.get(task_id, 0), 'fingerprints': len(seen)}
+                for task_id, seen in self.task_sets.items()
+            }
+        }
+
+
+# مرشح التكرار المشترك
+dedup_filter = DedupFilter()
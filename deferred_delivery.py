@@ -0,0 +1,306 @@
+"""
+قائمة التوصيل المؤجل: الرسائل المرفوضة خارج نافذة النشر (فلترا الأيام والساعات)
+تُحفظ في سجل دائم مرتب حسب لحظة فتح النافذة القادمة، وعند فتحها تُوزَّع الرسائل
+المتراكمة على مدة النافذة عبر محدد المعدل المشترك بدلاً من إرسالها دفعة واحدة
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.types import Message
+
+from config import (
+    DEFERRED_DELIVERIES_FILE, DEFER_MAX_SPACING_SECONDS, DEFER_RETRY_BASE_SECONDS, DEFER_RETRY_MAX_ATTEMPTS
+)
+from executors import disk_executor
+
+logger = logging.getLogger(__name__)
+
+# إعادة كتابة السجل عندما يتجاوز عدد السجلات المنتهية هذا الحد
+_COMPACT_THRESHOLD = 1000
+
+# أقصى مدة انتظار في حلقة الإطلاق (للتحقق الدوري حتى بدون رسائل جديدة)
+_MAX_IDLE_SECONDS = 60
+
+
+class DeferredDeliveryQueue:
+    """سجل دائم (JSONL: add/done) + كومتان في الذاكرة:
+    parked مرتبة حسب فتح النافذة، و ready مرتبة حسب موعد الإرسال الموزع.
+    الكتابة في السجل عبر disk_executor (خيط واحد: ترتيب الكتابات محفوظ)؛
+    إعادة التأجيل بعد فشل الإرسال = سجل add جديد بنفس المعرف يحل محل السابق عند التحميل
+    """
+
+    def __init__(self, journal_file: str = DEFERRED_DELIVERIES_FILE):
+        self.journal_file = journal_file
+        self.bot: Optional[Bot] = None
+        self.entries: Dict[str, Dict] = {}
+        self.parked: List[Tuple[float, int, str]] = []
+        self.ready: List[Tuple[float, int, str]] = []
+        self.sequence = itertools.count()
+        self.done_records = 0
+        self.is_running = False
+        self.release_task: Optional[asyncio.Task] = None
+        self.delivery_tasks = set()
+        self.wakeup: Optional[asyncio.Event] = None
+        self.released = 0
+        self.failed = 0
+
+    def _read_journal(self) -> Dict[str, Dict]:
+        """قراءة الرسائل المعلقة من السجل وضغطه إن وُجدت سجلات منتهية (في خيط القرص)"""
+        entries: Dict[str, Dict] = {}
+        if not os.path.exists(self.journal_file):
+            return entries
+
+        done_records = 0
+        with open(self.journal_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # سطر غير مكتمل (توقف أثناء الكتابة)
+                    continue
+                if record.get('op') == 'add':
+                    entries[record['id']] = record
+                elif record.get('op') == 'done':
+                    entries.pop(record.get('id'), None)
+                    done_records += 1
+        if done_records:
+            self._write_compacted(list(entries.values()))
+        return entries
+
+    async def load(self):
+        """إعادة بناء الرسائل المعلقة من السجل عند التشغيل (لا قراءة عند الاستيراد: العمليات الفرعية
+        تعيد استيراد الوحدات ويجب ألا تلمس سجل عملية أخرى)"""
+        try:
+            entries = await disk_executor.run(self._read_journal)
+        except Exception as e:
+            logger.error(f"❌ خطأ في تحميل الرسائل المؤجلة: {e}")
+            return
+
+        self.done_records = 0
+        for entry in sorted(entries.values(), key=lambda e: e['release_at']):
+            # رسالة أُجلت قبل اكتمال التحميل موجودة في الذاكرة بالفعل
+            if entry['id'] not in self.entries:
+                self.entries[entry['id']] = entry
+                heapq.heappush(self.parked, (entry['release_at'], next(self.sequence), entry['id']))
+        if entries:
+            logger.info(f"⏳ تم تحميل {len(entries)} رسالة مؤجلة من السجل")
+
+    def use_journal(self, journal_file: str):
+        """تبديل ملف السجل قبل التشغيل (كل عملية توجيه تستخدم سجلاً منفصلاً)"""
+        self.journal_file = journal_file
+        self.entries = {}
+        self.parked = []
+        self.ready = []
+        self.done_records = 0
+
+    def _append(self, record: Dict):
+        with open(self.journal_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def _write_compacted(self, entries: List[Dict]):
+        """إعادة كتابة السجل بالرسائل المعلقة فقط (في خيط القرص)"""
+        temp_file = f"{self.journal_file}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        os.replace(temp_file, self.journal_file)
+
+    def _push_parked(self, entry: Dict):
+        heapq.heappush(self.parked, (entry['release_at'], next(self.sequence), entry['id']))
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    async def park(self, message: Message, target_chat_id: int, user_id: int, task_id: int,
+                   window: Tuple[int, int]) -> bool:
+        """تأجيل رسالة حتى فتح النافذة (opens_at, closes_at)"""
+        opens_at, closes_at = window
+        entry = {
+            'op': 'add',
+            'id': uuid.uuid4().hex,
+            'user_id': user_id,
+            'task_id': task_id,
+            'target_chat_id': target_chat_id,
+            'release_at': opens_at,
+            'window_end': closes_at,
+            'created_at': time.time(),
+            'message': json.loads(message.model_dump_json(exclude_none=True)),
+        }
+        # في الذاكرة قبل الكتابة: ضغط السجل المنتظر في خيط القرص يتضمنها
+        self.entries[entry['id']] = entry
+        try:
+            await disk_executor.run(self._append, entry)
+        except Exception as e:
+            self.entries.pop(entry['id'], None)
+            logger.error(f"❌ خطأ في حفظ الرسالة المؤجلة: {e}")
+            return False
+
+        self._push_parked(entry)
+        return True
+
+    async def _repark(self, entry: Dict, error: Exception):
+        """فشل الإرسال: تبقى الرسالة في السجل وتُعاد المحاولة بتأخير يتضاعف"""
+        attempts = entry.get('attempts', 0) + 1
+        if attempts >= DEFER_RETRY_MAX_ATTEMPTS:
+            logger.error(
+                f"❌ تجاهل رسالة مؤجلة إلى {entry['target_chat_id']} بعد {attempts} محاولات فاشلة: {error}"
+            )
+            await self._mark_done(entry['id'])
+            return
+
+        delay = DEFER_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+        release_at = time.time() + delay
+        entry = {**entry, 'attempts': attempts, 'release_at': release_at,
+                 'window_end': max(entry['window_end'], release_at)}
+        self.entries[entry['id']] = entry
+        try:
+            await disk_executor.run(self._append, entry)
+        except Exception as e:
+            logger.error(f"❌ خطأ في تحديث سجل الرسائل المؤجلة: {e}")
+        self._push_parked(entry)
+        logger.warning(
+            f"⚠️ فشل إرسال رسالة مؤجلة إلى {entry['target_chat_id']} (محاولة {attempts}): {error} - "
+            f"إعادة المحاولة بعد {delay:.0f}s"
+        )
+
+    async def _mark_done(self, entry_id: str):
+        if self.entries.pop(entry_id, None) is None:
+            return
+        try:
+            await disk_executor.run(self._append, {'op': 'done', 'id': entry_id})
+            self.done_records += 1
+            if self.done_records >= _COMPACT_THRESHOLD and self.done_records > len(self.entries):
+                self.done_records = 0
+                await disk_executor.run(self._write_compacted, list(self.entries.values()))
+        except Exception as e:
+            logger.error(f"❌ خطأ في تحديث سجل الرسائل المؤجلة: {e}")
+
+    def _spread_due(self, now: float):
+        """نقل الرسائل التي فُتحت نافذتها إلى قائمة الإرسال موزعة على مدة النافذة"""
+        due: Dict[Tuple[int, int], List[Dict]] = defaultdict(list)
+        while self.parked and self.parked[0][0] <= now:
+            _, _, entry_id = heapq.heappop(self.parked)
+            entry = self.entries.get(entry_id)
+            if entry is not None:
+                due[(entry['user_id'], entry['task_id'])].append(entry)
+
+        for (user_id, task_id), entries in due.items():
+            # الفاصل = المدة المتبقية من النافذة / عدد الرسائل (بحد أقصى)
+            remaining = max(min(entry['window_end'] for entry in entries) - now, 0)
+            spacing = min(remaining / len(entries), DEFER_MAX_SPACING_SECONDS)
+            for i, entry in enumerate(entries):
+                heapq.heappush(self.ready, (now + i * spacing, next(self.sequence), entry['id']))
+            logger.info(
+                f"⏰ [User:{user_id} Task:{task_id}] فتح نافذة النشر: إطلاق {len(entries)} رسالة مؤجلة "
+                f"بفاصل {spacing:.1f}s"
+            )
+
+    async def _deliver(self, entry: Dict):
+        from integrated_media_handler import IntegratedMediaHandler
+
+        try:
+            message = Message.model_validate(entry['message']).as_(self.bot)
+            # إعادة تطبيق جميع الفلاتر - إذا أُغلقت النافذة مجدداً تُؤجل الرسالة للنافذة التالية (سجل جديد)
+            # الرسالة المؤجلة تنتظر دورها في محدد المعدل بدون حد (لا تُؤجل مرة أخرى بسبب الازدحام)
+            sent = await IntegratedMediaHandler.process_and_send_message(
+                self.bot, message, entry['target_chat_id'], entry['user_id'], entry['task_id'], raise_errors=True,
+                max_rate_wait=None
+            )
+        except asyncio.CancelledError:
+            # إيقاف البوت: تبقى الرسالة في السجل وتُعاد بعد إعادة التشغيل
+            raise
+        except Exception as e:
+            self.failed += 1
+            await self._repark(entry, e)
+            return
+
+        # True = أُرسلت، False = رفض مقصود من الفلاتر أو أُجلت من جديد
+        if sent:
+            self.released += 1
+        await self._mark_done(entry['id'])
+
+    async def _release_loop(self):
+        while self.is_running:
+            try:
+                now = time.time()
+                self._spread_due(now)
+
+                if self.ready and self.ready[0][0] <= now:
+                    _, _, entry_id = heapq.heappop(self.ready)
+                    entry = self.entries.get(entry_id)
+                    if entry is None:
+                        continue
+                    # الإرسال نفسه ينتظر محدد المعدل المشترك (بعد إعادة تطبيق الفلاتر)
+                    task = asyncio.create_task(self._deliver(entry))
+                    self.delivery_tasks.add(task)
+                    task.add_done_callback(self.delivery_tasks.discard)
+                    continue
+
+                next_times = [heap[0][0] for heap in (self.parked, self.ready) if heap]
+                wait = min(min(next_times) - now, _MAX_IDLE_SECONDS) if next_times else _MAX_IDLE_SECONDS
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=max(wait, 0))
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"❌ خطأ في حلقة إطلاق الرسائل المؤجلة: {e}")
+                await asyncio.sleep(1)
+
+    async def start(self, bot: Bot):
+        if self.is_running:
+            return
+
+        self.bot = bot
+        self.is_running = True
+        self.wakeup = asyncio.Event()
+        await self.load()
+        self.release_task = asyncio.create_task(self._release_loop())
+        logger.info(f"✅ تم تشغيل قائمة التوصيل المؤجل ({len(self.entries)} رسالة معلقة)")
+
+    async def stop(self):
+        self.is_running = False
+        if self.release_task:
+            self.release_task.cancel()
+            try:
+                await self.release_task
+            except asyncio.CancelledError:
+                pass
+        for task in list(self.delivery_tasks):
+            task.cancel()
+        logger.info("🛑 تم إيقاف قائمة التوصيل المؤجل")
+
+    def get_stats(self) -> Dict:
+        return {
+            'pending': len(self.entries),
+            'parked': len(self.parked),
+            'ready': len(self.ready),
+            'released': self.released,
+            'failed': self.failed,
+            'next_release_at': self.parked[0][0] if self.parked else None,
+        }
+
+
+# القائمة المشتركة
+deferred_delivery_queue = DeferredDeliveryQueue()
+
+
+async def initialize_deferred_delivery(bot: Bot):
+    await deferred_delivery_queue.start(bot)
+
+
+async def shutdown_deferred_delivery():
+    await deferred_delivery_queue.stop()
@@ -1,6 +1,18 @@
 
-from typing import List, Optional, Dict
+import hashlib
+import html
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import List, Optional, Dict, Tuple
 from aiogram.types import MessageEntity
+from hot_logging import get_hot_logger
+
+# تفاصيل التحويل لكل entity ولكل هدف: تُنسق فقط عند تفعيل DEBUG لنظام text
+text_log = get_hot_logger('text')
+
+# عدد نصوص HTML المحفوظة (نفس التسمية تُطلب لكل هدف يشترك في نفس المعالجة)
+HTML_CACHE_SIZE = 512
+_html_cache: "OrderedDict[bytes, str]" = OrderedDict()
 
 class EntityHandler:
     @staticmethod
@@ -43,9 +55,6 @@ class EntityHandler:
         if not original_entities or original_text == new_text:
             return EntityHandler.entities_to_dict(original_entities, original_text) if original_entities else []
         
-        import logging
-        logger = logging.getLogger(__name__)
-        
         preserved_entities = []
         
         for entity in original_entities:
@@ -66,7 +75,8 @@ class EntityHandler:
                 new_utf16_end = EntityHandler.python_offset_to_utf16(new_text, new_py_end)
                 new_utf16_length = new_utf16_end - new_utf16_offset
                 
-                logger.debug(f"Entity '{entity_text}': py_pos={new_py_position} -> utf16_offset={new_utf16_offset}, length={new_utf16_length}")
+                text_log.debug("Entity '%s': py_pos=%d -> utf16_offset=%d, length=%d",
+                               entity_text, new_py_position, new_utf16_offset, new_utf16_length)
                 
                 preserved_entities.append({
                     'type': entity.type,
@@ -78,7 +88,7 @@ class EntityHandler:
                     'custom_emoji_id': entity.custom_emoji_id if hasattr(entity, 'custom_emoji_id') else None
                 })
         
-        logger.info(f"✅ preserve_entities: {len(original_entities)} -> {len(preserved_entities)} entities محفوظة")
+        text_log.debug("✅ preserve_entities: %d -> %d entities محفوظة", len(original_entities), len(preserved_entities))
         return preserved_entities
     
     @staticmethod
@@ -91,9 +101,6 @@ class EntityHandler:
         if not entities:
             return []
         
-        import logging
-        logger = logging.getLogger(__name__)
-        
         result = []
         for entity in entities:
             entity_dict = {
@@ -105,7 +112,7 @@ class EntityHandler:
             # حفظ url (مهم جداً للـ text_link)
             if hasattr(entity, 'url') and entity.url:
                 entity_dict['url'] = entity.url
-                logger.debug(f"💾 حفظ url للـ entity: {entity.type} - URL: {entity.url}")
+                text_log.debug("💾 حفظ url للـ entity: %s - URL: %s", entity.type, entity.url)
             
             # حفظ user (للـ text_mention)
             if hasattr(entity, 'user') and entity.user:
@@ -130,8 +137,9 @@ class EntityHandler:
         
         import logging
         logger = logging.getLogger(__name__)
+        verbose = text_log.enabled(logging.DEBUG)
         
-        logger.info(f"🔄 dict_to_entities - تحويل {len(entities_dict)} entities")
+        text_log.debug("🔄 dict_to_entities - تحويل %d entities", len(entities_dict))
         
         result = []
         for e in entities_dict:
@@ -143,40 +151,132 @@ class EntityHandler:
                     'length': e['length']
                 }
                 
-                logger.info(f"   Entity: type={e['type']}, offset={e['offset']}, length={e['length']}")
+                if verbose:
+                    text_log.debug("   Entity: type=%s, offset=%s, length=%s", e['type'], e['offset'], e['length'])
                 
                 # إضافة url إذا كان موجوداً (مهم للـ text_link)
                 if 'url' in e and e['url']:
                     entity_kwargs['url'] = e['url']
-                    logger.info(f"      + url={e['url']}")
+                    text_log.debug("      + url=%s", e['url'])
                 
                 # إضافة language إذا كان موجوداً (للـ code blocks)
                 if 'language' in e and e['language']:
                     entity_kwargs['language'] = e['language']
-                    logger.info(f"      + language={e['language']}")
+                    text_log.debug("      + language=%s", e['language'])
                 
                 # إضافة user إذا كان موجوداً (للـ text_mention)
                 if 'user' in e and e['user']:
                     entity_kwargs['user'] = e['user']
-                    logger.info(f"      + user={e['user']}")
+                    text_log.debug("      + user=%s", e['user'])
                 
                 # إضافة custom_emoji_id إذا كان موجوداً
                 if 'custom_emoji_id' in e and e['custom_emoji_id']:
                     entity_kwargs['custom_emoji_id'] = e['custom_emoji_id']
-                    logger.info(f"      + custom_emoji_id={e['custom_emoji_id']}")
+                    text_log.debug("      + custom_emoji_id=%s", e['custom_emoji_id'])
                 
                 entity = MessageEntity(**entity_kwargs)
                 result.append(entity)
-                logger.info(f"   ✅ تم إنشاء Entity بنجاح")
             except Exception as ex:
                 logger.error(f"⚠️ فشل تحويل entity: {e} - خطأ: {ex}")
                 import traceback
                 logger.error(f"Traceback: {traceback.format_exc()}")
                 continue
         
-        logger.info(f"✅ dict_to_entities - تم تحويل {len(result)} entities بنجاح")
+        text_log.debug("✅ dict_to_entities - تم تحويل %d entities بنجاح", len(result))
         return result
     
+    @staticmethod
+    def utf16_length(text: str) -> int:
+        """طول النص بوحدات UTF-16 (كما يحسبه Telegram)"""
+        return len(text.encode('utf-16-le')) // 2
+    
+    @staticmethod
+    def remap_entities_to_segments(text: str, entities: Optional[List[Dict]],
+                                   segments: List[Tuple[int, int]]) -> List[Dict]:
+        """إعادة حساب entities بعد حذف أجزاء من النص بحساب الإزاحات بدلاً من البحث النصي
+        
+        Args:
+            text: النص الأصلي
+            entities: entities بصيغة dict (offsets بـ UTF-16)
+            segments: الأجزاء المحتفظ بها من النص الأصلي [(بداية, نهاية)] بـ Python index،
+                      مرتبة وغير متداخلة - النص الجديد هو دمجها بالترتيب
+        
+        Returns:
+            entities بإزاحات النص الجديد؛ تُقص الـ entity عند الأجزاء المحذوفة
+            وتُحذف إذا لم يبقَ منها شيء
+        """
+        if not entities:
+            return []
+        
+        # حدود كل جزء بوحدات UTF-16 في النص الأصلي + عدد الوحدات المحتفظ بها قبله
+        seg_starts = []
+        seg_ends = []
+        kept_before = []
+        position = 0
+        utf16_position = 0
+        kept = 0
+        for start, end in segments:
+            utf16_position += EntityHandler.utf16_length(text[position:start])
+            segment_length = EntityHandler.utf16_length(text[start:end])
+            seg_starts.append(utf16_position)
+            seg_ends.append(utf16_position + segment_length)
+            kept_before.append(kept)
+            utf16_position += segment_length
+            kept += segment_length
+            position = end
+        
+        def kept_units_before(utf16_offset: int) -> int:
+            index = bisect_right(seg_starts, utf16_offset) - 1
+            if index < 0:
+                return 0
+            return kept_before[index] + min(utf16_offset, seg_ends[index]) - seg_starts[index]
+        
+        remapped = []
+        for entity in entities:
+            new_start = kept_units_before(entity['offset'])
+            new_end = kept_units_before(entity['offset'] + entity['length'])
+            if new_end <= new_start:
+                continue
+            new_entity = entity.copy()
+            new_entity['offset'] = new_start
+            new_entity['length'] = new_end - new_start
+            remapped.append(new_entity)
+        
+        return remapped
+    
+    @staticmethod
+    def normalize_entities(entities: Optional[List[Dict]]) -> List[Dict]:
+        """entities مرتبة حسب الموقع (الأطول أولاً) بدون الفارغة أو الحقول الفارغة"""
+        if not entities:
+            return []
+        normalized = [
+            {key: value for key, value in entity.items() if value is not None}
+            for entity in entities
+            if entity.get('length', 0) > 0
+        ]
+        normalized.sort(key=lambda e: (e['offset'], -e['length']))
+        return normalized
+    
+    @staticmethod
+    def splice_entities(blocks: List[Tuple[List[Dict], int]]) -> List[Dict]:
+        """دمج كتل entities متتالية في نص واحد مع إزاحة كل كتلة - O(entities) بدون ترتيب
+        
+        Args:
+            blocks: [(entities, إزاحة الكتلة بـ UTF-16)] بترتيب ظهورها في النص
+        """
+        spliced = []
+        for entities, shift in blocks:
+            if not entities:
+                continue
+            if shift:
+                for entity in entities:
+                    shifted = entity.copy()
+                    shifted['offset'] += shift
+                    spliced.append(shifted)
+            else:
+                spliced.extend(entities)
+        return spliced
+    
     @staticmethod
     def shift_entities(entities: List[Dict], offset: int) -> List[Dict]:
         if not entities:
@@ -203,11 +303,41 @@ class EntityHandler:
         
         return merged
     
+    @staticmethod
+    def utf16_to_python_index(text: str) -> Optional[List[int]]:
+        """فهرس تحويل كل UTF-16 offset إلى Python index في مرور واحد
+        
+        يرجع None إذا لم يحتوِ النص على أحرف خارج BMP (التحويل مطابق)؛
+        الـ offset الواقع داخل زوج surrogate يُقرَّب للحرف التالي
+        """
+        if EntityHandler.utf16_length(text) == len(text):
+            return None
+        
+        index = []
+        for py_index, char in enumerate(text):
+            index.append(py_index)
+            if ord(char) > 0xFFFF:
+                index.append(py_index + 1)
+        index.append(len(text))
+        return index
+    
+    @staticmethod
+    def _html_cache_key(text: str, entities: List[Dict]) -> bytes:
+        digest = hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16)
+        for entity in entities:
+            digest.update(repr((
+                entity['type'], entity['offset'], entity['length'],
+                entity.get('url'), entity.get('language'), entity.get('custom_emoji_id')
+            )).encode('utf-8'))
+        return digest.digest()
+    
     @staticmethod
     def entities_to_html(text: str, entities: List[Dict]) -> str:
         """تحويل النص مع entities إلى HTML formatted text
         
-        يعالج UTF-16 offsets بشكل صحيح ويدعم entities المتداخلة
+        يعالج UTF-16 offsets بشكل صحيح ويدعم entities المتداخلة: عند تقاطع
+        entities تُغلق الوسوم الداخلية وتُعاد فتحها بحيث يبقى HTML متداخلاً بشكل صحيح.
+        النتيجة تُحفظ في LRU محدود لأن نفس النص يُطلب لكل هدف
         
         Args:
             text: النص الأصلي
@@ -216,80 +346,89 @@ class EntityHandler:
         Returns:
             النص بصيغة HTML مع التنسيقات
         """
-        import html
-        
         if not text:
             return ""
         
         if not entities:
             return html.escape(text)
         
-        # تحويل UTF-16 offsets إلى Python indices
-        entities_with_py_offsets = []
-        for entity in entities:
-            utf16_offset = entity['offset']
-            utf16_length = entity['length']
-            
-            # تحويل offset و end إلى Python indices
-            py_start = EntityHandler.utf16_offset_to_python(text, utf16_offset)
-            py_end = EntityHandler.utf16_offset_to_python(text, utf16_offset + utf16_length)
-            
-            entities_with_py_offsets.append({
-                'entity': entity,
-                'py_start': py_start,
-                'py_end': py_end
-            })
-        
-        # ترتيب entities حسب البداية (start أولاً) ثم النهاية (الأطول أولاً)
-        sorted_entities = sorted(entities_with_py_offsets, key=lambda x: (x['py_start'], -x['py_end']))
-        
-        # إنشاء قائمة من الأحداث (بداية ونهاية كل entity)
-        events = []
-        for i, ent_data in enumerate(sorted_entities):
-            entity = ent_data['entity']
-            py_start = ent_data['py_start']
-            py_end = ent_data['py_end']
-            
-            # start event: (position, priority, type, index, entity)
-            # priority: 0 for start (يفتح أولاً), 1 for end (يغلق لاحقاً)
-            events.append((py_start, 0, 'start', i, entity))
-            events.append((py_end, 1, 'end', i, entity))
+        cache_key = EntityHandler._html_cache_key(text, entities)
+        cached = _html_cache.get(cache_key)
+        if cached is not None:
+            _html_cache.move_to_end(cache_key)
+            return cached
+        
+        rendered = EntityHandler._render_html(text, entities)
+        
+        _html_cache[cache_key] = rendered
+        if len(_html_cache) > HTML_CACHE_SIZE:
+            _html_cache.popitem(last=False)
+        return rendered
+    
+    @staticmethod
+    def _render_html(text: str, entities: List[Dict]) -> str:
+        """مسح خطي لحدود الـ entities مع تقسيم الوسوم المتقاطعة وإعادة فتحها"""
+        text_length = len(text)
+        utf16_index = EntityHandler.utf16_to_python_index(text)
+        max_utf16 = len(utf16_index) - 1 if utf16_index is not None else text_length
+        
+        # (بداية, نهاية, ترتيب, opening, closing) بـ Python indices
+        spans = []
+        for order, entity in enumerate(entities):
+            opening = EntityHandler._get_opening_tag(entity)
+            if not opening:
+                continue
+            start = min(max(entity['offset'], 0), max_utf16)
+            end = min(max(entity['offset'] + entity['length'], 0), max_utf16)
+            if utf16_index is not None:
+                start = utf16_index[start]
+                end = utf16_index[end]
+            if end <= start:
+                continue
+            spans.append((start, end, order, opening, EntityHandler._get_closing_tag(entity)))
+        
+        if not spans:
+            return html.escape(text)
         
-        # ترتيب الأحداث حسب الموقع ثم الأولوية
-        events.sort(key=lambda x: (x[0], x[1]))
+        # الأطول أولاً عند نفس البداية ليكون الوسم الخارجي
+        spans.sort(key=lambda span: (span[0], -span[1], span[2]))
         
-        # بناء HTML
+        boundaries = sorted({span[0] for span in spans} | {span[1] for span in spans})
         parts = []
+        stack = []  # الـ spans المفتوحة حالياً (من الخارج للداخل)
+        next_span = 0
         current_pos = 0
-        open_tags_stack = []  # stack للتتبع (entity_idx, entity)
         
-        for pos, priority, event_type, entity_idx, entity in events:
-            # إضافة النص قبل الحدث
+        for pos in boundaries:
             if pos > current_pos:
-                text_part = text[current_pos:pos]
-                parts.append(html.escape(text_part))
+                parts.append(html.escape(text[current_pos:pos]))
                 current_pos = pos
             
-            if event_type == 'start':
-                # فتح tag جديد
-                tag = EntityHandler._get_opening_tag(entity)
-                if tag:  # بعض entities قد لا يكون لها tag
-                    parts.append(tag)
-                    open_tags_stack.append((entity_idx, entity))
-            else:
-                # إغلاق tag
-                # نحتاج لإغلاق بالترتيب الصحيح (LIFO لـ nested tags)
-                # لكن Telegram entities قد تتداخل بشكل معقد
-                # سنغلق ببساطة
-                tag = EntityHandler._get_closing_tag(entity)
-                if tag:
-                    parts.append(tag)
-                    # إزالة من stack
-                    if (entity_idx, entity) in open_tags_stack:
-                        open_tags_stack.remove((entity_idx, entity))
-        
-        # إضافة ما تبقى من النص
-        if current_pos < len(text):
+            # إغلاق ما ينتهي هنا: نغلق من الأعلى حتى أعمق span منتهٍ ثم نعيد فتح الباقي
+            lowest = None
+            for depth, span in enumerate(stack):
+                if span[1] == pos:
+                    lowest = depth
+                    break
+            if lowest is not None:
+                reopen = []
+                while len(stack) > lowest:
+                    span = stack.pop()
+                    parts.append(span[4])
+                    if span[1] != pos:
+                        reopen.append(span)
+                for span in reversed(reopen):
+                    parts.append(span[3])
+                    stack.append(span)
+            
+            # فتح ما يبدأ هنا
+            while next_span < len(spans) and spans[next_span][0] == pos:
+                span = spans[next_span]
+                parts.append(span[3])
+                stack.append(span)
+                next_span += 1
+        
+        if current_pos < text_length:
             parts.append(html.escape(text[current_pos:]))
         
         return ''.join(parts)
@@ -300,8 +439,6 @@ class EntityHandler:
         
         يدعم جميع أنواع entities في Telegram
         """
-        import html
-        
         entity_type = entity['type']
         
         # تنسيقات النص الأساسية
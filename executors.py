@@ -0,0 +1,175 @@
+"""
+منفذات مسماة ومحدودة لكل نوع عمل حاجز (ترجمة، كشف لغة، قرص، معالجة) بدلاً من
+المنفذ الافتراضي المشترك لحلقة الأحداث: لكل منفذ عدد عمال وحد للمهام المنتظرة
+وسياسة عند الامتلاء (wait: انتظار مكان، reject: رفض فوري)، فمزود ترجمة بطيء
+لا يؤخر حفظ الإحصائيات على القرص
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from config import (
+    TRANSLATION_EXECUTOR_WORKERS, TRANSLATION_EXECUTOR_QUEUE,
+    DETECTION_EXECUTOR_WORKERS, DETECTION_EXECUTOR_QUEUE, DISK_EXECUTOR_QUEUE
+)
+from metrics import EXECUTOR_WAIT_SECONDS, EXECUTOR_REJECTIONS
+
+logger = logging.getLogger(__name__)
+
+WAIT = 'wait'
+REJECT = 'reject'
+
+
+class ExecutorSaturated(RuntimeError):
+    """المنفذ ممتلئ (العمال + القائمة) وسياسته الرفض"""
+
+
+def _timed_call(fn: Callable, args: tuple):
+    """تُنفذ داخل العامل: لحظة البدء + النتيجة
+    (time.monotonic ساعة النظام نفسها في جميع العمليات على Linux فتصلح لمجمع العمليات أيضاً)"""
+    return time.monotonic(), fn(*args)
+
+
+class BoundedExecutor:
+    """منفذ بعدد عمال محدد وسعة انتظار محددة
+
+    المكان يُحجز حتى ينتهي العمل فعلياً (وليس حتى انتهاء مهلة المستدعي)،
+    فالعمال العالقون يظهرون كـ active ولا تُقبل فوقهم مهام أكثر من السعة
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, policy: str = WAIT,
+                 pool_factory: Optional[Callable[[], Executor]] = None, drain_on_shutdown: bool = False):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.policy = policy
+        self.drain_on_shutdown = drain_on_shutdown
+        self.pool_factory = pool_factory or (
+            lambda: ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'{name}-executor')
+        )
+        self.pool: Optional[Executor] = None
+        self.slots = asyncio.Semaphore(max_workers + max_queue)
+        self.pending = 0
+        self.waiting = 0
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _release(self, loop: asyncio.AbstractEventLoop):
+        def release():
+            self.pending -= 1
+            self.completed += 1
+            self.slots.release()
+        # الاستدعاء من خيط العامل (أو خيط إدارة مجمع العمليات)
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(release)
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None) -> Any:
+        """تنفيذ fn(*args) في المنفذ؛ ExecutorSaturated عند الامتلاء مع سياسة الرفض،
+        و asyncio.TimeoutError عند تجاوز المهلة (العامل يكمل ويبقى المكان محجوزاً حتى ينتهي)"""
+        requested_at = time.monotonic()
+        if self.slots.locked():
+            if self.policy == REJECT:
+                self.rejected += 1
+                EXECUTOR_REJECTIONS.inc(self.name)
+                raise ExecutorSaturated(f"المنفذ {self.name} ممتلئ ({self.pending} مهمة)")
+            self.waiting += 1
+            try:
+                await self.slots.acquire()
+            finally:
+                self.waiting -= 1
+        else:
+            await self.slots.acquire()
+
+        loop = asyncio.get_running_loop()
+        try:
+            if self.pool is None:
+                self.pool = self.pool_factory()
+            future = self.pool.submit(_timed_call, fn, args)
+        except BaseException:
+            self.slots.release()
+            raise
+        self.pending += 1
+        self.submitted += 1
+        future.add_done_callback(lambda _: self._release(loop))
+
+        try:
+            started_at, result = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise
+        EXECUTOR_WAIT_SECONDS.observe(started_at - requested_at, self.name)
+        return result
+
+    def get_stats(self) -> Dict:
+        active = min(self.pending, self.max_workers)
+        return {
+            'policy': self.policy,
+            'max_workers': self.max_workers,
+            'max_queue': self.max_queue,
+            'active': active,
+            'queued': self.pending - active,
+            'waiting': self.waiting,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out,
+        }
+
+    async def shutdown(self):
+        if self.pool is None:
+            return
+        pool, self.pool = self.pool, None
+        # منفذ القرص يكمل الكتابات المنتظرة؛ الباقي يلغي ما لم يبدأ
+        await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=not self.drain_on_shutdown)
+
+
+_executors: Dict[str, BoundedExecutor] = {}
+
+
+def register_executor(executor: BoundedExecutor) -> BoundedExecutor:
+    _executors[executor.name] = executor
+    return executor
+
+
+def unregister_executor(name: str):
+    _executors.pop(name, None)
+
+
+def get_executor_stats() -> Dict[str, Dict]:
+    return {name: executor.get_stats() for name, executor in _executors.items()}
+
+
+def merge_executor_stats(stats_list: Iterable[Dict[str, Dict]]) -> Dict[str, Dict]:
+    """جمع إحصائيات المنفذات من عدة عمليات (وضع العمليات المتعددة)"""
+    merged: Dict[str, Dict] = {}
+    for stats in stats_list:
+        for name, executor_stats in stats.items():
+            target = merged.setdefault(name, {'policy': executor_stats['policy']})
+            for key, value in executor_stats.items():
+                if key != 'policy':
+                    target[key] = target.get(key, 0) + value
+    return merged
+
+
+async def shutdown_executors():
+    for executor in list(_executors.values()):
+        await executor.shutdown()
+    logger.info("🛑 تم إيقاف المنفذات المسماة")
+
+
+# ترجمة: مزود خارجي بطيء أحياناً - المستدعون ينتظرون مكاناً (الرفض يعني إرسال النص بدون ترجمة)
+translation_executor = register_executor(BoundedExecutor(
+    'translation', TRANSLATION_EXECUTOR_WORKERS, TRANSLATION_EXECUTOR_QUEUE, WAIT
+))
+# كشف اللغة: عند الامتلاء يُرفض فوراً ويُستخدم 'auto'
+detection_executor = register_executor(BoundedExecutor(
+    'detection', DETECTION_EXECUTOR_WORKERS, DETECTION_EXECUTOR_QUEUE, REJECT
+))
+# القرص: خيط واحد (تحديثات read-modify-write للملفات متسلسلة) ويُفرغ عند الإيقاف
+disk_executor = register_executor(BoundedExecutor(
+    'disk_io', 1, DISK_EXECUTOR_QUEUE, WAIT, drain_on_shutdown=True
+))
@@ -347,6 +347,9 @@ class ExportImportManager:
                             'start_hour': 0,
                             'end_hour': 23
                         },
+                        'schedule_defer': {
+                            'enabled': False
+                        },
                         'translation': {
                             'enabled': False,
                             'mode': 'all_to_target',
@@ -379,6 +382,9 @@ class ExportImportManager:
                     
                     with open(settings_file, 'w', encoding='utf-8') as f:
                         json.dump(merged_settings, f, ensure_ascii=False, indent=2)
+
+                from schedule_gate import invalidate_schedule
+                invalidate_schedule(int(user_id))
             
             return True
             
@@ -0,0 +1,273 @@
+"""
+خادم Bot API وهمي لاختبارات الحمل المحلية
+يحاكي methods التوجيه الأساسية بزمن استجابة قابل للضبط واستجابات 429 قابلة للحقن،
+ويسجل لحظة وصول كل رسالة لحساب زمن التوصيل الكامل في تقرير مولّد الحمل
+
+التشغيل:
+    python fake_telegram_server.py --port 8081 --latency default=lognormal:60,0.4 --rate-429 0.01
+ثم تشغيل البوت مع:
+    TELEGRAM_API_SERVER=http://127.0.0.1:8081 BOT_TOKEN=123456:LOADTEST python main.py
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import random
+import re
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+from aiohttp import web
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# علامة يضيفها مولّد الحمل في نص الرسالة لربط الإرسال بالوصول
+LOAD_MARKER_PATTERN = re.compile(r'#lg(\d+)')
+
+SUPPORTED_METHODS = (
+    'sendMessage', 'sendPhoto', 'sendVideo', 'sendDocument', 'sendMediaGroup',
+    'copyMessage', 'deleteMessage', 'pinChatMessage', 'getChatMember',
+    'getMe', 'setWebhook', 'deleteWebhook', 'getWebhookInfo'
+)
+
+# methods تُحسب كتوصيل رسالة لقناة هدف
+DELIVERY_METHODS = ('sendMessage', 'sendPhoto', 'sendVideo', 'sendDocument', 'sendMediaGroup', 'copyMessage')
+
+
+class LatencyDistribution:
+    """توزيع زمن الاستجابة بالملي ثانية
+
+    الصيغ المدعومة:
+        fixed:50 | uniform:20,80 | normal:60,15 | lognormal:60,0.5 | exponential:40
+    """
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        kind, _, params = spec.partition(':')
+        self.kind = kind.strip().lower()
+        self.params = [float(p) for p in params.split(',') if p.strip()] if params else []
+
+        required = {'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2, 'exponential': 1}
+        if self.kind not in required or len(self.params) != required[self.kind]:
+            raise ValueError(f"توزيع زمن غير صالح: {spec}")
+
+    def sample(self) -> float:
+        """عينة بالثواني"""
+        p = self.params
+        if self.kind == 'fixed':
+            ms = p[0]
+        elif self.kind == 'uniform':
+            ms = random.uniform(p[0], p[1])
+        elif self.kind == 'normal':
+            ms = random.gauss(p[0], p[1])
+        elif self.kind == 'lognormal':
+            # p[0] هو الوسيط بالملي ثانية و p[1] هو sigma
+            ms = p[0] * random.lognormvariate(0, p[1])
+        else:
+            ms = random.expovariate(1.0 / p[0]) if p[0] > 0 else 0.0
+        return max(ms, 0.0) / 1000.0
+
+
+class FakeTelegramServer:
+    """حالة الخادم الوهمي: التوزيعات والحقن والإحصائيات"""
+
+    def __init__(self, latencies: Dict[str, LatencyDistribution], rate_429: float = 0.0,
+                 retry_after: int = 1, seed: Optional[int] = None):
+        self.latencies = latencies
+        self.default_latency = latencies.get('default', LatencyDistribution('fixed:0'))
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        # {method: [count, retry_after]} - حقن عدد محدد من استجابات 429 القادمة
+        self.injected_429: Dict[str, List[int]] = {}
+        self.message_ids = itertools.count(1)
+        if seed is not None:
+            random.seed(seed)
+        self.reset()
+
+    def reset(self):
+        self.started_at = time.time()
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.throttled: Dict[str, int] = defaultdict(int)
+        self.latency_sum: Dict[str, float] = defaultdict(float)
+        self.deliveries_per_chat: Dict[str, int] = defaultdict(int)
+        # {seq: [لحظات الوصول]} للرسائل التي تحمل علامة مولّد الحمل
+        self.arrivals: Dict[str, List[float]] = defaultdict(list)
+
+    def inject_429(self, method: str, count: int, retry_after: int):
+        self.injected_429[method] = [count, retry_after]
+        logger.info(f"💉 حقن {count} استجابة 429 لـ {method} (retry_after={retry_after})")
+
+    def _take_429(self, method: str) -> Optional[int]:
+        for key in (method, '*'):
+            injected = self.injected_429.get(key)
+            if injected and injected[0] > 0:
+                injected[0] -= 1
+                return injected[1]
+        if self.rate_429 and method in DELIVERY_METHODS and random.random() < self.rate_429:
+            return self.retry_after
+        return None
+
+    def _message(self, chat_id, text: Optional[str] = None) -> Dict:
+        try:
+            chat_id = int(chat_id)
+        except (TypeError, ValueError):
+            chat_id = 0
+        message = {
+            'message_id': next(self.message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'channel', 'title': f'fake {chat_id}'},
+        }
+        if text is not None:
+            message['text'] = text
+        return message
+
+    def _build_result(self, method: str, params: Dict):
+        chat_id = params.get('chat_id')
+        if method in ('sendMessage', 'sendPhoto', 'sendVideo', 'sendDocument'):
+            return self._message(chat_id, params.get('text') or params.get('caption') or '')
+        if method == 'sendMediaGroup':
+            return [self._message(chat_id) for _ in range(max(1, params.get('_media_count', 1)))]
+        if method == 'copyMessage':
+            return {'message_id': next(self.message_ids)}
+        if method == 'getChatMember':
+            return {
+                'status': 'administrator',
+                'user': {'id': int(params.get('user_id', 0) or 0), 'is_bot': True, 'first_name': 'fake'},
+                'can_be_edited': False, 'is_anonymous': False, 'can_manage_chat': True,
+                'can_delete_messages': True, 'can_manage_video_chats': True,
+                'can_restrict_members': True, 'can_promote_members': False,
+                'can_change_info': True, 'can_invite_users': True,
+                'can_post_stories': True, 'can_edit_stories': True, 'can_delete_stories': True,
+                'can_post_messages': True, 'can_edit_messages': True, 'can_pin_messages': True,
+            }
+        if method == 'getMe':
+            return {'id': 123456, 'is_bot': True, 'first_name': 'Fake Bot', 'username': 'fake_load_bot'}
+        if method == 'getWebhookInfo':
+            return {'url': '', 'has_custom_certificate': False, 'pending_update_count': 0}
+        # deleteMessage, pinChatMessage, setWebhook, deleteWebhook
+        return True
+
+    def _record_delivery(self, method: str, params: Dict, now: float):
+        chat_id = str(params.get('chat_id'))
+        self.deliveries_per_chat[chat_id] += 1
+        if method == 'copyMessage':
+            # مولّد الحمل يستخدم رقم التسلسل كـ message_id للرسالة المصدر
+            self.arrivals[str(params.get('message_id'))].append(now)
+            return
+        text = params.get('text') or params.get('caption') or ''
+        match = LOAD_MARKER_PATTERN.search(text)
+        if match:
+            self.arrivals[match.group(1)].append(now)
+
+    async def handle_method(self, request):
+        method = request.match_info['method']
+        if method not in SUPPORTED_METHODS:
+            return web.json_response(
+                {'ok': False, 'error_code': 404, 'description': f'Not Found: method {method} is not faked'},
+                status=404
+            )
+
+        form = await request.post()
+        params = dict(form)
+        if method == 'sendMediaGroup':
+            media = params.get('media', '[]')
+            params['_media_count'] = media.count('"type"') if isinstance(media, str) else 1
+
+        delay = self.latencies.get(method, self.default_latency).sample()
+        start = time.perf_counter()
+        if delay:
+            await asyncio.sleep(delay)
+
+        self.calls[method] += 1
+        self.latency_sum[method] += time.perf_counter() - start
+
+        retry_after = self._take_429(method)
+        if retry_after is not None:
+            self.throttled[method] += 1
+            return web.json_response({
+                'ok': False,
+                'error_code': 429,
+                'description': f'Too Many Requests: retry after {retry_after}',
+                'parameters': {'retry_after': retry_after}
+            }, status=429)
+
+        if method in DELIVERY_METHODS:
+            self._record_delivery(method, params, time.time())
+
+        return web.json_response({'ok': True, 'result': self._build_result(method, params)})
+
+    async def handle_stats(self, request):
+        elapsed = max(time.time() - self.started_at, 1e-9)
+        total_deliveries = sum(self.deliveries_per_chat.values())
+        return web.json_response({
+            'elapsed_seconds': elapsed,
+            'calls': dict(self.calls),
+            'throttled': dict(self.throttled),
+            'avg_latency_ms': {
+                method: self.latency_sum[method] / count * 1000
+                for method, count in self.calls.items() if count
+            },
+            'total_deliveries': total_deliveries,
+            'deliveries_per_second': total_deliveries / elapsed,
+            'deliveries_per_chat': dict(self.deliveries_per_chat),
+            'arrivals': dict(self.arrivals),
+        })
+
+    async def handle_reset(self, request):
+        self.reset()
+        return web.json_response({'ok': True})
+
+    async def handle_inject(self, request):
+        method = request.query.get('method', '*')
+        count = int(request.query.get('count', '1'))
+        retry_after = int(request.query.get('retry_after', str(self.retry_after)))
+        self.inject_429(method, count, retry_after)
+        return web.json_response({'ok': True})
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle_method)
+        app.router.add_get('/bot{token}/{method}', self.handle_method)
+        app.router.add_get('/_fake/stats', self.handle_stats)
+        app.router.add_post('/_fake/reset', self.handle_reset)
+        app.router.add_post('/_fake/inject', self.handle_inject)
+        return app
+
+
+def parse_latencies(specs: List[str]) -> Dict[str, LatencyDistribution]:
+    """تحويل "method=spec" إلى توزيعات (default للبقية)"""
+    latencies = {}
+    for spec in specs:
+        method, sep, dist = spec.partition('=')
+        if not sep:
+            method, dist = 'default', spec
+        latencies[method.strip()] = LatencyDistribution(dist)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description='خادم Bot API وهمي لاختبارات الحمل')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', action='append', default=[],
+                        help='method=dist أو dist للافتراضي، مثل sendMessage=lognormal:80,0.5')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='نسبة استجابات 429 العشوائية لطلبات التوصيل')
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    latencies = parse_latencies(args.latency or ['default=lognormal:50,0.4'])
+    server = FakeTelegramServer(latencies, rate_429=args.rate_429, retry_after=args.retry_after, seed=args.seed)
+
+    logger.info(f"🧪 خادم Bot API الوهمي على http://{args.host}:{args.port}")
+    for method, dist in latencies.items():
+        logger.info(f"  ⏱️ {method}: {dist.spec}")
+    web.run_app(server.create_app(), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
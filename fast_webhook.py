@@ -0,0 +1,62 @@
+"""
+استقبال webhook سريع لتحديثات channel_post
+تُقرأ الحقول اللازمة للتوجيه فقط (chat.id و message_id و media_group_id) من JSON الخام،
+وتُضاف بايتات التحديث للقائمة العامة مع رد 200 فوراً؛ بناء نماذج aiogram يتم لاحقاً في الـ worker.
+باقي أنواع التحديثات (message, callback_query, my_chat_member) تمر عبر Dispatcher كالمعتاد
+"""
+import logging
+import time
+
+from aiohttp import web
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+
+import parallel_forwarding_system
+from metrics import UPDATES_RECEIVED, WEBHOOK_ACK_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class FastIngestRequestHandler(SimpleRequestHandler):
+    """SimpleRequestHandler مع مسار مختصر لرسائل القنوات"""
+
+    async def handle(self, request: web.Request) -> web.Response:
+        started = time.perf_counter()
+        bot = await self.resolve_bot(request)
+        if not self.verify_secret(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), bot):
+            return web.Response(body="Unauthorized", status=401)
+
+        # القراءة تُحفظ في الطلب فيستطيع المسار العادي إعادة استخدامها
+        raw_update = await request.read()
+        if self._try_fast_ingest(raw_update, bot):
+            WEBHOOK_ACK_SECONDS.observe(time.perf_counter() - started, 'fast')
+            return web.json_response({})
+
+        response = await super().handle(request)
+        WEBHOOK_ACK_SECONDS.observe(time.perf_counter() - started, 'dispatcher')
+        return response
+
+    @staticmethod
+    def _try_fast_ingest(raw_update: bytes, bot) -> bool:
+        """إضافة channel_post للقائمة العامة مباشرة، أو False للمسار العادي"""
+        system = parallel_forwarding_system.parallel_system
+        if system is None:
+            return False
+
+        try:
+            update = bot.session.json_loads(raw_update)
+        except ValueError:
+            return False
+
+        post = update.get('channel_post') if isinstance(update, dict) else None
+        if not isinstance(post, dict):
+            return False
+        chat = post.get('chat')
+        chat_id = chat.get('id') if isinstance(chat, dict) else None
+        message_id = post.get('message_id')
+        if not chat_id or message_id is None:
+            return False
+
+        # عند امتلاء القائمة تُسجل الرسالة كمتجاهلة (نفس سلوك المسار العادي) ويُرد 200
+        system.add_raw_update(raw_update, chat_id, message_id, post.get('media_group_id'))
+        UPDATES_RECEIVED.inc('channel_post', 'fast')
+        return True
@@ -75,7 +75,8 @@ async def show_stats(callback: CallbackQuery):
     text = "📊 <b>إحصائيات النظام المتوازي</b>\n\n"
     text += f"📥 حجم القائمة العامة: {stats['global_queue_size']}\n"
     text += f"🔄 عدد Global Workers: {stats['num_global_workers']}\n"
-    text += f"✅ عدد المهام النشطة: {stats['num_active_tasks']}\n\n"
+    text += f"✅ عدد المهام النشطة: {stats['num_active_tasks']}\n"
+    text += f"🧬 رسائل مكررة تم تجاهلها: {stats['duplicates_suppressed']}\n\n"
 
     if stats['tasks']:
         text += "📋 <b>تفاصيل المهام:</b>\n"
@@ -83,6 +84,17 @@ async def show_stats(callback: CallbackQuery):
             text += f"\nالمهمة #{task_id}:\n"
             text += f"  📥 قائمة الانتظار: {task_stats['queue_size']}\n"
             text += f"  👷 عدد Workers: {task_stats['num_workers']}\n"
+            if task_stats['duplicates_suppressed']:
+                text += f"  🧬 مكررة: {task_stats['duplicates_suppressed']}\n"
+
+    if stats.get('executors'):
+        text += "\n⚙️ <b>المنفذات:</b>\n"
+        for name, executor_stats in stats['executors'].items():
+            text += (
+                f"  {name}: نشطة {executor_stats['active']}/{executor_stats['max_workers']}، "
+                f"منتظرة {executor_stats['queued'] + executor_stats['waiting']}، "
+                f"مرفوضة {executor_stats['rejected']}\n"
+            )
 
     keyboard = [[InlineKeyboardButton(text="refresh", callback_data="fwd_stats")],
                 [InlineKeyboardButton(text="🔙 رجوع", callback_data="back_to_fwd_menu")]]
@@ -335,7 +347,8 @@ async def view_task(callback: CallbackQuery, bot: Bot):
 
     text = f"📋 <b>تفاصيل المهمة #{task_id}</b>\n\n"
     text += f"📝 الاسم: {task.name}\n"
-    text += f"✅ الحالة: {'مفعّلة' if task.is_active else 'معطّلة'}\n\n"
+    text += f"✅ الحالة: {'مفعّلة' if task.is_active else 'معطّلة'}\n"
+    text += f"🧬 منع التكرار: {'مفعّل' if task.dedup_enabled else 'معطّل'}\n\n"
 
     text += f"📥 قنوات المصدر ({len(task.source_channels)}):\n"
     for ch in task.source_channels:
@@ -352,6 +365,10 @@ async def view_task(callback: CallbackQuery, bot: Bot):
             InlineKeyboardButton(text="📥 تعديل المصدر", callback_data=f"fwd_edit_source_{task_id}"),
             InlineKeyboardButton(text="📤 إدارة الأهداف", callback_data=f"fwd_manage_targets_{task_id}_0")
         ],
+        [InlineKeyboardButton(
+            text="🧬 تعطيل منع التكرار" if task.dedup_enabled else "🧬 تفعيل منع التكرار",
+            callback_data=f"fwd_dedup_{task_id}"
+        )],
         [InlineKeyboardButton(text="🗑 حذف المهمة", callback_data=f"fwd_delete_{task_id}")],
         [InlineKeyboardButton(text="🔙 رجوع", callback_data="fwd_list")]
     ]
@@ -830,6 +847,21 @@ async def toggle_task(callback: CallbackQuery):
     )
     await view_task(callback, callback.bot)
 
+@router.callback_query(F.data.startswith("fwd_dedup_"))
+async def toggle_task_dedup(callback: CallbackQuery):
+    task_id = int(callback.data.split("_")[2])
+    new_status = manager.toggle_dedup(task_id)
+
+    # إعادة تحميل المهام في النظام المتوازي
+    if parallel_forwarding_system.parallel_system:
+        await parallel_forwarding_system.parallel_system.reload_tasks()
+
+    await callback.answer(
+        f"✅ تم {'تفعيل' if new_status else 'تعطيل'} منع التكرار!",
+        show_alert=True
+    )
+    await view_task(callback, callback.bot)
+
 @router.callback_query(F.data.startswith("fwd_delete_"))
 async def delete_task(callback: CallbackQuery):
     task_id = int(callback.data.split("_")[2])
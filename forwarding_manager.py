@@ -14,6 +14,7 @@ class ForwardingTask:
     target_channels: List[Dict]  # [{"id": -100..., "title": "..."}]
     is_active: bool
     created_at: str
+    dedup_enabled: bool = False  # منع تكرار نفس المحتوى القادم من عدة قنوات مصدر
     
 class ForwardingManager:
     def __init__(self):
@@ -80,6 +81,14 @@ class ForwardingManager:
             return tasks[task_id].is_active
         return False
     
+    def toggle_dedup(self, task_id: int) -> bool:
+        tasks = self.load_tasks()
+        if task_id in tasks:
+            tasks[task_id].dedup_enabled = not tasks[task_id].dedup_enabled
+            self.save_tasks(tasks)
+            return tasks[task_id].dedup_enabled
+        return False
+    
     def delete_task(self, task_id: int) -> bool:
         tasks = self.load_tasks()
         if task_id in tasks:
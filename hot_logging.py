@@ -0,0 +1,189 @@
+"""
+سجلات المسار الساخن (التوجيه ومعالجة النص): تنسيق كسول بأسلوب % بدلاً من f-strings
+(النص لا يُبنى إذا كان المستوى معطلاً)، مستوى لكل نظام فرعي يُغيّر أثناء التشغيل
+من لوحة Console، كتم التكرار بحد لكل نافذة زمنية، وملخص دوري لكل مهمة
+بدلاً من سطر لكل هدف
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from config import HOT_LOG_LEVELS, HOT_LOG_DEFAULT_LEVEL, HOT_LOG_REPEAT_BURST, HOT_LOG_SUMMARY_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# بادئة أسماء loggers الأنظمة الفرعية (hot.delivery، hot.text...)
+_PREFIX = 'hot.'
+
+# الأنظمة الفرعية المعروفة (تظهر في لوحة Console حتى قبل أول سجل)
+SUBSYSTEMS = ('ingest', 'delivery', 'text', 'translation', 'loop')
+
+
+class HotLogger:
+    """logger لنظام فرعي: الرسالة والمعاملات لا تُنسق إلا إذا كان المستوى مفعلاً
+
+    repeat(): نفس المفتاح يُسجل HOT_LOG_REPEAT_BURST مرة لكل نافذة ملخص، والباقي يُعد
+    ويظهر عدده في الملخص الدوري
+    """
+
+    def __init__(self, subsystem: str):
+        self.subsystem = subsystem
+        self.logger = logging.getLogger(_PREFIX + subsystem)
+        _hot_loggers[subsystem] = self
+
+    def enabled(self, level: int) -> bool:
+        """للمعاملات المكلفة (قوائم entities...): تُحسب فقط إذا كان المستوى مفعلاً"""
+        return self.logger.isEnabledFor(level)
+
+    def debug(self, msg: str, *args):
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger._log(logging.DEBUG, msg, args)
+
+    def info(self, msg: str, *args):
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger._log(logging.INFO, msg, args)
+
+    def warning(self, msg: str, *args):
+        if self.logger.isEnabledFor(logging.WARNING):
+            self.logger._log(logging.WARNING, msg, args)
+
+    def repeat(self, level: int, key: Hashable, msg: str, *args):
+        """سجل قد يتكرر بكثرة (نفس الخطأ لكل هدف): حد لكل مفتاح في كل نافذة"""
+        if not self.logger.isEnabledFor(level):
+            return
+        if hot_log_summary.count_repeat(self.subsystem, key):
+            self.logger._log(level, msg, args)
+
+
+class DeliverySummary:
+    """تجميع نتائج التوجيه لكل مهمة وكتابتها كسطر واحد كل HOT_LOG_SUMMARY_SECONDS"""
+
+    def __init__(self, interval: float = HOT_LOG_SUMMARY_SECONDS, repeat_burst: int = HOT_LOG_REPEAT_BURST):
+        self.interval = interval
+        self.repeat_burst = repeat_burst
+        self.outcomes: Dict[int, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.repeats: Dict[Tuple[str, Hashable], int] = defaultdict(int)
+        self.window_start = time.monotonic()
+        self.summary_logger = logging.getLogger(_PREFIX + 'summary')
+        self.flush_task: Optional[asyncio.Task] = None
+
+    def record(self, task_id: int, outcome: str, count: int = 1):
+        self.outcomes[task_id][outcome] += count
+
+    def count_repeat(self, subsystem: str, key: Hashable) -> bool:
+        """True إذا كان السجل ضمن الحد المسموح في النافذة الحالية"""
+        seen = self.repeats[(subsystem, key)] = self.repeats[(subsystem, key)] + 1
+        return seen <= self.repeat_burst
+
+    def flush(self):
+        """كتابة ملخص النافذة المنتهية وبدء نافذة جديدة"""
+        now = time.monotonic()
+        elapsed = now - self.window_start
+        outcomes, self.outcomes = self.outcomes, defaultdict(lambda: defaultdict(int))
+        repeats, self.repeats = self.repeats, defaultdict(int)
+        self.window_start = now
+
+        for task_id in sorted(outcomes):
+            counts = outcomes[task_id]
+            details = ' | '.join(f"{outcome}: {counts[outcome]}" for outcome in sorted(counts))
+            self.summary_logger.info("📈 [المهمة #%s] آخر %.0fs: %s", task_id, elapsed, details)
+
+        for (subsystem, key), seen in repeats.items():
+            if seen > self.repeat_burst:
+                self.summary_logger.info(
+                    "🔇 [%s] تم كتم %d تكرار لـ %s خلال %.0fs", subsystem, seen - self.repeat_burst, key, elapsed
+                )
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.sleep(self.interval)
+                self.flush()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"❌ خطأ في ملخص السجلات: {e}")
+
+    def start(self):
+        if self.flush_task is None:
+            self.window_start = time.monotonic()
+            self.flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self.flush_task is None:
+            return
+        self.flush_task.cancel()
+        try:
+            await self.flush_task
+        except asyncio.CancelledError:
+            pass
+        self.flush_task = None
+        # ملخص آخر نافذة قبل الإيقاف
+        self.flush()
+
+
+_hot_loggers: Dict[str, HotLogger] = {}
+
+# تُستدعى عند تغيير مستوى من لوحة Console (وضع العمليات المتعددة يبلغ عمليات التوجيه)
+_level_listeners: List[Callable[[str, str], None]] = []
+
+hot_log_summary = DeliverySummary()
+
+
+def get_hot_logger(subsystem: str) -> HotLogger:
+    return _hot_loggers.get(subsystem) or HotLogger(subsystem)
+
+
+def add_level_listener(listener: Callable[[str, str], None]):
+    _level_listeners.append(listener)
+
+
+def remove_level_listener(listener: Callable[[str, str], None]):
+    if listener in _level_listeners:
+        _level_listeners.remove(listener)
+
+
+def set_hot_log_level(subsystem: str, level: str, notify: bool = True) -> bool:
+    """تغيير مستوى نظام فرعي أثناء التشغيل (DEBUG/INFO/WARNING/ERROR)"""
+    level = level.upper()
+    numeric = logging.getLevelName(level)
+    if not isinstance(numeric, int):
+        return False
+    logging.getLogger(_PREFIX + subsystem).setLevel(numeric)
+    logger.info(f"🎚️ مستوى سجلات {subsystem}: {level}")
+    if notify:
+        for listener in list(_level_listeners):
+            listener(subsystem, level)
+    return True
+
+
+def get_hot_log_levels() -> Dict[str, str]:
+    subsystems = set(SUBSYSTEMS) | set(_hot_loggers) | {'summary'}
+    return {
+        subsystem: logging.getLevelName(logging.getLogger(_PREFIX + subsystem).getEffectiveLevel())
+        for subsystem in sorted(subsystems)
+    }
+
+
+def _apply_configured_levels():
+    """المستوى الافتراضي لجميع الأنظمة الفرعية، ثم HOT_LOG_LEVELS (مثال: delivery=DEBUG,text=INFO)"""
+    logging.getLogger(_PREFIX.rstrip('.')).setLevel(HOT_LOG_DEFAULT_LEVEL.upper())
+    # الملخص الدوري هو بديل السطور لكل هدف فيبقى مفعلاً
+    logging.getLogger(_PREFIX + 'summary').setLevel(logging.INFO)
+    for item in HOT_LOG_LEVELS.split(','):
+        if '=' in item:
+            subsystem, level = item.split('=', 1)
+            set_hot_log_level(subsystem.strip(), level.strip())
+
+
+_apply_configured_levels()
+
+
+async def initialize_hot_logging():
+    hot_log_summary.start()
+
+
+async def shutdown_hot_logging():
+    await hot_log_summary.stop()
@@ -1,13 +1,53 @@
 import logging
 from datetime import datetime
 from typing import Dict, List, Tuple
-from zoneinfo import ZoneInfo
+from timezone_manager import get_zoneinfo
 
 logger = logging.getLogger(__name__)
 
 class HourFilter:
     """فلتر الساعات للتحكم في ساعات النشر"""
     
+    @staticmethod
+    def evaluate_hour(settings: Dict, current_hour: int) -> Tuple[bool, str]:
+        """
+        الحكم على ساعة محددة (0-23) بدون قراءة الوقت الحالي
+        
+        Returns:
+            (مسموح, سبب الرفض)
+        """
+        mode = settings.get('mode', 'allow')
+        allowed_hours = settings.get('hours', [])
+        
+        # وضع السماح: الساعة يجب أن تكون في القائمة
+        if mode == 'allow':
+            if current_hour not in allowed_hours:
+                return False, f"الساعة الحالية ({current_hour}:00) غير مسموح بالنشر فيها"
+            return True, ""
+        
+        # وضع الحظر: الساعة يجب ألا تكون في القائمة
+        elif mode == 'block':
+            if current_hour in allowed_hours:
+                return False, f"الساعة الحالية ({current_hour}:00) محظورة من النشر"
+            return True, ""
+        
+        # وضع النطاق الزمني
+        elif mode == 'range':
+            start_hour = settings.get('start_hour', 0)
+            end_hour = settings.get('end_hour', 23)
+            
+            # التعامل مع النطاق الذي يمر بمنتصف الليل
+            if start_hour <= end_hour:
+                is_allowed = start_hour <= current_hour <= end_hour
+            else:
+                is_allowed = current_hour >= start_hour or current_hour <= end_hour
+            
+            if not is_allowed:
+                return False, f"الساعة الحالية ({current_hour}:00) خارج النطاق المسموح ({start_hour}:00 - {end_hour}:00)"
+            return True, ""
+        
+        return True, ""
+    
     @staticmethod
     def check_hour_allowed(settings: Dict, timezone: str = 'UTC') -> Tuple[bool, str]:
         """
@@ -25,51 +65,8 @@ class HourFilter:
         
         try:
             # الحصول على الساعة الحالية حسب المنطقة الزمنية
-            tz = ZoneInfo(timezone)
-            now = datetime.now(tz)
-            current_hour = now.hour  # 0-23
-            
-            mode = settings.get('mode', 'allow')
-            allowed_hours = settings.get('hours', [])
-            
-            # وضع السماح: الساعة يجب أن تكون في القائمة
-            if mode == 'allow':
-                is_allowed = current_hour in allowed_hours
-                
-                if not is_allowed:
-                    return False, f"الساعة الحالية ({current_hour}:00) غير مسموح بالنشر فيها"
-                
-                logger.info(f"✅ الساعة ({current_hour}:00) مسموحة للنشر")
-                return True, ""
-            
-            # وضع الحظر: الساعة يجب ألا تكون في القائمة
-            elif mode == 'block':
-                is_blocked = current_hour in allowed_hours
-                
-                if is_blocked:
-                    return False, f"الساعة الحالية ({current_hour}:00) محظورة من النشر"
-                
-                logger.info(f"✅ الساعة ({current_hour}:00) غير محظورة")
-                return True, ""
-            
-            # وضع النطاق الزمني
-            elif mode == 'range':
-                start_hour = settings.get('start_hour', 0)
-                end_hour = settings.get('end_hour', 23)
-                
-                # التعامل مع النطاق الذي يمر بمنتصف الليل
-                if start_hour <= end_hour:
-                    is_allowed = start_hour <= current_hour <= end_hour
-                else:
-                    is_allowed = current_hour >= start_hour or current_hour <= end_hour
-                
-                if not is_allowed:
-                    return False, f"الساعة الحالية ({current_hour}:00) خارج النطاق المسموح ({start_hour}:00 - {end_hour}:00)"
-                
-                logger.info(f"✅ الساعة ({current_hour}:00) ضمن النطاق المسموح")
-                return True, ""
-            
-            return True, ""
+            now = datetime.now(get_zoneinfo(timezone))
+            return HourFilter.evaluate_hour(settings, now.hour)
             
         except Exception as e:
             logger.error(f"❌ خطأ في فلتر الساعات: {e}")
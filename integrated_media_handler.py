@@ -1,5 +1,7 @@
 
 import logging
+import time
+from typing import Optional
 from aiogram import Bot
 from aiogram.types import Message
 from message_processor import MessageProcessor
@@ -11,45 +13,86 @@ from auto_pin_filter import auto_pin_manager
 from auto_delete_manager import auto_delete_manager
 from reply_preservation_handler import reply_preservation
 from link_preview_manager import LinkPreviewManager
-from task_statistics_manager import TaskStatistics
+from task_statistics_manager import record_task_stat
+from translation_gateway import TranslationUnavailable, deferral_window
 from translation_handler import TranslationHandler
+from deferred_delivery import deferred_delivery_queue
+from rate_limiter import RateLimitDeferred, telegram_rate_limiter
+from config import TELEGRAM_MAX_SEND_WAIT_SECONDS
+from message_envelope import Envelope
+from metrics import RENDER_SECONDS
+from tracing import tracer
+from hot_logging import get_hot_logger
 
 # Configure and initialize logger at module level
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+# سطور كل هدف (المسار الساخن): مستوى قابل للتغيير أثناء التشغيل وتنسيق كسول
+hot_log = get_hot_logger('delivery')
+
+# {نوع الوسائط: (دالة الإرسال, اسم حقل الملف, يدعم caption)}
+_SEND_METHODS = {
+    'photo': ('send_photo', 'photo', True),
+    'video': ('send_video', 'video', True),
+    'document': ('send_document', 'document', True),
+    'audio': ('send_audio', 'audio', True),
+    'voice': ('send_voice', 'voice', True),
+    'video_note': ('send_video_note', 'video_note', False),
+    'animation': ('send_animation', 'animation', True),
+    'sticker': ('send_sticker', 'sticker', False),
+}
 
 class IntegratedMediaHandler:
     @staticmethod
-    async def process_and_send_message(bot: Bot, message: Message, target_chat_id: int, user_id: int, task_id: int) -> bool:
+    async def process_and_send_message(bot: Bot, message: Optional[Message], target_chat_id: int, user_id: int,
+                                       task_id: int, envelope: Optional[Envelope] = None,
+                                       raise_errors: bool = False,
+                                       max_rate_wait: Optional[float] = TELEGRAM_MAX_SEND_WAIT_SECONDS) -> bool:
+        """False = رفض مقصود (فلتر أو تأجيل)؛ أخطاء الإرسال تُرجع False أيضاً إلا مع raise_errors
+        (التوصيل المؤجل يميز الفشل ليعيد المحاولة بدلاً من حذف الرسالة).
+        دور الإرسال الأبعد من max_rate_wait يُؤجل الرسالة بدلاً من انتظاره (None = انتظار بلا حد).
+        message يمكن أن يكون None مع envelope: الإرسال العادي يقرأ الغلاف فقط و envelope.message
+        يُبنى في المسارات النادرة (التأجيل، الرد، النسخ)"""
         try:
-            logger.info(f"🔧 [User:{user_id} Task:{task_id}] بدء معالجة رسالة للقناة {target_chat_id}")
+            if envelope is None:
+                envelope = Envelope(message)
+            hot_log.debug("🔧 [User:%s Task:%s] بدء معالجة رسالة للقناة %s", user_id, task_id, target_chat_id)
             processor = MessageProcessor(user_id, task_id)
             settings_manager = TaskSettingsManager(user_id, task_id)
             sub_manager = SubscriptionManager(user_id)
             
-            should_process, reason = processor.should_process_message(message)
+            with tracer.span('should_process', target_chat_id):
+                should_process, reason = processor.should_process_message(None, envelope)
             if not should_process:
-                logger.warning(f"⚠️ [User:{user_id} Task:{task_id}] تم حظر الرسالة: {reason}")
+                # وضع التأجيل: الرسالة خارج نافذة النشر تُحفظ حتى فتح النافذة القادمة
+                window = processor.get_deferral_window()
+                if window and await deferred_delivery_queue.park(envelope.message, target_chat_id, user_id, task_id, window):
+                    hot_log.info("⏳ [User:%s Task:%s] تأجيل الرسالة للقناة %s حتى %s: %s",
+                                 user_id, task_id, target_chat_id, window[0], reason)
+                    return False
+                
+                hot_log.repeat(logging.WARNING, ('blocked', task_id),
+                               "⚠️ [User:%s Task:%s] تم حظر الرسالة: %s", user_id, task_id, reason)
                 
                 # تسجيل الرسالة المفلترة
-                stats = TaskStatistics(user_id, task_id)
-                stats.increment_filtered_message('media_filter')
+                record_task_stat(user_id, task_id, 'increment_filtered_message', 'media_filter')
                 
                 return False
             
-            logger.info(f"✅ [User:{user_id} Task:{task_id}] الرسالة مسموحة، بدء معالجة النص")
+            hot_log.debug("✅ [User:%s Task:%s] الرسالة مسموحة، بدء معالجة النص", user_id, task_id)
             
-            allowed, processed_text, entities, reason = processor.process_message_text(message)
+            with tracer.span('process_text', target_chat_id):
+                allowed, processed_text, entities, reason = await processor.process_message_text_async(None, envelope)
             if not allowed:
-                logger.warning(f"⚠️ [User:{user_id} Task:{task_id}] تم حظر الرسالة بعد معالجة النص: {reason}")
+                hot_log.repeat(logging.WARNING, ('text_blocked', task_id),
+                               "⚠️ [User:%s Task:%s] تم حظر الرسالة بعد معالجة النص: %s", user_id, task_id, reason)
                 
                 # تسجيل الرسالة المفلترة (تحديد نوع الفلتر من سبب الحظر)
-                stats = TaskStatistics(user_id, task_id)
-                stats.increment_filtered_message('text_filter')
+                record_task_stat(user_id, task_id, 'increment_filtered_message', 'text_filter')
                 
                 return False
             
-            logger.info(f"✅ [User:{user_id} Task:{task_id}] تمت معالجة النص بنجاح")
+            hot_log.debug("✅ [User:%s Task:%s] تمت معالجة النص بنجاح", user_id, task_id)
             
             # إعدادات الميزات المتقدمة
             settings = settings_manager.load_settings()
@@ -60,40 +103,50 @@ class IntegratedMediaHandler:
             if is_premium and translation_setting.get('enabled', False) and processed_text:
                 translator = TranslationHandler()
                 try:
-                    translated, translated_text, new_entities = await translator.process_translation(
-                        processed_text, 
-                        translation_setting,
-                        entities
-                    )
+                    with tracer.span('translate', target_chat_id):
+                        translated, translated_text, new_entities = await translator.process_translation(
+                            processed_text, 
+                            translation_setting,
+                            entities
+                        )
                     if translated and translated_text:
                         processed_text = translated_text
                         entities = new_entities  # استخدام entities المحدثة بعد الترجمة
-                        logger.info(
-                            f"✅ [User:{user_id} Task:{task_id}] تمت ترجمة النص بنجاح "
-                            f"مع الحفاظ على {len(entities)} entities"
+                        hot_log.debug(
+                            "✅ [User:%s Task:%s] تمت ترجمة النص بنجاح مع الحفاظ على %d entities",
+                            user_id, task_id, len(entities)
                         )
                         
                         # تتبع إحصائيات الترجمة
-                        stats = TaskStatistics(user_id, task_id)
-                        stats.increment_translation()
+                        record_task_stat(user_id, task_id, 'increment_translation')
+                except TranslationUnavailable as e:
+                    # وضع التأجيل: إعادة المحاولة بعد عودة المزود (ضمن حد أقصى لعمر الرسالة)
+                    window = deferral_window(envelope.date, e)
+                    if window and await deferred_delivery_queue.park(envelope.message, target_chat_id, user_id, task_id, window):
+                        hot_log.info("⏳ [User:%s Task:%s] تأجيل الرسالة للقناة %s حتى توفر الترجمة: %s",
+                                     user_id, task_id, target_chat_id, e)
+                        return False
+                    hot_log.repeat(logging.WARNING, ('translation_unavailable', task_id),
+                                   "⚠️ [User:%s Task:%s] الترجمة غير متاحة، إرسال النص الأصلي: %s", user_id, task_id, e)
                 except Exception as e:
                     logger.error(f"❌ [User:{user_id} Task:{task_id}] خطأ في الترجمة: {e}")
             
-            reply_markup = processor.get_reply_markup(message)
+            reply_markup = processor.get_reply_markup(None, envelope=envelope)
             
             # تحويل entities إلى HTML للحصول على التنسيقات الصحيحة
             if entities and processed_text:
-                html_text = EntityHandler.entities_to_html(processed_text, entities)
-                logger.info(f"🎨 تحويل النص إلى HTML: '{html_text[:100]}...'")
+                with RENDER_SECONDS.time(), tracer.span('render', target_chat_id):
+                    html_text = EntityHandler.entities_to_html(processed_text, entities)
+                hot_log.debug("🎨 تحويل النص إلى HTML: '%.100s...'", html_text)
             else:
                 html_text = processed_text
             
             # الحصول على reply_to_message_id إذا كان مفعل Reply Preservation
             reply_to_msg_id = None
             reply_preservation_setting = settings.get('reply_preservation', {})
-            if is_premium and reply_preservation_setting.get('enabled', False):
+            if is_premium and reply_preservation_setting.get('enabled', False) and envelope.reply_to_message_id is not None:
                 reply_to_msg_id = reply_preservation.get_reply_to_message_id(
-                    message, target_chat_id
+                    envelope.message, target_chat_id
                 )
             
             # الحصول على إعداد Link Preview
@@ -104,82 +157,40 @@ class IntegratedMediaHandler:
                     link_preview_setting
                 )
             
-            logger.info(f"📤 [User:{user_id} Task:{task_id}] بدء الإرسال إلى القناة {target_chat_id}")
+            hot_log.debug("📤 [User:%s Task:%s] بدء الإرسال إلى القناة %s", user_id, task_id, target_chat_id)
             
             sent_msg = None
+            # حد البوت المشترك (وحد القناة) قبل الإرسال الفعلي - بعد الفلاتر حتى لا تستهلك الرسائل المرفوضة رموزاً
+            try:
+                await telegram_rate_limiter.acquire(target_chat_id, max_rate_wait)
+            except RateLimitDeferred as e:
+                # القناة مزدحمة: الرسالة تُحفظ للتوصيل المؤجل بعد موعدها بدلاً من انتهاء مهلة التوجيه
+                opens_at = time.time() + e.retry_after
+                window = (int(opens_at), int(opens_at + e.retry_after))
+                if await deferred_delivery_queue.park(envelope.message, target_chat_id, user_id, task_id, window):
+                    hot_log.info("⏳ [User:%s Task:%s] تأجيل الرسالة للقناة %s لمدة %.0fs (حد معدل الإرسال)",
+                                 user_id, task_id, target_chat_id, e.retry_after)
+                    return False
+                await telegram_rate_limiter.acquire(target_chat_id)
             
-            if message.photo:
-                sent_msg = await bot.send_photo(
-                    chat_id=target_chat_id,
-                    photo=message.photo[-1].file_id,
-                    caption=html_text,
-                    parse_mode='HTML',
-                    reply_markup=reply_markup,
-                    reply_to_message_id=reply_to_msg_id
-                )
-            elif message.video:
-                sent_msg = await bot.send_video(
-                    chat_id=target_chat_id,
-                    video=message.video.file_id,
-                    caption=html_text,
-                    parse_mode='HTML',
-                    reply_markup=reply_markup,
-                    reply_to_message_id=reply_to_msg_id
-                )
-            elif message.document:
-                sent_msg = await bot.send_document(
-                    chat_id=target_chat_id,
-                    document=message.document.file_id,
-                    caption=html_text,
-                    parse_mode='HTML',
-                    reply_markup=reply_markup,
-                    reply_to_message_id=reply_to_msg_id
-                )
-            elif message.audio:
-                sent_msg = await bot.send_audio(
-                    chat_id=target_chat_id,
-                    audio=message.audio.file_id,
-                    caption=html_text,
-                    parse_mode='HTML',
-                    reply_markup=reply_markup,
-                    reply_to_message_id=reply_to_msg_id
-                )
-            elif message.voice:
-                sent_msg = await bot.send_voice(
-                    chat_id=target_chat_id,
-                    voice=message.voice.file_id,
-                    caption=html_text,
-                    parse_mode='HTML',
-                    reply_markup=reply_markup,
-                    reply_to_message_id=reply_to_msg_id
-                )
-            elif message.video_note:
-                sent_msg = await bot.send_video_note(
-                    chat_id=target_chat_id,
-                    video_note=message.video_note.file_id,
-                    reply_markup=reply_markup,
-                    reply_to_message_id=reply_to_msg_id
-                )
-            elif message.animation:
-                sent_msg = await bot.send_animation(
-                    chat_id=target_chat_id,
-                    animation=message.animation.file_id,
-                    caption=html_text,
-                    parse_mode='HTML',
-                    reply_markup=reply_markup,
-                    reply_to_message_id=reply_to_msg_id
-                )
-            elif message.sticker:
-                sent_msg = await bot.send_sticker(
-                    chat_id=target_chat_id,
-                    sticker=message.sticker.file_id,
-                    reply_markup=reply_markup,
-                    reply_to_message_id=reply_to_msg_id
-                )
-            elif message.text:
+            send_spec = _SEND_METHODS.get(envelope.media_kind)
+            if send_spec:
+                method_name, media_field, has_caption = send_spec
                 kwargs = {
                     'chat_id': target_chat_id,
-                    'text': html_text or message.text,
+                    media_field: envelope.file_id,
+                    'reply_markup': reply_markup,
+                    'reply_to_message_id': reply_to_msg_id
+                }
+                if has_caption:
+                    kwargs['caption'] = html_text
+                    kwargs['parse_mode'] = 'HTML'
+                
+                sent_msg = await getattr(bot, method_name)(**kwargs)
+            elif envelope.media_kind == 'text':
+                kwargs = {
+                    'chat_id': target_chat_id,
+                    'text': html_text or envelope.text,
                     'parse_mode': 'HTML',
                     'reply_markup': reply_markup,
                     'reply_to_message_id': reply_to_msg_id
@@ -191,45 +202,26 @@ class IntegratedMediaHandler:
             else:
                 result = await bot.copy_message(
                     chat_id=target_chat_id,
-                    from_chat_id=message.chat.id,
-                    message_id=message.message_id,
+                    from_chat_id=envelope.chat_id,
+                    message_id=envelope.message_id,
                     reply_to_message_id=reply_to_msg_id
                 )
                 sent_msg = result if hasattr(result, 'message_id') else None
             
-            logger.info(f"✅ [User:{user_id} Task:{task_id}] تم إرسال الرسالة بنجاح إلى القناة {target_chat_id}")
+            hot_log.debug("✅ [User:%s Task:%s] تم إرسال الرسالة بنجاح إلى القناة %s", user_id, task_id, target_chat_id)
             
             # تسجيل الإحصائيات للرسالة الناجحة
-            stats = TaskStatistics(user_id, task_id)
-            
-            # تحديد نوع الوسائط
-            if message.photo:
-                media_type = 'photo'
-            elif message.video:
-                media_type = 'video'
-            elif message.document:
-                media_type = 'document'
-            elif message.audio:
-                media_type = 'audio'
-            elif message.voice:
-                media_type = 'voice'
-            elif message.video_note:
-                media_type = 'video_note'
-            elif message.animation:
-                media_type = 'animation'
-            elif message.sticker:
-                media_type = 'sticker'
-            else:
-                media_type = 'text'
+            # نوع الوسائط محسوب مسبقاً في الغلاف (الرسائل غير المدعومة تُحسب كنص)
+            media_type = envelope.media_kind or 'text'
             
             text_length = len(processed_text) if processed_text else 0
-            stats.increment_successful_forward(media_type, text_length)
+            record_task_stat(user_id, task_id, 'increment_successful_forward', media_type, text_length)
             
             # حفظ mapping للردود
             if is_premium and reply_preservation_setting.get('enabled', False) and sent_msg:
                 reply_preservation.store_message_mapping(
-                    message.chat.id,
-                    message.message_id,
+                    envelope.chat_id,
+                    envelope.message_id,
                     target_chat_id,
                     sent_msg.message_id
                 )
@@ -245,8 +237,7 @@ class IntegratedMediaHandler:
                     auto_pin_setting.get('delete_notification_after')
                 )
                 # تتبع إحصائيات التثبيت التلقائي
-                stats = TaskStatistics(user_id, task_id)
-                stats.increment_auto_pin()
+                record_task_stat(user_id, task_id, 'increment_auto_pin')
             
             # جدولة الحذف التلقائي
             auto_delete_setting = settings.get('auto_delete', {})
@@ -265,8 +256,7 @@ class IntegratedMediaHandler:
                     task_id
                 )
                 # تتبع إحصائيات الحذف التلقائي
-                stats = TaskStatistics(user_id, task_id)
-                stats.increment_auto_delete()
+                record_task_stat(user_id, task_id, 'increment_auto_delete')
             
             return True
             
@@ -274,7 +264,8 @@ class IntegratedMediaHandler:
             logger.error(f"❌ [User:{user_id} Task:{task_id}] خطأ في معالجة وإرسال الرسالة إلى {target_chat_id}: {e}", exc_info=True)
             
             # تسجيل الفشل
-            stats = TaskStatistics(user_id, task_id)
-            stats.increment_failed_forward()
+            record_task_stat(user_id, task_id, 'increment_failed_forward')
             
+            if raise_errors:
+                raise
             return False
@@ -0,0 +1,117 @@
+"""
+كشف لغة النص مرة واحدة لكل نص: نظام الكتابة يكفي عندما يكون حاسماً (بدون langdetect)،
+ونتائج langdetect تُحفظ في LRU بمفتاح blake2b للنص، والطلبات المتزامنة لنفس النص
+(توجيه رسالة واحدة لعدة أهداف) تنتظر نفس عملية الكشف بدلاً من تكرارها.
+langdetect عشوائي بدون seed، فيُثبّت الـ seed لتكون النتيجة نفسها لكل هدف ولكل إعادة تشغيل
+"""
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from langdetect import DetectorFactory, detect
+from langdetect.lang_detect_exception import LangDetectException
+
+from config import LANGUAGE_DETECTION_CACHE_SIZE
+from executors import detection_executor
+from metrics import LANGUAGE_DETECTIONS
+from script_histogram import get_script_histogram
+
+logger = logging.getLogger(__name__)
+
+# نتائج ثابتة: نفس النص يعطي نفس اللغة دائماً
+DetectorFactory.seed = 0
+
+
+def _detect_sync(text: str) -> Optional[str]:
+    """تُنفذ في منفذ الكشف؛ None للنصوص بدون ميزات لغوية (رموز، روابط فقط)"""
+    try:
+        return detect(text)
+    except LangDetectException:
+        return None
+
+
+class LanguageDetector:
+    """كشف اللغة مع LRU للنتائج ودمج الطلبات المتزامنة لنفس النص"""
+
+    def __init__(self, max_entries: int = LANGUAGE_DETECTION_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.items: 'OrderedDict[bytes, Optional[str]]' = OrderedDict()
+        self.in_flight: Dict[bytes, asyncio.Future] = {}
+        self.script_hits = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.detector_calls = 0
+
+    @staticmethod
+    def _key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+    def _put(self, key: bytes, language: Optional[str]):
+        self.items[key] = language
+        if len(self.items) > self.max_entries:
+            self.items.popitem(last=False)
+
+    async def detect(self, text: str) -> Optional[str]:
+        """اللغة المكتشفة أو None عند تعذر الكشف؛ ExecutorSaturated عند امتلاء منفذ الكشف"""
+        histogram = get_script_histogram(text)
+        if not histogram.total:
+            # لا أحرف: لا شيء يكشفه langdetect
+            self.script_hits += 1
+            LANGUAGE_DETECTIONS.inc('script')
+            return None
+        guessed = histogram.guess_language()
+        if guessed:
+            self.script_hits += 1
+            LANGUAGE_DETECTIONS.inc('script')
+            return guessed
+
+        key = self._key(text)
+        if key in self.items:
+            self.items.move_to_end(key)
+            self.cache_hits += 1
+            LANGUAGE_DETECTIONS.inc('cache')
+            return self.items[key]
+
+        pending = self.in_flight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            LANGUAGE_DETECTIONS.inc('coalesced')
+            # shield: إلغاء أحد المنتظرين لا يلغي الكشف للبقية
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            self.detector_calls += 1
+            LANGUAGE_DETECTIONS.inc('detector')
+            language = await detection_executor.run(_detect_sync, text)
+        except Exception as e:
+            # الفشل (منفذ ممتلئ) لا يُحفظ - المحاولة التالية قد تنجح
+            future.set_exception(e)
+            # تعليم الاستثناء كمُسترجع حتى لا يظهر تحذير عند عدم وجود منتظرين
+            future.exception()
+            raise
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        finally:
+            self.in_flight.pop(key, None)
+
+        self._put(key, language)
+        future.set_result(language)
+        return language
+
+    def get_stats(self) -> Dict:
+        return {
+            'entries': len(self.items),
+            'script_hits': self.script_hits,
+            'cache_hits': self.cache_hits,
+            'coalesced': self.coalesced,
+            'detector_calls': self.detector_calls,
+        }
+
+
+# الكاشف المشترك
+language_detector = LanguageDetector()
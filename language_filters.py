@@ -1,28 +1,16 @@
 
-from typing import Tuple
-import re
+from typing import Optional, Tuple
+from script_histogram import ScriptHistogram, get_script_histogram
 
 class LanguageFilters:
     
-    LANGUAGE_PATTERNS = {
-        'ar': r'[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF]',
-        'en': r'[a-zA-Z]',
-        'ru': r'[а-яА-ЯёЁ]',
-        'fa': r'[\u0600-\u06FF]',
-        'ur': r'[\u0600-\u06FF]',
-        'tr': r'[a-zA-ZçÇğĞıİöÖşŞüÜ]',
-        'de': r'[a-zA-ZäöüßÄÖÜ]',
-        'fr': r'[a-zA-ZàâäæçéèêëïîôùûüÿœÀÂÄÆÇÉÈÊËÏÎÔÙÛÜŸŒ]',
-        'es': r'[a-zA-ZáéíóúüñÁÉÍÓÚÜÑ]',
-        'it': r'[a-zA-ZàèéìíîòóùúÀÈÉÌÍÎÒÓÙÚ]',
-        'pt': r'[a-zA-ZáâãàçéêíóôõúüÁÂÃÀÇÉÊÍÓÔÕÚÜ]'
-    }
-    
     @staticmethod
     def detect_language_ratio(text: str, language: str) -> float:
         """
         كشف نسبة وجود لغة معينة في النص
         
+        يعتمد على مدرّج أنظمة الكتابة المحسوب مرة واحدة لكل نص (script_histogram)
+        
         Args:
             text: النص المراد فحصه
             language: كود اللغة
@@ -30,30 +18,14 @@ class LanguageFilters:
         Returns:
             نسبة وجود اللغة (0.0 - 1.0)
         """
-        if language not in LanguageFilters.LANGUAGE_PATTERNS:
-            return 0.0
-        
-        pattern = LanguageFilters.LANGUAGE_PATTERNS[language]
-        
-        # إزالة علامات الترقيم والمسافات للحصول على الأحرف فقط
-        text_clean = re.sub(r'[^\w\s]', '', text)
-        text_clean = re.sub(r'\s+', '', text_clean)
-        
-        if not text_clean:
+        if not text or not ScriptHistogram.supports(language):
             return 0.0
         
-        # البحث عن أحرف اللغة في النص المنظف
-        language_chars = len(re.findall(pattern, text_clean))
-        total_chars = len(text_clean)
-        
-        if total_chars == 0:
-            return 0.0
-        
-        ratio = language_chars / total_chars
-        return ratio
+        return get_script_histogram(text).language_ratio(language)
     
     @staticmethod
-    def apply_language_filter(text: str, mode: str, languages: list, sensitivity: str) -> Tuple[bool, str]:
+    def apply_language_filter(text: str, mode: str, languages: list, sensitivity: str,
+                              histogram: Optional[ScriptHistogram] = None) -> Tuple[bool, str]:
         """
         تطبيق فلتر اللغة
         
@@ -64,6 +36,7 @@ class LanguageFilters:
             sensitivity: حساسية الفلتر ('partial' أو 'full')
                 - partial: يكتشف وجود جزء من النص باللغة (20%+)
                 - full: يتطلب أن يكون النص كاملاً باللغة (85%+)
+            histogram: مدرّج النص المحسوب مسبقاً (Envelope.histogram) إن وجد
         
         Returns:
             (مسموح, سبب الرفض)
@@ -80,9 +53,13 @@ class LanguageFilters:
         detected_lang = None
         max_ratio = 0.0
         
+        # مدرّج واحد للنص يخدم جميع اللغات المحددة
+        if histogram is None:
+            histogram = get_script_histogram(text or '')
+        
         # فحص جميع اللغات المحددة
         for lang in languages:
-            ratio = LanguageFilters.detect_language_ratio(text, lang)
+            ratio = histogram.language_ratio(lang)
             
             # تتبع أعلى نسبة
             if ratio > max_ratio:
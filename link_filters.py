@@ -1,126 +1,175 @@
 import re
-from typing import Tuple, List, Dict, Optional
+from functools import lru_cache
+from typing import Tuple, List, Dict, NamedTuple, Optional
+
+# ماسح موحّد لجميع أنواع الروابط (مُجمَّع مرة واحدة) - كل مجموعة تحدد نوع الرابط
+LINK_PATTERN = re.compile(
+    r'(?P<url>http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+)'
+    r'|(?P<www>www\.(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+)'
+    r'|(?P<tme>t\.me/[a-zA-Z0-9_]+)'
+    r'|(?P<mention>@[a-zA-Z0-9_]+)'
+    # روابط بدون http/https (مثل domain.com/path)
+    r'|(?P<domain>(?<![/@])(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\.)+[a-zA-Z]{2,}(?:/[a-zA-Z0-9._~:/?#\[\]@!$&\'()*+,;=-]*)?)',
+    re.IGNORECASE
+)
+
+# أنماط find_all_links/remove_links (أضيق من الماسح الموحد الذي يستخدمه فلتر المهام):
+# حساسة لحالة الأحرف، واسم المستخدم من 5 إلى 32 حرفاً كما في Telegram (@abc ليس رابطاً)
+_STRICT_URL_PATTERN = re.compile(
+    r'https?://(?:www\.)?[-a-zA-Z0-9@:%._\+~#=]{1,256}\.[a-zA-Z0-9()]{1,6}\b(?:[-a-zA-Z0-9()@:%_\+.~#?&/=]*)'
+)
+_STRICT_USERNAME_PATTERN = re.compile(r'@[a-zA-Z0-9_]{5,32}')
+_STRICT_TME_PATTERN = re.compile(r't\.me/[a-zA-Z0-9_]+')
+_STRICT_DOMAIN_PATTERN = re.compile(
+    r'(?<![/@])(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\.)+[a-zA-Z]{2,}(?:/[a-zA-Z0-9._~:/?#\[\]@!$&\'()*+,;=-]*)?'
+)
+_STRICT_PATTERNS = (_STRICT_URL_PATTERN, _STRICT_USERNAME_PATTERN, _STRICT_TME_PATTERN, _STRICT_DOMAIN_PATTERN)
+
+# أنواع entities التي تمثل روابط
+LINK_ENTITY_TYPES = ('url', 'text_link', 'mention', 'text_mention')
+
+_NEWLINE_RUN_PATTERN = re.compile(r'\n{3,}')
+_WHITESPACE_RUN_PATTERN = re.compile(r'\s+')
+
+
+class LinkSpan(NamedTuple):
+    """رابط واحد في النص: نوعه وموقعه (Python index)"""
+    kind: str
+    start: int
+    end: int
+
+
+@lru_cache(maxsize=1024)
+def scan_links(text: str) -> Tuple[LinkSpan, ...]:
+    """جميع الروابط في النص بمرور واحد (مع cache: نفس الرسالة لكل الأهداف تُفحص مرة واحدة)"""
+    return tuple(
+        LinkSpan(match.lastgroup, match.start(), match.end())
+        for match in LINK_PATTERN.finditer(text)
+    )
+
 
 class LinkFilters:
     @staticmethod
     def find_all_links(text: str) -> List[str]:
-        url_pattern = r'https?://(?:www\.)?[-a-zA-Z0-9@:%._\+~#=]{1,256}\.[a-zA-Z0-9()]{1,6}\b(?:[-a-zA-Z0-9()@:%_\+.~#?&/=]*)'
-
-        username_pattern = r'@[a-zA-Z0-9_]{5,32}'
-
-        tme_pattern = r't\.me/[a-zA-Z0-9_]+'
-        
-        # pattern للروابط بدون http/https
-        domain_pattern = r'(?<![/@])(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\.)+[a-zA-Z]{2,}(?:/[a-zA-Z0-9._~:/?#\[\]@!$&\'()*+,;=-]*)?'
-
-        urls = re.findall(url_pattern, text)
-        usernames = re.findall(username_pattern, text)
-        tme_links = re.findall(tme_pattern, text)
-        domain_links = re.findall(domain_pattern, text)
-
-        all_links = urls + usernames + tme_links + domain_links
-
-        return list(set(all_links))
+        # كل نمط على حدة (قد تتداخل النتائج، مثل الرابط الكامل والنطاق داخله)
+        return list({link for pattern in _STRICT_PATTERNS for link in pattern.findall(text)})
 
     @staticmethod
     def remove_links(text: str, entities: Optional[List[Dict]] = None) -> Tuple[str, List[Dict]]:
         from entity_handler import EntityHandler
 
-        url_pattern = r'https?://(?:www\.)?[-a-zA-Z0-9@:%._\+~#=]{1,256}\.[a-zA-Z0-9()]{1,6}\b(?:[-a-zA-Z0-9()@:%_\+.~#?&/=]*)'
-
-        username_pattern = r'@[a-zA-Z0-9_]{5,32}'
-
-        tme_pattern = r't\.me/[a-zA-Z0-9_]+'
-        
-        # pattern للروابط بدون http/https
-        domain_pattern = r'(?<![/@])(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\.)+[a-zA-Z]{2,}(?:/[a-zA-Z0-9._~:/?#\[\]@!$&\'()*+,;=-]*)?'
+        # حذف متتالٍ لكل نمط (حذف اسم المستخدم قد يكشف نطاقاً بعده: me@example.org)
+        # الأجزاء المحتفظ بها في كل مرور = ما بين الروابط
+        stripped_text, new_entities = text, entities
+        for pattern in _STRICT_PATTERNS:
+            segments = []
+            position = 0
+            for match in pattern.finditer(stripped_text):
+                if match.start() > position:
+                    segments.append((position, match.start()))
+                position = match.end()
+            if position == 0:
+                continue
+            if position < len(stripped_text):
+                segments.append((position, len(stripped_text)))
+            new_entities = EntityHandler.remap_entities_to_segments(stripped_text, new_entities, segments)
+            stripped_text = ''.join(stripped_text[start:end] for start, end in segments)
+
+        # دمج المسافات المتتالية في مسافة واحدة مع الإبقاء على أول حرف من كل مجموعة
+        segments = []
+        position = 0
+        for match in _WHITESPACE_RUN_PATTERN.finditer(stripped_text):
+            segments.append((position, match.start() + 1))
+            position = match.end()
+        segments.append((position, len(stripped_text)))
+        new_entities = EntityHandler.remap_entities_to_segments(stripped_text, new_entities, segments)
+        new_text = _WHITESPACE_RUN_PATTERN.sub(' ', stripped_text)
+
+        return LinkFilters._strip_with_entities(new_text, new_entities)
 
-        new_text = text
-        new_text = re.sub(url_pattern, '', new_text)
-        new_text = re.sub(username_pattern, '', new_text)
-        new_text = re.sub(tme_pattern, '', new_text)
-        new_text = re.sub(domain_pattern, '', new_text)
-
-        new_text = re.sub(r'\s+', ' ', new_text).strip()
-
-        new_entities = EntityHandler.preserve_entities(text,
-            EntityHandler.dict_to_entities(entities) if entities else None,
-            new_text)
+    @staticmethod
+    def _strip_with_entities(text: str, entities: List[Dict]) -> Tuple[str, List[Dict]]:
+        """strip() للنص مع إزاحة entities"""
+        from entity_handler import EntityHandler
 
-        return new_text, new_entities
+        start = len(text) - len(text.lstrip())
+        end = len(text.rstrip())
+        if start == 0 and end == len(text):
+            return text, entities
+        return text[start:end], EntityHandler.remap_entities_to_segments(text, entities, [(start, end)] if end > start else [])
 
     @staticmethod
-    def apply_link_filter(text: str, mode: str, entities: List[Dict]) -> Tuple[bool, str, List[Dict]]:
-        """تطبيق فلتر الروابط مع الحفاظ على بنية الأسطر"""
+    def apply_link_filter(text: str, mode: str, entities: Optional[List[Dict]] = None,
+                          spans: Optional[Tuple[LinkSpan, ...]] = None) -> Tuple[bool, str, List[Dict]]:
+        """تطبيق فلتر الروابط مع الحفاظ على بنية الأسطر (spans: مواقع الروابط المحسوبة مسبقاً للنص نفسه)"""
         from entity_handler import EntityHandler
-        
+
+        entities = entities or []
         if not text:
             return True, text, entities
 
-        # التحقق من وجود روابط
-        url_patterns = [
-            r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+',
-            r'www\.(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+',
-            r't\.me/[a-zA-Z0-9_]+',
-            r'@[a-zA-Z0-9_]+',
-            # إضافة pattern لروابط بدون http/https (مثل domain.com/path)
-            r'(?<![/@])(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\.)+[a-zA-Z]{2,}(?:/[a-zA-Z0-9._~:/?#\[\]@!$&\'()*+,;=-]*)?'
-        ]
-
-        has_link = any(re.search(pattern, text, re.IGNORECASE) for pattern in url_patterns)
+        # التحقق من وجود روابط (مرور واحد على النص كاملاً)
+        if spans is None:
+            spans = scan_links(text)
 
         # التحقق من وجود entities من نوع url, text_link, mention
-        has_link_entity = any(
-            e.get('type') in ['url', 'text_link', 'mention', 'text_mention']
-            for e in entities
-        ) if entities else False
-
-        has_link = has_link or has_link_entity
+        has_link_entity = any(e.get('type') in LINK_ENTITY_TYPES for e in entities)
 
-        if not has_link:
+        if not spans and not has_link_entity:
             return True, text, entities
 
         if mode == 'block':
             return False, "الرسالة تحتوي على روابط", []
 
         elif mode == 'remove':
-            # معالجة النص سطر بسطر - حذف الأسطر التي تحتوي على روابط
-            lines = text.split('\n')
-            new_lines = []
-
-            for line in lines:
-                # التحقق من وجود رابط في السطر
-                line_has_link = any(re.search(pattern, line, re.IGNORECASE) for pattern in url_patterns)
-                
-                if line_has_link:
-                    # حذف السطر بالكامل إذا كان يحتوي على رابط
-                    continue
-                else:
-                    # الحفاظ على السطر كما هو
-                    new_lines.append(line)
-
-            new_text = '\n'.join(new_lines)
-
-            # إزالة entities المرتبطة بالروابط
-            if entities:
-                new_entities = [
-                    e for e in entities
-                    if e.get('type') not in ['url', 'text_link', 'mention', 'text_mention']
-                ]
-
-                # إعادة حساب offsets
-                new_entities = EntityHandler.preserve_entities(
-                    text,
-                    EntityHandler.dict_to_entities(entities) if entities else None,
-                    new_text
-                )
-            else:
-                new_entities = []
+            # حذف الأسطر التي تحتوي على روابط (الروابط لا تمتد عبر الأسطر)
+            # الأجزاء المحتفظ بها: كل سطر بدون رابط مع سطره الجديد الفاصل
+            segments = []
+            span_index = 0
+            line_start = 0
+            text_length = len(text)
+            while line_start <= text_length:
+                line_end = text.find('\n', line_start)
+                if line_end == -1:
+                    line_end = text_length
+
+                while span_index < len(spans) and spans[span_index].start < line_start:
+                    span_index += 1
+                line_has_link = span_index < len(spans) and spans[span_index].start < line_end
+
+                if not line_has_link:
+                    if segments and segments[-1][1] == line_start - 1:
+                        # السطر السابق محتفظ به - ضم الفاصل بينهما
+                        segments[-1] = (segments[-1][0], line_end)
+                    elif segments:
+                        # الفاصل '\n' قبل هذا السطر يُستخدم بين السطرين المحتفظ بهما
+                        segments.append((line_start - 1, line_end))
+                    else:
+                        segments.append((line_start, line_end))
+                line_start = line_end + 1
+
+            new_text = ''.join(text[start:end] for start, end in segments)
+
+            # إزالة entities الروابط وإعادة حساب offsets بحساب الإزاحات
+            new_entities = EntityHandler.remap_entities_to_segments(
+                text,
+                [e for e in entities if e.get('type') not in LINK_ENTITY_TYPES],
+                segments
+            )
 
             # تنظيف الأسطر الفارغة المتتالية فقط (3 أو أكثر -> 2)
-            new_text = re.sub(r'\n{3,}', '\n\n', new_text)
-            new_text = new_text.strip()
+            segments = []
+            position = 0
+            for match in _NEWLINE_RUN_PATTERN.finditer(new_text):
+                segments.append((position, match.start() + 2))
+                position = match.end()
+            if segments:
+                segments.append((position, len(new_text)))
+                new_entities = EntityHandler.remap_entities_to_segments(new_text, new_entities, segments)
+                new_text = _NEWLINE_RUN_PATTERN.sub('\n\n', new_text)
+
+            new_text, new_entities = LinkFilters._strip_with_entities(new_text, new_entities)
 
             return True, new_text, new_entities
 
-        return True, text, entities
\ No newline at end of file
+        return True, text, entities
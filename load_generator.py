@@ -0,0 +1,236 @@
+"""
+مولّد حمل لنظام التوجيه المتوازي
+يرسل تحديثات channel_post صناعية إلى /webhook بمعدل محدد، ثم يقرأ إحصائيات
+الخادم الوهمي (fake_telegram_server.py) ليُخرج تقرير إنتاجية وزمن توصيل قابل للتكرار
+
+الخطوات:
+    1) python load_generator.py setup --tasks 5 --targets 20
+    2) python fake_telegram_server.py --port 8081
+    3) TELEGRAM_API_SERVER=http://127.0.0.1:8081 BOT_TOKEN=123456:LOADTEST python main.py
+    4) python load_generator.py run --tasks 5 --targets 20 --rate 20 --duration 30
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List
+import aiohttp
+
+# معرفات ثابتة للقنوات الصناعية حتى تكون التقارير قابلة للمقارنة بين التشغيلات
+SOURCE_BASE_ID = -1009000000000
+TARGET_BASE_ID = -1008000000000
+
+SAMPLE_TEXTS = [
+    "🔴 عاجل: انطلاق فعاليات المؤتمر الدولي للتقنية في الرياض بمشاركة واسعة",
+    "Breaking: markets rally as central bank holds rates steady 📈",
+    "📢 تابعونا على https://t.me/example_channel لمزيد من الأخبار",
+    "مرحبا بكم في قناتنا، هذا نص تجريبي طويل نسبياً يحتوي على عدة جمل. الجملة الثانية هنا. والثالثة!",
+    "Weekly digest ✨ #news #tech — read more at https://example.com/article?id=42",
+    "خبر: ارتفاع درجات الحرارة غداً 🌡️ مع رياح نشطة على المناطق الساحلية",
+]
+
+
+def source_channel_id(task_index: int) -> int:
+    return SOURCE_BASE_ID - task_index
+
+
+def target_channel_id(task_index: int, target_index: int, targets_per_task: int) -> int:
+    return TARGET_BASE_ID - (task_index * targets_per_task + target_index)
+
+
+def setup_tasks(num_tasks: int, targets_per_task: int):
+    """إنشاء N مهام × M أهداف في ملف المهام (يُشغَّل قبل تشغيل البوت)"""
+    from forwarding_manager import ForwardingManager
+
+    manager = ForwardingManager()
+    for task_index in range(num_tasks):
+        source_id = source_channel_id(task_index)
+        manager.add_task(
+            name=f"load-test #{task_index + 1}",
+            source_channels=[{'id': source_id, 'title': f'load source {task_index + 1}'}],
+            target_channels=[
+                {
+                    'id': target_channel_id(task_index, target_index, targets_per_task),
+                    'title': f'load target {task_index + 1}.{target_index + 1}'
+                }
+                for target_index in range(targets_per_task)
+            ]
+        )
+    print(f"✅ تم إنشاء {num_tasks} مهام × {targets_per_task} أهداف في {manager.tasks_file}")
+
+
+def build_update(update_id: int, seq: int, chat_id: int) -> Dict:
+    text = f"{random.choice(SAMPLE_TEXTS)} #lg{seq}"
+    return {
+        'update_id': update_id,
+        'channel_post': {
+            'message_id': seq,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'channel', 'title': f'load source {chat_id}'},
+            'text': text,
+        }
+    }
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+async def run_load(args) -> Dict:
+    random.seed(args.seed)
+    sources = [source_channel_id(i) for i in range(args.tasks)]
+    interval = 1.0 / args.rate if args.rate > 0 else 0.0
+    total_messages = int(args.rate * args.duration)
+
+    sent_at: Dict[str, float] = {}
+    ack_latencies: List[float] = []
+    webhook_errors = 0
+
+    async with aiohttp.ClientSession() as session:
+        await session.post(f"{args.fake_server}/_fake/reset")
+
+        async def post_update(seq: int):
+            nonlocal webhook_errors
+            update = build_update(seq, seq, sources[seq % len(sources)])
+            start = time.perf_counter()
+            sent_at[str(seq)] = time.time()
+            try:
+                async with session.post(args.webhook_url, json=update) as response:
+                    await response.read()
+                    if response.status != 200:
+                        webhook_errors += 1
+            except aiohttp.ClientError:
+                webhook_errors += 1
+            ack_latencies.append(time.perf_counter() - start)
+
+        # جدولة منتظمة مستقلة عن زمن الاستجابة (open-loop)
+        print(f"🚀 إرسال {total_messages} رسالة بمعدل {args.rate}/ث إلى {args.webhook_url}")
+        started = time.perf_counter()
+        pending = []
+        for seq in range(1, total_messages + 1):
+            target_time = started + (seq - 1) * interval
+            delay = target_time - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            pending.append(asyncio.create_task(post_update(seq)))
+        await asyncio.gather(*pending)
+        send_duration = time.perf_counter() - started
+
+        # انتظار تصريف القوائم حتى تتوقف التوصيلات عن الزيادة
+        expected = total_messages * args.targets
+        stats = {}
+        last_total = -1
+        idle_since = time.perf_counter()
+        deadline = time.perf_counter() + args.drain_timeout
+        while time.perf_counter() < deadline:
+            async with session.get(f"{args.fake_server}/_fake/stats") as response:
+                stats = await response.json()
+            total = stats.get('total_deliveries', 0)
+            if total >= expected:
+                break
+            if total != last_total:
+                last_total = total
+                idle_since = time.perf_counter()
+            elif time.perf_counter() - idle_since > args.idle_timeout:
+                break
+            await asyncio.sleep(0.5)
+
+    end_to_end = []
+    last_arrival = 0.0
+    for seq, arrivals in stats.get('arrivals', {}).items():
+        sent = sent_at.get(seq)
+        if sent is None:
+            continue
+        for arrival in arrivals:
+            end_to_end.append(arrival - sent)
+            last_arrival = max(last_arrival, arrival)
+
+    first_sent = min(sent_at.values()) if sent_at else 0.0
+    delivered = stats.get('total_deliveries', 0)
+    delivery_window = (last_arrival - first_sent) if last_arrival else 0.0
+
+    return {
+        'tasks': args.tasks,
+        'targets_per_task': args.targets,
+        'rate': args.rate,
+        'messages_sent': total_messages,
+        'send_duration_seconds': send_duration,
+        'webhook_errors': webhook_errors,
+        'webhook_ack_ms': {
+            'p50': percentile(ack_latencies, 50) * 1000,
+            'p95': percentile(ack_latencies, 95) * 1000,
+            'p99': percentile(ack_latencies, 99) * 1000,
+        },
+        'expected_deliveries': expected,
+        'delivered': delivered,
+        'delivery_ratio': delivered / expected if expected else 0.0,
+        'deliveries_per_second': delivered / delivery_window if delivery_window > 0 else 0.0,
+        'end_to_end_ms': {
+            'p50': percentile(end_to_end, 50) * 1000,
+            'p95': percentile(end_to_end, 95) * 1000,
+            'p99': percentile(end_to_end, 99) * 1000,
+            'max': max(end_to_end) * 1000 if end_to_end else 0.0,
+        },
+        'api_calls': stats.get('calls', {}),
+        'api_throttled': stats.get('throttled', {}),
+    }
+
+
+def print_report(report: Dict):
+    print("\n📊 تقرير الحمل")
+    print(f"  المهام × الأهداف: {report['tasks']} × {report['targets_per_task']}")
+    print(f"  الرسائل المرسلة: {report['messages_sent']} بمعدل {report['rate']}/ث "
+          f"خلال {report['send_duration_seconds']:.1f}ث (أخطاء webhook: {report['webhook_errors']})")
+    ack = report['webhook_ack_ms']
+    print(f"  زمن استجابة webhook: p50={ack['p50']:.1f}ms p95={ack['p95']:.1f}ms p99={ack['p99']:.1f}ms")
+    print(f"  التوصيلات: {report['delivered']}/{report['expected_deliveries']} "
+          f"({report['delivery_ratio'] * 100:.1f}%) | {report['deliveries_per_second']:.1f} توصيل/ث")
+    e2e = report['end_to_end_ms']
+    print(f"  زمن التوصيل الكامل: p50={e2e['p50']:.0f}ms p95={e2e['p95']:.0f}ms "
+          f"p99={e2e['p99']:.0f}ms max={e2e['max']:.0f}ms")
+    print(f"  طلبات API: {report['api_calls']}")
+    if report['api_throttled']:
+        print(f"  استجابات 429: {report['api_throttled']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='مولّد حمل لنظام التوجيه')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    setup_parser = subparsers.add_parser('setup', help='إنشاء مهام صناعية في ملف المهام')
+    setup_parser.add_argument('--tasks', type=int, default=1)
+    setup_parser.add_argument('--targets', type=int, default=10)
+
+    run_parser = subparsers.add_parser('run', help='إرسال الحمل وإخراج التقرير')
+    run_parser.add_argument('--tasks', type=int, default=1)
+    run_parser.add_argument('--targets', type=int, default=10)
+    run_parser.add_argument('--rate', type=float, default=10.0, help='رسائل في الثانية')
+    run_parser.add_argument('--duration', type=float, default=10.0, help='مدة الإرسال بالثواني')
+    run_parser.add_argument('--webhook-url', default='http://127.0.0.1:5000/webhook')
+    run_parser.add_argument('--fake-server', default='http://127.0.0.1:8081')
+    run_parser.add_argument('--drain-timeout', type=float, default=120.0)
+    run_parser.add_argument('--idle-timeout', type=float, default=10.0)
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--json', dest='json_output', default=None, help='حفظ التقرير في ملف JSON')
+
+    args = parser.parse_args()
+
+    if args.command == 'setup':
+        setup_tasks(args.tasks, args.targets)
+        return
+
+    report = asyncio.run(run_load(args))
+    print_report(report)
+    if args.json_output:
+        with open(args.json_output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 تم حفظ التقرير في {args.json_output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+"""
+مراقبة تأخر event loop: نبضة كل LOOP_LAG_INTERVAL_SECONDS تقيس تأخر جدولتها،
+وخيط مراقبة منفصل يلتقط stack الخيط الرئيسي عندما تتأخر النبضة أكثر من LOOP_LAG_THRESHOLD_SECONDS
+(الخيط الرئيسي مشغول بكود متزامن: open/json.dump/حلقات ثقيلة).
+كل توقف يُنسب لأعمق سطر من كود المشروع في الـ stack (موقع الاستدعاء) وللدالة التي استدعاها (الدالة الحاجزة)،
+والمواقع تُجمع في جدول يُعرض في لوحة Console ويُصدر كمقاييس
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, List, Optional, Tuple
+
+from config import LOOP_LAG_INTERVAL_SECONDS, LOOP_LAG_THRESHOLD_SECONDS, LOOP_LAG_TOP
+from hot_logging import get_hot_logger
+from metrics import LOOP_LAG_SECONDS, LOOP_STALLS
+
+logger = logging.getLogger(__name__)
+loop_log = get_hot_logger('loop')
+
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# عدد الإطارات المحفوظة لكل موقع للعرض
+_STACK_DEPTH = 8
+
+# المواقع المحفوظة قبل حذف الأقل تأثيراً (أكثر من المعروض حتى لا يُحذف موقع يتكرر ببطء)
+_SITES_PER_TOP = 5
+
+
+def _short_path(filename: str) -> str:
+    if filename.startswith(_PROJECT_DIR + os.sep):
+        return os.path.relpath(filename, _PROJECT_DIR)
+    # مكتبات ومكتبة Python القياسية: المجلد الأخير + اسم الملف يكفيان للتمييز
+    return '/'.join(filename.split(os.sep)[-2:])
+
+
+def _is_project(filename: str) -> bool:
+    return (filename.startswith(_PROJECT_DIR + os.sep) and 'site-packages' not in filename
+            and filename != __file__)
+
+
+def attribute_stack(stack: traceback.StackSummary) -> Tuple[str, str, List[str]]:
+    """(موقع الاستدعاء في كود المشروع، الإطار الحاجز، آخر الإطارات للعرض)"""
+    frames = [f"{_short_path(frame.filename)}:{frame.lineno} in {frame.name}" for frame in stack]
+    if not frames:
+        return '?', '?', []
+    index = next(
+        (index for index in range(len(stack) - 1, -1, -1) if _is_project(stack[index].filename)),
+        len(stack) - 1
+    )
+    # الدالة الحاجزة: أول إطار بعد كود المشروع (json.dump...) وليس أعمق إطار حتى يبقى المفتاح ثابتاً
+    # لنفس التوقف؛ الدوال المكتوبة بـ C (open...) بدون إطار فالموقع نفسه هو الاستدعاء الحاجز
+    blocking = frames[index + 1] if index + 1 < len(frames) else frames[index]
+    return frames[index], blocking, frames[-_STACK_DEPTH:]
+
+
+class LoopLagMonitor:
+    """نبضة داخل event loop + خيط مراقبة يلتقط stack الخيط الرئيسي أثناء التوقف"""
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL_SECONDS,
+                 threshold: float = LOOP_LAG_THRESHOLD_SECONDS, top: int = LOOP_LAG_TOP):
+        self.interval = interval
+        self.threshold = threshold
+        self.top = top
+        # حالة مشتركة مع خيط المراقبة (محمية بالقفل)
+        self.lock = threading.Lock()
+        self.last_beat = 0.0
+        self.beat = 0
+        self.captured_beat = -1
+        # (رقم النبضة المتوقفة، الموقع الملتقط)
+        self.pending: Optional[Tuple[int, Tuple[str, str, List[str]]]] = None
+        # جدول المواقع يُحدّث من event loop فقط
+        self.sites: Dict[Tuple[str, str], Dict] = {}
+        self.stalls = 0
+        self.unattributed = 0
+        self.max_lag = 0.0
+        self.loop_thread_id: Optional[int] = None
+        self.heartbeat_task: Optional[asyncio.Task] = None
+        self.watchdog: Optional[threading.Thread] = None
+        self.stop_event = threading.Event()
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._on_beat(now, max(0.0, now - expected))
+
+    def _on_beat(self, now: float, lag: float):
+        LOOP_LAG_SECONDS.observe(lag)
+        with self.lock:
+            beat = self.beat
+            self.last_beat = now
+            self.beat += 1
+            pending, self.pending = self.pending, None
+        if lag < self.threshold:
+            return
+        # الـ stack الملتقط يخص هذا التوقف فقط إذا التُقط قبل هذه النبضة
+        self._record(pending[1] if pending is not None and pending[0] == beat else None, lag)
+
+    def _watch(self):
+        """خيط المراقبة: يفحص آخر نبضة عدة مرات خلال حد التوقف"""
+        poll = self.threshold / 4
+        while not self.stop_event.wait(poll):
+            with self.lock:
+                overdue = time.monotonic() - self.last_beat - self.interval
+                if overdue < self.threshold or self.captured_beat == self.beat:
+                    continue
+                # التقاط واحد لكل توقف (أول موقع بعد تجاوز الحد)
+                beat = self.captured_beat = self.beat
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                continue
+            site = attribute_stack(traceback.extract_stack(frame))
+            del frame
+            with self.lock:
+                # النبضة سبقت الالتقاط: التوقف سُجل بالفعل (بدون موقع)
+                if self.beat == beat:
+                    self.pending = (beat, site)
+
+    def _record(self, captured: Optional[Tuple[str, str, List[str]]], lag: float):
+        self.stalls += 1
+        self.max_lag = max(self.max_lag, lag)
+        LOOP_STALLS.inc()
+        if captured is None:
+            # انتهى التوقف قبل أن يلحقه خيط المراقبة
+            self.unattributed += 1
+            return
+
+        site, blocking, frames = captured
+        entry = self.sites.get((site, blocking))
+        if entry is None:
+            entry = self.sites[(site, blocking)] = {
+                'site': site, 'blocking': blocking, 'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0
+            }
+            if len(self.sites) > self.top * _SITES_PER_TOP:
+                weakest = min(self.sites, key=lambda key: self.sites[key]['total_seconds'])
+                del self.sites[weakest]
+        entry['count'] += 1
+        entry['total_seconds'] += lag
+        entry['max_seconds'] = max(entry['max_seconds'], lag)
+        entry['last_seen'] = time.time()
+        entry['stack'] = frames
+        loop_log.repeat(logging.WARNING, site, "🐢 توقف event loop %.0fms في %s (%s)", lag * 1000, site, blocking)
+
+    def get_top(self) -> List[Dict]:
+        return sorted(self.sites.values(), key=lambda entry: entry['total_seconds'], reverse=True)[:self.top]
+
+    def get_stats(self) -> Dict:
+        return {
+            'interval_seconds': self.interval,
+            'threshold_seconds': self.threshold,
+            'lag': LOOP_LAG_SECONDS.snapshot(),
+            'stalls': self.stalls,
+            'unattributed': self.unattributed,
+            'max_lag_seconds': self.max_lag,
+            'top': self.get_top(),
+        }
+
+    def start(self):
+        if self.heartbeat_task is not None:
+            return
+        self.loop_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self.stop_event.clear()
+        self.heartbeat_task = asyncio.create_task(self._heartbeat())
+        self.watchdog = threading.Thread(target=self._watch, name='loop-lag-watchdog', daemon=True)
+        self.watchdog.start()
+        logger.info(f"🩺 مراقبة تأخر event loop (نبضة {self.interval * 1000:.0f}ms، حد التوقف {self.threshold * 1000:.0f}ms)")
+
+    async def stop(self):
+        if self.heartbeat_task is None:
+            return
+        self.stop_event.set()
+        self.heartbeat_task.cancel()
+        try:
+            await self.heartbeat_task
+        except asyncio.CancelledError:
+            pass
+        self.heartbeat_task = None
+        await asyncio.to_thread(self.watchdog.join)
+        self.watchdog = None
+
+
+loop_monitor = LoopLagMonitor()
+
+
+async def initialize_loop_monitor():
+    loop_monitor.start()
+
+
+async def shutdown_loop_monitor():
+    await loop_monitor.stop()
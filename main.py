@@ -2,17 +2,29 @@ import logging
 from aiohttp import web
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
-from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiogram.webhook.aiohttp_server import setup_application
 from aiogram.fsm.storage.memory import MemoryStorage
 import os
 
 from handlers import register_handlers
-from config import BOT_TOKEN, WEBHOOK_URL, WEBHOOK_PATH, WEB_SERVER_HOST, WEB_SERVER_PORT
+from config import BOT_TOKEN, WEBHOOK_URL, WEBHOOK_PATH, WEB_SERVER_HOST, WEB_SERVER_PORT, TELEGRAM_API_SERVER, FORWARDING_SHARDS
 from web_console import console_handler, setup_console_routes
+from fast_webhook import FastIngestRequestHandler
+from metrics import setup_metrics_routes, TelegramMetricsMiddleware, UpdateMetricsMiddleware
+from debug_routes import setup_debug_routes
 from parallel_forwarding_system import initialize_parallel_system, shutdown_parallel_system
+from sharded_workers import initialize_sharded_system, shutdown_sharded_system
 from user_interaction_middleware import UserInteractionMiddleware
 from subscription_checker import initialize_subscription_checker, shutdown_subscription_checker
+from deferred_delivery import initialize_deferred_delivery, shutdown_deferred_delivery
+from pipeline_offload import initialize_pipeline_offload, shutdown_pipeline_offload
+from executors import shutdown_executors
+from task_statistics_manager import shutdown_task_statistics
+from hot_logging import initialize_hot_logging, shutdown_hot_logging
+from loop_monitor import initialize_loop_monitor, shutdown_loop_monitor
 
 logging.basicConfig(
     level=logging.INFO,
@@ -23,14 +35,28 @@ logger = logging.getLogger(__name__)
 logging.getLogger().addHandler(console_handler)
 
 storage = MemoryStorage()
-bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+
+# توجيه طلبات Bot API لخادم مخصص إن وُجد
+session = None
+if TELEGRAM_API_SERVER:
+    session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_SERVER))
+    logger.info(f"🧪 استخدام خادم Bot API مخصص: {TELEGRAM_API_SERVER}")
+
+bot = Bot(token=BOT_TOKEN, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+# قياس زمن طلبات Bot API لكل method
+bot.session.middleware(TelegramMetricsMiddleware())
 dp = Dispatcher(storage=storage)
+# عد التحديثات حسب النوع (رسائل القنوات من المسار السريع تُعد في fast_webhook)
+dp.update.outer_middleware(UpdateMetricsMiddleware())
 
 # إضافة middleware لتتبع تفاعل المستخدمين
 dp.message.middleware(UserInteractionMiddleware())
 dp.callback_query.middleware(UserInteractionMiddleware())
 
 async def on_startup(bot: Bot):
+    # مراقبة تأخر event loop من البداية (تحميل الملفات المتزامن عند التشغيل يظهر أيضاً)
+    await initialize_loop_monitor()
+
     webhook_url = f"{WEBHOOK_URL}{WEBHOOK_PATH}"
     
     # محاولة تعيين webhook مع معالجة Flood control
@@ -71,23 +97,49 @@ async def on_startup(bot: Bot):
     logger.info(f"  Username: @{bot_info.username}")
     logger.info(f"  ID: {bot_info.id}")
 
-    # تشغيل النظام المتوازي
-    await initialize_parallel_system(bot)
-    logger.info("✅ تم تشغيل النظام المتوازي للتوجيه")
+    # تشغيل النظام المتوازي (داخل هذه العملية، أو موزعاً على عدة عمليات توجيه)
+    if FORWARDING_SHARDS > 1:
+        await initialize_sharded_system(bot, FORWARDING_SHARDS)
+        logger.info(f"✅ تم تشغيل النظام المتوازي للتوجيه على {FORWARDING_SHARDS} عمليات")
+    else:
+        # مجمع عمليات مراحل النص الثقيلة (في وضع العمليات المتعددة كل عملية توجيه تعالج داخلها)
+        await initialize_pipeline_offload()
+        await initialize_parallel_system(bot)
+        logger.info("✅ تم تشغيل النظام المتوازي للتوجيه")
 
     # تشغيل نظام فحص الاشتراكات
     await initialize_subscription_checker(bot)
     logger.info("✅ تم تشغيل نظام فحص الاشتراكات")
 
+    # تشغيل قائمة التوصيل المؤجل (رسائل خارج نافذة النشر)
+    await initialize_deferred_delivery(bot)
+
+    # الملخص الدوري لنتائج التوجيه لكل مهمة (بدلاً من سطر لكل هدف)
+    await initialize_hot_logging()
+
 async def on_shutdown(bot: Bot):
+    # إيقاف قائمة التوصيل المؤجل (الرسائل المعلقة تبقى محفوظة)
+    await shutdown_deferred_delivery()
+
     # إيقاف نظام فحص الاشتراكات
     await shutdown_subscription_checker()
     logger.info("🛑 تم إيقاف نظام فحص الاشتراكات")
 
     # إيقاف النظام المتوازي
-    await shutdown_parallel_system()
+    if FORWARDING_SHARDS > 1:
+        await shutdown_sharded_system()
+    else:
+        await shutdown_parallel_system()
+        await shutdown_pipeline_offload()
     logger.info("🛑 تم إيقاف النظام المتوازي")
 
+    await shutdown_hot_logging()
+    await shutdown_loop_monitor()
+
+    # إيقاف المنفذات المسماة (منفذ القرص يكمل الكتابات المنتظرة بعد آخر دفعة إحصائيات)
+    await shutdown_task_statistics()
+    await shutdown_executors()
+
     await bot.delete_webhook()
     logger.info("Webhook deleted")
 
@@ -99,7 +151,8 @@ def main():
 
     app = web.Application()
 
-    webhook_requests_handler = SimpleRequestHandler(
+    # رسائل القنوات تُضاف للقائمة العامة مباشرة من JSON الخام، والباقي عبر Dispatcher
+    webhook_requests_handler = FastIngestRequestHandler(
         dispatcher=dp,
         bot=bot,
     )
@@ -119,6 +172,8 @@ def main():
 
     app.router.add_get('/', home)
     setup_console_routes(app)
+    setup_metrics_routes(app)
+    setup_debug_routes(app)
 
     setup_application(app, dp, bot=bot)
 
@@ -27,8 +27,11 @@ class MediaFilters:
     
     @staticmethod
     def is_media_allowed(message: Message, allowed_types: list) -> bool:
-        media_type = MediaFilters.get_message_media_type(message)
-        
+        return MediaFilters.is_media_kind_allowed(MediaFilters.get_message_media_type(message), allowed_types)
+    
+    @staticmethod
+    def is_media_kind_allowed(media_type: Optional[str], allowed_types: list) -> bool:
+        """فحص نوع وسائط محسوب مسبقاً (Envelope.media_kind)"""
         if media_type is None:
             return True
         
@@ -6,6 +6,8 @@ from aiogram import Bot, Router
 from aiogram.types import Message
 from integrated_media_handler import IntegratedMediaHandler
 from album_processor import AlbumProcessor, AlbumBuffer as NewAlbumBuffer
+from message_envelope import Envelope
+from rate_limiter import telegram_rate_limiter
 
 logger = logging.getLogger(__name__)
 
@@ -14,17 +16,24 @@ router = Router()
 class MediaHandler:
     
     @staticmethod
-    async def copy_message_with_entities(bot: Bot, message: Message, target_chat_id: int, user_id: int = 0, task_id: int = 0) -> bool:
+    async def copy_message_with_entities(bot: Bot, message: Optional[Message], target_chat_id: int, user_id: int = 0,
+                                         task_id: int = 0, envelope: Optional[Envelope] = None) -> bool:
+        """message يمكن أن يكون None مع envelope (الموزع لا يحتفظ بكائن Message)"""
         try:
             if user_id and task_id:
                 return await IntegratedMediaHandler.process_and_send_message(
-                    bot, message, target_chat_id, user_id, task_id
+                    bot, message, target_chat_id, user_id, task_id, envelope
                 )
             else:
+                if envelope is not None:
+                    from_chat_id, message_id = envelope.chat_id, envelope.message_id
+                else:
+                    from_chat_id, message_id = message.chat.id, message.message_id
+                await telegram_rate_limiter.acquire(target_chat_id)
                 await bot.copy_message(
                     chat_id=target_chat_id,
-                    from_chat_id=message.chat.id,
-                    message_id=message.message_id
+                    from_chat_id=from_chat_id,
+                    message_id=message_id
                 )
                 return True
         except Exception as e:
@@ -386,6 +395,7 @@ class AlbumBuffer:
                 media_group.append(media)
             
             if media_group:
+                await telegram_rate_limiter.acquire(target_chat_id)
                 await bot.send_media_group(
                     chat_id=target_chat_id,
                     media=media_group
@@ -0,0 +1,287 @@
+"""
+فحص ذاكرة العملية أثناء التشغيل: عدد العناصر والحجم التقريبي لكل بنية طويلة العمر
+(album buffers، mapping الردود، مهام الحذف التلقائي، قوائم الانتظار، سجل Console...)
+ومقارنة لقطتي tracemalloc عند الطلب فقط (التتبع يبطئ كل تخصيص فلا يبقى مفعلاً)
+"""
+import asyncio
+import itertools
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+from aiogram import Bot
+
+from config import MEMORY_SIZE_SAMPLE, TRACEMALLOC_FRAMES
+
+logger = logging.getLogger(__name__)
+
+# قيم بدون محتوى متداخل يستحق القياس
+_ATOMIC = (str, bytes, bytearray, int, float, bool, complex, type(None), range)
+
+# كائنات مشتركة أو خارج نطاق البنية المقاسة: حجمها المباشر فقط (Bot يجر جلسة HTTP كاملة)
+_OPAQUE = (
+    type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType,
+    types.CoroutineType, types.FrameType, asyncio.Future, asyncio.AbstractEventLoop,
+    logging.Logger, logging.Handler, Bot, type(threading.Lock()),
+)
+
+_MAX_DEPTH = 12
+
+# مسارات tracemalloc الداخلية لا تُعرض في المقارنة
+_TRACEMALLOC_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def _slot_values(value) -> List:
+    values = []
+    for cls in type(value).__mro__:
+        for name in getattr(cls, '__slots__', ()):
+            if name in ('__dict__', '__weakref__'):
+                continue
+            if name.startswith('__') and not name.endswith('__'):
+                name = f"_{cls.__name__.lstrip('_')}{name}"
+            try:
+                values.append(getattr(value, name))
+            except AttributeError:
+                pass
+    return values
+
+
+def approx_size(obj, sample: int = MEMORY_SIZE_SAMPLE) -> int:
+    """حجم تقريبي بالبايت يشمل المحتوى المتداخل (كل كائن يُعد مرة واحدة)
+
+    الحاويات الأكبر من sample عنصر تُقاس من أول sample عنصر ويُضرب المتوسط في العدد الكلي
+    """
+    seen = set()
+
+    def size(value, depth: int) -> float:
+        if id(value) in seen:
+            return 0
+        seen.add(id(value))
+        total = sys.getsizeof(value, 0)
+        if isinstance(value, _ATOMIC) or isinstance(value, _OPAQUE) or depth >= _MAX_DEPTH:
+            return total
+
+        if isinstance(value, dict):
+            count = len(value)
+            children: Iterable = value.items()
+        elif isinstance(value, (list, tuple, set, frozenset, deque)):
+            count = len(value)
+            children = value
+        else:
+            members = _slot_values(value)
+            if hasattr(value, '__dict__'):
+                members.append(value.__dict__)
+            count = len(members)
+            children = members
+
+        measured = 0
+        child_total = 0.0
+        for child in itertools.islice(children, sample):
+            if isinstance(child, tuple) and isinstance(value, dict):
+                child_total += size(child[0], depth + 1) + size(child[1], depth + 1)
+            else:
+                child_total += size(child, depth + 1)
+            measured += 1
+        if measured and count > measured:
+            child_total *= count / measured
+        return total + child_total
+
+    return int(size(obj, 0))
+
+
+def _structure(count: int, obj=None, deep: bool = True, **extra) -> Dict:
+    """عنصر التقرير: العدد، والحجم التقريبي عند طلب القياس العميق"""
+    entry = {'count': count, **extra}
+    if deep and obj is not None:
+        entry['approx_bytes'] = approx_size(obj)
+    return entry
+
+
+def _read_int(path: str) -> Optional[int]:
+    try:
+        with open(path) as file:
+            value = file.read().strip()
+    except OSError:
+        return None
+    # "max" أو قيمة ضخمة (v1 بدون حد) تعني عدم وجود حد
+    return int(value) if value.isdigit() and int(value) < 1 << 60 else None
+
+
+def process_memory() -> Dict:
+    """ذاكرة العملية من النظام: RSS الحالي والأقصى وحد الـ cgroup إن وُجد"""
+    rss = None
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmRSS:'):
+                    rss = int(line.split()[1]) * 1024
+                    break
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        peak *= 1024
+    return {
+        'pid': os.getpid(),
+        'rss_bytes': rss,
+        'peak_rss_bytes': peak,
+        'limit_bytes': _read_int('/sys/fs/cgroup/memory.max')
+        or _read_int('/sys/fs/cgroup/memory/memory.limit_in_bytes'),
+    }
+
+
+def _forwarding_structures(deep: bool) -> Dict:
+    """قوائم الانتظار وalbum buffers للنظام المتوازي في هذه العملية"""
+    import parallel_forwarding_system
+
+    system = parallel_forwarding_system.parallel_system
+    if system is None or not hasattr(system, 'task_workers'):
+        # وضع العمليات المتعددة: هذه البنى داخل عمليات التوجيه
+        return {}
+
+    workers = list(system.task_workers.values())
+    # القوائم الداخلية لـ asyncio.Queue (deque) تحمل الرسائل المنتظرة نفسها
+    global_items = system.global_queue.queue._queue
+    task_items = [worker.task_queue.queue._queue for worker in workers]
+    album_buffers = [getattr(worker, 'album_buffers', {}) for worker in workers]
+    return {
+        'global_queue': _structure(
+            len(global_items), global_items, deep, max_size=system.global_queue.max_size
+        ),
+        'task_queues': _structure(
+            sum(len(items) for items in task_items), task_items, deep,
+            tasks={worker.task_id: len(items) for worker, items in zip(workers, task_items)}
+        ),
+        'album_buffers': _structure(
+            sum(len(buffers) for buffers in album_buffers), album_buffers, deep,
+            messages=sum(
+                len(messages)
+                for buffers in album_buffers for buffer in buffers.values()
+                for messages in buffer.albums.values()
+            )
+        ),
+    }
+
+
+def collect_memory_report(deep: bool = True) -> Dict:
+    """تقرير البنى طويلة العمر في هذه العملية (deep=False: الأعداد فقط بدون قياس الأحجام)"""
+    from auto_delete_manager import auto_delete_manager
+    from dedup_filter import dedup_filter
+    from deferred_delivery import deferred_delivery_queue
+    from language_detection import language_detector
+    from media_handler import album_buffer
+    from reply_preservation_handler import reply_preservation
+    from tracing import tracer
+    from web_console import console_handler
+
+    mapping = reply_preservation.message_mapping
+    console_clients = list(console_handler.clients)
+    structures = {
+        'reply_mapping': _structure(
+            sum(len(messages) for messages in mapping.values()), mapping, deep, sources=len(mapping)
+        ),
+        'auto_delete_tasks': _structure(
+            len(auto_delete_manager.deletion_tasks), auto_delete_manager.deletion_tasks, deep
+        ),
+        'console_logs': _structure(
+            # نسخة: المنفذات تسجل من خيوط أخرى أثناء القياس
+            len(console_handler.logs), console_handler.logs.copy(), deep, max_size=console_handler.logs.maxlen,
+            clients=len(console_clients),
+            client_buffered=sum(len(client.ring) for client in console_clients)
+        ),
+        'handler_album_buffer': _structure(len(album_buffer.albums), album_buffer.albums, deep),
+        'dedup_fingerprints': _structure(
+            sum(len(seen) for seen in dedup_filter.task_sets.values()), dedup_filter.task_sets, deep
+        ),
+        'deferred_deliveries': _structure(
+            len(deferred_delivery_queue.entries), deferred_delivery_queue.entries, deep
+        ),
+        'language_cache': _structure(len(language_detector.items), language_detector.items, deep),
+        'recent_traces': _structure(len(tracer.get_recent()), tracer.get_recent(), deep),
+    }
+    structures.update(_forwarding_structures(deep))
+    return {
+        'process': process_memory(),
+        'structures': structures,
+        'tracemalloc': tracemalloc_status(),
+    }
+
+
+def tracemalloc_status() -> Dict:
+    if not tracemalloc.is_tracing():
+        return {'tracing': False}
+    current, peak = tracemalloc.get_traced_memory()
+    return {'tracing': True, 'traced_bytes': current, 'traced_peak_bytes': peak}
+
+
+class TracemallocDiff:
+    """مقارنة لقطتين بفاصل زمني: أكثر المواقع زيادة في الذاكرة خلال الفاصل
+
+    التتبع يُفعّل لمدة المقارنة فقط ثم يُوقف (ما لم يكن مفعلاً قبلها)، ومقارنة واحدة في كل مرة
+    """
+
+    GROUPINGS = ('lineno', 'filename', 'traceback')
+
+    def __init__(self, frames: int = TRACEMALLOC_FRAMES):
+        self.frames = frames
+        self.lock = asyncio.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self.lock.locked()
+
+    @staticmethod
+    def _take_snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(_TRACEMALLOC_FILTERS)
+
+    async def run(self, seconds: float, top: int = 20, group_by: str = 'lineno') -> Dict:
+        async with self.lock:
+            started_here = not tracemalloc.is_tracing()
+            if started_here:
+                tracemalloc.start(self.frames)
+            try:
+                before = self._take_snapshot()
+                await asyncio.sleep(seconds)
+                after = self._take_snapshot()
+                started = time.perf_counter()
+                stats = after.compare_to(before, group_by)
+                compare_seconds = time.perf_counter() - started
+                current, peak = tracemalloc.get_traced_memory()
+            finally:
+                if started_here:
+                    tracemalloc.stop()
+
+        logger.info(f"🧠 مقارنة tracemalloc: {seconds:.0f}s، {len(stats)} موقع، المقارنة {compare_seconds:.2f}s")
+        return {
+            'seconds': seconds,
+            'group_by': group_by,
+            'frames': self.frames,
+            'size_diff_bytes': sum(stat.size_diff for stat in stats),
+            'traced_bytes': current,
+            'traced_peak_bytes': peak,
+            'top': [
+                {
+                    'location': [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+                    'size_diff_bytes': stat.size_diff,
+                    'size_bytes': stat.size,
+                    'count_diff': stat.count_diff,
+                    'count': stat.count,
+                }
+                for stat in stats[:top]
+            ],
+        }
+
+
+tracemalloc_diff = TracemallocDiff()
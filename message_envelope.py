@@ -0,0 +1,121 @@
+"""
+غلاف الرسالة (Envelope): الحقائق المشتقة من رسالة المصدر تُحسب مرة واحدة عند التوزيع
+(النص، entities بصيغة dict، نوع الوسائط، file_id، بصمة المحتوى، مدرّج أنظمة الكتابة، مواقع الروابط)
+ويُشارك الغلاف نفسه بين جميع الأهداف ومعالجة الألبومات.
+رسائل مسار الاستقبال السريع لا تحتفظ بكائن Message في قوائم الانتظار: بايتات التحديث الخام فقط
+(أصغر بكثير من شجرة نماذج pydantic) ويُعاد بناء الرسالة عند الحاجة في المسارات النادرة
+"""
+from datetime import datetime
+from typing import Dict, Optional, Tuple, Union
+
+from aiogram.types import InlineKeyboardMarkup, Message, Update
+
+from dedup_filter import fingerprint_content
+from entity_handler import EntityHandler
+from link_filters import LinkSpan, scan_links
+from script_histogram import ScriptHistogram, get_script_histogram
+
+# نفس ترتيب الفحص في MediaFilters وسلسلة الإرسال السابقة
+# (رسالة GIF تحمل animation و document معاً فتُعامل كـ document)
+MEDIA_KINDS = ('photo', 'video', 'document', 'audio', 'voice', 'video_note', 'animation', 'sticker')
+
+# قيمة تمييز للحقول الكسولة التي لم تُحسب بعد (بصمة المحتوى قد تكون None)
+_UNSET = object()
+
+
+class Envelope:
+    """حقائق رسالة مصدر واحدة - تُحسب مرة واحدة عند البناء ولا تُعدَّل
+
+    entities مخزنة كـ tuple من dict: المعالجة تنسخ القائمة (وكل entity تُعدَّل تُنسخ أولاً).
+    الحقول التي يحتاجها الإرسال العادي (reply_markup، الرد، التاريخ) منسوخة في الغلاف؛
+    message للمسارات النادرة (الألبومات، التأجيل، النسخ الاحتياطي) ويُبنى من raw_update عند أول طلب.
+
+    حالة قابلة للتعديل يكتبها عدة عمال أهداف: message و _raw_update (البناء الكسول)،
+    الحقول الكسولة (البصمة، المدرّج، مواقع الروابط)، و text_results: نتيجة معالجة النص
+    (أو Future المعالجة الجارية) لكل (user_id, task_id). كل الكتابات من نفس event loop
+    بدون await بين الفحص والكتابة، فلا تحتاج قفلاً
+    """
+    __slots__ = ('_message', '_raw_update', '_bot', 'chat_id', 'message_id', 'media_group_id', 'date',
+                 'text', 'entities', 'media_kind', 'file_id', 'file_unique_id', 'is_forwarded',
+                 'reply_markup', 'reply_to_message_id', 'text_results',
+                 '_content_hash', '_histogram', '_link_spans')
+
+    def __init__(self, message: Message, raw_update: Optional[bytes] = None):
+        """raw_update: بايتات التحديث الذي بُنيت منه الرسالة - عند تمريرها لا يُحتفظ بـ message"""
+        if raw_update is None:
+            self._message: Optional[Message] = message
+            self._raw_update = None
+            self._bot = None
+        else:
+            self._message = None
+            self._raw_update = raw_update
+            self._bot = message.bot
+        self.chat_id = message.chat.id
+        self.message_id = message.message_id
+        self.media_group_id = message.media_group_id
+        self.date: datetime = message.date
+        self.text = message.text or message.caption or ""
+        self.entities: Tuple[Dict, ...] = tuple(
+            EntityHandler.entities_to_dict(message.entities or message.caption_entities, self.text)
+        )
+        self.is_forwarded = message.forward_date is not None
+        self.reply_markup: Optional[InlineKeyboardMarkup] = message.reply_markup
+        self.reply_to_message_id: Optional[int] = (
+            message.reply_to_message.message_id if message.reply_to_message else None
+        )
+        self.text_results: Dict[Tuple[int, int], object] = {}
+
+        self.media_kind: Optional[str] = None
+        self.file_id: Optional[str] = None
+        self.file_unique_id: Optional[str] = None
+        for kind in MEDIA_KINDS:
+            media = getattr(message, kind)
+            if media:
+                if kind == 'photo':
+                    # أكبر حجم متاح
+                    media = media[-1]
+                self.media_kind = kind
+                self.file_id = media.file_id
+                self.file_unique_id = media.file_unique_id
+                break
+        else:
+            if message.text:
+                self.media_kind = 'text'
+
+        self._content_hash = _UNSET
+        self._histogram: Optional[ScriptHistogram] = None
+        self._link_spans: Optional[Tuple[LinkSpan, ...]] = None
+
+    @property
+    def message(self) -> Message:
+        """الرسالة الكاملة (تُبنى من التحديث الخام عند أول طلب وتُحفظ)"""
+        if self._message is None:
+            self._message = Update.model_validate_json(self._raw_update, context={'bot': self._bot}).channel_post
+            self._raw_update = None
+        return self._message
+
+    @classmethod
+    def wrap(cls, item: Union['Envelope', Message]) -> 'Envelope':
+        """غلاف موجود كما هو، أو غلاف جديد لرسالة (للمسارات القديمة)"""
+        return item if isinstance(item, cls) else cls(item)
+
+    @property
+    def content_hash(self) -> Optional[bytes]:
+        """بصمة المحتوى لمنع التكرار: النص المُطبَّع + file_unique_id لأكبر حجم (None للرسائل بدون نص أو وسائط)"""
+        if self._content_hash is _UNSET:
+            self._content_hash = fingerprint_content(self.text, self.file_unique_id)
+        return self._content_hash
+
+    @property
+    def histogram(self) -> ScriptHistogram:
+        """مدرّج أنظمة الكتابة للنص الأصلي"""
+        if self._histogram is None:
+            self._histogram = get_script_histogram(self.text)
+        return self._histogram
+
+    @property
+    def link_spans(self) -> Tuple[LinkSpan, ...]:
+        """مواقع الروابط في النص الأصلي"""
+        if self._link_spans is None:
+            self._link_spans = scan_links(self.text)
+        return self._link_spans
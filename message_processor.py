@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from typing import Optional, Tuple, Dict, List
 from aiogram.types import Message, InlineKeyboardMarkup
@@ -5,17 +6,21 @@ from task_settings_manager import TaskSettingsManager
 from subscription_manager import SubscriptionManager
 from entity_handler import EntityHandler
 from text_filters import TextFilters
-from link_filters import LinkFilters
 from button_filters import ButtonFilters
 from media_filters import MediaFilters
 from language_filters import LanguageFilters
 from button_parser import ButtonParser
-from day_filter import DayFilter
-from hour_filter import HourFilter
 from character_limit_filter import CharacterLimitFilter
-from timezone_manager import TimezoneManager
+from schedule_gate import check_schedule, next_schedule_window
+from message_envelope import Envelope
+from metrics import FILTER_STAGE_SECONDS
+import pipeline_offload
+from transform_stages import run_transform_stages
+from hot_logging import get_hot_logger
 
 logger = logging.getLogger(__name__)
+# تفريغ النص و entities لكل هدف: يُنسق فقط عند تفعيل DEBUG لنظام text
+text_log = get_hot_logger('text')
 
 class MessageProcessor:
     def __init__(self, user_id: int, task_id: int):
@@ -24,62 +29,90 @@ class MessageProcessor:
         self.settings_manager = TaskSettingsManager(user_id, task_id)
         self.subscription_manager = SubscriptionManager(user_id)
 
-    def should_process_message(self, message: Message) -> Tuple[bool, str]:
+    @staticmethod
+    def _schedule_filters(settings: Dict, is_premium: bool) -> Tuple[Optional[Dict], Optional[Dict]]:
+        """إعدادات فلتري الأيام والساعات المفعّلين (None للمعطّل)"""
+        if not is_premium:
+            return None, None
+        day_filter = settings.get('day_filter', {})
+        hour_filter = settings.get('hour_filter', {})
+        return (
+            day_filter if day_filter.get('enabled', False) else None,
+            hour_filter if hour_filter.get('enabled', False) else None
+        )
+
+    def get_deferral_window(self) -> Optional[Tuple[int, int]]:
+        """نافذة النشر القادمة (فتح, إغلاق) إذا كان وضع التأجيل مفعلاً والجدولة مغلقة الآن"""
         settings = self.settings_manager.load_settings()
         is_premium = self.subscription_manager.is_premium()
+        if not is_premium or not settings.get('schedule_defer', {}).get('enabled', False):
+            return None
 
-        # الحصول على المنطقة الزمنية
-        tz_manager = TimezoneManager(self.user_id)
-        timezone = tz_manager.get_timezone()
+        day_filter, hour_filter = self._schedule_filters(settings, is_premium)
+        if not day_filter and not hour_filter:
+            return None
+        return next_schedule_window(self.user_id, self.task_id, day_filter, hour_filter)
 
-        # فلتر الأيام
-        day_filter = settings.get('day_filter', {})
-        if is_premium and day_filter.get('enabled', False):
-            allowed, reason = DayFilter.check_day_allowed(day_filter, timezone)
-            if not allowed:
-                return False, reason
+    def should_process_message(self, message: Optional[Message], envelope: Optional[Envelope] = None) -> Tuple[bool, str]:
+        """فلاتر ما قبل النص؛ envelope يحمل نوع الوسائط المحسوب مرة واحدة لجميع الأهداف (message غير مطلوب معه)"""
+        settings = self.settings_manager.load_settings()
+        is_premium = self.subscription_manager.is_premium()
 
-        # فلتر الساعات
-        hour_filter = settings.get('hour_filter', {})
-        if is_premium and hour_filter.get('enabled', False):
-            allowed, reason = HourFilter.check_hour_allowed(hour_filter, timezone)
+        # فلترا الأيام والساعات (نافذة نشر مُجمَّعة مسبقاً بتوقيت UTC، المنطقة الزمنية تُقرأ عند التجميع فقط)
+        day_filter, hour_filter = self._schedule_filters(settings, is_premium)
+        if day_filter or hour_filter:
+            with FILTER_STAGE_SECONDS.time('schedule'):
+                allowed, reason = check_schedule(self.user_id, self.task_id, day_filter, hour_filter)
             if not allowed:
                 return False, reason
 
         media_filter = settings['media_filters']
         if media_filter['enabled']:
-            if not MediaFilters.is_media_allowed(message, media_filter['allowed_types']):
+            with FILTER_STAGE_SECONDS.time('media_filter'):
+                if envelope is not None:
+                    media_allowed = MediaFilters.is_media_kind_allowed(envelope.media_kind, media_filter['allowed_types'])
+                else:
+                    media_allowed = MediaFilters.is_media_allowed(message, media_filter['allowed_types'])
+            if not media_allowed:
                 return False, "نوع الوسائط غير مسموح"
 
         forwarded_filter = settings['forwarded_filter']
         if is_premium and forwarded_filter['enabled']:
-            is_forwarded = message.forward_date is not None
+            is_forwarded = envelope.is_forwarded if envelope is not None else message.forward_date is not None
             if not TextFilters.check_forwarded_filter(is_forwarded, forwarded_filter['mode']):
                 return False, "رسالة موجهة محظورة"
 
         button_filter = settings['button_filter']
         if is_premium and button_filter['enabled']:
-            allowed, _ = ButtonFilters.apply_button_filter(message.reply_markup, button_filter['mode'])
+            reply_markup = envelope.reply_markup if envelope is not None else message.reply_markup
+            allowed, _ = ButtonFilters.apply_button_filter(reply_markup, button_filter['mode'])
             if not allowed:
                 return False, "الرسالة تحتوي على أزرار محظورة"
 
         return True, ""
 
-    def process_message_text(self, message: Message) -> Tuple[bool, Optional[str], List[Dict], str]:
-        text = message.text or message.caption or ""
-        original_entities = message.entities or message.caption_entities
+    def _prepare_text(self, message: Message, envelope: Optional[Envelope]):
+        """فلاتر القبول/الرفض (حدود الأحرف، القوائم، اللغة) وبناء خطة مراحل التحويل
 
-        logger.info(f"🔍 process_message_text - النص الأصلي: '{text}'")
-        logger.info(f"🔍 process_message_text - entities أصلية: {len(original_entities) if original_entities else 0}")
-        if original_entities:
-            for e in original_entities:
-                logger.info(f"   Original Entity: {e.type} at {e.offset}:{e.offset+e.length}")
+        Returns:
+            (نتيجة نهائية أو None, النص, entities, المراحل)
+        """
+        if envelope is not None:
+            text = envelope.text
+            # نسخة من القائمة لكل هدف - entities نفسها لا تُعدَّل في مكانها (تُنسخ قبل أي تعديل)
+            entities = list(envelope.entities)
+        else:
+            text = message.text or message.caption or ""
+            entities = EntityHandler.entities_to_dict(message.entities or message.caption_entities, text)
 
-        entities = EntityHandler.entities_to_dict(original_entities, text)
-        logger.info(f"🔍 بعد entities_to_dict: {len(entities)} entities")
+        if text_log.enabled(logging.DEBUG):
+            text_log.debug("🔍 process_message_text - النص الأصلي: '%s'", text)
+            text_log.debug("🔍 process_message_text - entities أصلية: %d", len(entities))
+            for e in entities:
+                text_log.debug("   Original Entity: %s at %d:%d", e['type'], e['offset'], e['offset'] + e['length'])
 
         if not text:
-            return True, text, entities, ""
+            return (True, text, entities, ""), text, entities, ()
 
         settings = self.settings_manager.load_settings()
         is_premium = self.subscription_manager.is_premium()
@@ -87,150 +120,145 @@ class MessageProcessor:
         # فلتر حدود الأحرف
         char_limit = settings.get('character_limit', {})
         if is_premium and char_limit.get('enabled', False):
-            allowed, reason = CharacterLimitFilter.check_character_limit(text, char_limit)
+            with FILTER_STAGE_SECONDS.time('character_limit'):
+                allowed, reason = CharacterLimitFilter.check_character_limit(text, char_limit)
             if not allowed:
-                return False, None, [], reason
+                return (False, None, [], reason), text, entities, ()
 
         whitelist = settings['whitelist_words']
         if is_premium and whitelist['enabled']:
-            allowed, reason = TextFilters.apply_whitelist(text, whitelist['words'])
+            with FILTER_STAGE_SECONDS.time('whitelist'):
+                allowed, reason = TextFilters.apply_whitelist(text, whitelist['words'])
             if not allowed:
-                return False, None, [], reason
+                return (False, None, [], reason), text, entities, ()
 
         blacklist = settings['blacklist_words']
         if is_premium and blacklist['enabled']:
-            allowed, reason = TextFilters.apply_blacklist(text, blacklist['words'])
+            with FILTER_STAGE_SECONDS.time('blacklist'):
+                allowed, reason = TextFilters.apply_blacklist(text, blacklist['words'])
             if not allowed:
-                return False, None, [], reason
+                return (False, None, [], reason), text, entities, ()
 
         language_filter = settings['language_filter']
         if is_premium and language_filter['enabled']:
-            allowed, reason = LanguageFilters.apply_language_filter(
-                text,
-                language_filter['mode'],
-                language_filter['languages'],
-                language_filter['sensitivity']
-            )
+            with FILTER_STAGE_SECONDS.time('language_filter'):
+                # النص لم يتغير بعد - المدرّج المحسوب للرسالة صالح
+                allowed, reason = LanguageFilters.apply_language_filter(
+                    text,
+                    language_filter['mode'],
+                    language_filter['languages'],
+                    language_filter['sensitivity'],
+                    envelope.histogram if envelope is not None else None
+                )
             if not allowed:
-                return False, None, [], reason
+                return (False, None, [], reason), text, entities, ()
+
+        # مواقع الروابط المحسوبة للرسالة صالحة لأن مرحلة الروابط هي الأولى
+        link_spans = envelope.link_spans if envelope is not None else None
+        return None, text, entities, self._build_transform_stages(settings, is_premium, link_spans)
 
+    def _build_transform_stages(self, settings: Dict, is_premium: bool, link_spans=None) -> Tuple:
+        """خطة مراحل التحويل (نص + entities ← نص + entities) كـ tuple قابلة للـ pickle
+
+        الترجمة غير متزامنة فتُطبق لاحقاً في integrated_media_handler.py
+        """
+        if not is_premium:
+            return ()
+
+        stages = []
         link_mgmt = settings['link_management']
-        if is_premium and link_mgmt['enabled']:
-            allowed, text, entities = LinkFilters.apply_link_filter(text, link_mgmt['mode'], entities)
-            if not allowed:
-                return False, None, [], text
+        if link_mgmt['enabled']:
+            stages.append(('link_filter', link_mgmt['mode'], link_spans))
 
         replacements = settings['replacements']
-        if is_premium and replacements['enabled']:
-            text, entities = TextFilters.apply_replacements(text, replacements['pairs'], entities)
-
-        # تخطي الترجمة في process_message_text لأنها غير async
-        # الترجمة سيتم تطبيقها في integrated_media_handler.py الذي يستخدم async
-        # translation = settings.get('translation', {})
-        # if is_premium and translation.get('enabled', False) and text:
-        #     from translation_handler import TranslationHandler
-        #     translator = TranslationHandler()
-        #     try:
-        #         translated, translated_text = await translator.process_translation(text, translation)
-        #         if translated and translated_text:
-        #             text = translated_text
-        #             logger.info(f"✅ تمت ترجمة النص بنجاح")
-        #     except Exception as e:
-        #         logger.error(f"❌ خطأ في الترجمة: {e}")
-
-        # تعطيل إضافة emoji مؤقتاً للحفاظ على entities
-        # سيتم إعادة تفعيله بعد إصلاح حساب الـ offsets
-        # text, entities = self.add_emoji_prefix(text, entities)
-
-        # معالجة الهيدر مع الحفاظ الكامل على entities
+        if replacements['enabled'] and replacements['pairs']:
+            stages.append(('replacements', replacements['pairs']))
+
+        # إضافة الهيدر والفوتر مع الحفاظ الكامل على entities
         # التأكد من أن المهمة للمستخدم (وليست إدارية)
         header = settings['header']
-        if is_premium and header['enabled'] and header['text'] and self.user_id and self.task_id:
-            header_saved_entities = header.get('entities', [])
-            logger.info(f"📋 هيدر - النص: '{header['text']}'")
-            logger.info(f"📋 هيدر - entities محفوظة: {len(header_saved_entities)}")
-            
-            # حساب الإزاحة الصحيحة بصيغة UTF-16
-            # الهيدر + سطر جديد
-            header_with_newline = header['text'] + '\n'
-            
-            # حساب طول الهيدر بصيغة UTF-16
-            shift_amount = 0
-            for char in header_with_newline:
-                # Emoji والأحرف الخاصة (> U+FFFF) تأخذ 2 units في UTF-16
-                if ord(char) > 0xFFFF:
-                    shift_amount += 2
-                else:
-                    shift_amount += 1
-            
-            logger.info(f"📋 إزاحة الهيدر (UTF-16): {shift_amount} (طول Python: {len(header_with_newline)})")
-            
-            # shift entities الرسالة الأصلية
-            shifted_message_entities = EntityHandler.shift_entities(entities, shift_amount)
-            logger.info(f"📋 entities الرسالة بعد الإزاحة: {len(shifted_message_entities)}")
-            
-            # دمج entities الهيدر مع entities الرسالة المزاحة
-            entities = EntityHandler.merge_entities(header_saved_entities, shifted_message_entities)
-            logger.info(f"📋 بعد دمج الهيدر: {len(entities)} entities")
-            
-            # تحديث النص
-            text = header['text'] + '\n' + text
-
-        # معالجة الفوتر مع الحفاظ الكامل على entities
-        # التأكد من أن المهمة للمستخدم (وليست إدارية)
         footer = settings['footer']
-        if is_premium and footer['enabled'] and footer['text'] and self.user_id and self.task_id:
-            footer_saved_entities = footer.get('entities', [])
-            logger.info(f"📋 فوتر - النص: '{footer['text']}'")
-            logger.info(f"📋 فوتر - entities محفوظة: {len(footer_saved_entities)}")
-            
-            # حساب الإزاحة الصحيحة بصيغة UTF-16
-            # النص الحالي + سطر جديد
-            current_text_with_newline = text + '\n'
-            
-            # حساب طول النص الحالي بصيغة UTF-16
-            shift_amount = 0
-            for char in current_text_with_newline:
-                if ord(char) > 0xFFFF:
-                    shift_amount += 2
-                else:
-                    shift_amount += 1
-            
-            logger.info(f"📋 إزاحة الفوتر (UTF-16): {shift_amount} (طول Python: {len(current_text_with_newline)})")
-            
-            # shift entities الفوتر
-            shifted_footer_entities = EntityHandler.shift_entities(footer_saved_entities, shift_amount)
-            
-            # دمج entities الحالية مع entities الفوتر المزاحة
-            entities = EntityHandler.merge_entities(entities, shifted_footer_entities)
-            logger.info(f"📋 بعد دمج الفوتر: {len(entities)} entities")
-            
-            # تحديث النص
-            text = text + '\n' + footer['text']
+        use_header = header['enabled'] and header['text'] and self.user_id and self.task_id
+        use_footer = footer['enabled'] and footer['text'] and self.user_id and self.task_id
+        if use_header or use_footer:
+            stages.append(('header_footer', header if use_header else None, footer if use_footer else None))
 
         # تطبيق تنسيق النص الموحد (آخر خطوة قبل الإرسال)
         text_format = settings.get('text_format', {'enabled': False, 'format_type': 'normal', 'text_link_url': ''})
-        if is_premium and text_format.get('enabled', False) and text_format.get('format_type'):
-            from text_formatter import TextFormatter
-            
-            format_type = text_format['format_type']
-            text_link_url = text_format.get('text_link_url', '')
-            logger.info(f"🎨 [TextFormat] تطبيق تنسيق '{format_type}' على النص النهائي")
-            logger.info(f"   📊 قبل التنسيق: {len(entities) if entities else 0} entities")
-            
-            text, entities = TextFormatter.apply_format(text, entities, format_type, text_link_url)
-            
-            logger.info(f"   📊 بعد التنسيق: {len(entities) if entities else 0} entities")
-
-        logger.info(f"🔍 process_message_text - النص النهائي: '{text}'")
-        logger.info(f"🔍 process_message_text - entities نهائية (dict): {len(entities) if entities else 0}")
-        if entities:
-            for e in entities[:5]:  # أول 5 فقط
-                logger.info(f"   Final Entity (dict): {e}")
-
-        return True, text, entities, ""
-
-    def get_reply_markup(self, message: Message, post_url: Optional[str] = None, message_text: Optional[str] = None) -> Optional[InlineKeyboardMarkup]:
+        if text_format.get('enabled', False) and text_format.get('format_type'):
+            stages.append(('text_format', text_format['format_type'], text_format.get('text_link_url', '')))
+
+        return tuple(stages)
+
+    @staticmethod
+    def _finish_text(result: Tuple[bool, Optional[str], List[Dict], str]) -> Tuple[bool, Optional[str], List[Dict], str]:
+        allowed, text, entities, _ = result
+        if allowed and text_log.enabled(logging.DEBUG):
+            text_log.debug("🔍 process_message_text - النص النهائي: '%s'", text)
+            text_log.debug("🔍 process_message_text - entities نهائية (dict): %d", len(entities) if entities else 0)
+            if entities:
+                for e in entities[:5]:  # أول 5 فقط
+                    text_log.debug("   Final Entity (dict): %s", e)
+        return result
+
+    @staticmethod
+    def _shared_result(result: Tuple[bool, Optional[str], List[Dict], str]) -> Tuple[bool, Optional[str], List[Dict], str]:
+        """نسخة من نتيجة محفوظة في الغلاف لهدف آخر (قائمة entities خاصة بالهدف)"""
+        allowed, text, entities, reason = result
+        return allowed, text, list(entities) if entities else entities, reason
+
+    def process_message_text(self, message: Optional[Message],
+                             envelope: Optional[Envelope] = None) -> Tuple[bool, Optional[str], List[Dict], str]:
+        """معالجة النص؛ مع envelope تُقرأ الحقائق المشتقة (النص، entities، المدرّج، الروابط)
+        من الغلاف المشترك، والنتيجة تُحفظ فيه: باقي أهداف المهمة نفسها لا تعيد المعالجة"""
+        key = (self.user_id, self.task_id)
+        if envelope is not None:
+            cached = envelope.text_results.get(key)
+            if isinstance(cached, tuple):
+                return self._shared_result(cached)
+
+        result, text, entities, stages = self._prepare_text(message, envelope)
+        if result is None:
+            result = self._finish_text(run_transform_stages(text, entities, stages, FILTER_STAGE_SECONDS.time))
+        if envelope is not None:
+            envelope.text_results[key] = result
+            return self._shared_result(result)
+        return result
+
+    async def _process_text_async(self, message: Optional[Message],
+                                  envelope: Optional[Envelope]) -> Tuple[bool, Optional[str], List[Dict], str]:
+        result, text, entities, stages = self._prepare_text(message, envelope)
+        if result is not None:
+            return result
+        return self._finish_text(await pipeline_offload.run_stages(text, entities, stages))
+
+    async def process_message_text_async(self, message: Optional[Message],
+                                         envelope: Optional[Envelope] = None) -> Tuple[bool, Optional[str], List[Dict], str]:
+        """نفس process_message_text، لكن مراحل التحويل الثقيلة تُنقل لمجمع العمليات (pipeline_offload)
+
+        الأهداف تُعالج بالتوازي: أول هدف للمهمة يبدأ المعالجة والباقي ينتظر نفس النتيجة
+        """
+        if envelope is None:
+            return await self._process_text_async(message, None)
+
+        key = (self.user_id, self.task_id)
+        cached = envelope.text_results.get(key)
+        if isinstance(cached, tuple):
+            return self._shared_result(cached)
+        if cached is None:
+            cached = envelope.text_results[key] = asyncio.ensure_future(self._process_text_async(message, envelope))
+        try:
+            # إلغاء أحد الأهداف لا يلغي المعالجة المشتركة
+            result = await asyncio.shield(cached)
+        except Exception:
+            if envelope.text_results.get(key) is cached:
+                del envelope.text_results[key]
+            raise
+        envelope.text_results[key] = result
+        return self._shared_result(result)
+
+    def get_reply_markup(self, message: Optional[Message], post_url: Optional[str] = None, message_text: Optional[str] = None,
+                         envelope: Optional[Envelope] = None) -> Optional[InlineKeyboardMarkup]:
         settings = self.settings_manager.load_settings()
         is_premium = self.subscription_manager.is_premium()
 
@@ -238,13 +266,18 @@ class MessageProcessor:
         if is_premium and button_filter['enabled'] and button_filter['mode'] == 'remove':
             reply_markup = None
         else:
-            reply_markup = message.reply_markup
+            reply_markup = envelope.reply_markup if envelope is not None else message.reply_markup
 
         inline_buttons = settings['inline_buttons']
         if is_premium and inline_buttons['enabled'] and inline_buttons['buttons']:
             # استخدام نص الرسالة أو الكابشن
-            text_for_sharing = message_text or message.text or message.caption or ''
-            custom_markup = ButtonParser.buttons_to_markup(inline_buttons['buttons'], post_url or '', text_for_sharing)
+            if envelope is not None:
+                text_for_sharing = message_text or envelope.text
+            else:
+                text_for_sharing = message_text or message.text or message.caption or ''
+            custom_markup = ButtonParser.buttons_to_markup(
+                inline_buttons['buttons'], post_url or '', text_for_sharing, inline_buttons.get('version')
+            )
 
             if reply_markup and hasattr(reply_markup, 'inline_keyboard'):
                 combined_keyboard = custom_markup.inline_keyboard + reply_markup.inline_keyboard
@@ -390,4 +423,4 @@ class MessageProcessor:
 
             return new_text, adjusted_entities
 
-        return new_text, entities
\ No newline at end of file
+        return new_text, entities
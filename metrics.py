@@ -0,0 +1,390 @@
+"""
+مقاييس الأداء بصيغة Prometheus
+Counters و Histograms خفيفة بـ buckets ثابتة تُحدَّث من المسار الساخن
+"""
+import time
+import logging
+from bisect import bisect_left
+from typing import Callable, Dict, List, Tuple
+from aiohttp import web
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# buckets افتراضية بالثواني (من 0.5ms حتى 30s)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape_label_value(value) -> str:
+    """تهريب \\ و " والسطر الجديد (قيم مثل المواقع وأسماء الـ methods تأتي من بيانات التشغيل)"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(label_names: Tuple[str, ...], label_values: Tuple, extra: str = '') -> str:
+    """بناء نص labels بصيغة Prometheus"""
+    parts = [
+        f'{name}="{_escape_label_value(value)}"'
+        for name, value in zip(label_names, label_values)
+    ]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Counter:
+    """عداد تراكمي مع labels اختيارية"""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1.0):
+        """زيادة العداد (بدون قفل - كل التحديثات من نفس event loop)"""
+        self.values[label_values] = self.values.get(label_values, 0.0) + amount
+
+    def get(self, *label_values) -> float:
+        return self.values.get(label_values, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_values, value in list(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {value}")
+        return lines
+
+
+class _HistogramTimer:
+    """context manager لقياس زمن كتلة كود"""
+    __slots__ = ('histogram', 'label_values', 'start')
+
+    def __init__(self, histogram: 'Histogram', label_values: Tuple):
+        self.histogram = histogram
+        self.label_values = label_values
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, *self.label_values)
+        return False
+
+
+class Histogram:
+    """Histogram بـ buckets ثابتة
+
+    كل سلسلة labels تحتفظ بقائمة أعداد غير تراكمية + المجموع + العدد،
+    والتجميع التراكمي يتم فقط عند القراءة (scrape)
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets))
+        # {label_values: [counts..., +Inf, sum, count]}
+        self.series: Dict[Tuple, List[float]] = {}
+
+    def observe(self, value: float, *label_values):
+        """تسجيل قيمة - O(log buckets)"""
+        series = self.series.get(label_values)
+        if series is None:
+            series = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            self.series[label_values] = series
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def time(self, *label_values) -> _HistogramTimer:
+        """قياس زمن كتلة: with HISTOGRAM.time('label'): ..."""
+        return _HistogramTimer(self, label_values)
+
+    def snapshot(self, *label_values) -> Dict:
+        """ملخص سلسلة واحدة (للعرض في الإحصائيات)"""
+        series = self.series.get(label_values)
+        if not series:
+            return {'count': 0, 'sum': 0.0, 'avg': 0.0}
+        return {
+            'count': series[-1],
+            'sum': series[-2],
+            'avg': series[-2] / series[-1] if series[-1] else 0.0
+        }
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        num_buckets = len(self.buckets)
+        for label_values, series in list(self.series.items()):
+            cumulative = 0
+            for idx, bound in enumerate(self.buckets):
+                cumulative += series[idx]
+                labels = _format_labels(self.label_names, label_values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            cumulative += series[num_buckets]
+            labels = _format_labels(self.label_names, label_values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            base_labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{base_labels} {series[-2]}")
+            lines.append(f"{self.name}_count{base_labels} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """سجل مركزي لجميع المقاييس"""
+
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+        # دوال تُستدعى عند القراءة لإنتاج gauges (أحجام القوائم، buffers...)
+        self.collectors: List[Callable[[], List[str]]] = []
+
+    def counter(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()) -> Counter:
+        if name not in self.metrics:
+            self.metrics[name] = Counter(name, help_text, label_names)
+        return self.metrics[name]
+
+    def histogram(self, name: str, help_text: str, label_names: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        if name not in self.metrics:
+            self.metrics[name] = Histogram(name, help_text, label_names, buckets)
+        return self.metrics[name]
+
+    def register_collector(self, collector: Callable[[], List[str]]):
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                logger.error(f"❌ خطأ في جمع المقاييس: {e}")
+        return '\n'.join(lines) + '\n'
+
+
+def gauge_lines(name: str, help_text: str, samples: List[Tuple[Tuple[str, ...], Tuple, float]]) -> List[str]:
+    """بناء أسطر gauge من عينات (label_names, label_values, value)"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    for label_names, label_values, value in samples:
+        lines.append(f"{name}{_format_labels(label_names, label_values)} {value}")
+    return lines
+
+
+# مثيل عام
+metrics_registry = MetricsRegistry()
+
+# ========== المقاييس الأساسية للمسار الساخن ==========
+
+UPDATES_RECEIVED = metrics_registry.counter(
+    'newsposter_updates_total',
+    'Incoming Telegram updates by type and ingest path (fast = raw channel_post, dispatcher = aiogram)',
+    ('type', 'path')
+)
+WEBHOOK_ACK_SECONDS = metrics_registry.histogram(
+    'newsposter_webhook_ack_seconds',
+    'Time from webhook request arrival until the response is returned, by ingestion path',
+    ('path',)
+)
+INGEST_TO_ENQUEUE_SECONDS = metrics_registry.histogram(
+    'newsposter_ingest_to_enqueue_seconds',
+    'Time from webhook ingest until the message is enqueued for a task',
+    ('task',)
+)
+QUEUE_WAIT_SECONDS = metrics_registry.histogram(
+    'newsposter_task_queue_wait_seconds',
+    'Time a message waits in a task queue before a worker picks it up',
+    ('task',)
+)
+FILTER_STAGE_SECONDS = metrics_registry.histogram(
+    'newsposter_filter_stage_seconds',
+    'Time spent in each filter/pipeline stage',
+    ('stage',)
+)
+RENDER_SECONDS = metrics_registry.histogram(
+    'newsposter_render_seconds',
+    'Time spent rendering text and entities to HTML',
+)
+TRANSFORM_STAGES_SECONDS = metrics_registry.histogram(
+    'newsposter_transform_stages_seconds',
+    'Wall time of the text transform stages as seen by the event loop, by execution mode',
+    ('mode',)
+)
+EXECUTOR_WAIT_SECONDS = metrics_registry.histogram(
+    'newsposter_executor_wait_seconds',
+    'Time a blocking call waits for a slot and a worker in a named executor',
+    ('executor',)
+)
+EXECUTOR_REJECTIONS = metrics_registry.counter(
+    'newsposter_executor_rejections_total',
+    'Calls rejected because a named executor queue was full',
+    ('executor',)
+)
+LANGUAGE_DETECTIONS = metrics_registry.counter(
+    'newsposter_language_detections_total',
+    'Language detections by source (script, cache, coalesced, detector)',
+    ('source',)
+)
+TRANSLATION_SECONDS = metrics_registry.histogram(
+    'newsposter_translation_seconds',
+    'Translation gateway call latency including hedged attempts',
+)
+TRANSLATION_REQUESTS = metrics_registry.counter(
+    'newsposter_translation_requests_total',
+    'Translation gateway calls by result (ok, error, timeout, open, hedge)',
+    ('result',)
+)
+TELEGRAM_REQUEST_SECONDS = metrics_registry.histogram(
+    'newsposter_telegram_request_seconds',
+    'Telegram Bot API request latency by method',
+    ('method',)
+)
+TELEGRAM_REQUEST_ERRORS = metrics_registry.counter(
+    'newsposter_telegram_request_errors_total',
+    'Failed Telegram Bot API requests by method',
+    ('method',)
+)
+DELIVERY_RETRIES = metrics_registry.counter(
+    'newsposter_delivery_retries_total',
+    'Delivery retries by task',
+    ('task',)
+)
+DROPPED_MESSAGES = metrics_registry.counter(
+    'newsposter_dropped_messages_total',
+    'Messages dropped before delivery by reason',
+    ('reason',)
+)
+DUPLICATES_SUPPRESSED = metrics_registry.counter(
+    'newsposter_duplicates_suppressed_total',
+    'Duplicate source posts suppressed before fan-out by task',
+    ('task',)
+)
+DELIVERIES = metrics_registry.counter(
+    'newsposter_deliveries_total',
+    'Per-target deliveries by task and result',
+    ('task', 'result')
+)
+LOOP_LAG_SECONDS = metrics_registry.histogram(
+    'newsposter_event_loop_lag_seconds',
+    'Event loop scheduling delay measured by the heartbeat',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+LOOP_STALLS = metrics_registry.counter(
+    'newsposter_event_loop_stalls_total',
+    'Heartbeats delayed past the stall threshold',
+)
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """middleware لجلسة البوت يقيس زمن كل طلب Bot API حسب الـ method"""
+
+    async def __call__(self, make_request, bot, method):
+        method_name = getattr(method, '__api_method__', type(method).__name__)
+        start = time.perf_counter()
+        try:
+            with tracer.span(f"api:{method_name}", getattr(method, 'chat_id', None)):
+                return await make_request(bot, method)
+        except Exception:
+            TELEGRAM_REQUEST_ERRORS.inc(method_name)
+            raise
+        finally:
+            TELEGRAM_REQUEST_SECONDS.observe(time.perf_counter() - start, method_name)
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """outer middleware على dp.update يعد التحديثات التي تمر عبر Dispatcher
+    (المسار السريع في fast_webhook يعد في نفس المقياس بـ path=fast)"""
+
+    async def __call__(self, handler, event, data):
+        UPDATES_RECEIVED.inc(event.event_type, 'dispatcher')
+        return await handler(event, data)
+
+
+def _collect_parallel_system() -> List[str]:
+    """gauges من حالة النظام المتوازي (تُحسب فقط عند القراءة)"""
+    import parallel_forwarding_system
+
+    system = parallel_forwarding_system.parallel_system
+    if not system:
+        return []
+
+    stats = system.get_stats()
+    lines = gauge_lines(
+        'newsposter_global_queue_size', 'Current global queue depth',
+        [((), (), stats['global_queue_size'])]
+    )
+    lines += gauge_lines(
+        'newsposter_task_queue_size', 'Current task queue depth',
+        [(('task',), (task_id,), task_stats['queue_size']) for task_id, task_stats in stats['tasks'].items()]
+    )
+    lines += gauge_lines(
+        'newsposter_album_buffers', 'Open album buffers per task',
+        [(('task',), (task_id,), task_stats['album_buffers']) for task_id, task_stats in stats['tasks'].items()]
+    )
+    return lines
+
+
+def _collect_executors() -> List[str]:
+    """gauges من حالة المنفذات المسماة"""
+    from executors import get_executor_stats
+
+    stats = get_executor_stats()
+    lines = gauge_lines(
+        'newsposter_executor_active', 'Calls currently running in a named executor',
+        [(('executor',), (name,), executor_stats['active']) for name, executor_stats in stats.items()]
+    )
+    lines += gauge_lines(
+        'newsposter_executor_queue_depth', 'Calls queued or waiting for a slot in a named executor',
+        [(('executor',), (name,), executor_stats['queued'] + executor_stats['waiting'])
+         for name, executor_stats in stats.items()]
+    )
+    return lines
+
+
+def _collect_translation_gateway() -> List[str]:
+    """حالة قاطع دائرة الترجمة (1 للحالة الحالية)"""
+    from translation_gateway import CircuitBreaker, translation_gateway
+
+    state = translation_gateway.breaker.state
+    return gauge_lines(
+        'newsposter_translation_breaker_state', 'Translation circuit breaker state',
+        [(('state',), (name,), int(name == state))
+         for name in (CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN)]
+    )
+
+
+def _collect_loop_stalls() -> List[str]:
+    """أكثر مواقع توقف event loop (عدد التوقفات ومجموع مدتها لكل موقع)"""
+    from loop_monitor import loop_monitor
+
+    top = loop_monitor.get_top()
+    lines = gauge_lines(
+        'newsposter_event_loop_stall_site_seconds', 'Total event loop stall time attributed to a call site',
+        [(('site', 'blocking'), (entry['site'], entry['blocking']), entry['total_seconds']) for entry in top]
+    )
+    lines += gauge_lines(
+        'newsposter_event_loop_stall_site_count', 'Event loop stalls attributed to a call site',
+        [(('site', 'blocking'), (entry['site'], entry['blocking']), entry['count']) for entry in top]
+    )
+    return lines
+
+
+metrics_registry.register_collector(_collect_parallel_system)
+metrics_registry.register_collector(_collect_executors)
+metrics_registry.register_collector(_collect_translation_gateway)
+metrics_registry.register_collector(_collect_loop_stalls)
+
+
+async def metrics_endpoint(request):
+    return web.Response(
+        text=metrics_registry.render(),
+        headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+    )
+
+
+def setup_metrics_routes(app):
+    app.router.add_get('/metrics', metrics_endpoint)
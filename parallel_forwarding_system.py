@@ -1,20 +1,51 @@
 
 import asyncio
 import logging
+import time
 from dataclasses import dataclass
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from aiogram import Bot
-from aiogram.types import Message
+from aiogram.types import Message, Update
 from forwarding_manager import ForwardingManager
+from tracing import tracer, Trace
+from dedup_filter import dedup_filter
+from executors import get_executor_stats
+from message_envelope import Envelope
+from hot_logging import get_hot_logger, hot_log_summary
+from metrics import (
+    INGEST_TO_ENQUEUE_SECONDS, QUEUE_WAIT_SECONDS, DELIVERY_RETRIES,
+    DROPPED_MESSAGES, DELIVERIES
+)
+from rate_limiter import send_deadline
 
 logger = logging.getLogger(__name__)
+# سطور كل رسالة وكل هدف: مستوى قابل للتغيير أثناء التشغيل، والنتائج تُجمع في ملخص دوري لكل مهمة
+ingest_log = get_hot_logger('ingest')
+delivery_log = get_hot_logger('delivery')
+
+# مهلة توجيه رسالة لهدف واحد (بالثواني، بدون الانتظار في دور محدد المعدل)
+DELIVERY_TIMEOUT = 30.0
 
 @dataclass
 class QueuedMessage:
-    """رسالة في قائمة الانتظار"""
-    message: Message
+    """رسالة في قائمة الانتظار
+
+    الرسائل القادمة من مسار الاستقبال السريع تحمل بايتات التحديث الخام (raw_update)
+    ويُبنى كائن Message منها عند السحب من القائمة فقط
+    """
+    message: Optional[Message]
     source_channel_id: int
     timestamp: float
+    trace: Optional[Trace] = None
+    raw_update: Optional[bytes] = None
+
+    def materialize(self, bot: Bot) -> Optional[Message]:
+        """بناء كائن Message من التحديث الخام (مرة واحدة)"""
+        if self.message is None and self.raw_update is not None:
+            update = Update.model_validate_json(self.raw_update, context={'bot': bot})
+            self.message = update.channel_post
+            self.raw_update = None
+        return self.message
 
 class GlobalMessageQueue:
     """قائمة انتظار عامة لجميع الرسائل الواردة"""
@@ -26,21 +57,44 @@ class GlobalMessageQueue:
         
     async def add_message(self, message: Message):
         """إضافة رسالة إلى القائمة العامة"""
-        import time
         queued_msg = QueuedMessage(
             message=message,
             source_channel_id=message.chat.id,
-            timestamp=time.time()
+            timestamp=time.time(),
+            trace=tracer.start_trace(message.chat.id, message.message_id)
         )
         
         try:
             # محاولة إضافة الرسالة بدون انتظار
             self.queue.put_nowait(queued_msg)
-            logger.info(f"📥 رسالة جديدة في القائمة العامة من القناة {message.chat.id}")
+            ingest_log.debug("📥 رسالة جديدة في القائمة العامة من القناة %s", message.chat.id)
         except asyncio.QueueFull:
             self.dropped_messages += 1
+            DROPPED_MESSAGES.inc('global_queue_full')
             logger.error(f"🚨 القائمة العامة ممتلئة ({self.max_size})! تم تجاهل رسالة من {message.chat.id} - إجمالي الرسائل المتجاهلة: {self.dropped_messages}")
     
+    def add_raw_update(self, raw_update: bytes, chat_id: int, message_id: int,
+                       media_group_id: Optional[str] = None) -> bool:
+        """إضافة تحديث channel_post خام بدون بناء النماذج (مسار الاستقبال السريع)"""
+        queued_msg = QueuedMessage(
+            message=None,
+            source_channel_id=chat_id,
+            timestamp=time.time(),
+            trace=tracer.start_trace(chat_id, message_id),
+            raw_update=raw_update
+        )
+        
+        try:
+            self.queue.put_nowait(queued_msg)
+            ingest_log.debug("📥 رسالة جديدة في القائمة العامة من القناة %s%s",
+                             chat_id, f" (ألبوم {media_group_id})" if media_group_id else "")
+            return True
+        except asyncio.QueueFull:
+            self.dropped_messages += 1
+            DROPPED_MESSAGES.inc('global_queue_full')
+            logger.error(f"🚨 القائمة العامة ممتلئة ({self.max_size})! تم تجاهل رسالة من {chat_id} - إجمالي الرسائل المتجاهلة: {self.dropped_messages}")
+            return False
+    
     async def get_message(self) -> Optional[QueuedMessage]:
         """استخراج رسالة من القائمة العامة"""
         return await self.queue.get()
@@ -50,18 +104,27 @@ class GlobalMessageQueue:
         return self.queue.qsize()
 
 class TaskQueue:
-    """قائمة انتظار داخلية لكل مهمة"""
+    """قائمة انتظار داخلية لكل مهمة (تحمل أغلفة الرسائل المشتركة بين المهام)"""
     def __init__(self, task_id: int):
         self.task_id = task_id
         self.queue = asyncio.Queue()
         
-    async def add_message(self, message: Message):
-        """إضافة رسالة لقائمة المهمة"""
-        await self.queue.put(message)
+    async def add_message(self, envelope: Envelope, trace: Optional[Trace] = None):
+        """إضافة رسالة لقائمة المهمة مع وقت الإدخال لقياس زمن الانتظار"""
+        await self.queue.put((time.perf_counter(), envelope, trace))
         
-    async def get_message(self) -> Optional[Message]:
+    async def get_message(self) -> Optional[Envelope]:
         """استخراج رسالة من قائمة المهمة"""
-        return await self.queue.get()
+        envelope, _ = await self.get_message_with_trace()
+        return envelope
+    
+    async def get_message_with_trace(self) -> Tuple[Optional[Envelope], Optional[Trace]]:
+        """استخراج رسالة مع مسار التتبع الخاص بها"""
+        enqueued_at, envelope, trace = await self.queue.get()
+        now = time.perf_counter()
+        QUEUE_WAIT_SECONDS.observe(now - enqueued_at, self.task_id)
+        tracer.record('task_queue_wait', enqueued_at, now, f"task#{self.task_id}", trace=trace)
+        return envelope, trace
 
 class TaskWorker:
     """Worker مخصص لمهمة توجيه واحدة"""
@@ -75,13 +138,14 @@ class TaskWorker:
         self.manager = None  # سيتم تعيينه في start()
         self.album_buffers_timestamps = {}  # تتبع وقت إنشاء كل buffer
         
-    async def process_message(self, message: Message, target_channel: Dict, retry_count: int = 0):
+    async def process_message(self, envelope: Envelope, target_channel: Dict, retry_count: int = 0):
         """نسخ رسالة واحدة لقناة هدف واحدة مع الحفاظ على entities وتطبيق الفلاتر"""
         target_name = target_channel.get('title', 'Unknown')
         target_id = target_channel.get('id', 0)
         max_retries = 3
         
-        logger.info(f"🔄 [المهمة #{self.task_id}] بدء توجيه رسالة إلى: {target_name} (ID: {target_id}) - محاولة {retry_count + 1}/{max_retries + 1}")
+        delivery_log.debug("🔄 [المهمة #%s] بدء توجيه رسالة إلى: %s (ID: %s) - محاولة %d/%d",
+                           self.task_id, target_name, target_id, retry_count + 1, max_retries + 1)
         
         try:
             from media_handler import MediaHandler
@@ -89,18 +153,18 @@ class TaskWorker:
             user_id = target_channel.get('user_id', 0)
             user_task_id = target_channel.get('user_task_id', 0)
             
-            if message.media_group_id:
-                logger.info(f"📦 [المهمة #{self.task_id}] معالجة ألبوم وسائط (ID: {message.media_group_id}) للهدف: {target_name}")
+            if envelope.media_group_id:
+                delivery_log.debug("📦 [المهمة #%s] معالجة ألبوم وسائط (ID: %s) للهدف: %s",
+                                   self.task_id, envelope.media_group_id, target_name)
                 
                 # إنشاء album buffer منفصل لكل قناة هدف
-                buffer_key = f"{message.media_group_id}_{target_channel['id']}"
+                buffer_key = f"{envelope.media_group_id}_{target_channel['id']}"
                 
                 if not hasattr(self, 'album_buffers'):
                     self.album_buffers = {}
                 
                 if buffer_key not in self.album_buffers:
                     from album_processor import AlbumBuffer
-                    import time
                     self.album_buffers[buffer_key] = AlbumBuffer()
                     self.album_buffers_timestamps[buffer_key] = time.time()
                 
@@ -111,22 +175,23 @@ class TaskWorker:
                         # تنظيف buffer حتى في حالة الفشل
                         if buffer_key in self.album_buffers:
                             del self.album_buffers[buffer_key]
-                            logger.info(f"🧹 [المهمة #{self.task_id}] تم تنظيف album buffer: {buffer_key}")
+                            delivery_log.debug("🧹 [المهمة #%s] تم تنظيف album buffer: %s", self.task_id, buffer_key)
                 
                 await self.album_buffers[buffer_key].add_message(
-                    message,
-                    message.media_group_id,
+                    envelope,
+                    envelope.media_group_id,
                     album_callback
                 )
             else:
-                logger.info(f"📝 [المهمة #{self.task_id}] نسخ رسالة فردية للهدف: {target_name}")
-                await MediaHandler.copy_message_with_entities(
-                    self.bot, message, target_channel['id'], user_id, user_task_id
-                )
-                logger.info(f"✅ [المهمة #{self.task_id}] نجح التوجيه إلى: {target_name} (ID: {target_id})")
-                
-                # تأخير صغير لتجنب Flood Control (50ms)
-                await asyncio.sleep(0.05)
+                delivery_log.debug("📝 [المهمة #%s] نسخ رسالة فردية للهدف: %s", self.task_id, target_name)
+                with tracer.span('deliver', target_id):
+                    sent = await MediaHandler.copy_message_with_entities(
+                        self.bot, None, target_channel['id'], user_id, user_task_id, envelope
+                    )
+                outcome = 'success' if sent else 'not_sent'
+                DELIVERIES.inc(self.task_id, outcome)
+                hot_log_summary.record(self.task_id, outcome)
+                delivery_log.debug("✅ [المهمة #%s] نجح التوجيه إلى: %s (ID: %s)", self.task_id, target_name, target_id)
         except Exception as e:
             # إعادة المحاولة في حالات معينة
             if retry_count < max_retries:
@@ -137,10 +202,16 @@ class TaskWorker:
                 if any(err in error_str for err in retriable_errors):
                     # Exponential backoff: 1s, 2s, 4s
                     wait_time = 2 ** retry_count
-                    logger.warning(f"⚠️ [المهمة #{self.task_id}] خطأ قابل للإعادة في {target_name} - إعادة المحاولة بعد {wait_time}s")
+                    DELIVERY_RETRIES.inc(self.task_id)
+                    hot_log_summary.record(self.task_id, 'retry')
+                    delivery_log.repeat(logging.WARNING, ('retry', self.task_id),
+                                        "⚠️ [المهمة #%s] خطأ قابل للإعادة في %s - إعادة المحاولة بعد %ss",
+                                        self.task_id, target_name, wait_time)
                     await asyncio.sleep(wait_time)
-                    return await self.process_message(message, target_channel, retry_count + 1)
+                    return await self.process_message(envelope, target_channel, retry_count + 1)
             
+            DELIVERIES.inc(self.task_id, 'failure')
+            hot_log_summary.record(self.task_id, 'failure')
             logger.error(f"❌ [المهمة #{self.task_id}] فشل التوجيه إلى: {target_name} (ID: {target_id}) - الخطأ: {e}")
     
     async def _process_album(self, album_messages, target_channel, user_id, user_task_id):
@@ -148,103 +219,124 @@ class TaskWorker:
         target_name = target_channel.get('title', 'Unknown')
         target_id = target_channel.get('id', 0)
         
-        logger.info(f"📦 [المهمة #{self.task_id}] بدء إرسال ألبوم ({len(album_messages)} وسائط) إلى: {target_name} (ID: {target_id})")
+        delivery_log.debug("📦 [المهمة #%s] بدء إرسال ألبوم (%d وسائط) إلى: %s (ID: %s)",
+                           self.task_id, len(album_messages), target_name, target_id)
         
         try:
             if user_id and user_task_id:
-                logger.info(f"🔧 [المهمة #{self.task_id}] استخدام AlbumProcessor مع فلاتر المستخدم (User: {user_id}, Task: {user_task_id})")
+                delivery_log.debug("🔧 [المهمة #%s] استخدام AlbumProcessor مع فلاتر المستخدم (User: %s, Task: %s)",
+                                   self.task_id, user_id, user_task_id)
                 from album_processor import AlbumProcessor
                 processor = AlbumProcessor(user_id, user_task_id)
-                await processor.process_and_send_album(
+                sent = await processor.process_and_send_album(
                     self.bot, album_messages, target_channel['id']
                 )
             else:
-                logger.info(f"🔧 [المهمة #{self.task_id}] استخدام album_buffer بدون فلاتر")
+                delivery_log.debug("🔧 [المهمة #%s] استخدام album_buffer بدون فلاتر", self.task_id)
                 from media_handler import album_buffer
-                await album_buffer.copy_album(self.bot, album_messages, target_channel['id'])
+                sent = await album_buffer.copy_album(
+                    self.bot, [envelope.message for envelope in album_messages], target_channel['id']
+                )
             
-            logger.info(f"✅ [المهمة #{self.task_id}] نجح إرسال الألبوم ({len(album_messages)} وسائط) إلى: {target_name} (ID: {target_id})")
+            outcome = 'success' if sent else 'not_sent'
+            DELIVERIES.inc(self.task_id, outcome)
+            hot_log_summary.record(self.task_id, outcome)
             
-            # تأخير صغير لتجنب Flood Control (50ms)
-            await asyncio.sleep(0.05)
+            delivery_log.debug("✅ [المهمة #%s] نجح إرسال الألبوم (%d وسائط) إلى: %s (ID: %s)",
+                               self.task_id, len(album_messages), target_name, target_id)
         except Exception as e:
+            DELIVERIES.inc(self.task_id, 'failure')
+            hot_log_summary.record(self.task_id, 'failure')
             logger.error(f"❌ [المهمة #{self.task_id}] فشل إرسال الألبوم إلى: {target_name} (ID: {target_id}) - الخطأ: {e}")
     
+    async def _deliver_with_deadline(self, envelope: Envelope, target_channel: Dict):
+        """توجيه لهدف واحد بمهلة 30 ثانية لا تشمل الانتظار في دور محدد المعدل
+        (acquire يؤخر send_deadline بمدة الانتظار المحجوز)"""
+        async with asyncio.timeout(DELIVERY_TIMEOUT) as deadline:
+            send_deadline.set(deadline)
+            await self.process_message(envelope, target_channel)
+    
+    async def _distribute_to_targets(self, envelope: Envelope):
+        """توجيه رسالة واحدة لجميع أهداف المهمة على دفعات"""
+        # حجم كل دفعة من الأهداف
+        BATCH_SIZE = 20
+        
+        # الحصول على معلومات المهمة من الـ manager المُحدَّث
+        if not self.manager:
+            logger.error(f"❌ Manager غير موجود للمهمة #{self.task_id}")
+            return
+            
+        task = self.manager.get_task(self.task_id)
+        if not task or not task.is_active:
+            return
+        
+        targets = task.target_channels
+        total_targets = len(targets)
+        
+        delivery_log.debug("📊 [المهمة #%s] بدء توزيع رسالة على %d أهداف بنظام Batching (كل دفعة %d قناة)",
+                           self.task_id, total_targets, BATCH_SIZE)
+        hot_log_summary.record(self.task_id, 'messages')
+        
+        total_success = 0
+        total_failure = 0
+        
+        # تقسيم الأهداف إلى دفعات
+        for batch_num, i in enumerate(range(0, total_targets, BATCH_SIZE), 1):
+            batch = targets[i:i + BATCH_SIZE]
+            batch_size = len(batch)
+            
+            delivery_log.debug("📦 [المهمة #%s] معالجة الدفعة #%d (%d قناة)", self.task_id, batch_num, batch_size)
+            
+            # توجيه الرسالة لجميع الأهداف في الدفعة بالتوازي مع timeout (كل هدف في مهمة بسياقه الخاص)
+            forward_tasks = [self._deliver_with_deadline(envelope, target) for target in batch]
+            
+            results = await asyncio.gather(*forward_tasks, return_exceptions=True)
+            
+            # تحليل نتائج الدفعة
+            batch_success = sum(1 for r in results if not isinstance(r, Exception))
+            batch_failure = sum(1 for r in results if isinstance(r, Exception))
+            
+            total_success += batch_success
+            total_failure += batch_failure
+            
+            delivery_log.debug("✅ [المهمة #%s] الدفعة #%d: نجح %d/%d", self.task_id, batch_num, batch_success, batch_size)
+            
+            # تسجيل الأخطاء في الدفعة إن وجدت
+            for idx, result in enumerate(results):
+                if isinstance(result, Exception):
+                    target = batch[idx] if idx < len(batch) else {'title': 'Unknown', 'id': 0}
+                    hot_log_summary.record(self.task_id, 'timeout' if isinstance(result, asyncio.TimeoutError) else 'exception')
+                    delivery_log.repeat(logging.ERROR, ('batch_exception', self.task_id),
+                                        "⚠️ [المهمة #%s] استثناء في الدفعة #%d عند التوجيه إلى %s: %r",
+                                        self.task_id, batch_num, target['title'], result)
+            # لا تأخير بين الدفعات: telegram_rate_limiter ينظم الإرسال لكل قناة وللبوت كاملاً
+        
+        delivery_log.debug("📈 [المهمة #%s] ملخص التوجيه النهائي: ✅ نجح: %d | ❌ فشل: %d | 📊 إجمالي: %d",
+                           self.task_id, total_success, total_failure, total_targets)
+    
     async def target_worker(self, worker_id: int):
         """Worker لتوجيه الرسائل للأهداف بالتوازي مع نظام Batching"""
         logger.info(f"🚀 بدء Target Worker #{worker_id} للمهمة #{self.task_id}")
         
-        # حجم كل دفعة من الأهداف
-        BATCH_SIZE = 20
-        
         while self.is_running:
             try:
                 # انتظار رسالة من قائمة المهمة
-                message = await asyncio.wait_for(
-                    self.task_queue.get_message(),
+                envelope, trace = await asyncio.wait_for(
+                    self.task_queue.get_message_with_trace(),
                     timeout=1.0
                 )
                 
                 # التحقق من أن الرسالة ليست None
-                if message is None:
+                if envelope is None:
                     continue
                 
-                # الحصول على معلومات المهمة من الـ manager المُحدَّث
-                if not self.manager:
-                    logger.error(f"❌ Manager غير موجود للمهمة #{self.task_id}")
-                    continue
-                    
-                task = self.manager.get_task(self.task_id)
-                if not task or not task.is_active:
-                    continue
-                
-                targets = task.target_channels
-                total_targets = len(targets)
-                
-                logger.info(f"📊 [المهمة #{self.task_id}] بدء توزيع رسالة على {total_targets} أهداف بنظام Batching (كل دفعة {BATCH_SIZE} قناة)")
-                
-                total_success = 0
-                total_failure = 0
-                
-                # تقسيم الأهداف إلى دفعات
-                for batch_num, i in enumerate(range(0, total_targets, BATCH_SIZE), 1):
-                    batch = targets[i:i + BATCH_SIZE]
-                    batch_size = len(batch)
-                    
-                    logger.info(f"📦 [المهمة #{self.task_id}] معالجة الدفعة #{batch_num} ({batch_size} قناة)")
-                    
-                    # توجيه الرسالة لجميع الأهداف في الدفعة بالتوازي مع timeout
-                    forward_tasks = [
-                        asyncio.wait_for(
-                            self.process_message(message, target),
-                            timeout=30.0  # 30 ثانية لكل رسالة
-                        )
-                        for target in batch
-                    ]
-                    
-                    results = await asyncio.gather(*forward_tasks, return_exceptions=True)
-                    
-                    # تحليل نتائج الدفعة
-                    batch_success = sum(1 for r in results if not isinstance(r, Exception))
-                    batch_failure = sum(1 for r in results if isinstance(r, Exception))
-                    
-                    total_success += batch_success
-                    total_failure += batch_failure
-                    
-                    logger.info(f"✅ [المهمة #{self.task_id}] الدفعة #{batch_num}: نجح {batch_success}/{batch_size}")
-                    
-                    # تسجيل الأخطاء في الدفعة إن وجدت
-                    for idx, result in enumerate(results):
-                        if isinstance(result, Exception):
-                            target = batch[idx] if idx < len(batch) else {'title': 'Unknown', 'id': 0}
-                            logger.error(f"⚠️ [المهمة #{self.task_id}] استثناء في الدفعة #{batch_num} عند التوجيه إلى {target['title']}: {result}")
-                    
-                    # تأخير كافٍ بين الدفعات لتجنب Rate Limiting
-                    # Telegram: حد 20 رسالة/ثانية، مع 30 قناة/دفعة نحتاج 1.5s
-                    if i + BATCH_SIZE < total_targets:
-                        await asyncio.sleep(1.5)
-                
-                logger.info(f"📈 [المهمة #{self.task_id}] ملخص التوجيه النهائي: ✅ نجح: {total_success} | ❌ فشل: {total_failure} | 📊 إجمالي: {total_targets}")
+                # تفعيل مسار التتبع لهذه الرسالة (ينتقل لمهام التوجيه المتوازية)
+                tracer.activate(trace)
+                try:
+                    await self._distribute_to_targets(envelope)
+                finally:
+                    tracer.release(trace)
+                    tracer.activate(None)
                 
             except asyncio.TimeoutError:
                 continue
@@ -257,7 +349,6 @@ class TaskWorker:
         if not hasattr(self, 'album_buffers'):
             return
         
-        import time
         current_time = time.time()
         max_age = 300  # 5 دقائق
         max_buffers = 100  # حد أقصى 100 buffer
@@ -409,8 +500,9 @@ class TaskWorker:
         try:
             while not self.task_queue.queue.empty():
                 try:
-                    message = self.task_queue.queue.get_nowait()
-                    pending_messages.append(message)
+                    _, envelope, trace = self.task_queue.queue.get_nowait()
+                    tracer.release(trace)
+                    pending_messages.append(envelope)
                 except asyncio.QueueEmpty:
                     break
             
@@ -422,11 +514,11 @@ class TaskWorker:
                     task = self.manager.get_task(self.task_id)
                     if task and task.is_active:
                         logger.info(f"🔄 [المهمة #{self.task_id}] محاولة معالجة الرسائل المعلقة...")
-                        for message in pending_messages[:10]:  # معالجة أول 10 رسائل فقط
+                        for envelope in pending_messages[:10]:  # معالجة أول 10 رسائل فقط
                             try:
                                 for target in task.target_channels:
                                     await asyncio.wait_for(
-                                        self.process_message(message, target),
+                                        self.process_message(envelope, target),
                                         timeout=2.0
                                     )
                             except asyncio.TimeoutError:
@@ -472,8 +564,25 @@ class ParallelForwardingSystem:
                 if queued_msg is None:
                     continue
                 
-                message = queued_msg.message
+                # بايتات التحديث تبقى في الغلاف بدلاً من كائن Message (ذاكرة قوائم المهام)
+                raw_update = queued_msg.raw_update
+                try:
+                    message = queued_msg.materialize(self.bot)
+                except Exception as e:
+                    DROPPED_MESSAGES.inc('invalid_update')
+                    logger.error(f"❌ تحديث غير صالح من القناة {queued_msg.source_channel_id}: {e}")
+                    tracer.release(queued_msg.trace)
+                    continue
+                if message is None:
+                    tracer.release(queued_msg.trace)
+                    continue
+                # الحقائق المشتقة من الرسالة تُحسب مرة واحدة وتُشارك بين جميع المهام والأهداف
+                envelope = Envelope(message, raw_update)
+                queued_msg.message = message = None
                 source_channel_id = queued_msg.source_channel_id
+                trace = queued_msg.trace
+                if trace is not None:
+                    tracer.record('global_queue_wait', trace.start, time.perf_counter(), trace=trace)
                 
                 # البحث عن المهام المناسبة
                 active_tasks = self.manager.get_active_tasks()
@@ -483,15 +592,29 @@ class ParallelForwardingSystem:
                     # التحقق من أن القناة المصدر موجودة في المهمة
                     source_ids = [ch['id'] for ch in task.source_channels]
                     if source_channel_id in source_ids:
+                        # منع التكرار: نفس المحتوى من قناة مصدر أخرى داخل النافذة الزمنية
+                        if task.dedup_enabled:
+                            if dedup_filter.is_duplicate(task_id, envelope.content_hash):
+                                ingest_log.debug("🧬 تم تجاهل رسالة مكررة من القناة %s للمهمة #%s", source_channel_id, task_id)
+                                hot_log_summary.record(task_id, 'duplicate')
+                                message_distributed = True
+                                continue
+                        
                         # إضافة الرسالة لقائمة المهمة
                         if task_id in self.task_workers:
                             try:
-                                await self.task_workers[task_id].task_queue.add_message(message)
-                                logger.info(f"📤 تم توزيع الرسالة للمهمة #{task_id}")
+                                tracer.acquire(trace)
+                                await self.task_workers[task_id].task_queue.add_message(envelope, trace)
+                                INGEST_TO_ENQUEUE_SECONDS.observe(time.time() - queued_msg.timestamp, task_id)
+                                ingest_log.debug("📤 تم توزيع الرسالة للمهمة #%s", task_id)
                                 message_distributed = True
                             except Exception as e:
+                                tracer.release(trace)
                                 logger.error(f"❌ فشل توزيع الرسالة للمهمة #{task_id}: {e}")
                 
+                # انتهاء مرحلة التوزيع - يُغلق المسار عند انتهاء جميع المهام
+                tracer.release(trace)
+                
                 if not message_distributed:
                     logger.warning(f"⚠️ لم يتم توزيع الرسالة من القناة {source_channel_id} - لا توجد مهام نشطة")
                 
@@ -533,6 +656,7 @@ class ParallelForwardingSystem:
                     await asyncio.gather(*stop_tasks, return_exceptions=True)
                     for task_id in tasks_to_delete:
                         del self.task_workers[task_id]
+                        dedup_filter.forget_task(task_id)
                         logger.info(f"🛑 تم إيقاف Workers للمهمة #{task_id}")
                 
                 # إنشاء workers للمهام الجديدة
@@ -597,6 +721,11 @@ class ParallelForwardingSystem:
         """إضافة رسالة من webhook للقائمة العامة"""
         await self.global_queue.add_message(message)
     
+    def add_raw_update(self, raw_update: bytes, chat_id: int, message_id: int,
+                       media_group_id: Optional[str] = None) -> bool:
+        """إضافة تحديث channel_post خام من مسار الاستقبال السريع"""
+        return self.global_queue.add_raw_update(raw_update, chat_id, message_id, media_group_id)
+    
     def get_stats(self) -> Dict:
         """إحصائيات النظام"""
         total_album_buffers = sum(
@@ -604,6 +733,8 @@ class ParallelForwardingSystem:
             for worker in self.task_workers.values()
         )
         
+        dedup_stats = dedup_filter.get_stats()
+        
         return {
             "global_queue_size": self.global_queue.queue_size(),
             "global_queue_max_size": self.global_queue.max_size,
@@ -611,11 +742,14 @@ class ParallelForwardingSystem:
             "num_global_workers": len(self.global_workers),
             "num_active_tasks": len(self.task_workers),
             "total_album_buffers": total_album_buffers,
+            "duplicates_suppressed": dedup_stats['total_suppressed'],
+            "executors": get_executor_stats(),
             "tasks": {
                 task_id: {
                     "queue_size": worker.task_queue.queue.qsize(),
                     "num_workers": len(worker.workers),
-                    "album_buffers": len(getattr(worker, 'album_buffers', {}))
+                    "album_buffers": len(getattr(worker, 'album_buffers', {})),
+                    "duplicates_suppressed": dedup_stats['tasks'].get(task_id, {}).get('suppressed', 0)
                 }
                 for task_id, worker in self.task_workers.items()
             }
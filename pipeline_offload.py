@@ -0,0 +1,94 @@
+"""
+نقل مراحل تحويل النص الثقيلة (روابط، استبدالات، هيدر/فوتر، تنسيق) إلى ProcessPoolExecutor
+حتى لا تحجز دفعة منشورات طويلة مع استبدالات كثيرة حلقة الأحداث (webhook والإرسال) لمئات الميلي ثانية.
+المدخلات والمخرجات tuples قابلة للـ pickle: (النص، entities، خطة المراحل) ← (مسموح، النص، entities، السبب)،
+وتقدير تكلفة بسيط يحدد التنفيذ داخل الحلقة أو في عملية منفصلة (النقل له تكلفة ثابتة ~1ms)
+"""
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+from config import PIPELINE_OFFLOAD_WORKERS, PIPELINE_OFFLOAD_MIN_COST, PIPELINE_OFFLOAD_QUEUE
+from executors import BoundedExecutor, WAIT, register_executor, unregister_executor
+from metrics import FILTER_STAGE_SECONDS, TRANSFORM_STAGES_SECONDS
+from transform_stages import init_worker, run_in_worker, run_transform_stages
+
+logger = logging.getLogger(__name__)
+
+# وزن كل entity مقارنة بحرف واحد (الاستبدال يعيد بناء قائمة entities لكل تطابق)
+_ENTITY_WEIGHT = 8
+
+# المنفذ المسمى 'cpu' (مجمع عمليات) - None عند التعطيل
+_executor: Optional[BoundedExecutor] = None
+
+
+def estimate_cost(text: str, entities: List[Dict], stages: Tuple) -> int:
+    """تكلفة تقديرية بوحدات "حرف": كل مرحلة تمر على النص و entities مرة،
+    والاستبدالات مرة لكل زوج"""
+    unit = len(text) + _ENTITY_WEIGHT * len(entities)
+    cost = 0
+    for stage in stages:
+        cost += unit * len(stage[1]) if stage[0] == 'replacements' else unit
+    return cost
+
+
+def _run_inline(text: str, entities: List[Dict], stages: Tuple) -> Tuple[bool, Optional[str], List[Dict], str]:
+    return run_transform_stages(text, entities, stages, FILTER_STAGE_SECONDS.time)
+
+
+async def run_stages(text: str, entities: List[Dict], stages: Tuple) -> Tuple[bool, Optional[str], List[Dict], str]:
+    """تنفيذ خطة المراحل في عملية منفصلة إذا كان المجمع مفعلاً والتكلفة كافية، وإلا داخل الحلقة"""
+    global _executor
+
+    if not stages:
+        return True, text, entities, ""
+
+    if _executor is not None and estimate_cost(text, entities, stages) >= PIPELINE_OFFLOAD_MIN_COST:
+        try:
+            with TRANSFORM_STAGES_SECONDS.time('offload'):
+                return await _executor.run(run_in_worker, text, tuple(entities), stages)
+        except BrokenProcessPool:
+            # توقفت عملية عمل بشكل غير متوقع - العودة للتنفيذ داخل الحلقة
+            logger.error("❌ مجمع عمليات معالجة النصوص متوقف - التنفيذ داخل حلقة الأحداث")
+            unregister_executor('cpu')
+            _executor = None
+
+    with TRANSFORM_STAGES_SECONDS.time('inline'):
+        return _run_inline(text, entities, stages)
+
+
+async def initialize_pipeline_offload(workers: int = PIPELINE_OFFLOAD_WORKERS):
+    global _executor
+
+    if workers <= 0 or _executor is not None:
+        return
+
+    log_level = logging.getLogger().getEffectiveLevel()
+    # spawn: عمليات نظيفة بدون نسخة من حلقة الأحداث والجلسات المفتوحة،
+    # ودوال العمل من transform_stages (لا تستورد البوت أو المعالجات أو القوائم)
+    _executor = register_executor(BoundedExecutor(
+        'cpu', workers, PIPELINE_OFFLOAD_QUEUE, WAIT,
+        pool_factory=lambda: ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker,
+            initargs=(log_level,)
+        )
+    ))
+    # تشغيل جميع العمليات وتهيئتها قبل أول رسالة
+    await asyncio.gather(*(_executor.run(abs, 0) for _ in range(workers)))
+    logger.info(f"✅ تم تشغيل مجمع معالجة النصوص ({workers} عمليات، الحد الأدنى للتكلفة {PIPELINE_OFFLOAD_MIN_COST})")
+
+
+async def shutdown_pipeline_offload():
+    global _executor
+
+    if _executor is None:
+        return
+    executor, _executor = _executor, None
+    unregister_executor('cpu')
+    await executor.shutdown()
+    logger.info("🛑 تم إيقاف مجمع معالجة النصوص")
@@ -0,0 +1,159 @@
+"""
+محدد معدل الإرسال المشترك لطلبات Bot API (Token Bucket)
+حد عام للبوت كاملاً + حد لكل قناة هدف، لتجنب Flood Control عند الإرسال المكثف
+"""
+import asyncio
+import contextvars
+import logging
+import time
+from typing import Dict, Optional
+
+from config import TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE_PER_MINUTE
+
+logger = logging.getLogger(__name__)
+
+# عدد دلاء القنوات قبل حذف الممتلئة منها (غير المستخدمة مؤخراً)
+_MAX_CHAT_BUCKETS = 10000
+
+# مهلة التوجيه الحالية (asyncio.timeout): انتظار محدد المعدل يؤخرها بنفس المدة
+# فلا يُحسب الانتظار في الدور من مهلة الإرسال نفسه
+send_deadline: contextvars.ContextVar[Optional[asyncio.Timeout]] = contextvars.ContextVar('send_deadline', default=None)
+
+
+class RateLimitDeferred(Exception):
+    """موعد الإرسال المتاح أبعد من أقصى انتظار مسموح: الرسالة تُؤجل بدلاً من حجز عامل التوجيه"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"rate limit wait {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """دلو رموز: rate رمز/ثانية بسعة capacity
+
+    يُحفظ موعد الرمز التالي النظري (tat) بدلاً من عدد الرموز، فكل طلب يحجز موعده فوراً
+    عند الاستدعاء: الطلبات تُخدم بترتيب وصولها (FIFO) بدون تسابق المنتظرين بعد النوم
+    """
+    __slots__ = ('rate', 'capacity', 'interval', 'tolerance', 'tat')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.tolerance = (capacity - 1.0) * self.interval
+        # موعد في الماضي = دلو ممتلئ
+        self.tat = 0.0
+
+    def earliest(self, at: float) -> float:
+        """أقرب موعد إرسال متاح لطلب يصل في at (بدون حجز)"""
+        if self.rate <= 0:
+            return at
+        return max(at, self.tat - self.tolerance)
+
+    def reserve(self, at: float) -> float:
+        """حجز رمز لطلب يصل في at: يعيد موعد الإرسال"""
+        start = self.earliest(at)
+        if self.rate > 0:
+            self.tat = max(self.tat, start) + self.interval
+        return start
+
+    def tokens(self, now: float) -> float:
+        """الرموز المتاحة الآن (سالبة عند وجود حجوزات معلقة)"""
+        if self.rate <= 0 or self.tat <= now:
+            return self.capacity
+        return self.capacity - (self.tat - now) / self.interval
+
+    def is_full(self, now: float) -> bool:
+        return self.tat <= now
+
+
+def _extend_deadline(wait: float):
+    deadline = send_deadline.get()
+    if deadline is None or deadline.when() is None:
+        return
+    try:
+        deadline.reschedule(deadline.when() + wait)
+    except RuntimeError:
+        # المهلة انتهت أو خرجت من نطاقها (مهمة منسوخة السياق بعد انتهاء التوجيه)
+        pass
+
+
+class TelegramRateLimiter:
+    """حد عام + حد لكل قناة
+
+    كل إرسال (الفوري والمؤجل) ينتظر acquire() قبل طلب Bot API حتى يسمح الحدان معاً.
+    الموعد يُحجز بترتيب الطلبات، ومدة الانتظار تُضاف لمهلة التوجيه الحالية (send_deadline)؛
+    مع max_wait يُرفع RateLimitDeferred بدون حجز إذا كان الموعد أبعد منه
+
+    في وضع العمليات المتعددة تُحوَّل الطلبات لمنسق في عملية الـ webhook (attach_coordinator)
+    فيبقى حد البوت الواحد مشتركاً بين جميع عمليات التوجيه
+    """
+
+    def __init__(self, global_rate: float = TELEGRAM_GLOBAL_RATE,
+                 chat_rate_per_minute: float = TELEGRAM_CHAT_RATE_PER_MINUTE):
+        self.global_bucket = TokenBucket(global_rate, max(global_rate, 1.0))
+        self.chat_rate = chat_rate_per_minute / 60.0
+        self.chat_capacity = max(chat_rate_per_minute / 6.0, 1.0)
+        self.chat_buckets: Dict[int, TokenBucket] = {}
+        self.total_wait_seconds = 0.0
+        self.deferred = 0
+        self.coordinator = None
+
+    def attach_coordinator(self, coordinator):
+        """تحويل الحجز لمحدد مشترك في عملية أخرى"""
+        self.coordinator = coordinator
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) >= _MAX_CHAT_BUCKETS:
+                self._prune()
+            bucket = TokenBucket(self.chat_rate, self.chat_capacity)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _prune(self):
+        now = time.monotonic()
+        for chat_id in [chat_id for chat_id, bucket in self.chat_buckets.items() if bucket.is_full(now)]:
+            del self.chat_buckets[chat_id]
+
+    def reserve(self, chat_id: int, max_wait: Optional[float] = None) -> float:
+        """حجز موعد إرسال للقناة: يعيد مدة الانتظار حتى الموعد
+
+        إذا تجاوزت المدة max_wait يُرفع RateLimitDeferred ولا يُستهلك أي رمز
+        """
+        now = time.monotonic()
+        chat_bucket = self._chat_bucket(chat_id)
+        wait = self.global_bucket.earliest(chat_bucket.earliest(now)) - now
+        if max_wait is not None and wait > max_wait:
+            self.deferred += 1
+            raise RateLimitDeferred(wait)
+
+        wait = self.global_bucket.reserve(chat_bucket.reserve(now)) - now
+        if wait > 0:
+            self.total_wait_seconds += wait
+        return wait
+
+    async def acquire(self, chat_id: int, max_wait: Optional[float] = None) -> float:
+        """الانتظار حتى موعد الإرسال المحجوز للقناة"""
+        if self.coordinator is not None:
+            wait = await self.coordinator.reserve(chat_id, max_wait)
+        else:
+            wait = self.reserve(chat_id, max_wait)
+        if wait > 0:
+            _extend_deadline(wait)
+            await asyncio.sleep(wait)
+        return wait
+
+    def get_stats(self) -> Dict:
+        return {
+            'global_tokens': round(self.global_bucket.tokens(time.monotonic()), 2),
+            'chat_buckets': len(self.chat_buckets),
+            'total_wait_seconds': round(self.total_wait_seconds, 2),
+            'deferred': self.deferred,
+            'coordinated': self.coordinator is not None,
+        }
+
+
+# محدد المعدل المشترك
+telegram_rate_limiter = TelegramRateLimiter()
@@ -0,0 +1,220 @@
+"""
+محلل أداء بالعينات للعملية الحية: خيط منفصل يقرأ stacks جميع الخيوط كل PROFILE_INTERVAL_SECONDS
+ويجمعها كـ collapsed stacks (صيغة flamegraph.pl / speedscope) بدون تعديل الكود أو إبطاء المسار الساخن.
+مدرك لـ asyncio: إطارات حلقة الأحداث (run_forever/_run_once) تُستبدل بجذر باسم coroutine المهمة
+الجارية في لحظة العينة، والخيوط المنتظرة (select، منفذات بلا عمل) لا تُحسب إلا عند الطلب.
+التكلفة محدودة: زمن كل عينة يُقاس والفاصل يُمدد تلقائياً حتى لا تتجاوز PROFILE_MAX_OVERHEAD من الوقت
+"""
+import asyncio
+import logging
+import math
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from config import PROFILE_INTERVAL_SECONDS, PROFILE_MAX_OVERHEAD, PROFILE_MAX_SECONDS
+
+logger = logging.getLogger(__name__)
+
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_MAX_DEPTH = 128
+
+# حد stacks المختلفة (الباقي يُجمع تحت جذر واحد حتى لا تنمو الذاكرة بلا حد)
+_MAX_UNIQUE_STACKS = 20000
+
+# أعمق إطار في خيط منتظر (لا يستهلك CPU): (نهاية اسم الملف، اسم الدالة)
+_IDLE_FRAMES = {
+    ('selectors.py', 'select'),
+    ('threading.py', 'wait'),
+    ('queue.py', 'get'),
+    (os.path.join('concurrent', 'futures', 'thread.py'), '_worker'),
+}
+
+# ThreadPoolExecutor يرقم خيوطه (translation_0، translation_1...): نفس الجذر لكل المنفذ
+_THREAD_NUMBER = re.compile(r'_\d+$')
+
+
+class ProfilerBusy(RuntimeError):
+    """تحليل آخر قيد التشغيل (تحليل واحد في كل مرة)"""
+
+
+def _short_path(filename: str) -> str:
+    if filename.startswith(_PROJECT_DIR + os.sep):
+        return os.path.relpath(filename, _PROJECT_DIR)
+    return '/'.join(filename.split(os.sep)[-2:])
+
+
+def _is_idle(code) -> bool:
+    return any(code.co_filename.endswith(suffix) and code.co_name == name for suffix, name in _IDLE_FRAMES)
+
+
+class ProfileResult:
+    """نتيجة التحليل: عدد العينات لكل stack (من الجذر للأعمق)"""
+
+    def __init__(self, stacks: Counter, samples: int, seconds: float, interval: float,
+                 sampling_seconds: float, idle_samples: int):
+        self.stacks = stacks
+        self.samples = samples
+        self.seconds = seconds
+        self.interval = interval
+        self.sampling_seconds = sampling_seconds
+        self.idle_samples = idle_samples
+
+    @property
+    def overhead(self) -> float:
+        """نسبة الوقت الذي قضاه خيط العينات ممسكاً بالـ GIL"""
+        return self.sampling_seconds / self.seconds if self.seconds else 0.0
+
+    def collapsed(self) -> str:
+        """سطر لكل stack: frame1;frame2;...;frameN count"""
+        return ''.join(
+            f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+    def top_functions(self, limit: int = 10) -> List[Tuple[str, int]]:
+        """أكثر الدوال ظهوراً كأعمق إطار (الوقت الذاتي)"""
+        own = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+        return own.most_common(limit)
+
+    def summary(self) -> Dict:
+        return {
+            'seconds': round(self.seconds, 3),
+            'samples': self.samples,
+            'idle_samples': self.idle_samples,
+            'interval_seconds': round(self.interval, 4),
+            'overhead': round(self.overhead, 4),
+            'unique_stacks': len(self.stacks),
+        }
+
+
+class SamplingProfiler:
+    """خيط العينات: يعمل فقط أثناء run() ويتوقف بعدها"""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_SECONDS, max_overhead: float = PROFILE_MAX_OVERHEAD,
+                 max_seconds: float = PROFILE_MAX_SECONDS):
+        self.interval = interval
+        self.max_overhead = max_overhead
+        self.max_seconds = max_seconds
+        self.lock = asyncio.Lock()
+        self.labels: Dict[object, str] = {}
+
+    @property
+    def busy(self) -> bool:
+        return self.lock.locked()
+
+    def _label(self, code, lineno: Optional[int] = None) -> str:
+        label = self.labels.get(code)
+        if label is None:
+            label = self.labels[code] = f"{code.co_name} ({_short_path(code.co_filename)})"
+        return label if lineno is None else f"{label[:-1]}:{lineno})"
+
+    @staticmethod
+    def _task_root(loop: asyncio.AbstractEventLoop) -> str:
+        """جذر العينة في خيط حلقة الأحداث: coroutine المهمة الجارية (وليس اسمها Task-N المتغير)"""
+        try:
+            task = asyncio.current_task(loop)
+        except RuntimeError:
+            task = None
+        if task is None:
+            return 'asyncio:callback'
+        coroutine = task.get_coro()
+        return f"task:{getattr(coroutine, '__qualname__', task.get_name())}"
+
+    def _walk(self, frame, lines: bool) -> Tuple[List, List[str]]:
+        """الإطارات من الأعمق للجذر (code objects) والتسميات المقابلة"""
+        codes = []
+        labels = []
+        while frame is not None and len(codes) < _MAX_DEPTH:
+            code = frame.f_code
+            codes.append(code)
+            labels.append(self._label(code, frame.f_lineno if lines else None))
+            frame = frame.f_back
+        return codes, labels
+
+    def _sample_loop(self, stop: threading.Event, loop: asyncio.AbstractEventLoop, loop_thread: int,
+                     include_idle: bool, lines: bool, state: Dict):
+        stacks: Counter = state['stacks']
+        own_thread = threading.get_ident()
+        delay = self.interval
+        while not stop.wait(delay):
+            started = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            frames = sys._current_frames()
+            for thread_id, frame in frames.items():
+                if thread_id == own_thread:
+                    continue
+                if _is_idle(frame.f_code):
+                    state['idle'] += 1
+                    if not include_idle:
+                        continue
+                codes, labels = self._walk(frame, lines)
+                if thread_id == loop_thread:
+                    # إطارات حلقة الأحداث فوق Handle._run لا تضيف معلومات: تُستبدل بجذر المهمة
+                    for index, code in enumerate(codes):
+                        if code.co_name == '_run' and code.co_filename.endswith(os.path.join('asyncio', 'events.py')):
+                            labels = labels[:index] + [self._task_root(loop)]
+                            break
+                    else:
+                        labels.append('asyncio:loop')
+                else:
+                    labels.append(f"thread:{_THREAD_NUMBER.sub('', names.get(thread_id, str(thread_id)))}")
+                stack = tuple(reversed(labels))
+                if stack in stacks or len(stacks) < _MAX_UNIQUE_STACKS:
+                    stacks[stack] += 1
+                else:
+                    stacks[(stack[0], '[truncated]')] += 1
+                state['samples'] += 1
+            # عدم الإمساك بإطارات الخيوط حتى العينة التالية
+            frames = frame = None
+            cost = time.perf_counter() - started
+            state['sampling_seconds'] += cost
+            state['rounds'] += 1
+            # فاصل أطول كلما كانت العينة أغلى (عدد خيوط كبير أو stacks عميقة)
+            delay = max(self.interval, cost / self.max_overhead)
+
+    async def run(self, seconds: float, include_idle: bool = False, lines: bool = False) -> ProfileResult:
+        """تحليل لمدة seconds (بحد PROFILE_MAX_SECONDS)؛ ProfilerBusy إذا كان تحليل آخر جارياً،
+        و ValueError لمدة غير محدودة (nan يتجاوز الحدود و asyncio.sleep(nan) لا ينتهي)"""
+        if not math.isfinite(seconds):
+            raise ValueError(f"invalid profile duration: {seconds}")
+        if self.busy:
+            raise ProfilerBusy("profile already running")
+        seconds = min(max(seconds, 0.1), self.max_seconds)
+        async with self.lock:
+            loop = asyncio.get_running_loop()
+            state = {'stacks': Counter(), 'samples': 0, 'idle': 0, 'rounds': 0, 'sampling_seconds': 0.0}
+            stop = threading.Event()
+            sampler = threading.Thread(
+                target=self._sample_loop, name='sampling-profiler', daemon=True,
+                args=(stop, loop, threading.get_ident(), include_idle, lines, state)
+            )
+            logger.info(f"🔬 بدء تحليل الأداء لمدة {seconds:.0f}s")
+            started = time.perf_counter()
+            sampler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                stop.set()
+                await asyncio.to_thread(sampler.join)
+            elapsed = time.perf_counter() - started
+
+        # الفاصل الفعلي (قد يكون أطول من PROFILE_INTERVAL_SECONDS عند تمديده لحد التكلفة)
+        interval = elapsed / state['rounds'] if state['rounds'] else self.interval
+        result = ProfileResult(
+            state['stacks'], state['samples'], elapsed, interval, state['sampling_seconds'], state['idle']
+        )
+        logger.info(
+            f"🔬 انتهى تحليل الأداء: {result.samples} عينة، {len(result.stacks)} stack، "
+            f"التكلفة {result.overhead * 100:.2f}%"
+        )
+        return result
+
+
+sampling_profiler = SamplingProfiler()
@@ -0,0 +1,199 @@
+"""
+بوابة الجدولة: فلتر الأيام وفلتر الساعات مع المنطقة الزمنية مُجمَّعة مسبقاً
+إلى انتقالات فتح/إغلاق مرتبة بتوقيت UTC للأسبوع القادم.
+فحص كل توصيل = مقارنة واحدة مع لحظة "صالح حتى" المحفوظة، وإعادة الحساب
+فقط عند الوصول للانتقال التالي. تغيير الإعدادات/المنطقة الزمنية يحذف البوابة عبر invalidate_schedule
+(يستدعيه TaskSettingsManager.save_settings و TimezoneManager.set_timezone) بدلاً من مقارنتها في كل فحص
+"""
+import logging
+import time
+from bisect import bisect_right
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from day_filter import DayFilter
+from hour_filter import HourFilter
+from timezone_manager import get_zoneinfo
+
+logger = logging.getLogger(__name__)
+
+# مدى التجميع المسبق (أسبوع كامل يغطي كل تركيبات اليوم/الساعة)
+SCHEDULE_HORIZON_SECONDS = 7 * 24 * 3600
+
+# جميع إزاحات المناطق الزمنية الحالية (بما فيها +5:30 و +5:45) من مضاعفات 15 دقيقة،
+# فحدود الساعات المحلية تقع دائماً على حدود ربع ساعة بتوقيت UTC
+_STEP_SECONDS = 15 * 60
+
+# الحالة عند عدم وجود فلاتر أو عند الخطأ
+_OPEN = (True, "")
+
+
+class ScheduleGate:
+    """انتقالات الجدولة لمهمة واحدة: [(لحظة UTC, (مسموح, سبب الرفض))] مرتبة"""
+    __slots__ = ('day_settings', 'hour_settings', 'timezone', 'tz',
+                 'starts', 'states', 'compiled_until', 'index', 'valid_until')
+
+    def __init__(self, day_settings: Optional[Dict], hour_settings: Optional[Dict], timezone: str):
+        self.day_settings = day_settings
+        self.hour_settings = hour_settings
+        self.timezone = timezone
+        self.tz = get_zoneinfo(timezone)
+        self.starts: List[int] = []
+        self.states: List[Tuple[bool, str]] = []
+        self.compiled_until = 0
+        self.index = 0
+        self.valid_until = 0
+
+    def _evaluate(self, local: datetime) -> Tuple[bool, str]:
+        # نفس ترتيب الفحص السابق: الأيام ثم الساعات
+        if self.day_settings:
+            allowed, reason = DayFilter.evaluate_day(self.day_settings, local.weekday())
+            if not allowed:
+                return allowed, reason
+        if self.hour_settings:
+            allowed, reason = HourFilter.evaluate_hour(self.hour_settings, local.hour)
+            if not allowed:
+                return allowed, reason
+        return _OPEN
+
+    def compile(self, now: float):
+        """حساب الانتقالات من بداية ربع الساعة الحالي حتى نهاية المدى"""
+        start = int(now) - int(now) % _STEP_SECONDS
+        end = start + SCHEDULE_HORIZON_SECONDS
+
+        starts = []
+        states = []
+        for instant in range(start, end, _STEP_SECONDS):
+            state = self._evaluate(datetime.fromtimestamp(instant, self.tz))
+            if not states or states[-1] != state:
+                starts.append(instant)
+                states.append(state)
+
+        self.starts = starts
+        self.states = states
+        self.compiled_until = end
+        logger.debug(f"🗓️ تجميع الجدولة ({self.timezone}): {len(starts)} انتقال حتى {end}")
+        self._seek(now)
+
+    def _seek(self, now: float):
+        index = bisect_right(self.starts, now) - 1
+        self.index = index
+        self.valid_until = self.starts[index + 1] if index + 1 < len(self.starts) else self.compiled_until
+
+    def check(self, now: Optional[float] = None) -> Tuple[bool, str]:
+        if now is None:
+            now = time.time()
+        if now >= self.valid_until:
+            if now >= self.compiled_until:
+                self.compile(now)
+            else:
+                self._seek(now)
+        elif now < self.starts[self.index]:
+            # الساعة رجعت للخلف: البحث في الانتقالات المجمعة، أو إعادة التجميع إذا سبقت بدايتها
+            if now < self.starts[0]:
+                self.compile(now)
+            else:
+                self._seek(now)
+        return self.states[self.index]
+
+    def next_window(self, now: Optional[float] = None) -> Optional[Tuple[int, int]]:
+        """(لحظة الفتح, لحظة الإغلاق) للنافذة الحالية أو القادمة، أو None إذا لم تُفتح خلال المدى"""
+        if now is None:
+            now = time.time()
+        self.check(now)
+
+        opens_index = self.index
+        while opens_index < len(self.states) and not self.states[opens_index][0]:
+            opens_index += 1
+        if opens_index >= len(self.states):
+            return None
+
+        opens_at = max(self.starts[opens_index], int(now))
+        closes_index = opens_index + 1
+        while closes_index < len(self.states) and self.states[closes_index][0]:
+            closes_index += 1
+        closes_at = self.starts[closes_index] if closes_index < len(self.starts) else self.compiled_until
+        return opens_at, closes_at
+
+
+# {(user_id, task_id): البوابة}
+_gates: Dict[Tuple[int, int], ScheduleGate] = {}
+
+# مستمعو الإلغاء (عملية الـ webhook تبلغ عمليات التوجيه في وضع العمليات المتعددة)
+_invalidation_listeners: List[Callable[[int, Optional[int]], None]] = []
+
+
+def add_invalidation_listener(listener: Callable[[int, Optional[int]], None]):
+    _invalidation_listeners.append(listener)
+
+
+def remove_invalidation_listener(listener: Callable[[int, Optional[int]], None]):
+    if listener in _invalidation_listeners:
+        _invalidation_listeners.remove(listener)
+
+
+def invalidate_schedule(user_id: int, task_id: Optional[int] = None, notify: bool = True):
+    """حذف بوابة المهمة (أو جميع مهام المستخدم عند task_id=None) لتُجمع من الإعدادات الجديدة في الفحص التالي"""
+    if task_id is None:
+        for key in [key for key in _gates if key[0] == user_id]:
+            del _gates[key]
+    else:
+        _gates.pop((user_id, task_id), None)
+    if notify:
+        for listener in list(_invalidation_listeners):
+            listener(user_id, task_id)
+
+
+def _get_gate(user_id: int, task_id: int, day_settings: Optional[Dict],
+              hour_settings: Optional[Dict], timezone: Optional[str]) -> ScheduleGate:
+    key = (user_id, task_id)
+    gate = _gates.get(key)
+    if gate is None or (timezone is not None and gate.timezone != timezone):
+        if timezone is None:
+            from timezone_manager import TimezoneManager
+            timezone = TimezoneManager(user_id).get_timezone()
+        gate = ScheduleGate(day_settings, hour_settings, timezone)
+        _gates[key] = gate
+    return gate
+
+
+def check_schedule(user_id: int, task_id: int, day_settings: Optional[Dict],
+                   hour_settings: Optional[Dict], timezone: Optional[str] = None) -> Tuple[bool, str]:
+    """
+    التحقق من أن اللحظة الحالية ضمن نافذة النشر (فلترا الأيام والساعات معاً)
+
+    Args:
+        day_settings: إعدادات فلتر الأيام المفعّل أو None
+        hour_settings: إعدادات فلتر الساعات المفعّل أو None
+        timezone: المنطقة الزمنية، أو None لقراءتها من TimezoneManager عند تجميع البوابة فقط
+
+    Returns:
+        (مسموح, سبب الرفض)
+    """
+    if not day_settings and not hour_settings:
+        return _OPEN
+
+    try:
+        return _get_gate(user_id, task_id, day_settings, hour_settings, timezone).check()
+
+    except Exception as e:
+        logger.error(f"❌ خطأ في فلتر الجدولة: {e}")
+        return _OPEN
+
+
+def next_schedule_window(user_id: int, task_id: int, day_settings: Optional[Dict],
+                         hour_settings: Optional[Dict], timezone: Optional[str] = None) -> Optional[Tuple[int, int]]:
+    """نافذة النشر القادمة (فتح, إغلاق) بتوقيت UTC عندما تكون الجدولة مغلقة الآن، وإلا None"""
+    if not day_settings and not hour_settings:
+        return None
+
+    try:
+        gate = _get_gate(user_id, task_id, day_settings, hour_settings, timezone)
+        allowed, _ = gate.check()
+        if allowed:
+            return None
+        return gate.next_window()
+
+    except Exception as e:
+        logger.error(f"❌ خطأ في حساب نافذة النشر القادمة: {e}")
+        return None
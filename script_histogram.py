@@ -0,0 +1,187 @@
+"""
+مدرّج أنظمة الكتابة (script histogram) للنص في مرور واحد
+يُحسب مرة واحدة لكل نص (مع cache) ويُستخدم من فلتر اللغة وقرار الترجمة
+بدلاً من تشغيل regex لكل لغة، و langdetect يُستخدم فقط عند الغموض
+"""
+from bisect import bisect_right
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Optional
+
+# نطاقات Unicode مرتبة: (بداية, نهاية, الفئة)
+_SCRIPT_RANGES = [
+    (0x0041, 0x005A, 'latin_basic'),
+    (0x0061, 0x007A, 'latin_basic'),
+    (0x00C0, 0x024F, 'latin_ext'),
+    (0x0370, 0x03FF, 'greek'),
+    (0x0400, 0x04FF, 'cyrillic'),
+    (0x0500, 0x052F, 'cyrillic'),
+    (0x0590, 0x05FF, 'hebrew'),
+    (0x0600, 0x06FF, 'arabic_core'),
+    (0x0750, 0x077F, 'arabic_ext'),
+    (0x08A0, 0x08FF, 'arabic_ext'),
+    (0x0900, 0x097F, 'devanagari'),
+    (0x0E00, 0x0E7F, 'thai'),
+    (0x1100, 0x11FF, 'hangul'),
+    (0x1E00, 0x1EFF, 'latin_ext'),
+    (0x3040, 0x30FF, 'kana'),
+    (0x3400, 0x4DBF, 'han'),
+    (0x4E00, 0x9FFF, 'han'),
+    (0xAC00, 0xD7AF, 'hangul'),
+    (0xFB50, 0xFDFF, 'arabic_presentation'),
+    (0xFE70, 0xFEFF, 'arabic_presentation'),
+]
+_RANGE_STARTS = [start for start, _, _ in _SCRIPT_RANGES]
+
+# أحرف خاصة بالفارسية/الأردية داخل نطاق العربية الأساسي
+PERSIAN_URDU_LETTERS = frozenset('پچژگکیٹڈڑںہھےۃۓ')
+
+# الأحرف الروسية تحديداً (مطابقة لنمط [а-яА-ЯёЁ] السابق)
+_RUSSIAN_LETTERS = frozenset('абвгдежзийклмнопрстуфхцчшщъыьэюяАБВГДЕЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯёЁ')
+
+# الأحرف الإضافية لكل لغة لاتينية (فوق a-zA-Z)
+LATIN_LANGUAGE_EXTRAS = {
+    'en': frozenset(),
+    'tr': frozenset('çÇğĞıİöÖşŞüÜ'),
+    'de': frozenset('äöüßÄÖÜ'),
+    'fr': frozenset('àâäæçéèêëïîôùûüÿœÀÂÄÆÇÉÈÊËÏÎÔÙÛÜŸŒ'),
+    'es': frozenset('áéíóúüñÁÉÍÓÚÜÑ'),
+    'it': frozenset('àèéìíîòóùúÀÈÉÌÍÎÒÓÙÚ'),
+    'pt': frozenset('áâãàçéêíóôõúüÁÂÃÀÇÉÊÍÓÔÕÚÜ'),
+}
+
+# فئات الحروف المحسوبة لكل لغة في نسبة فلتر اللغة
+_LANGUAGE_CLASSES = {
+    'ar': ('arabic_core', 'arabic_ext'),
+    'fa': ('arabic_core',),
+    'ur': ('arabic_core',),
+    'ru': ('cyrillic_ru',),
+}
+
+# أنظمة كتابة تدل على لغة واحدة بدون الحاجة لـ langdetect
+_UNAMBIGUOUS_SCRIPTS = {
+    'greek': 'el',
+    'hebrew': 'he',
+    'thai': 'th',
+    'hangul': 'ko',
+    'kana': 'ja',
+}
+
+# نسبة الهيمنة المطلوبة لاعتبار النص بلغة واحدة
+DOMINANCE_THRESHOLD = 0.9
+
+# cache لتصنيف كل حرف (عدد الأحرف المختلفة في النصوص محدود عملياً)
+_char_class_cache: Dict[str, str] = {}
+
+
+def _classify(char: str) -> str:
+    """تصنيف حرف كلمة (\\w) إلى فئة نظام الكتابة"""
+    cls = _char_class_cache.get(char)
+    if cls is not None:
+        return cls
+
+    code = ord(char)
+    index = bisect_right(_RANGE_STARTS, code) - 1
+    cls = 'other'
+    if index >= 0:
+        start, end, script = _SCRIPT_RANGES[index]
+        if code <= end:
+            cls = script
+    if cls == 'other' and char.isdigit():
+        cls = 'digit'
+    elif cls == 'cyrillic' and char in _RUSSIAN_LETTERS:
+        cls = 'cyrillic_ru'
+
+    if len(_char_class_cache) < 65536:
+        _char_class_cache[char] = cls
+    return cls
+
+
+class ScriptHistogram:
+    """عدد أحرف الكلمات لكل نظام كتابة في النص"""
+    __slots__ = ('counts', 'latin_ext_chars', 'persian_urdu', 'total')
+
+    def __init__(self, text: str):
+        counts = Counter()
+        latin_ext_chars = Counter()
+        persian_urdu = 0
+        total = 0
+
+        # مرور واحد: نفس تعريف الأحرف المحسوبة سابقاً (\w بدون المسافات)
+        for char in text:
+            if not (char.isalnum() or char == '_'):
+                continue
+            total += 1
+            cls = _classify(char)
+            counts[cls] += 1
+            if cls == 'latin_ext':
+                latin_ext_chars[char] += 1
+            elif cls == 'arabic_core' and char in PERSIAN_URDU_LETTERS:
+                persian_urdu += 1
+
+        self.counts = counts
+        self.latin_ext_chars = latin_ext_chars
+        self.persian_urdu = persian_urdu
+        self.total = total
+
+    def language_ratio(self, language: str) -> float:
+        """نسبة أحرف اللغة من إجمالي أحرف الكلمات (0.0 - 1.0)"""
+        if not self.total:
+            return 0.0
+
+        if language in LATIN_LANGUAGE_EXTRAS:
+            extras = LATIN_LANGUAGE_EXTRAS[language]
+            matched = self.counts['latin_basic']
+            if extras:
+                matched += sum(count for char, count in self.latin_ext_chars.items() if char in extras)
+            return matched / self.total
+
+        classes = _LANGUAGE_CLASSES.get(language)
+        if not classes:
+            return 0.0
+        return sum(self.counts[cls] for cls in classes) / self.total
+
+    @staticmethod
+    def supports(language: str) -> bool:
+        return language in LATIN_LANGUAGE_EXTRAS or language in _LANGUAGE_CLASSES
+
+    def dominant_script(self):
+        """(الفئة المهيمنة, نسبتها) بين الحروف فقط (بدون الأرقام)"""
+        letters = {cls: count for cls, count in self.counts.items() if cls not in ('digit', 'other')}
+        if not letters:
+            return None, 0.0
+        # العربية بأشكالها المختلفة تُعامل كنظام واحد
+        arabic = letters.pop('arabic_core', 0) + letters.pop('arabic_ext', 0) + letters.pop('arabic_presentation', 0)
+        if arabic:
+            letters['arabic'] = arabic
+        latin = letters.pop('latin_basic', 0) + letters.pop('latin_ext', 0)
+        if latin:
+            letters['latin'] = latin
+        cyrillic = letters.pop('cyrillic', 0) + letters.pop('cyrillic_ru', 0)
+        if cyrillic:
+            letters['cyrillic'] = cyrillic
+
+        script = max(letters, key=letters.get)
+        return script, letters[script] / sum(letters.values())
+
+    def guess_language(self) -> Optional[str]:
+        """تخمين اللغة عندما يكون نظام الكتابة حاسماً، وإلا None (يُستخدم langdetect)
+
+        اللاتينية والسيريلية والصينية تشترك فيها لغات عديدة فتُترك لـ langdetect
+        """
+        script, share = self.dominant_script()
+        if script is None or share < DOMINANCE_THRESHOLD:
+            return None
+        if script == 'arabic':
+            # وجود أحرف فارسية/أردية يجعل النص غامضاً (fa/ur)
+            return None if self.persian_urdu else 'ar'
+        return _UNAMBIGUOUS_SCRIPTS.get(script)
+
+    def to_dict(self) -> Dict:
+        return {'total': self.total, 'counts': dict(self.counts), 'persian_urdu': self.persian_urdu}
+
+
+@lru_cache(maxsize=1024)
+def get_script_histogram(text: str) -> ScriptHistogram:
+    """المدرّج مع cache: نفس نص الرسالة لكل الأهداف يُحسب مرة واحدة"""
+    return ScriptHistogram(text or '')
@@ -446,6 +446,41 @@ async def toggle_auto_delete(callback: CallbackQuery):
     await callback.answer(f"{'تم تفعيل' if new_state else 'تم تعطيل'} الحذف التلقائي")
     await settings_auto_delete(callback)
 
+def schedule_defer_status(settings: dict) -> str:
+    """سطر حالة وضع التأجيل المشترك بين فلتري الأيام والساعات"""
+    if settings.get('schedule_defer', {}).get('enabled', False):
+        return "⏳ الرسائل خارج أوقات النشر: تُؤجل وتُرسل تدريجياً عند فتح النافذة\n"
+    return "⏳ الرسائل خارج أوقات النشر: تُحذف\n"
+
+
+def schedule_defer_button(settings: dict, task_id: int, origin: str) -> InlineKeyboardButton:
+    """زر تبديل وضع التأجيل (origin: day أو hour للعودة لنفس الصفحة)"""
+    defer_enabled = settings.get('schedule_defer', {}).get('enabled', False)
+    return InlineKeyboardButton(
+        text=f"⏳ تأجيل الرسائل: {'🟢 مفعل' if defer_enabled else '🔴 معطل'}",
+        callback_data=f"toggle_schedule_defer:{task_id}:{origin}"
+    )
+
+
+@router.callback_query(F.data.startswith("toggle_schedule_defer:"))
+async def toggle_schedule_defer(callback: CallbackQuery):
+    """تبديل وضع تأجيل الرسائل خارج نافذة النشر بدلاً من حذفها"""
+    parts = callback.data.split(":")
+    task_id = int(parts[1])
+    origin = parts[2] if len(parts) > 2 else 'hour'
+    user_id = callback.from_user.id
+
+    settings_manager = TaskSettingsManager(user_id, task_id)
+    new_state = settings_manager.toggle_feature('schedule_defer')
+
+    await callback.answer(f"{'تم تفعيل' if new_state else 'تم تعطيل'} تأجيل الرسائل")
+    callback.data = f"settings_{origin}_filter:{task_id}"
+    if origin == 'day':
+        await settings_day_filter(callback)
+    else:
+        await settings_hour_filter(callback)
+
+
 @router.callback_query(F.data.startswith("settings_day_filter:"))
 async def settings_day_filter(callback: CallbackQuery):
     """إعدادات فلتر الأيام"""
@@ -478,6 +513,7 @@ async def settings_day_filter(callback: CallbackQuery):
 
     if enabled:
         text += f"الوضع: {DayFilter.get_mode_description(mode)}\n"
+        text += schedule_defer_status(settings)
         if days:
             day_names = [DayFilter.DAYS_AR.get(d, str(d)) for d in days]
             text += f"الأيام: {', '.join(day_names)}\n"
@@ -496,6 +532,7 @@ async def settings_day_filter(callback: CallbackQuery):
                 callback_data=f"toggle_day_filter_mode:{task_id}"
             )
         ])
+        keyboard.append([schedule_defer_button(settings, task_id, 'day')])
 
         # أزرار الأيام
         for i in range(0, 7, 2):
@@ -798,6 +835,7 @@ async def settings_hour_filter(callback: CallbackQuery):
 
     if enabled:
         text += f"الوضع: {HourFilter.get_mode_description(mode)}\n"
+        text += schedule_defer_status(settings)
         if hours:
             sorted_hours = sorted(hours)
             hour_texts = [f"{h}:00" for h in sorted_hours]
@@ -828,6 +866,7 @@ async def settings_hour_filter(callback: CallbackQuery):
                 callback_data=f"toggle_hour_filter_mode:{task_id}"
             )
         ])
+        keyboard.append([schedule_defer_button(settings, task_id, 'hour')])
         
         # أزرار تفعيل الكل / تعطيل الكل
         keyboard.append([
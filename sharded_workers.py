@@ -0,0 +1,493 @@
+"""
+وضع التوجيه متعدد العمليات (FORWARDING_SHARDS > 1)
+عملية الـ webhook تستقبل التحديثات وتوجه كل channel_post خام لإحدى عمليات التوجيه
+عبر Unix socket محلي، وكل عملية تشغل ParallelForwardingSystem خاصاً بها.
+المصادر التي تشترك في مهمة واحدة تُوجه لنفس العملية (منع التكرار وترتيب الألبوم يبقيان محليين)،
+ومحدد معدل الإرسال يبقى في عملية الـ webhook كمنسق مشترك لحد البوت الواحد
+"""
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import struct
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.types import Message
+
+import parallel_forwarding_system
+from config import DEFERRED_DELIVERIES_FILE, SHARD_SOCKET_PATH
+from executors import merge_executor_stats, shutdown_executors
+from forwarding_manager import ForwardingManager
+from hot_logging import (
+    add_level_listener, remove_level_listener, get_hot_log_levels, set_hot_log_level, get_hot_logger,
+    initialize_hot_logging, shutdown_hot_logging
+)
+from loop_monitor import initialize_loop_monitor, loop_monitor, shutdown_loop_monitor
+from memory_introspection import collect_memory_report
+from metrics import DROPPED_MESSAGES
+from rate_limiter import RateLimitDeferred, telegram_rate_limiter
+from schedule_gate import add_invalidation_listener, invalidate_schedule, remove_invalidation_listener
+from task_statistics_manager import shutdown_task_statistics
+
+logger = logging.getLogger(__name__)
+ingest_log = get_hot_logger('ingest')
+
+# أنواع الإطارات: طول (4 بايت) + نوع (بايت) + المحتوى
+_HELLO = b'H'    # توجيه → webhook: رقم العملية
+_UPDATE = b'U'   # webhook → توجيه: chat_id + message_id + التحديث الخام
+_RELOAD = b'R'   # webhook → توجيه: إعادة تحميل المهام
+_STOP = b'Q'     # webhook → توجيه: إيقاف
+_STATS = b'S'    # توجيه → webhook: إحصائيات JSON
+_ACQUIRE = b'A'  # توجيه → webhook: حجز موعد إرسال (رقم الطلب + chat_id + أقصى انتظار، سالب = بلا حد)
+_GRANT = b'G'    # webhook → توجيه: رقم الطلب + مدة الانتظار + تم الحجز (أو تأجيل)
+_LOG_LEVELS = b'L'  # webhook → توجيه: مستويات سجلات المسار الساخن JSON {النظام الفرعي: المستوى}
+_SCHEDULE = b'T'    # webhook → توجيه: إلغاء بوابة جدولة (user_id + task_id، أو -1 لجميع المهام)
+
+_LENGTH = struct.Struct('>I')
+_SHARD_INDEX = struct.Struct('>H')
+_UPDATE_HEADER = struct.Struct('>qq')
+_ACQUIRE_BODY = struct.Struct('>Iqd')
+_GRANT_BODY = struct.Struct('>Id?')
+_SCHEDULE_BODY = struct.Struct('>qq')
+
+# إطارات محفوظة لكل عملية قبل اتصالها (بدء التشغيل أو إعادة التشغيل)
+_MAX_PENDING_FRAMES = 10000
+
+# أقصى حجم بيانات غير مرسلة لكل عملية قبل اعتبارها متأخرة وتجاهل الرسائل الجديدة
+_MAX_WRITE_BUFFER = 64 * 1024 * 1024
+
+_STATS_INTERVAL = 5
+_SUPERVISE_INTERVAL = 5
+_STOP_TIMEOUT = 15
+
+
+def _frame(kind: bytes, payload: bytes = b'') -> bytes:
+    return _LENGTH.pack(len(payload) + 1) + kind + payload
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> Tuple[bytes, bytes]:
+    (length,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+    body = await reader.readexactly(length)
+    return body[:1], body[1:]
+
+
+def _hash_shard(key: int, shards: int) -> int:
+    # blake2b ثابت بين العمليات وعمليات إعادة التشغيل (بعكس hash()) وموزع جيداً للمعرفات المتتالية
+    digest = hashlib.blake2b(str(key).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % shards
+
+
+def build_shard_map(manager: ForwardingManager, shards: int) -> Dict[int, int]:
+    """{source_channel_id: رقم العملية}
+
+    المصادر المتصلة عبر المهام (مهمة بعدة مصادر، أو مصدر في عدة مهام) تُجمع في مجموعة واحدة
+    وتُوزع المجموعة حسب أصغر معرف فيها، فكل مهمة تُعالج بالكامل داخل عملية واحدة
+    """
+    parent: Dict[int, int] = {}
+
+    def find(source_id: int) -> int:
+        root = source_id
+        while parent[root] != root:
+            root = parent[root]
+        while parent[source_id] != root:
+            parent[source_id], source_id = root, parent[source_id]
+        return root
+
+    for task in manager.get_all_tasks().values():
+        source_ids = [ch['id'] for ch in task.source_channels]
+        for source_id in source_ids:
+            parent.setdefault(source_id, source_id)
+        for source_id in source_ids[1:]:
+            first_root, root = find(source_ids[0]), find(source_id)
+            if first_root != root:
+                # الجذر = أصغر معرف في المجموعة
+                parent[max(first_root, root)] = min(first_root, root)
+
+    return {source_id: _hash_shard(find(source_id), shards) for source_id in parent}
+
+
+class ShardedForwardingSystem:
+    """الواجهة في عملية الـ webhook: نفس واجهة ParallelForwardingSystem المستخدمة من المعالجات
+    (add_raw_update / add_message_from_webhook / reload_tasks / get_stats)
+    """
+
+    def __init__(self, bot: Bot, shards: int, socket_path: str = SHARD_SOCKET_PATH):
+        self.bot = bot
+        self.shards = shards
+        self.socket_path = socket_path
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * shards
+        self.writers: List[Optional[asyncio.StreamWriter]] = [None] * shards
+        self.pending: List[Deque[bytes]] = [deque() for _ in range(shards)]
+        self.shard_stats: List[Dict] = [{} for _ in range(shards)]
+        self.routed = [0] * shards
+        self.shard_map: Dict[int, int] = {}
+        self.dropped_messages = 0
+        self.restarts = 0
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.supervisor_task: Optional[asyncio.Task] = None
+        self.is_running = False
+
+    def shard_for(self, source_channel_id: int) -> int:
+        shard = self.shard_map.get(source_channel_id)
+        return shard if shard is not None else _hash_shard(source_channel_id, self.shards)
+
+    def _send(self, shard: int, frame: bytes) -> bool:
+        writer = self.writers[shard]
+        if writer is None or writer.is_closing():
+            if len(self.pending[shard]) >= _MAX_PENDING_FRAMES:
+                return False
+            self.pending[shard].append(frame)
+            return True
+        if writer.transport.get_write_buffer_size() > _MAX_WRITE_BUFFER:
+            return False
+        writer.write(frame)
+        return True
+
+    def _broadcast(self, frame: bytes):
+        for shard in range(self.shards):
+            self._send(shard, frame)
+
+    def add_raw_update(self, raw_update: bytes, chat_id: int, message_id: int,
+                       media_group_id: Optional[str] = None) -> bool:
+        """توجيه تحديث channel_post خام لعملية التوجيه المسؤولة عن القناة"""
+        shard = self.shard_for(chat_id)
+        frame = _frame(_UPDATE, _UPDATE_HEADER.pack(chat_id, message_id) + raw_update)
+        if self._send(shard, frame):
+            self.routed[shard] += 1
+            ingest_log.debug("📥 رسالة جديدة من القناة %s%s → عملية التوجيه #%d",
+                             chat_id, f" (ألبوم {media_group_id})" if media_group_id else "", shard)
+            return True
+
+        self.dropped_messages += 1
+        DROPPED_MESSAGES.inc('shard_backlog')
+        logger.error(f"🚨 عملية التوجيه #{shard} متأخرة! تم تجاهل رسالة من {chat_id} - إجمالي الرسائل المتجاهلة: {self.dropped_messages}")
+        return False
+
+    async def add_message_from_webhook(self, message: Message):
+        """رسالة قناة من مسار Dispatcher العادي: تُسلسل كتحديث خام وتُوجه"""
+        raw_update = f'{{"update_id":0,"channel_post":{message.model_dump_json(exclude_none=True)}}}'.encode('utf-8')
+        self.add_raw_update(raw_update, message.chat.id, message.message_id, message.media_group_id)
+
+    def _broadcast_log_level(self, subsystem: str, level: str):
+        """تغيير مستوى من لوحة Console يُطبق في جميع عمليات التوجيه"""
+        self._broadcast(_frame(_LOG_LEVELS, json.dumps({subsystem: level}).encode('utf-8')))
+
+    def _broadcast_schedule_invalidation(self, user_id: int, task_id: Optional[int]):
+        """حفظ إعدادات المهمة أو المنطقة الزمنية يُلغي البوابة المجمعة في جميع عمليات التوجيه"""
+        self._broadcast(_frame(_SCHEDULE, _SCHEDULE_BODY.pack(user_id, -1 if task_id is None else task_id)))
+
+    async def reload_tasks(self):
+        """إعادة حساب توزيع المصادر وإبلاغ جميع عمليات التوجيه بإعادة تحميل المهام"""
+        self.shard_map = build_shard_map(ForwardingManager(), self.shards)
+        self._broadcast(_frame(_RELOAD))
+        logger.info(f"🔄 تم توزيع {len(self.shard_map)} قناة مصدر على {self.shards} عمليات توجيه")
+
+    def _grant(self, request_id: int, chat_id: int, max_wait: float) -> bytes:
+        """الحجز فوري في المحدد المشترك والرد بمدة الانتظار: عملية التوجيه تنتظر محلياً"""
+        try:
+            wait = telegram_rate_limiter.reserve(chat_id, None if max_wait < 0 else max_wait)
+            granted = True
+        except RateLimitDeferred as e:
+            wait, granted = e.retry_after, False
+        return _frame(_GRANT, _GRANT_BODY.pack(request_id, wait, granted))
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        shard = None
+        try:
+            kind, payload = await _read_frame(reader)
+            if kind != _HELLO:
+                writer.close()
+                return
+            (shard,) = _SHARD_INDEX.unpack(payload)
+            self.writers[shard] = writer
+            while self.pending[shard]:
+                writer.write(self.pending[shard].popleft())
+            # العملية الجديدة (أو المعاد تشغيلها) تبدأ بالمستويات الحالية المعدلة من لوحة Console
+            writer.write(_frame(_LOG_LEVELS, json.dumps(get_hot_log_levels()).encode('utf-8')))
+            logger.info(f"🔗 اتصلت عملية التوجيه #{shard}")
+
+            while True:
+                kind, payload = await _read_frame(reader)
+                if kind == _ACQUIRE:
+                    writer.write(self._grant(*_ACQUIRE_BODY.unpack(payload)))
+                elif kind == _STATS:
+                    self.shard_stats[shard] = json.loads(payload)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            if shard is not None and self.is_running:
+                logger.warning(f"⚠️ انقطع الاتصال بعملية التوجيه #{shard}")
+        except Exception as e:
+            logger.error(f"❌ خطأ في اتصال عملية التوجيه #{shard}: {e}")
+        finally:
+            if shard is not None and self.writers[shard] is writer:
+                self.writers[shard] = None
+            writer.close()
+
+    def _start_process(self, shard: int):
+        # spawn: عملية جديدة نظيفة (بدون حالة asyncio أو sockets موروثة من fork)
+        context = multiprocessing.get_context('spawn')
+        process = context.Process(
+            target=run_shard,
+            args=(shard, self.shards, self.socket_path),
+            name=f"forwarding-shard-{shard}",
+            daemon=True
+        )
+        process.start()
+        self.processes[shard] = process
+        logger.info(f"🚀 تشغيل عملية التوجيه #{shard} (PID {process.pid})")
+
+    async def _supervise(self):
+        """إعادة تشغيل عمليات التوجيه المتوقفة"""
+        while self.is_running:
+            try:
+                await asyncio.sleep(_SUPERVISE_INTERVAL)
+                for shard, process in enumerate(self.processes):
+                    if self.is_running and process is not None and not process.is_alive():
+                        logger.error(f"🚨 توقفت عملية التوجيه #{shard} (exit code {process.exitcode}) - إعادة التشغيل")
+                        self.restarts += 1
+                        self._start_process(shard)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"❌ خطأ في مراقبة عمليات التوجيه: {e}")
+
+    async def start(self):
+        self.is_running = True
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.server = await asyncio.start_unix_server(self._handle_connection, path=self.socket_path)
+        self.shard_map = build_shard_map(ForwardingManager(), self.shards)
+        for shard in range(self.shards):
+            self._start_process(shard)
+        self.supervisor_task = asyncio.create_task(self._supervise())
+        add_level_listener(self._broadcast_log_level)
+        add_invalidation_listener(self._broadcast_schedule_invalidation)
+        logger.info(f"🎯 تم تشغيل وضع العمليات المتعددة بـ {self.shards} عمليات توجيه")
+
+    async def stop(self):
+        self.is_running = False
+        remove_level_listener(self._broadcast_log_level)
+        remove_invalidation_listener(self._broadcast_schedule_invalidation)
+        if self.supervisor_task:
+            self.supervisor_task.cancel()
+        self._broadcast(_frame(_STOP))
+
+        # كل عملية تُنهي الرسائل المعلقة وتُغلق قبل انتهاء المهلة، وإلا تُنهى قسرياً
+        for shard, process in enumerate(self.processes):
+            if process is None:
+                continue
+            await asyncio.to_thread(process.join, _STOP_TIMEOUT)
+            if process.is_alive():
+                logger.warning(f"⚠️ إنهاء عملية التوجيه #{shard} قسرياً")
+                process.terminate()
+
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        logger.info("🛑 تم إيقاف وضع العمليات المتعددة")
+
+    def get_stats(self) -> Dict:
+        """إحصائيات مجمعة من آخر تقرير لكل عملية توجيه (بنفس بنية ParallelForwardingSystem)"""
+        tasks: Dict[int, Dict] = {}
+        for stats in self.shard_stats:
+            for task_id, task_stats in stats.get('tasks', {}).items():
+                merged = tasks.setdefault(int(task_id), dict.fromkeys(task_stats, 0))
+                for key, value in task_stats.items():
+                    merged[key] = merged.get(key, 0) + value
+
+        def total(key: str) -> int:
+            return sum(stats.get(key, 0) for stats in self.shard_stats)
+
+        return {
+            "global_queue_size": total('global_queue_size'),
+            "global_queue_max_size": total('global_queue_max_size'),
+            "dropped_messages": total('dropped_messages') + self.dropped_messages,
+            "num_global_workers": total('num_global_workers'),
+            # كل عملية تشغل workers لجميع المهام
+            "num_active_tasks": max((stats.get('num_active_tasks', 0) for stats in self.shard_stats), default=0),
+            "total_album_buffers": total('total_album_buffers'),
+            "duplicates_suppressed": total('duplicates_suppressed'),
+            "tasks": tasks,
+            "executors": merge_executor_stats(stats.get('executors', {}) for stats in self.shard_stats),
+            "shards": [
+                {
+                    "index": shard,
+                    "pid": process.pid if process else None,
+                    "alive": bool(process and process.is_alive()),
+                    "connected": self.writers[shard] is not None,
+                    "routed": self.routed[shard],
+                    "pending": len(self.pending[shard]),
+                }
+                for shard, process in enumerate(self.processes)
+            ],
+            "shard_restarts": self.restarts,
+        }
+
+
+# ========== عملية التوجيه ==========
+
+class RateLimitClient:
+    """وكيل محدد المعدل داخل عملية التوجيه: الطلبات تُنفذ في المحدد المشترك بعملية الـ webhook"""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.sequence = itertools.count(1)
+        self.pending: Dict[int, asyncio.Future] = {}
+
+    async def reserve(self, chat_id: int, max_wait: Optional[float] = None) -> float:
+        """حجز موعد في المحدد المشترك: يعيد مدة الانتظار أو يرفع RateLimitDeferred"""
+        request_id = next(self.sequence) & 0xFFFFFFFF
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        try:
+            self.writer.write(_frame(_ACQUIRE, _ACQUIRE_BODY.pack(request_id, chat_id, -1.0 if max_wait is None else max_wait)))
+            wait, granted = await future
+        finally:
+            self.pending.pop(request_id, None)
+        if not granted:
+            raise RateLimitDeferred(wait)
+        return wait
+
+    def grant(self, payload: bytes):
+        request_id, wait, granted = _GRANT_BODY.unpack(payload)
+        future = self.pending.get(request_id)
+        if future is not None and not future.done():
+            future.set_result((wait, granted))
+
+    def close(self):
+        for future in self.pending.values():
+            if not future.done():
+                future.cancel()
+
+
+def _create_shard_bot() -> Bot:
+    """Bot بنفس إعدادات عملية الـ webhook (خادم Bot API المخصص و HTML وقياس الطلبات)"""
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from aiogram.enums import ParseMode
+    from config import BOT_TOKEN, TELEGRAM_API_SERVER
+    from metrics import TelegramMetricsMiddleware
+
+    session = None
+    if TELEGRAM_API_SERVER:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_SERVER))
+    bot = Bot(token=BOT_TOKEN, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    bot.session.middleware(TelegramMetricsMiddleware())
+    return bot
+
+
+async def _connect(socket_path: str) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            return await asyncio.open_unix_connection(socket_path)
+        except (FileNotFoundError, ConnectionError):
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+async def _push_stats(writer: asyncio.StreamWriter, system):
+    while True:
+        await asyncio.sleep(_STATS_INTERVAL)
+        if writer.is_closing():
+            return
+        stats = system.get_stats()
+        # أعداد البنى طويلة العمر لـ /debug/memory في عملية الـ webhook (بدون قياس الأحجام)
+        stats['memory'] = collect_memory_report(deep=False)
+        stats['loop_lag'] = loop_monitor.get_stats()
+        writer.write(_frame(_STATS, json.dumps(stats).encode('utf-8')))
+
+
+async def _shard_main(shard: int, socket_path: str):
+    from deferred_delivery import deferred_delivery_queue, initialize_deferred_delivery, shutdown_deferred_delivery
+
+    reader, writer = await _connect(socket_path)
+    writer.write(_frame(_HELLO, _SHARD_INDEX.pack(shard)))
+
+    client = RateLimitClient(writer)
+    telegram_rate_limiter.attach_coordinator(client)
+    # سجل تأجيل منفصل لكل عملية (عملية الـ webhook تحتفظ بالسجل الأصلي)
+    deferred_delivery_queue.use_journal(f"{DEFERRED_DELIVERIES_FILE}.shard{shard}")
+
+    bot = _create_shard_bot()
+    system = await parallel_forwarding_system.initialize_parallel_system(bot)
+    await initialize_deferred_delivery(bot)
+    await initialize_hot_logging()
+    await initialize_loop_monitor()
+    stats_task = asyncio.create_task(_push_stats(writer, system))
+    reload_tasks = set()
+    logger.info(f"✅ عملية التوجيه #{shard} جاهزة (PID {os.getpid()})")
+
+    try:
+        while True:
+            kind, payload = await _read_frame(reader)
+            if kind == _UPDATE:
+                chat_id, message_id = _UPDATE_HEADER.unpack_from(payload)
+                system.add_raw_update(payload[_UPDATE_HEADER.size:], chat_id, message_id)
+            elif kind == _GRANT:
+                client.grant(payload)
+            elif kind == _RELOAD:
+                task = asyncio.create_task(system.reload_tasks())
+                reload_tasks.add(task)
+                task.add_done_callback(reload_tasks.discard)
+            elif kind == _LOG_LEVELS:
+                for subsystem, level in json.loads(payload).items():
+                    set_hot_log_level(subsystem, level, notify=False)
+            elif kind == _SCHEDULE:
+                user_id, task_id = _SCHEDULE_BODY.unpack(payload)
+                invalidate_schedule(user_id, None if task_id < 0 else task_id, notify=False)
+            elif kind == _STOP:
+                logger.info(f"🛑 طلب إيقاف عملية التوجيه #{shard}")
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        logger.warning(f"⚠️ انقطع الاتصال بعملية الـ webhook - إيقاف عملية التوجيه #{shard}")
+    finally:
+        stats_task.cancel()
+        client.close()
+        await shutdown_deferred_delivery()
+        await parallel_forwarding_system.shutdown_parallel_system()
+        await shutdown_hot_logging()
+        await shutdown_loop_monitor()
+        await shutdown_task_statistics()
+        await shutdown_executors()
+        await bot.session.close()
+        writer.close()
+
+
+def run_shard(shard: int, shards: int, socket_path: str):
+    """نقطة دخول عملية التوجيه"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f'%(asctime)s - shard{shard}/{shards} - %(name)s - %(levelname)s - %(message)s',
+        force=True
+    )
+    try:
+        asyncio.run(_shard_main(shard, socket_path))
+    except KeyboardInterrupt:
+        pass
+
+
+# ========== التشغيل من main.py ==========
+
+async def initialize_sharded_system(bot: Bot, shards: int) -> ShardedForwardingSystem:
+    """تشغيل عمليات التوجيه وتسجيل الواجهة كـ parallel_system للمعالجات"""
+    system = ShardedForwardingSystem(bot, shards)
+    await system.start()
+    parallel_forwarding_system.parallel_system = system
+    return system
+
+
+async def shutdown_sharded_system():
+    system = parallel_forwarding_system.parallel_system
+    if isinstance(system, ShardedForwardingSystem):
+        await system.stop()
+        parallel_forwarding_system.parallel_system = None
@@ -105,7 +105,7 @@ class SubscriptionManager:
                               'blacklist_words', 'replacements', 'link_management', 
                               'button_filter', 'forwarded_filter', 'language_filter', 'media_filters',
                               'auto_pin', 'link_preview', 'reply_preservation', 'auto_delete',
-                              'day_filter', 'hour_filter', 'translation', 'character_limit']
+                              'day_filter', 'hour_filter', 'schedule_defer', 'translation', 'character_limit']
             
             disabled_count = 0
             # all_tasks is a Dict[int, UserTask], so iterate over keys
@@ -262,6 +262,11 @@ PREMIUM_FEATURES = {
         'icon': '🕒',
         'description': 'تحديد ساعات النشر المسموح بها مع دعم النطاقات الزمنية'
     },
+    'schedule_defer': {
+        'name': 'تأجيل الرسائل',
+        'icon': '⏳',
+        'description': 'تأجيل الرسائل خارج أيام وساعات النشر وإرسالها تدريجياً عند فتح النافذة'
+    },
     'translation': {
         'name': 'ترجمة النصوص',
         'icon': '🌍',
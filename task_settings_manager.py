@@ -1,7 +1,9 @@
 import json
 import os
+import uuid
 from typing import Dict, List, Optional, Any
 from config import USERS_DATA_DIR
+from schedule_gate import invalidate_schedule
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,6 +20,7 @@ class TaskSettingsManager:
         if force_new and os.path.exists(self.settings_file):
             logger.info(f"🗑️ حذف ملف إعدادات قديم للمهمة {task_id} للمستخدم {user_id}")
             os.remove(self.settings_file)
+            invalidate_schedule(user_id, task_id)
         
         self._ensure_file_exists()
 
@@ -105,6 +108,9 @@ class TaskSettingsManager:
                     'start_hour': 0,
                     'end_hour': 23
                 },
+                'schedule_defer': {
+                    'enabled': False
+                },
                 'translation': {
                     'enabled': False,
                     'mode': 'all_to_target',
@@ -130,6 +136,8 @@ class TaskSettingsManager:
     def save_settings(self, settings: Dict):
         with open(self.settings_file, 'w', encoding='utf-8') as f:
             json.dump(settings, f, ensure_ascii=False, indent=2)
+        # بوابة الجدولة المجمعة لا تقارن الإعدادات في كل فحص
+        invalidate_schedule(self.user_id, self.task_id)
 
     def update_setting(self, category: str, key: str, value: Any):
         settings = self.load_settings()
@@ -201,47 +209,25 @@ class TaskSettingsManager:
             'new_entities': new_entities_list
         }
 
-        logger.info(f"💾 TaskSettingsManager.add_replacement:")
-        logger.info(f"   old_word: '{old_word}'")
-        logger.info(f"   new_word: '{new_word}'")
-        logger.info(f"   old_entities قبل الحفظ: {len(old_entities_list)} items")
-        logger.info(f"   new_entities قبل الحفظ: {len(new_entities_list)} items")
-
-        if old_entities_list:
-            logger.info(f"   محتوى old_entities:")
-            for i, e in enumerate(old_entities_list):
-                logger.info(f"      [{i}] {e}")
-
-        if new_entities_list:
-            logger.info(f"   محتوى new_entities:")
-            for i, e in enumerate(new_entities_list):
-                logger.info(f"      [{i}] {e}")
-
         settings['replacements']['pairs'].append(replacement)
         self.save_settings(settings)
 
-        # التحقق من الحفظ
-        reloaded_settings = self.load_settings()
-        saved_pairs = reloaded_settings['replacements']['pairs']
-        if saved_pairs:
-            last_pair = saved_pairs[-1]
-            logger.info(f"✅ تم التحقق من الحفظ - آخر استبدال محفوظ:")
-            logger.info(f"   old_entities بعد التحميل: {len(last_pair.get('old_entities', []))} items")
-            logger.info(f"   new_entities بعد التحميل: {len(last_pair.get('new_entities', []))} items")
-
-            if last_pair.get('old_entities'):
-                logger.info(f"   محتوى old_entities المحفوظة:")
-                for i, e in enumerate(last_pair['old_entities']):
-                    logger.info(f"      [{i}] {e}")
-            else:
-                logger.warning(f"   ⚠️ old_entities فارغة بعد الحفظ!")
-
-            if last_pair.get('new_entities'):
-                logger.info(f"   محتوى new_entities المحفوظة:")
-                for i, e in enumerate(last_pair['new_entities']):
-                    logger.info(f"      [{i}] {e}")
-            else:
-                logger.warning(f"   ⚠️ new_entities فارغة بعد الحفظ!")
+        logger.info(
+            "💾 إضافة استبدال '%s' → '%s' (entities: %d → %d)",
+            old_word, new_word, len(old_entities_list), len(new_entities_list)
+        )
+        # محتوى entities وإعادة التحميل للتحقق فقط عند تفعيل DEBUG
+        if logger.isEnabledFor(logging.DEBUG):
+            for label, entities_list in (('old', old_entities_list), ('new', new_entities_list)):
+                for i, e in enumerate(entities_list):
+                    logger.debug("   %s_entities[%d] %s", label, i, e)
+            saved_pairs = self.load_settings()['replacements']['pairs']
+            if saved_pairs:
+                last_pair = saved_pairs[-1]
+                logger.debug(
+                    "✅ تم التحقق من الحفظ: old_entities=%d, new_entities=%d",
+                    len(last_pair.get('old_entities', [])), len(last_pair.get('new_entities', []))
+                )
 
     def clear_replacements(self):
         settings = self.load_settings()
@@ -250,19 +236,29 @@ class TaskSettingsManager:
 
     def set_header(self, text: str, entities: Optional[List] = None):
         settings = self.load_settings()
-        settings['header']['text'] = text
-        settings['header']['entities'] = entities or []
+        settings['header'].update(self._build_text_block(text, entities))
         self.save_settings(settings)
 
     def set_footer(self, text: str, entities: Optional[List] = None):
         settings = self.load_settings()
-        settings['footer']['text'] = text
-        settings['footer']['entities'] = entities or []
+        settings['footer'].update(self._build_text_block(text, entities))
         self.save_settings(settings)
 
+    @staticmethod
+    def _build_text_block(text: str, entities: Optional[List]) -> Dict:
+        """نص الهيدر/الفوتر مع طوله بـ UTF-16 و entities مرتبة - تُحسب مرة واحدة عند الحفظ"""
+        from entity_handler import EntityHandler
+        return {
+            'text': text,
+            'entities': EntityHandler.normalize_entities(entities),
+            'utf16_length': EntityHandler.utf16_length(text or '')
+        }
+
     def set_inline_buttons(self, buttons: List[List[Dict]]):
         settings = self.load_settings()
         settings['inline_buttons']['buttons'] = buttons
+        # نسخة فريدة للأزرار: القالب المجمع يُبحث عنه بها بدلاً من بصمة المحتوى في كل إرسال
+        settings['inline_buttons']['version'] = uuid.uuid4().hex
         self.save_settings(settings)
 
     def set_media_filters(self, allowed_types: List[str]):
@@ -1,9 +1,11 @@
+import asyncio
 import logging
 import json
 import os
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Set, Tuple
 from datetime import datetime, timedelta
 from config import USERS_DATA_DIR
+from executors import disk_executor
 
 logger = logging.getLogger(__name__)
 
@@ -72,10 +74,12 @@ class TaskStatistics:
             return self.load_stats()
     
     def save_stats(self, stats: Dict):
-        """حفظ الإحصائيات"""
+        """حفظ الإحصائيات (ملف مؤقت ثم استبدال: القراءة من خيط آخر لا ترى ملفاً نصف مكتوب)"""
         try:
-            with open(self.stats_file, 'w', encoding='utf-8') as f:
+            temp_file = f"{self.stats_file}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
                 json.dump(stats, f, ensure_ascii=False, indent=2)
+            os.replace(temp_file, self.stats_file)
         except Exception as e:
             logger.error(f"❌ خطأ في حفظ الإحصائيات: {e}")
     
@@ -269,3 +273,45 @@ class TaskStatistics:
             os.remove(self.stats_file)
         self._ensure_file_exists()
         logger.info(f"🔄 تم إعادة تعيين إحصائيات المهمة {self.task_id}")
+
+
+# تحديثات مجمعة لكل مهمة بانتظار منفذ القرص: {(user_id, task_id): [(method, args)]}
+_pending_updates: Dict[Tuple[int, int], List[Tuple[str, tuple]]] = {}
+_flush_tasks: Set[asyncio.Task] = set()
+
+
+def _apply_updates(user_id: int, task_id: int, updates: List[Tuple[str, tuple]]):
+    stats = TaskStatistics(user_id, task_id)
+    for method, args in updates:
+        getattr(stats, method)(*args)
+
+
+async def _flush_updates(key: Tuple[int, int]):
+    # التحديثات التي تصل أثناء الكتابة تُجمع في دفعة جديدة بمهمة جديدة
+    updates = _pending_updates.pop(key, [])
+    try:
+        await disk_executor.run(_apply_updates, key[0], key[1], updates)
+    except Exception as e:
+        logger.error(f"❌ خطأ في حفظ إحصائيات المهمة {key[1]} ({len(updates)} تحديث): {e}")
+
+
+def record_task_stat(user_id: int, task_id: int, method: str, *args):
+    """تسجيل تحديث إحصائيات مهمة بدون انتظار: التحديثات تُجمع لكل مهمة وتُكتب كدفعة واحدة
+    في منفذ القرص (خيط واحد: تحديثات read-modify-write للملف متسلسلة فلا تضيع زيادات)،
+    فمسار الإرسال لا ينتظر القرص ضمن مهلة التوجيه"""
+    key = (user_id, task_id)
+    updates = _pending_updates.get(key)
+    if updates is not None:
+        updates.append((method, args))
+        return
+    _pending_updates[key] = [(method, args)]
+    task = asyncio.get_running_loop().create_task(_flush_updates(key))
+    _flush_tasks.add(task)
+    task.add_done_callback(_flush_tasks.discard)
+
+
+async def shutdown_task_statistics():
+    """انتظار كتابة التحديثات المجمعة قبل إيقاف منفذ القرص"""
+    while _flush_tasks:
+        await asyncio.gather(*list(_flush_tasks), return_exceptions=True)
+    logger.info("🛑 تم حفظ إحصائيات المهام المعلقة")
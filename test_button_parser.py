@@ -0,0 +1,71 @@
+"""
+اختبار قوالب الأزرار المجمعة: إعادة استخدام الأزرار الثابتة، إعادة بناء خلايا المشاركة لكل رسالة،
+والبحث بنسخة الأزرار المحفوظة (set_inline_buttons) بدون بصمة المحتوى في كل إرسال
+"""
+import os
+import shutil
+
+import button_parser
+from button_parser import ButtonParser
+from config import USERS_DATA_DIR
+from task_settings_manager import TaskSettingsManager
+
+STATIC = [
+    [{'text': 'الموقع', 'type': 'url', 'url': 'https://example.com'}],
+    [{'text': 'تنبيه', 'type': 'popup', 'popup_text': 'مرحباً'}],
+]
+WITH_SHARE = [
+    [{'text': 'الموقع', 'type': 'url', 'url': 'https://example.com'},
+     {'text': 'شارك', 'type': 'share', 'platform': 'telegram'}],
+    [{'text': 'واتساب', 'type': 'share', 'platform': 'whatsapp'}],
+]
+
+
+def test_static_markup_reused():
+    template = ButtonParser.compile_buttons(STATIC)
+    first = template.render('https://t.me/news/1', 'خبر أول')
+    second = ButtonParser.buttons_to_markup(STATIC, 'https://t.me/news/2', 'خبر ثان')
+    assert template.is_static and first is second is template.static_markup
+    assert first.inline_keyboard[1][0].callback_data == 'popup:مرحباً'
+
+
+def test_share_cells_rebuilt_per_message():
+    template = ButtonParser.compile_buttons(WITH_SHARE)
+    assert not template.is_static and template.static_markup is None
+
+    first = template.render('https://t.me/news/1', 'خبر أول')
+    second = template.render('https://t.me/news/2', 'خبر ثان')
+    # الزر الثابت نفس الكائن، وخلايا المشاركة تحمل رابط ونص كل رسالة
+    assert first.inline_keyboard[0][0] is second.inline_keyboard[0][0]
+    assert first.inline_keyboard[0][1].url == 'https://t.me/share/url?url=https%3A//t.me/news/1&text=%D8%AE%D8%A8%D8%B1%20%D8%A3%D9%88%D9%84'
+    assert second.inline_keyboard[1][0].url.startswith('https://wa.me/?text=') and 'news/2' in second.inline_keyboard[1][0].url
+
+
+def test_template_found_by_version():
+    manager = TaskSettingsManager(900005, 1, force_new=True)
+    try:
+        manager.set_inline_buttons(STATIC)
+        first = manager.get_setting('inline_buttons')
+        manager.set_inline_buttons(WITH_SHARE)
+        second = manager.get_setting('inline_buttons')
+    finally:
+        shutil.rmtree(os.path.join(USERS_DATA_DIR, '900005'), ignore_errors=True)
+    assert first['version'] and first['version'] != second['version']
+
+    original_key = button_parser._template_cache_key
+
+    def no_content_hash(buttons):
+        raise AssertionError("بصمة المحتوى غير مطلوبة مع رقم النسخة")
+
+    button_parser._template_cache_key = no_content_hash
+    try:
+        template = ButtonParser.compile_buttons(first['buttons'], first['version'])
+        assert ButtonParser.compile_buttons(first['buttons'], first['version']) is template
+        # نسخة جديدة = قالب جديد للأزرار الجديدة
+        updated = ButtonParser.compile_buttons(second['buttons'], second['version'])
+        assert updated is not template and not updated.is_static
+    finally:
+        button_parser._template_cache_key = original_key
+
+    # إعدادات بدون نسخة (محفوظة سابقاً) تستخدم بصمة المحتوى
+    assert ButtonParser.compile_buttons([list(row) for row in STATIC]) is ButtonParser.compile_buttons(STATIC)
@@ -0,0 +1,74 @@
+"""
+اختبار منع التكرار: انتهاء النافذة، حد عدد البصمات، وتطبيع البصمة (النص/الوصف و file_unique_id)
+"""
+from aiogram.types import Message
+
+from dedup_filter import DedupFilter, TimedLRUSet, normalize_text
+from message_envelope import Envelope
+
+CHAT = {'id': -100123, 'type': 'channel'}
+
+
+def make_message(message_id: int, **fields) -> Message:
+    return Message.model_validate({'message_id': message_id, 'date': 0, 'chat': CHAT, **fields})
+
+
+def content_fingerprint(message: Message):
+    return Envelope(message).content_hash
+
+
+def photo(file_id: str, file_unique_id: str):
+    return [
+        {'file_id': f'{file_id}-small', 'file_unique_id': f'{file_unique_id}-small', 'width': 90, 'height': 90},
+        {'file_id': file_id, 'file_unique_id': file_unique_id, 'width': 1280, 'height': 720},
+    ]
+
+
+def test_window_expiry():
+    seen = TimedLRUSet(window=60, max_entries=10)
+    assert not seen.seen_or_add(b'a', 1000)
+    assert seen.seen_or_add(b'a', 1059)
+    # الوقت المحفوظ هو أول ظهور: التكرار لا يمدد النافذة
+    assert not seen.seen_or_add(b'a', 1060)
+    assert len(seen) == 1 and seen.items[b'a'] == 1060
+
+
+def test_max_entries_evicts_oldest():
+    seen = TimedLRUSet(window=3600, max_entries=3)
+    for i, key in enumerate((b'a', b'b', b'c', b'd')):
+        assert not seen.seen_or_add(key, 1000 + i)
+    assert len(seen) == 3 and list(seen.items) == [b'b', b'c', b'd']
+    assert not seen.seen_or_add(b'a', 1010)
+    assert seen.seen_or_add(b'd', 1011)
+
+
+def test_fingerprint_normalization():
+    assert normalize_text("  عاجل:\u200b خ\u0640\u0640بر   Breaking\nNEWS ") == "عاجل: خبر breaking news"
+
+    text = make_message(1, text="عاجل: خبر Breaking")
+    caption = make_message(2, caption="عاجل:\u200f  خبر  breaking", photo=photo('A', 'U1'))
+    reposted = make_message(3, caption="عاجل: خبر breaking", photo=photo('B', 'U1'))
+    other_photo = make_message(4, caption="عاجل: خبر breaking", photo=photo('A', 'U2'))
+
+    # نفس النص كنص أو وصف بدون وسائط = نفس البصمة
+    assert content_fingerprint(text) == content_fingerprint(make_message(5, caption="عاجل:  خبر BREAKING"))
+    # نفس الصورة (file_unique_id لأكبر حجم) بـ file_id مختلف = مكررة، وصورة أخرى بنفس النص = مختلفة
+    assert content_fingerprint(caption) == content_fingerprint(reposted)
+    assert content_fingerprint(caption) != content_fingerprint(other_photo)
+    assert content_fingerprint(caption) != content_fingerprint(text)
+    # رسالة بدون نص أو وسائط لا تُفحص
+    assert content_fingerprint(make_message(6)) is None
+
+
+def test_dedup_per_task():
+    dedup = DedupFilter(window=3600, max_entries=100)
+    fingerprint = content_fingerprint(make_message(1, text="خبر"))
+    assert not dedup.is_duplicate(1, fingerprint)
+    assert dedup.is_duplicate(1, fingerprint)
+    assert not dedup.is_duplicate(2, fingerprint)
+    assert not dedup.is_duplicate(1, None) and not dedup.is_duplicate(1, None)
+    stats = dedup.get_stats()
+    print(f"♻️ {stats}")
+    assert stats['total_suppressed'] == 1 and stats['tasks'][1] == {'suppressed': 1, 'fingerprints': 1}
+    dedup.forget_task(1)
+    assert not dedup.is_duplicate(1, fingerprint)
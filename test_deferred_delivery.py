@@ -0,0 +1,117 @@
+"""
+اختبار قائمة التوصيل المؤجل: الحفظ في السجل وإعادة التحميل، الضغط، توزيع الإطلاق على النافذة،
+وإبقاء الرسالة في السجل مع إعادة المحاولة عند فشل الإرسال
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from aiogram.types import Message
+
+import deferred_delivery
+from deferred_delivery import DeferredDeliveryQueue
+from integrated_media_handler import IntegratedMediaHandler
+
+
+def make_message(message_id: int) -> Message:
+    return Message.model_validate({
+        'message_id': message_id, 'date': 0, 'chat': {'id': -100123, 'type': 'channel'}, 'text': f'خبر {message_id}'
+    })
+
+
+async def reload(journal: str) -> DeferredDeliveryQueue:
+    queue = DeferredDeliveryQueue(journal)
+    await queue.load()
+    return queue
+
+
+def journal_lines(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_park_reload_and_compact():
+    async def run():
+        with tempfile.TemporaryDirectory() as data_dir:
+            journal = os.path.join(data_dir, 'deferred_deliveries.jsonl')
+            queue = DeferredDeliveryQueue(journal)
+            now = int(time.time())
+            for i in range(3):
+                assert await queue.park(make_message(i), -200, 1, 7, (now + 300 - i * 100, now + 600))
+            first_id = min(queue.parked)[2]
+            await queue._mark_done(first_id)
+
+            # لا قراءة للسجل عند الإنشاء (الاستيراد في العمليات الفرعية)
+            assert not DeferredDeliveryQueue(journal).entries
+            reloaded = await reload(journal)
+            print(f"⏳ {reloaded.get_stats()}")
+            assert len(reloaded.entries) == 2 and first_id not in reloaded.entries
+            # أقرب نافذة أولاً
+            assert [item[0] for item in sorted(reloaded.parked)] == [now + 200, now + 300]
+            # التحميل يضغط السجل: سجلات add للمعلقة فقط
+            assert [record['op'] for record in journal_lines(journal)] == ['add', 'add']
+
+    asyncio.run(run())
+
+
+def test_release_spread_over_window():
+    async def run():
+        with tempfile.TemporaryDirectory() as data_dir:
+            queue = DeferredDeliveryQueue(os.path.join(data_dir, 'deferred_deliveries.jsonl'))
+            now = time.time()
+            for i in range(3):
+                await queue.park(make_message(i), -200, 1, 7, (int(now) - 1, int(now) + 30))
+            queue._spread_due(now)
+            offsets = [round(item[0] - now, 3) for item in sorted(queue.ready)]
+            print(f"📤 {offsets}")
+            spacing = (int(now) + 30 - now) / 3
+            assert offsets == [0, round(spacing, 3), round(2 * spacing, 3)]
+            assert not queue.parked
+
+    asyncio.run(run())
+
+
+def test_failed_send_kept_and_reparked():
+    async def run():
+        original = IntegratedMediaHandler.process_and_send_message
+        outcomes = []
+
+        async def fake_send(bot, message, target_chat_id, user_id, task_id, envelope=None, raise_errors=False,
+                            max_rate_wait=None):
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        with tempfile.TemporaryDirectory() as data_dir:
+            journal = os.path.join(data_dir, 'deferred_deliveries.jsonl')
+            queue = DeferredDeliveryQueue(journal)
+            now = int(time.time())
+            await queue.park(make_message(1), -200, 1, 7, (now, now + 60))
+            entry = next(iter(queue.entries.values()))
+            IntegratedMediaHandler.process_and_send_message = staticmethod(fake_send)
+            try:
+                outcomes[:] = [RuntimeError("Bad Gateway"), False, True]
+                await queue._deliver(entry)
+                retried = queue.entries[entry['id']]
+                assert retried['attempts'] == 1
+                assert retried['release_at'] >= now + deferred_delivery.DEFER_RETRY_BASE_SECONDS - 1
+                assert queue.released == 0 and queue.failed == 1
+                # الفشل محفوظ في السجل: إعادة التحميل تجد الرسالة بموعدها الجديد
+                assert (await reload(journal)).entries[entry['id']]['attempts'] == 1
+
+                # رفض مقصود من الفلاتر: تُحذف بدون احتسابها كمرسلة
+                await queue._deliver(retried)
+                assert not queue.entries and queue.released == 0
+
+                await queue.park(make_message(2), -200, 1, 7, (now, now + 60))
+                await queue._deliver(next(iter(queue.entries.values())))
+                assert not queue.entries and queue.released == 1
+            finally:
+                IntegratedMediaHandler.process_and_send_message = original
+            print(f"🔁 {queue.get_stats()}")
+            assert not (await reload(journal)).entries
+
+    asyncio.run(run())
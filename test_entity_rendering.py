@@ -0,0 +1,68 @@
+"""
+اختبار تحويل entities إلى HTML (التداخل، UTF-16، وإعادة حساب الإزاحات)
+"""
+from entity_handler import EntityHandler
+
+
+def test_entities_to_html_nesting():
+    """اختبار الوسوم المتداخلة والمتقاطعة"""
+    print("\n" + "="*60)
+    print("🧪 اختبار تحويل entities إلى HTML")
+    print("="*60)
+
+    # اختبار 1: bold و italic على نفس الكلمة - يجب أن يُغلق الداخلي أولاً
+    html_text = EntityHandler.entities_to_html("word", [
+        {'type': 'bold', 'offset': 0, 'length': 4},
+        {'type': 'italic', 'offset': 0, 'length': 4},
+    ])
+    print(f"📝 اختبار 1: {html_text}")
+    assert html_text == "<b><i>word</i></b>"
+
+    # اختبار 2: entities متقاطعة - تُغلق الداخلية وتُعاد فتحها
+    html_text = EntityHandler.entities_to_html("abcdef", [
+        {'type': 'bold', 'offset': 0, 'length': 4},
+        {'type': 'italic', 'offset': 2, 'length': 4},
+    ])
+    print(f"📝 اختبار 2: {html_text}")
+    assert html_text == "<b>ab<i>cd</i></b><i>ef</i>"
+
+    # اختبار 3: entities متجاورة - الإغلاق قبل الفتح
+    html_text = EntityHandler.entities_to_html("abcd", [
+        {'type': 'bold', 'offset': 0, 'length': 2},
+        {'type': 'italic', 'offset': 2, 'length': 2},
+    ])
+    print(f"📝 اختبار 3: {html_text}")
+    assert html_text == "<b>ab</b><i>cd</i>"
+
+    # اختبار 4: emoji قبل الـ entity (UTF-16) مع escape للنص
+    html_text = EntityHandler.entities_to_html("😀 <مرحبا>", [
+        {'type': 'text_link', 'offset': 3, 'length': 7, 'url': 'https://example.com'},
+    ])
+    print(f"📝 اختبار 4: {html_text}")
+    assert html_text == "😀 <a href='https://example.com'>&lt;مرحبا&gt;</a>"
+
+
+def test_remap_entities_to_segments():
+    """اختبار إعادة حساب الإزاحات بعد حذف أجزاء من النص"""
+    text = "😀 keep\nremove me\nbold"
+    entities = [
+        {'type': 'italic', 'offset': 3, 'length': 4},
+        {'type': 'underline', 'offset': 8, 'length': 9},
+        {'type': 'bold', 'offset': 18, 'length': 4},
+    ]
+    # حذف السطر الثاني مع سطره الجديد
+    segments = [(0, 7), (17, 21)]
+    new_text = ''.join(text[start:end] for start, end in segments)
+    remapped = EntityHandler.remap_entities_to_segments(text, entities, segments)
+    print(f"📝 النص الجديد: {new_text!r} - entities: {remapped}")
+
+    assert new_text == "😀 keep\nbold"
+    assert remapped == [
+        {'type': 'italic', 'offset': 3, 'length': 4},
+        {'type': 'bold', 'offset': 8, 'length': 4},
+    ]
+
+
+if __name__ == '__main__':
+    test_entities_to_html_nesting()
+    test_remap_entities_to_segments()
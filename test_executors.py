@@ -0,0 +1,111 @@
+"""
+اختبار المنفذات المحدودة: حجز الأماكن حتى انتهاء العمل فعلياً، سياسة الرفض، بقاء المكان محجوزاً
+بعد انتهاء مهلة المستدعي، جمع الإحصائيات من عدة عمليات، وتجميع تحديثات إحصائيات المهام بدون انتظار
+"""
+import asyncio
+import os
+import shutil
+import threading
+
+from config import USERS_DATA_DIR
+from executors import REJECT, WAIT, BoundedExecutor, ExecutorSaturated, disk_executor, merge_executor_stats
+from task_statistics_manager import TaskStatistics, record_task_stat, shutdown_task_statistics
+
+
+def blocking(event: threading.Event, value):
+    event.wait(5)
+    return value
+
+
+def test_slots_and_reject_policy():
+    async def run():
+        executor = BoundedExecutor('test_reject', 1, 1, REJECT)
+        event = threading.Event()
+        try:
+            first = asyncio.create_task(executor.run(blocking, event, 1))
+            second = asyncio.create_task(executor.run(blocking, event, 2))
+            await asyncio.sleep(0.05)
+            stats = executor.get_stats()
+            assert (stats['active'], stats['queued']) == (1, 1)
+
+            # عامل + مكان انتظار واحد: الثالث يُرفض فوراً
+            try:
+                await executor.run(blocking, event, 3)
+                rejected = False
+            except ExecutorSaturated:
+                rejected = True
+            assert rejected and executor.get_stats()['rejected'] == 1
+
+            event.set()
+            assert await asyncio.gather(first, second) == [1, 2]
+            await asyncio.sleep(0.05)
+            stats = executor.get_stats()
+            print(f"📊 {stats}")
+            assert (stats['active'], stats['queued'], stats['submitted'], stats['completed']) == (0, 0, 2, 2)
+            assert await executor.run(blocking, event, 4) == 4
+        finally:
+            event.set()
+            await executor.shutdown()
+
+    asyncio.run(run())
+
+
+def test_timeout_keeps_slot_until_work_finishes():
+    async def run():
+        executor = BoundedExecutor('test_timeout', 1, 0, WAIT)
+        event = threading.Event()
+        try:
+            try:
+                await executor.run(blocking, event, 1, timeout=0.05)
+                timed_out = False
+            except asyncio.TimeoutError:
+                timed_out = True
+            assert timed_out and executor.get_stats()['timed_out'] == 1
+            # العامل العالق ما زال يحجز المكان: الطلب التالي ينتظر (سياسة الانتظار)
+            assert executor.get_stats()['active'] == 1
+
+            waiter = asyncio.create_task(executor.run(blocking, event, 2))
+            await asyncio.sleep(0.05)
+            assert not waiter.done() and executor.get_stats()['waiting'] == 1
+
+            event.set()
+            assert await waiter == 2
+            await asyncio.sleep(0.05)
+            stats = executor.get_stats()
+            assert (stats['active'], stats['waiting'], stats['completed']) == (0, 0, 2)
+        finally:
+            event.set()
+            await executor.shutdown()
+
+    asyncio.run(run())
+
+
+def test_merge_executor_stats():
+    shard_a = {'disk_io': {'policy': WAIT, 'active': 1, 'queued': 2, 'rejected': 0},
+               'detection': {'policy': REJECT, 'active': 0, 'queued': 0, 'rejected': 3}}
+    shard_b = {'disk_io': {'policy': WAIT, 'active': 1, 'queued': 5, 'rejected': 0}}
+    merged = merge_executor_stats([shard_a, shard_b, {}])
+    assert merged == {
+        'disk_io': {'policy': WAIT, 'active': 2, 'queued': 7, 'rejected': 0},
+        'detection': {'policy': REJECT, 'active': 0, 'queued': 0, 'rejected': 3},
+    }
+
+
+def test_task_stats_batched_without_waiting():
+    async def run():
+        submitted_before = disk_executor.submitted
+        try:
+            # التسجيل لا ينتظر القرص: الزيادات المتتالية لنفس المهمة تُكتب في دفعة واحدة
+            record_task_stat(900007, 1, 'increment_successful_forward', 'photo', 10)
+            record_task_stat(900007, 1, 'increment_successful_forward', 'text', 5)
+            record_task_stat(900007, 1, 'increment_filtered_message', 'media_filter')
+            await shutdown_task_statistics()
+            stats = await disk_executor.run(lambda: TaskStatistics(900007, 1).load_stats())
+        finally:
+            shutil.rmtree(os.path.join(USERS_DATA_DIR, '900007'), ignore_errors=True)
+
+        assert disk_executor.submitted - submitted_before == 2
+        assert stats['successful_forwards'] == 2 and stats['total_characters'] == 15
+        assert stats['media_types']['photo'] == 1 and stats['filter_blocks']['media_filter'] == 1
+
+    asyncio.run(run())
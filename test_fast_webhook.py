@@ -0,0 +1,80 @@
+"""
+اختبار مسار الاستقبال السريع: channel_post خام من الطلب حتى materialize في الموزع،
+وباقي التحديثات عبر Dispatcher، مع عد الاثنين في نفس مقياس التحديثات
+"""
+import asyncio
+import json
+
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+import parallel_forwarding_system
+from fast_webhook import FastIngestRequestHandler
+from metrics import UPDATES_RECEIVED, UpdateMetricsMiddleware
+from parallel_forwarding_system import ParallelForwardingSystem
+
+CHANNEL_POST = {
+    'update_id': 501,
+    'channel_post': {
+        'message_id': 42,
+        'date': 1700000000,
+        'chat': {'id': -1001234567890, 'type': 'channel', 'title': 'أخبار'},
+        'text': 'خبر عاجل https://example.com',
+        'entities': [{'type': 'url', 'offset': 9, 'length': 19}],
+    },
+}
+PRIVATE_MESSAGE = {
+    'update_id': 502,
+    'message': {
+        'message_id': 7,
+        'date': 1700000000,
+        'chat': {'id': 1001, 'type': 'private'},
+        'from': {'id': 1001, 'is_bot': False, 'first_name': 'مستخدم'},
+        'text': '/start',
+    },
+}
+
+
+def test_channel_post_fast_path_to_materialize():
+    async def run():
+        bot = Bot(token='123456:TEST-TOKEN')
+        dispatcher = Dispatcher()
+        dispatcher.update.outer_middleware(UpdateMetricsMiddleware())
+        app = web.Application()
+        FastIngestRequestHandler(dispatcher=dispatcher, bot=bot).register(app, path='/webhook')
+
+        system = ParallelForwardingSystem(bot=None)
+        previous = parallel_forwarding_system.parallel_system
+        parallel_forwarding_system.parallel_system = system
+        fast_before = UPDATES_RECEIVED.get('channel_post', 'fast')
+        dispatcher_before = UPDATES_RECEIVED.get('message', 'dispatcher')
+        client = TestClient(TestServer(app))
+        await client.start_server()
+        try:
+            response = await client.post('/webhook', data=json.dumps(CHANNEL_POST, ensure_ascii=False).encode('utf-8'))
+            assert response.status == 200
+            response = await client.post('/webhook', json=PRIVATE_MESSAGE)
+            assert response.status == 200
+            # Dispatcher يعالج في الخلفية
+            await asyncio.sleep(0.1)
+        finally:
+            await client.close()
+            parallel_forwarding_system.parallel_system = previous
+            await bot.session.close()
+
+        # رسالة القناة فقط في القائمة العامة، كبايتات خام حتى السحب
+        assert system.global_queue.queue.qsize() == 1
+        queued = system.global_queue.queue.get_nowait()
+        assert queued.message is None and queued.source_channel_id == -1001234567890
+
+        message = queued.materialize(bot)
+        print(f"⚡ {message.chat.id}/{message.message_id}: {message.text}")
+        assert message.message_id == 42 and message.text == 'خبر عاجل https://example.com'
+        assert message.entities[0].type == 'url' and queued.raw_update is None
+        assert message.bot is bot
+
+        assert UPDATES_RECEIVED.get('channel_post', 'fast') == fast_before + 1
+        assert UPDATES_RECEIVED.get('message', 'dispatcher') == dispatcher_before + 1
+
+    asyncio.run(run())
@@ -0,0 +1,86 @@
+"""
+اختبار إحاطة النص بالهيدر والفوتر: الأطوال المحسوبة مسبقاً بـ UTF-16 عند الحفظ، ودمج الكتل
+بنفس نتيجة الطريقة القديمة (shift_entities + merge_entities) مع emoji وأزواج surrogate
+"""
+import os
+import shutil
+
+from config import USERS_DATA_DIR
+from entity_handler import EntityHandler
+from task_settings_manager import TaskSettingsManager
+from transform_stages import wrap_with_header_footer
+
+# emoji خارج BMP (وحدتا UTF-16) في الهيدر والنص والفوتر
+HEADER = "📰 عاجل 🔥"
+BODY = "🚀 خبر 👍🏽 مهم"
+FOOTER = "تابعونا 📢"
+
+
+def utf16_slice(text: str, entity: dict) -> str:
+    encoded = text.encode('utf-16-le')
+    return encoded[entity['offset'] * 2:(entity['offset'] + entity['length']) * 2].decode('utf-16-le')
+
+
+def old_wrap(text, entities, header, footer):
+    """الطريقة السابقة: إزاحة لكل حرف ثم دمج مع ترتيب"""
+    def units(value):
+        return sum(2 if ord(char) > 0xFFFF else 1 for char in value)
+
+    header_entities = header.get('entities', [])
+    entities = EntityHandler.merge_entities(header_entities, EntityHandler.shift_entities(entities, units(header['text'] + '\n')))
+    text = header['text'] + '\n' + text
+    footer_entities = EntityHandler.shift_entities(footer.get('entities', []), units(text + '\n'))
+    entities = EntityHandler.merge_entities(entities, footer_entities)
+    return text + '\n' + footer['text'], entities
+
+
+def ordered(entities):
+    return sorted(entities, key=lambda e: (e['offset'], -e['length'], e['type']))
+
+
+def test_splice_matches_shift_and_merge():
+    manager = TaskSettingsManager(900004, 1, force_new=True)
+    try:
+        # entities على حدود كل كتلة: بداية ونهاية الهيدر والنص والفوتر
+        manager.set_header(HEADER, [
+            {'type': 'italic', 'offset': 8, 'length': 2, 'url': None},
+            {'type': 'bold', 'offset': 0, 'length': 2},
+            {'type': 'underline', 'offset': 0, 'length': 0},
+        ])
+        manager.set_footer(FOOTER, [
+            {'type': 'bold', 'offset': 0, 'length': 7},
+            {'type': 'text_link', 'offset': 8, 'length': 2, 'url': 'https://t.me/example'},
+        ])
+        settings = manager.load_settings()
+    finally:
+        shutil.rmtree(os.path.join(USERS_DATA_DIR, '900004'), ignore_errors=True)
+
+    header, footer = settings['header'], settings['footer']
+    assert header['utf16_length'] == len(HEADER.encode('utf-16-le')) // 2 == 10
+    assert footer['utf16_length'] == 10
+    # entities محفوظة مرتبة بدون الفارغة أو الحقول None
+    assert header['entities'] == [{'type': 'bold', 'offset': 0, 'length': 2},
+                                  {'type': 'italic', 'offset': 8, 'length': 2}]
+
+    body_entities = [
+        {'type': 'bold', 'offset': 0, 'length': 2},
+        {'type': 'code', 'offset': 7, 'length': 4},
+        {'type': 'italic', 'offset': 12, 'length': 3},
+    ]
+    text, entities = wrap_with_header_footer(BODY, [e.copy() for e in body_entities], header, footer)
+    old_text, old_entities = old_wrap(BODY, [e.copy() for e in body_entities], header, footer)
+
+    print(f"📋 {[(e['type'], utf16_slice(text, e)) for e in entities]}")
+    assert text == old_text == f"{HEADER}\n{BODY}\n{FOOTER}"
+    assert ordered(entities) == ordered(old_entities)
+    assert [utf16_slice(text, e) for e in entities] == ['📰', '🔥', '🚀', '👍🏽', 'مهم', 'تابعونا', '📢']
+    # الدمج لا يعدل entities المحفوظة في الإعدادات
+    assert footer['entities'][1]['offset'] == 8
+
+
+def test_wrap_without_stored_length():
+    """إعدادات محفوظة قبل تخزين utf16_length تُحسب عند الحاجة"""
+    header = {'text': HEADER, 'entities': [{'type': 'bold', 'offset': 8, 'length': 2}]}
+    text, entities = wrap_with_header_footer(BODY, [{'type': 'bold', 'offset': 0, 'length': 2}], header, None)
+    assert text == f"{HEADER}\n{BODY}"
+    assert [utf16_slice(text, e) for e in entities] == ['🔥', '🚀']
@@ -0,0 +1,77 @@
+"""
+اختبار سجلات المسار الساخن: التنسيق الكسول، كتم التكرار، والملخص الدوري لكل مهمة
+"""
+import logging
+
+from hot_logging import DeliverySummary, get_hot_logger, hot_log_summary, set_hot_log_level
+
+
+class CountingArg:
+    """معامل يعد مرات تنسيقه"""
+
+    def __init__(self):
+        self.formatted = 0
+
+    def __str__(self):
+        self.formatted += 1
+        return 'arg'
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def test_lazy_levels_and_repeats():
+    """المعاملات لا تُنسق عند تعطيل المستوى، والتكرار يُكتم بعد الحد ويظهر في الملخص"""
+    handler = ListHandler()
+    logging.getLogger('hot').addHandler(handler)
+    try:
+        hot_log = get_hot_logger('test_subsystem')
+        arg = CountingArg()
+
+        set_hot_log_level('test_subsystem', 'WARNING')
+        hot_log.debug("🔍 %s", arg)
+        assert arg.formatted == 0 and not handler.messages
+
+        set_hot_log_level('test_subsystem', 'DEBUG')
+        hot_log.debug("🔍 %s", arg)
+        assert arg.formatted >= 1 and handler.messages == ["🔍 arg"]
+
+        handler.messages.clear()
+        hot_log_summary.flush()
+        for i in range(hot_log_summary.repeat_burst + 3):
+            hot_log.repeat(logging.WARNING, ('failure', 7), "⚠️ فشل %d", i)
+        assert len(handler.messages) == hot_log_summary.repeat_burst
+
+        hot_log_summary.flush()
+        print(f"🔇 {handler.messages[-1]}")
+        assert "تم كتم 3 تكرار" in handler.messages[-1]
+    finally:
+        logging.getLogger('hot').removeHandler(handler)
+
+
+def test_summary_per_task():
+    """نتائج الأهداف تُجمع في سطر واحد لكل مهمة"""
+    handler = ListHandler()
+    summary = DeliverySummary(interval=30, repeat_burst=1)
+    summary.summary_logger.addHandler(handler)
+    try:
+        for _ in range(50):
+            summary.record(3, 'success')
+        summary.record(3, 'failure')
+        summary.record(5, 'not_sent', 2)
+        summary.flush()
+        print(f"📈 {handler.messages}")
+        assert len(handler.messages) == 2
+        assert "failure: 1 | success: 50" in handler.messages[0]
+        assert "[المهمة #5]" in handler.messages[1]
+
+        summary.flush()
+        assert len(handler.messages) == 2
+    finally:
+        summary.summary_logger.removeHandler(handler)
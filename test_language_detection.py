@@ -0,0 +1,39 @@
+"""
+اختبار كاشف اللغة: اختصار نظام الكتابة، والـ cache، ودمج الطلبات المتزامنة لنفس النص
+"""
+import asyncio
+
+from language_detection import LanguageDetector
+
+
+def test_detection_once_per_fan_out():
+    """توجيه نص لعدة أهداف بالتوازي يستدعي langdetect مرة واحدة فقط"""
+    async def run():
+        detector = LanguageDetector(max_entries=8)
+        text = "The quick brown fox jumps over the lazy dog near the river bank"
+
+        results = await asyncio.gather(*(detector.detect(text) for _ in range(5)))
+        print(f"🔍 النتائج: {results} - {detector.get_stats()}")
+        assert results == ['en'] * 5
+        assert detector.detector_calls == 1 and detector.coalesced == 4
+
+        assert await detector.detect(text) == 'en'
+        assert detector.cache_hits == 1 and detector.detector_calls == 1
+
+        # نظام كتابة حاسم أو نص بدون أحرف: بدون langdetect
+        assert await detector.detect("مرحبا بكم في القناة الإخبارية") == 'ar'
+        assert await detector.detect("🔥🔥 !!! 🔥") is None
+        assert detector.script_hits == 2 and detector.detector_calls == 1
+
+    asyncio.run(run())
+
+
+def test_detection_is_deterministic():
+    """الـ seed الثابت يعطي نفس النتيجة لنص قصير غامض في كل مرة"""
+    async def run():
+        text = "ok merci danke"
+        results = {await LanguageDetector().detect(text) for _ in range(10)}
+        print(f"🎯 النتائج: {results}")
+        assert len(results) == 1
+
+    asyncio.run(run())
@@ -0,0 +1,33 @@
+"""
+اختبار أنماط الروابط: find_all_links/remove_links حساسة لحالة الأحرف وتشترط 5-32 حرفاً لاسم المستخدم،
+بينما فلتر الروابط (apply_link_filter) يستخدم الماسح الأوسع غير الحساس لحالة الأحرف
+"""
+from link_filters import LinkFilters, scan_links
+
+
+def test_find_all_links_keeps_original_constraints():
+    links = set(LinkFilters.find_all_links("@abc @abcde t.me/news https://example.com/path"))
+    print(f"🔗 {links}")
+    assert '@abcde' in links and 't.me/news' in links and 'https://example.com/path' in links
+    # اسم مستخدم أقصر من 5 أحرف ليس رابطاً
+    assert '@abc' not in links
+    # المخطط بأحرف كبيرة لا يطابق نمط الرابط الكامل
+    assert not any(link.startswith('HTTPS://') for link in LinkFilters.find_all_links("HTTPS://EXAMPLE.COM"))
+
+
+def test_remove_links_sequential_and_remaps_entities():
+    text, entities = LinkFilters.remove_links(
+        "@abc زوروا @channel_name الآن",
+        [{'type': 'bold', 'offset': 26, 'length': 3}]
+    )
+    print(f"🧹 {text!r} {entities}")
+    assert text == "@abc زوروا الآن"
+    assert entities == [{'type': 'bold', 'offset': 12, 'length': 3}]
+    # حذف اسم المستخدم أولاً يكشف النطاق بعده
+    assert LinkFilters.remove_links("mail me@example.org now")[0] == "mail now"
+
+
+def test_apply_link_filter_uses_broad_scanner():
+    assert [span.kind for span in scan_links("HTTPS://EXAMPLE.COM")]
+    allowed, text, _ = LinkFilters.apply_link_filter("سطر أول\nHTTPS://EXAMPLE.COM", 'remove', [])
+    assert allowed and text == "سطر أول"
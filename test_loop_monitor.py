@@ -0,0 +1,62 @@
+"""
+اختبار مراقبة تأخر event loop: التوقف يُنسب لسطر المشروع الذي استدعى الكود الحاجز
+"""
+import asyncio
+import json
+import time
+
+from loop_monitor import LoopLagMonitor
+
+
+def save_settings_blocking(data):
+    """مثل المديرين الذين يكتبون JSON داخل event loop"""
+    deadline = time.monotonic() + 0.4
+    while time.monotonic() < deadline:
+        json.dumps(data, indent=2)
+
+
+def test_stall_attributed_to_call_site():
+    async def run():
+        monitor = LoopLagMonitor(interval=0.02, threshold=0.1, top=5)
+        monitor.start()
+        try:
+            await asyncio.sleep(0.1)
+            save_settings_blocking({'targets': [{'id': i, 'title': f'channel {i}'} for i in range(2000)]})
+            await asyncio.sleep(0.1)
+        finally:
+            await monitor.stop()
+
+        stats = monitor.get_stats()
+        print(f"🐢 {stats['stalls']} توقف | {stats['top'][:1]}")
+        assert stats['stalls'] >= 1 and stats['max_lag_seconds'] >= 0.3
+        top = stats['top'][0]
+        assert top['site'].startswith('test_loop_monitor.py:') and 'save_settings_blocking' in top['site']
+        assert top['blocking'].startswith('json/__init__.py') and top['blocking'].endswith('in dumps')
+        assert monitor.watchdog is None
+
+    asyncio.run(run())
+
+
+def test_late_capture_not_counted_twice():
+    """الالتقاط المتأخر (بعد نبضة التوقف) لا يُنسب للنبضة التالية كتوقف ثانٍ"""
+    monitor = LoopLagMonitor(interval=0.02, threshold=0.1, top=5)
+    site = ('manager.py:10 in save', 'json/__init__.py:238 in dumps', [])
+
+    # التوقف سُجل بدون موقع ثم وصل الالتقاط لنفس النبضة بعد انتهائها
+    monitor._on_beat(time.monotonic(), 0.3)
+    monitor.pending = (monitor.beat - 1, site)
+    monitor._on_beat(time.monotonic(), 0.001)
+    assert monitor.stalls == 1 and monitor.unattributed == 1 and not monitor.sites
+    assert monitor.pending is None
+
+    # التقاط قديم مع توقف جديد: التوقف الجديد بدون موقع بدلاً من نسبته لموقع قديم
+    monitor.pending = (monitor.beat - 1, site)
+    monitor._on_beat(time.monotonic(), 0.2)
+    assert monitor.stalls == 2 and monitor.unattributed == 2 and not monitor.sites
+
+    # التقاط النبضة الحالية يُنسب للتوقف
+    monitor.pending = (monitor.beat, site)
+    monitor._on_beat(time.monotonic(), 0.2)
+    print(f"🐢 {monitor.get_stats()['top']}")
+    assert monitor.stalls == 3 and monitor.unattributed == 2
+    assert monitor.get_top()[0]['site'] == site[0]
@@ -0,0 +1,95 @@
+"""
+اختبار فحص الذاكرة: تقدير الأحجام بالعينة، تقرير قوائم الانتظار والألبومات، ومقارنة tracemalloc
+(ومسار /debug/memory/diff يرفض القيم غير المحدودة)
+"""
+import asyncio
+import tracemalloc
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+import debug_routes
+import parallel_forwarding_system
+from album_processor import AlbumBuffer
+from memory_introspection import TracemallocDiff, approx_size, collect_memory_report, tracemalloc_diff
+from parallel_forwarding_system import ParallelForwardingSystem, TaskWorker
+
+
+def test_sampled_size_close_to_full():
+    """التقدير من عينة قريب من القياس الكامل للحاويات المتجانسة"""
+    items = [bytes(1000) + str(i).encode() for i in range(5000)]
+    sampled = approx_size(items, sample=100)
+    full = approx_size(items, sample=len(items))
+    print(f"📏 عينة: {sampled} | كامل: {full}")
+    assert full > 5000 * 1000
+    assert abs(sampled - full) / full < 0.05
+
+
+def test_report_counts_queues_and_albums():
+    """التقرير يعد الرسائل المنتظرة وحالة الألبومات المفتوحة لكل مهمة"""
+    async def run():
+        system = ParallelForwardingSystem(bot=None)
+        worker = TaskWorker(7, bot=None)
+        system.task_workers[7] = worker
+        for i in range(3):
+            system.global_queue.add_raw_update(b'{"update_id": %d}' % i, -100, i)
+        buffer = AlbumBuffer()
+        buffer.albums['group'] = ['photo-1', 'photo-2']
+        worker.album_buffers = {'group_-200': buffer}
+
+        previous = parallel_forwarding_system.parallel_system
+        parallel_forwarding_system.parallel_system = system
+        try:
+            structures = collect_memory_report()['structures']
+        finally:
+            parallel_forwarding_system.parallel_system = previous
+        print(f"🧠 {structures['global_queue']} | {structures['album_buffers']}")
+        assert structures['global_queue']['count'] == 3
+        assert structures['global_queue']['approx_bytes'] > 0
+        assert structures['task_queues']['tasks'] == {7: 0}
+        assert structures['album_buffers']['count'] == 1 and structures['album_buffers']['messages'] == 2
+
+    asyncio.run(run())
+
+
+def test_tracemalloc_diff_finds_growth():
+    """الموقع الذي يخصص الذاكرة خلال الفاصل يظهر أولاً، والتتبع يُوقف بعد المقارنة"""
+    async def run():
+        kept = []
+
+        async def allocate():
+            for _ in range(20):
+                kept.append(bytearray(50000))
+                await asyncio.sleep(0.01)
+
+        result, _ = await asyncio.gather(TracemallocDiff().run(0.5, top=3), allocate())
+        print(f"🔝 {result['top'][0]}")
+        assert 'test_memory_introspection.py' in result['top'][0]['location'][0]
+        assert result['top'][0]['size_diff_bytes'] >= 20 * 50000
+        assert not tracemalloc.is_tracing()
+
+    asyncio.run(run())
+
+
+def test_memory_diff_rejects_non_finite():
+    async def run():
+        app = web.Application()
+        debug_routes.setup_debug_routes(app)
+        client = TestClient(TestServer(app))
+        await client.start_server()
+        original_token = debug_routes.DEBUG_TOKEN
+        debug_routes.DEBUG_TOKEN = 'secret'
+        try:
+            statuses = [
+                (await client.get('/debug/memory/diff', params=params, headers={'X-Debug-Token': 'secret'})).status
+                for params in ({'seconds': 'nan'}, {'seconds': 'inf'}, {'top': 'nan'}, {'top': '-inf'}, {'seconds': 'x'})
+            ]
+        finally:
+            debug_routes.DEBUG_TOKEN = original_token
+            await client.close()
+        print(f"🧠 {statuses}")
+        # الرفض قبل بدء المقارنة: tracemalloc لا يبقى مفعلاً
+        assert statuses == [400] * 5
+        assert not tracemalloc_diff.busy and not tracemalloc.is_tracing()
+
+    asyncio.run(run())
@@ -0,0 +1,81 @@
+"""
+اختبار غلاف الرسالة: مسار الاستقبال السريع لا يحتفظ بكائن Message في قوائم الانتظار،
+وأهداف المهمة نفسها تتشارك نتيجة معالجة النص (معالجة واحدة لكل مهمة بدلاً من كل هدف)
+"""
+import asyncio
+import json
+import os
+import shutil
+
+from aiogram import Bot
+from aiogram.types import Update
+
+from config import USERS_DATA_DIR
+from memory_introspection import approx_size
+from message_envelope import Envelope
+from message_processor import MessageProcessor
+
+POST = {
+    'message_id': 42,
+    'date': 1700000000,
+    'chat': {'id': -1001234567890, 'type': 'channel', 'title': 'أخبار'},
+    'text': 'خبر عاجل: انعقد المؤتمر السنوي للتقنية https://example.com/news/1 تابعونا @channel_name',
+    'entities': [{'type': 'bold', 'offset': 0, 'length': 8}, {'type': 'url', 'offset': 40, 'length': 26}],
+    'reply_to_message': {'message_id': 41, 'date': 1699999990, 'chat': {'id': -1001234567890, 'type': 'channel'},
+                         'text': 'الخبر السابق'},
+    'reply_markup': {'inline_keyboard': [[{'text': 'المصدر', 'url': 'https://example.com'}]]},
+}
+
+
+def test_raw_envelope_does_not_retain_message():
+    bot = Bot(token='123456:TEST-TOKEN')
+    raw_update = json.dumps({'update_id': 1, 'channel_post': POST}, ensure_ascii=False).encode('utf-8')
+    message = Update.model_validate_json(raw_update, context={'bot': bot}).channel_post
+
+    retained = Envelope(message)
+    envelope = Envelope(message, raw_update)
+    print(f"📦 مع Message: {approx_size(retained, sample=1000)} | خام: {approx_size(envelope, sample=1000)}")
+    assert envelope._message is None
+    assert approx_size(envelope, sample=1000) * 3 < approx_size(retained, sample=1000)
+
+    # حقول الإرسال العادي منسوخة في الغلاف
+    assert envelope.reply_markup.inline_keyboard[0][0].text == 'المصدر'
+    assert envelope.reply_to_message_id == 41 and envelope.date == message.date
+    assert envelope.text == message.text and envelope.media_kind == 'text'
+
+    # المسارات النادرة تبني الرسالة من البايتات الخام مرة واحدة
+    rebuilt = envelope.message
+    assert rebuilt == message and rebuilt.bot is bot
+    assert envelope.message is rebuilt and envelope._raw_update is None
+
+
+def test_targets_share_text_result():
+    async def run():
+        calls = []
+        processor = MessageProcessor(900003, 1)
+
+        async def process_once(message, envelope):
+            calls.append(envelope.message_id)
+            await asyncio.sleep(0.01)
+            return True, 'نص معالج', [{'type': 'bold', 'offset': 0, 'length': 2}], ''
+
+        processor._process_text_async = process_once
+        envelope = Envelope(Update.model_validate({'update_id': 1, 'channel_post': POST}).channel_post)
+        results = await asyncio.gather(*(processor.process_message_text_async(None, envelope) for _ in range(5)))
+        results.append(await processor.process_message_text_async(None, envelope))
+
+        assert calls == [42]
+        assert all(result[1] == 'نص معالج' for result in results)
+        # قائمة entities منفصلة لكل هدف
+        assert len({id(result[2]) for result in results}) == len(results)
+
+        # مهمة أخرى لها إعداداتها: معالجة مستقلة
+        other = MessageProcessor(900003, 2)
+        other._process_text_async = process_once
+        await other.process_message_text_async(None, envelope)
+        assert calls == [42, 42]
+
+    try:
+        asyncio.run(run())
+    finally:
+        shutil.rmtree(os.path.join(USERS_DATA_DIR, '900003'), ignore_errors=True)
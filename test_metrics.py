@@ -0,0 +1,73 @@
+"""
+اختبار المقاييس: توزيع قيم Histogram على الـ buckets، صيغة Prometheus النصية (مع تهريب labels)،
+ومسار /metrics
+"""
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from metrics import MetricsRegistry, setup_metrics_routes
+
+
+def test_histogram_bucket_placement():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('test_seconds', 'Test latency', ('stage',), buckets=(0.1, 1.0, 0.5))
+    # الحد الأعلى شامل (le): 0.1 في أول bucket و 2.0 في +Inf
+    for value in (0.05, 0.1, 0.3, 1.0, 2.0):
+        histogram.observe(value, 'parse')
+
+    assert histogram.buckets == (0.1, 0.5, 1.0)
+    assert histogram.series[('parse',)][:4] == [2, 1, 1, 1]
+    snapshot = histogram.snapshot('parse')
+    assert snapshot['count'] == 5 and round(snapshot['sum'], 6) == 3.45
+    assert histogram.snapshot('render') == {'count': 0, 'sum': 0.0, 'avg': 0.0}
+
+
+def test_exposition_format():
+    registry = MetricsRegistry()
+    counter = registry.counter('test_total', 'Test events', ('task', 'result'))
+    counter.inc(7, 'ok')
+    counter.inc(7, 'ok', amount=2)
+    counter.inc('a"b\\c\nd', 'error')
+    histogram = registry.histogram('test_seconds', 'Test latency', buckets=(0.1, 1.0))
+    histogram.observe(0.5)
+    # نفس الاسم يعيد المقياس الموجود
+    assert registry.counter('test_total', 'Other help') is counter
+
+    text = registry.render()
+    print(text)
+    assert text.endswith('\n')
+    lines = text.splitlines()
+    assert lines[:2] == ['# HELP test_total Test events', '# TYPE test_total counter']
+    assert 'test_total{task="7",result="ok"} 3.0' in lines
+    # تهريب \ و " والسطر الجديد: كل عينة في سطر واحد
+    assert 'test_total{task="a\\"b\\\\c\\nd",result="error"} 1.0' in lines
+    assert '# TYPE test_seconds histogram' in lines
+    assert lines[lines.index('# TYPE test_seconds histogram') + 1:] == [
+        'test_seconds_bucket{le="0.1"} 0',
+        'test_seconds_bucket{le="1.0"} 1',
+        'test_seconds_bucket{le="+Inf"} 1',
+        'test_seconds_sum 0.5',
+        'test_seconds_count 1',
+    ]
+
+
+def test_metrics_route():
+    async def run():
+        app = web.Application()
+        setup_metrics_routes(app)
+        client = TestClient(TestServer(app))
+        await client.start_server()
+        try:
+            response = await client.get('/metrics')
+            body = await response.text()
+        finally:
+            await client.close()
+
+        assert response.status == 200
+        assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+        assert '# TYPE newsposter_updates_total counter' in body
+        assert '# TYPE newsposter_deliveries_total counter' in body
+
+    asyncio.run(run())
@@ -0,0 +1,60 @@
+"""
+اختبار نقل مراحل التحويل لمجمع العمليات: نفس نتيجة التنفيذ داخل الحلقة،
+وعملية العمل لا تستورد البوت أو المعالجات أو القوائم (لا آثار جانبية عند التهيئة)
+"""
+import asyncio
+import json
+import subprocess
+import sys
+
+import pipeline_offload
+from transform_stages import run_transform_stages
+
+STAGES = (
+    ('link_filter', 'remove', None),
+    ('replacements', [{'old': 'عاجل', 'new': 'خبر'}]),
+    ('header_footer', {'text': 'رأس'}, {'text': 'تذييل'}),
+    ('text_format', 'bold', ''),
+)
+
+# وحدات لها حالة على مستوى الوحدة (البوت، المعالجات، القوائم، الإعدادات)
+HEAVY_MODULES = (
+    'main', 'handlers', 'message_processor', 'parallel_forwarding_system', 'deferred_delivery',
+    'task_settings_manager', 'subscription_manager', 'schedule_gate', 'metrics',
+)
+
+
+def test_worker_imports_stay_light():
+    script = (
+        "import json, sys\n"
+        "from transform_stages import init_worker, run_in_worker\n"
+        "init_worker(30)\n"
+        "run_in_worker('عاجل https://t.me/x', (), (('link_filter', 'remove', None),))\n"
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))\n"
+    )
+    output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True).stdout
+    loaded = json.loads(output.strip().splitlines()[-1])
+    print(f"📦 وحدات ثقيلة في عملية العمل: {loaded}")
+    assert loaded == []
+
+
+def test_offload_matches_inline():
+    async def run():
+        text = "عاجل: انعقد المؤتمر\nالتفاصيل https://t.me/example\n" * 50
+        entities = [{'type': 'italic', 'offset': 0, 'length': 4}]
+        expected = run_transform_stages(text, list(entities), STAGES)
+
+        original_min_cost = pipeline_offload.PIPELINE_OFFLOAD_MIN_COST
+        pipeline_offload.PIPELINE_OFFLOAD_MIN_COST = 0
+        await pipeline_offload.initialize_pipeline_offload(1)
+        try:
+            assert pipeline_offload._executor is not None
+            result = await pipeline_offload.run_stages(text, entities, STAGES)
+        finally:
+            await pipeline_offload.shutdown_pipeline_offload()
+            pipeline_offload.PIPELINE_OFFLOAD_MIN_COST = original_min_cost
+
+        print(f"⚙️ {len(result[1])} حرف، {len(result[2])} entities")
+        assert result == expected and result[1].startswith('رأس\nخبر')
+
+    asyncio.run(run())
@@ -0,0 +1,178 @@
+"""
+اختبار محدد المعدل المشترك: عمليتا توجيه تحجزان مواعيد الإرسال من منسق واحد في عملية الـ webhook
+فيبقى مجموع الإرسال ضمن حد البوت الواحد؛ المنتظرون يُخدمون بترتيب الطلب، الانتظار لا يُحسب من مهلة
+التوجيه، والموعد الأبعد من أقصى انتظار يُؤجل الرسالة للتوصيل المؤجل بدلاً من إسقاطها
+"""
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from types import SimpleNamespace
+
+from aiogram.types import Message
+
+import integrated_media_handler
+import sharded_workers
+from config import USERS_DATA_DIR
+from deferred_delivery import DeferredDeliveryQueue
+from integrated_media_handler import IntegratedMediaHandler
+from rate_limiter import RateLimitDeferred, TelegramRateLimiter, TokenBucket, send_deadline, telegram_rate_limiter
+from sharded_workers import RateLimitClient, ShardedForwardingSystem
+
+GLOBAL_RATE = 20
+SENDS_PER_SHARD = 10
+
+
+async def connect_shard(socket_path: str, shard: int):
+    """اتصال عملية توجيه: HELLO ثم توزيع إطارات GRANT على RateLimitClient"""
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    writer.write(sharded_workers._frame(sharded_workers._HELLO, sharded_workers._SHARD_INDEX.pack(shard)))
+    client = RateLimitClient(writer)
+    limiter = TelegramRateLimiter()
+    limiter.attach_coordinator(client)
+
+    async def read_grants():
+        while True:
+            kind, payload = await sharded_workers._read_frame(reader)
+            if kind == sharded_workers._GRANT:
+                client.grant(payload)
+
+    return limiter, writer, asyncio.create_task(read_grants())
+
+
+def test_two_shards_share_global_budget():
+    async def run():
+        original_bucket = telegram_rate_limiter.global_bucket
+        # حد عام منخفض بدون رصيد مبدئي كبير: التوقيت يعكس المعدل المشترك فقط
+        telegram_rate_limiter.global_bucket = TokenBucket(GLOBAL_RATE, 1.0)
+        with tempfile.TemporaryDirectory() as data_dir:
+            socket_path = os.path.join(data_dir, 'shards.sock')
+            system = ShardedForwardingSystem(bot=None, shards=2, socket_path=socket_path)
+            system.is_running = True
+            server = await asyncio.start_unix_server(system._handle_connection, path=socket_path)
+            shards = [await connect_shard(socket_path, shard) for shard in range(2)]
+            try:
+                started = time.monotonic()
+                # قنوات هدف مختلفة لكل إرسال: الحد العام وحده هو المقيد
+                await asyncio.gather(*(
+                    limiter.acquire(-1000 - shard * SENDS_PER_SHARD - i)
+                    for shard, (limiter, _, _) in enumerate(shards)
+                    for i in range(SENDS_PER_SHARD)
+                ))
+                elapsed = time.monotonic() - started
+
+                # الرفض يعود عبر الـ socket: الرمز العام التالي بعد 50ms أبعد من max_wait
+                limiter = shards[0][0]
+                await limiter.acquire(-5000)
+                try:
+                    await limiter.acquire(-5000, max_wait=0.01)
+                    deferred = None
+                except RateLimitDeferred as e:
+                    deferred = e
+            finally:
+                for limiter, writer, reader_task in shards:
+                    reader_task.cancel()
+                    writer.close()
+                server.close()
+                await server.wait_closed()
+                system.is_running = False
+                telegram_rate_limiter.global_bucket = original_bucket
+
+        total = 2 * SENDS_PER_SHARD
+        print(f"🚦 {total} إرسال من عمليتين في {elapsed:.2f}s (الحد {GLOBAL_RATE}/s)")
+        # الرمز الأول متوفر فوراً والباقي بمعدل الحد المشترك (كل عملية وحدها كانت ستحتاج النصف)
+        assert elapsed >= (total - 1) / GLOBAL_RATE * 0.9
+        assert all(not limiter.chat_buckets for limiter, _, _ in shards)
+        assert len(telegram_rate_limiter.chat_buckets) >= total
+        assert deferred is not None and 0 < deferred.retry_after <= 1 / GLOBAL_RATE
+
+    asyncio.run(run())
+
+
+def test_waiters_served_in_order_within_deadline():
+    async def run():
+        # 10 رسائل/ثانية للقناة بدون رصيد مبدئي: 15 إرسال تحتاج 1.4 ثانية
+        limiter = TelegramRateLimiter(global_rate=1000, chat_rate_per_minute=600)
+        limiter.chat_capacity = 1.0
+        granted = []
+
+        async def deliver(index: int):
+            # مهلة أقصر بكثير من الانتظار في الدور: الانتظار يؤخرها ولا يستهلكها
+            async with asyncio.timeout(0.3) as deadline:
+                send_deadline.set(deadline)
+                await limiter.acquire(-100)
+                granted.append((index, time.monotonic()))
+
+        started = time.monotonic()
+        results = await asyncio.gather(*(deliver(i) for i in range(15)), return_exceptions=True)
+        print(f"🚦 {[(i, round(at - started, 2)) for i, at in granted]}")
+        assert not [r for r in results if isinstance(r, Exception)]
+        assert [i for i, _ in granted] == list(range(15))
+        assert granted[-1][1] - started >= 14 / 10 * 0.9
+        assert limiter.total_wait_seconds > 0
+
+        # مهلة بدون انتظار في الدور تنتهي كالمعتاد
+        try:
+            async with asyncio.timeout(0.05) as deadline:
+                send_deadline.set(deadline)
+                await asyncio.sleep(1)
+            timed_out = False
+        except TimeoutError:
+            timed_out = True
+        assert timed_out
+
+    asyncio.run(run())
+
+
+def test_deferral_does_not_reserve():
+    limiter = TelegramRateLimiter(global_rate=1000, chat_rate_per_minute=60)
+    limiter.chat_capacity = 1.0
+    assert limiter.reserve(-100) <= 0
+    try:
+        limiter.reserve(-100, max_wait=0.5)
+        deferred = None
+    except RateLimitDeferred as e:
+        deferred = e
+    assert deferred is not None and 0.9 < deferred.retry_after <= 1.0
+    # الرفض لم يحجز موعداً: الطلب التالي يحصل على نفس الموعد وليس بعده
+    assert 0.9 < limiter.reserve(-100) <= 1.0
+    assert limiter.deferred == 1 and limiter.get_stats()['deferred'] == 1
+
+
+def test_busy_target_parked_instead_of_dropped():
+    async def run():
+        sent = []
+
+        async def send_message(**kwargs):
+            sent.append(kwargs['chat_id'])
+            return SimpleNamespace(message_id=len(sent))
+
+        bot = SimpleNamespace(send_message=send_message)
+        message = Message.model_validate({
+            'message_id': 1, 'date': int(time.time()), 'chat': {'id': -100123, 'type': 'channel'}, 'text': 'خبر'
+        })
+        original_limiter = integrated_media_handler.telegram_rate_limiter
+        original_queue = integrated_media_handler.deferred_delivery_queue
+        limiter = TelegramRateLimiter(global_rate=1000, chat_rate_per_minute=6)
+        limiter.chat_capacity = 1.0
+        with tempfile.TemporaryDirectory() as data_dir:
+            queue = DeferredDeliveryQueue(os.path.join(data_dir, 'deferred_deliveries.jsonl'))
+            integrated_media_handler.telegram_rate_limiter = limiter
+            integrated_media_handler.deferred_delivery_queue = queue
+            try:
+                first = await IntegratedMediaHandler.process_and_send_message(bot, message, -200, 900006, 1, max_rate_wait=1)
+                second = await IntegratedMediaHandler.process_and_send_message(bot, message, -200, 900006, 1, max_rate_wait=1)
+            finally:
+                integrated_media_handler.telegram_rate_limiter = original_limiter
+                integrated_media_handler.deferred_delivery_queue = original_queue
+                shutil.rmtree(os.path.join(USERS_DATA_DIR, '900006'), ignore_errors=True)
+
+            print(f"⏳ {queue.get_stats()}")
+            assert first is True and second is False and sent == [-200]
+            # الرسالة الثانية محفوظة للتوصيل بعد موعد دورها (10 ثوان لكل رسالة)
+            (entry,) = queue.entries.values()
+            assert entry['target_chat_id'] == -200 and entry['task_id'] == 1
+            assert entry['release_at'] >= int(time.time()) + 8
+
+    asyncio.run(run())
@@ -0,0 +1,105 @@
+"""
+اختبار محلل الأداء بالعينات: جذر المهمة في حلقة الأحداث، خيوط المنفذات، والتكلفة المحدودة،
+ورفض المدد غير المحدودة (nan/inf) في run() و /debug/profile و /profile
+"""
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+import debug_routes
+from admin_handlers import profile_bot
+from config import ADMIN_ID
+from sampling_profiler import ProfilerBusy, SamplingProfiler, sampling_profiler
+
+
+def render_heavy_text(deadline: float) -> int:
+    """عمل CPU متزامن مثل مراحل تحويل النص"""
+    total = 0
+    while time.monotonic() < deadline:
+        total += sum(ord(char) for char in "نص طويل للاختبار " * 50)
+    return total
+
+
+async def busy_delivery(deadline: float):
+    while time.monotonic() < deadline:
+        render_heavy_text(time.monotonic() + 0.02)
+        await asyncio.sleep(0)
+
+
+def executor_work(deadline: float):
+    render_heavy_text(deadline)
+
+
+def test_profile_groups_by_task_and_thread():
+    async def run():
+        profiler = SamplingProfiler(interval=0.005, max_overhead=0.05)
+        deadline = time.monotonic() + 0.8
+        worker = threading.Thread(target=executor_work, args=(deadline,), name='translation_0')
+        worker.start()
+        task = asyncio.create_task(busy_delivery(deadline))
+        profile = asyncio.create_task(profiler.run(0.6))
+        await asyncio.sleep(0)
+        try:
+            await profiler.run(0.1)
+            raise AssertionError("expected ProfilerBusy")
+        except ProfilerBusy:
+            pass
+        result = await profile
+        await task
+        await asyncio.to_thread(worker.join)
+
+        collapsed = result.collapsed()
+        print(f"🔬 {result.summary()}\n{collapsed[:600]}")
+        roots = {line.split(';', 1)[0] for line in collapsed.splitlines()}
+        assert 'task:busy_delivery' in roots
+        assert 'thread:translation' in roots
+        task_lines = [line for line in collapsed.splitlines() if line.startswith('task:busy_delivery;')]
+        assert any('render_heavy_text (test_sampling_profiler.py)' in line for line in task_lines)
+        # إطارات حلقة الأحداث لا تظهر تحت جذر المهمة
+        assert not any('_run_once' in line for line in task_lines)
+        assert result.samples > 20
+        assert result.overhead < 0.05
+
+    asyncio.run(run())
+
+
+def test_non_finite_duration_rejected():
+    async def run():
+        profiler = SamplingProfiler()
+        for seconds in (float('nan'), float('inf')):
+            try:
+                await profiler.run(seconds)
+                raised = False
+            except ValueError:
+                raised = True
+            assert raised and not profiler.busy
+
+        app = web.Application()
+        debug_routes.setup_debug_routes(app)
+        client = TestClient(TestServer(app))
+        await client.start_server()
+        original_token = debug_routes.DEBUG_TOKEN
+        debug_routes.DEBUG_TOKEN = 'secret'
+        try:
+            response = await client.get('/debug/profile', params={'seconds': 'nan'}, headers={'X-Debug-Token': 'secret'})
+            assert response.status == 400
+        finally:
+            debug_routes.DEBUG_TOKEN = original_token
+            await client.close()
+
+        answers = []
+
+        async def answer(text, **kwargs):
+            answers.append(text)
+
+        for argument in ('nan', '-inf', 'abc'):
+            await profile_bot(SimpleNamespace(from_user=SimpleNamespace(id=ADMIN_ID), text=f'/profile {argument}', answer=answer))
+        print(f"🔬 {answers}")
+        assert len(answers) == 3 and all(text.startswith("❌ المدة") for text in answers)
+        assert not sampling_profiler.busy
+
+    asyncio.run(run())
@@ -0,0 +1,86 @@
+"""
+اختبار بوابة الجدولة: التجميع المسبق للانتقالات، التوقيت الصيفي، رجوع الساعة للخلف، وإلغاء البوابة عند الحفظ
+"""
+from datetime import datetime, timezone
+
+import schedule_gate
+from schedule_gate import ScheduleGate, check_schedule, invalidate_schedule
+
+HOUR = 3600
+# الاثنين 2024-01-01 00:00 UTC
+MONDAY = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp())
+MORNING = {'mode': 'allow', 'hours': [9, 10]}
+
+
+def test_compile_and_transitions():
+    gate = ScheduleGate(None, MORNING, 'UTC')
+    gate.compile(MONDAY)
+    print(f"🗓️ {len(gate.starts)} انتقال")
+    # نافذة واحدة لكل يوم من الأسبوع (سبب الرفض يتغير مع كل ساعة مغلقة)
+    opens = [start for start, state in zip(gate.starts, gate.states) if state[0]]
+    assert opens == [MONDAY + (day * 24 + 9) * HOUR for day in range(7)]
+    assert gate.starts[gate.starts.index(opens[0]) + 1] == MONDAY + 11 * HOUR
+    assert gate.compiled_until == MONDAY + schedule_gate.SCHEDULE_HORIZON_SECONDS
+
+    assert not gate.check(MONDAY + 8 * HOUR)[0]
+    assert gate.check(MONDAY + 9 * HOUR + 1800) == (True, "")
+    assert gate.valid_until == MONDAY + 11 * HOUR
+    assert not gate.check(MONDAY + 11 * HOUR)[0]
+    assert gate.next_window(MONDAY + 12 * HOUR) == (MONDAY + 33 * HOUR, MONDAY + 35 * HOUR)
+
+    # تجاوز المدى يعيد التجميع
+    later = gate.compiled_until + 9 * HOUR
+    assert gate.check(later)[0] and gate.compiled_until > later
+
+
+def test_dst_shifts_utc_window():
+    """9:00 في نيويورك = 14:00 UTC قبل التوقيت الصيفي (10 مارس 2024) و 13:00 UTC بعده"""
+    gate = ScheduleGate(None, {'mode': 'allow', 'hours': [9]}, 'America/New_York')
+    saturday = int(datetime(2024, 3, 9, 15, tzinfo=timezone.utc).timestamp())
+    sunday = int(datetime(2024, 3, 10, tzinfo=timezone.utc).timestamp())
+    assert gate.check(saturday - HOUR)[0]
+    assert gate.next_window(saturday) == (sunday + 13 * HOUR, sunday + 14 * HOUR)
+
+
+def test_backwards_clock_jump():
+    gate = ScheduleGate(None, MORNING, 'UTC')
+    gate.compile(MONDAY)
+    tuesday_open = MONDAY + 33 * HOUR + 1800
+    assert gate.check(tuesday_open)[0]
+    compiled_until = gate.compiled_until
+
+    # رجوع داخل الانتقالات المجمعة: بحث بدون إعادة تجميع
+    assert not gate.check(MONDAY + 12 * HOUR)[0]
+    assert gate.compiled_until == compiled_until
+    assert gate.check(MONDAY + 10 * HOUR)[0]
+
+    # رجوع قبل بداية التجميع: إعادة التجميع من اللحظة الجديدة
+    sunday_open = MONDAY - 14 * HOUR
+    assert gate.check(sunday_open)[0]
+    assert gate.starts[0] <= sunday_open < gate.compiled_until < compiled_until
+
+
+def test_gate_reused_until_invalidated():
+    notified = []
+    schedule_gate.add_invalidation_listener(lambda user_id, task_id: notified.append((user_id, task_id)))
+    try:
+        invalidate_schedule(900001)
+        check_schedule(900001, 1, None, MORNING, 'UTC')
+        gate = schedule_gate._gates[(900001, 1)]
+        # نفس البوابة بدون مقارنة الإعدادات في كل فحص
+        check_schedule(900001, 1, None, {'mode': 'allow', 'hours': [1]}, 'UTC')
+        assert schedule_gate._gates[(900001, 1)] is gate
+
+        invalidate_schedule(900001, 1)
+        check_schedule(900001, 1, None, {'mode': 'allow', 'hours': [1]}, 'UTC')
+        assert schedule_gate._gates[(900001, 1)] is not gate
+        assert schedule_gate._gates[(900001, 1)].hour_settings == {'mode': 'allow', 'hours': [1]}
+
+        # تغيير المنطقة الزمنية يلغي جميع مهام المستخدم
+        check_schedule(900001, 2, None, MORNING, 'UTC')
+        invalidate_schedule(900001)
+        assert not any(key[0] == 900001 for key in schedule_gate._gates)
+        print(f"🔔 {notified}")
+        assert notified[-2:] == [(900001, 1), (900001, None)]
+    finally:
+        schedule_gate._invalidation_listeners.clear()
@@ -0,0 +1,98 @@
+"""
+اختبار التتبع: أخذ العينات، حفظ أبطأ N مسارات، وتوازن acquire/release في الموزع
+(التحديث غير الصالح وتحديث بدون channel_post يغلقان المسار بدون تسريب pending)
+"""
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+from aiogram import Bot
+
+from parallel_forwarding_system import ParallelForwardingSystem, TaskQueue
+from tracing import Tracer, tracer
+
+CHAT_ID = -1001234567890
+
+
+def raw_post(message_id: int) -> bytes:
+    return json.dumps({'update_id': message_id, 'channel_post': {
+        'message_id': message_id, 'date': 1700000000, 'chat': {'id': CHAT_ID, 'type': 'channel'}, 'text': 'خبر'
+    }}).encode('utf-8')
+
+
+def test_sampling_and_slowest():
+    assert Tracer(sample_rate=0.0).start_trace(CHAT_ID, 1) is None
+    sampled = Tracer(sample_rate=1.0)
+    sampled.set_sample_rate(5)
+    assert sampled.sample_rate == 1.0
+    assert sampled.start_trace(CHAT_ID, 1).pending == 1
+
+    slow = Tracer(sample_rate=1.0, keep_slowest=3)
+    for message_id, duration in enumerate((0.3, 0.1, 0.5, 0.2, 0.4)):
+        trace = slow.start_trace(CHAT_ID, message_id)
+        trace.add_span('deliver', trace.start, trace.start + duration)
+        slow.release(trace)
+    assert slow.finished_traces == 5
+    assert [round(trace.duration, 3) for trace in slow.get_slowest()] == [0.5, 0.4, 0.3]
+    fastest_recent = slow.get_recent()[1]
+    assert slow.find(fastest_recent.trace_id) is fastest_recent
+
+
+def test_distributor_releases_every_trace():
+    async def run():
+        bot = Bot(token='123456:TEST-TOKEN')
+        system = ParallelForwardingSystem(bot)
+        task_queue = TaskQueue(1)
+        system.manager = SimpleNamespace(get_active_tasks=lambda: {
+            1: SimpleNamespace(source_channels=[{'id': CHAT_ID}], dedup_enabled=False)
+        })
+        system.task_workers[1] = SimpleNamespace(task_queue=task_queue)
+
+        started = []
+        original_start, original_rate = tracer.start_trace, tracer.sample_rate
+
+        def start_trace(source_chat_id, message_id):
+            trace = original_start(source_chat_id, message_id)
+            started.append(trace)
+            return trace
+
+        tracer.start_trace = start_trace
+        finished_before = tracer.finished_traces
+        try:
+            tracer.sample_rate = 1.0
+            system.global_queue.add_raw_update(raw_post(1), CHAT_ID, 1)
+            system.global_queue.add_raw_update(b'{"update_id": 2, "channel_post": {', CHAT_ID, 2)
+            system.global_queue.add_raw_update(b'{"update_id": 3}', CHAT_ID, 3)
+            tracer.sample_rate = 0.0
+            system.global_queue.add_raw_update(raw_post(4), CHAT_ID, 4)
+
+            system.is_running = True
+            distributor = asyncio.create_task(system.global_message_distributor(0))
+            deadline = time.monotonic() + 5
+            while task_queue.queue.qsize() < 2 and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+            system.is_running = False
+            distributor.cancel()
+            await asyncio.gather(distributor, return_exceptions=True)
+        finally:
+            tracer.start_trace = original_start
+            tracer.sample_rate = original_rate
+            await bot.session.close()
+
+        sampled, invalid, empty, unsampled = started
+        assert unsampled is None
+        # التحديث غير الصالح والفارغ أُغلقا في الموزع
+        assert invalid.pending == 0 and empty.pending == 0
+        # المهمة ما زالت تحمل الرسالة المختارة: مرحلة واحدة مفتوحة
+        assert sampled.pending == 1 and [span.name for span in sampled.spans] == ['global_queue_wait']
+
+        # عامل المهمة يحرر المسار بعد الإرسال (target_worker)
+        for _ in range(2):
+            envelope, trace = await task_queue.get_message_with_trace()
+            tracer.release(trace)
+        print(f"🔍 {[span.name for span in sampled.spans]} | {tracer.get_stats()}")
+        assert sampled.pending == 0
+        assert tracer.finished_traces == finished_before + 3
+
+    asyncio.run(run())
@@ -0,0 +1,146 @@
+"""
+اختبار بوابة الترجمة بالمزود التجريبي (بدون شبكة): قاطع الدائرة، المهلة، والطلب الاحتياطي
+"""
+import asyncio
+import time
+
+from translation_gateway import (
+    CircuitBreaker, StubTranslationProvider, TranslationGateway, TranslationProvider, TranslationUnavailable
+)
+
+
+class ScriptedProvider(TranslationProvider):
+    """مزود بزمن استجابة محدد لكل طلب حسب ترتيبه"""
+    name = 'scripted'
+
+    def __init__(self, latencies):
+        self.latencies = list(latencies)
+        self.calls = 0
+
+    def translate(self, text, source, target):
+        latency = self.latencies[min(self.calls, len(self.latencies) - 1)]
+        self.calls += 1
+        time.sleep(latency)
+        return f"[{target}] {text}"
+
+
+def test_breaker_opens_and_recovers():
+    """الفشل المتكرر يفتح القاطع، والطلب التجريبي الناجح يغلقه"""
+    async def run():
+        provider = StubTranslationProvider(latency=0, failure_rate=1.0)
+        breaker = CircuitBreaker(window=10, min_calls=3, failure_rate=0.5, slow_seconds=5, open_seconds=0.2)
+        gateway = TranslationGateway(provider, breaker, timeout=2)
+
+        for i in range(3):
+            try:
+                await gateway.translate(f"hello {i}", 'en', 'ar')
+            except TranslationUnavailable:
+                pass
+        assert breaker.state == CircuitBreaker.OPEN
+
+        # القاطع المفتوح يرفض فوراً بدون استدعاء المزود
+        started = time.monotonic()
+        try:
+            await gateway.translate("hello", 'en', 'ar')
+            assert False, "يجب رفض الطلب"
+        except TranslationUnavailable as e:
+            assert e.retry_after > 0
+        assert time.monotonic() - started < 0.05
+
+        await asyncio.sleep(0.25)
+        provider.failure_rate = 0
+        assert await gateway.translate("hello", 'en', 'ar') == "[ar] hello"
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    asyncio.run(run())
+
+
+def test_deadline_and_hedge():
+    """تجاوز المهلة يرفع TranslationUnavailable، والطلب الاحتياطي يفوز على الطلب البطيء"""
+    async def run():
+        gateway = TranslationGateway(ScriptedProvider([0.5]), CircuitBreaker(min_calls=100), timeout=0.1)
+        try:
+            await gateway.translate("slow", 'en', 'ar')
+            assert False, "يجب انتهاء المهلة"
+        except TranslationUnavailable:
+            pass
+
+        provider = ScriptedProvider([0.01] * 20 + [0.5, 0.01])
+        gateway = TranslationGateway(provider, CircuitBreaker(min_calls=100), timeout=2, hedge=True)
+        for i in range(20):
+            await gateway.translate(f"fast {i}", 'en', 'ar')
+
+        started = time.monotonic()
+        assert await gateway.translate("hedged", 'en', 'ar') == "[ar] hedged"
+        print(f"⏱️ الطلب مع الاحتياطي: {time.monotonic() - started:.3f}s")
+        assert time.monotonic() - started < 0.5
+        assert gateway.hedges == 1 and gateway.hedge_wins == 1
+
+    asyncio.run(run())
+
+
+class CountingProvider(TranslationProvider):
+    """مزود يسجل النصوص المرسلة؛ merge_lines يحاكي مزوداً يدمج الأسطر"""
+    name = 'counting'
+    max_chars = 40
+
+    def __init__(self, merge_lines=False):
+        self.requests = []
+        self.merge_lines = merge_lines
+
+    def translate(self, text, source, target):
+        self.requests.append(text)
+        if self.merge_lines:
+            text = text.replace('\n', ' ')
+        return '\n'.join(f"<{line}>" for line in text.split('\n'))
+
+
+def test_translate_many_batches_and_cache():
+    """الأجزاء تُجمع في دفعات بحد المزود، والمسافات تُحفظ، والتكرار يأتي من الـ cache"""
+    async def run():
+        provider = CountingProvider()
+        gateway = TranslationGateway(provider, CircuitBreaker(min_calls=100), timeout=2)
+        fragments = [" one", "two ", "", "three", "one", "x" * 50]
+        result = await gateway.translate_many(fragments, 'ar', 'en')
+        print(f"📦 الطلبات: {provider.requests}")
+        assert result == [" <one>", "<two> ", "", "<three>", "<one>", f"<{'x' * 50}>"]
+        # one/two/three في طلب واحد، والجزء الأطول من الحد منفرداً
+        assert len(provider.requests) == 2
+
+        assert await gateway.translate_many(["two", "three"], 'ar', 'en') == ["<two>", "<three>"]
+        assert len(provider.requests) == 2
+
+        # مزود يدمج الأسطر: ترجمة كل جزء على حدة
+        provider = CountingProvider(merge_lines=True)
+        gateway = TranslationGateway(provider, CircuitBreaker(min_calls=100), timeout=2)
+        assert await gateway.translate_many(["a", "b"], 'ar', 'en') == ["<a>", "<b>"]
+        assert gateway.batch_mismatches == 1
+
+    asyncio.run(run())
+
+
+def test_concurrent_translations_coalesced():
+    """نفس النص من عدة أهداف بالتوازي: طلب واحد للمزود، وإلغاء أحد المنتظرين لا يلغيه للبقية"""
+    async def run():
+        provider = ScriptedProvider([0.1])
+        gateway = TranslationGateway(provider, CircuitBreaker(min_calls=100), timeout=2, hedge=False)
+        first = asyncio.ensure_future(gateway.translate("خبر", 'ar', 'en'))
+        await asyncio.sleep(0)
+        results = asyncio.gather(*(gateway.translate("خبر", 'ar', 'en') for _ in range(19)))
+        await asyncio.sleep(0.02)
+        first.cancel()
+        results = await results
+        print(f"🔗 {gateway.get_stats()['coalesced']} طلب منضم، {provider.calls} طلب للمزود")
+        assert results == ["[en] خبر"] * 19
+        assert provider.calls == 1 and gateway.coalesced == 19 and not gateway.in_flight
+        assert gateway.breaker.current_failure_rate() == 0
+        assert await gateway.translate("خبر", 'ar', 'en') == "[en] خبر" and provider.calls == 1
+
+        try:
+            TranslationProvider()
+            instantiated = True
+        except TypeError:
+            instantiated = False
+        assert not instantiated
+
+    asyncio.run(run())
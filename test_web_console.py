@@ -0,0 +1,82 @@
+"""
+اختبار معالج سجلات لوحة Console: الحلقة المحدودة لكل عميل، الفلاتر قبل الإضافة، وصفحات السجل،
+وتغيير مستويات السجلات (يتطلب DEBUG_TOKEN، والأنظمة الفرعية المعروفة فقط)
+"""
+import asyncio
+import logging
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+import debug_routes
+from hot_logging import SUBSYSTEMS, get_hot_log_levels, set_hot_log_level
+from web_console import ConsoleClient, ConsoleHandler, LogFilter, setup_console_routes
+
+
+def test_client_ring_filters_and_history():
+    """العميل البطيء يفقد الأقدم فقط ويُبلغ بالعدد، والفلاتر تُطبق قبل الإضافة"""
+    async def run():
+        handler = ConsoleHandler(maxlen=100)
+        log = logging.getLogger('console_test')
+        log.propagate = False
+        log.setLevel(logging.INFO)
+        log.addHandler(handler)
+        try:
+            client = ConsoleClient(LogFilter({'level': 'WARNING', 'task_id': '2'}), maxlen=3)
+            handler.clients.add(client)
+            for i in range(10):
+                log.warning("⚠️ [المهمة #%d] فشل %d", i % 2 + 1, i)
+            log.info("✅ [المهمة #2] تم")
+
+            await asyncio.wait_for(client.ready.wait(), 1)
+            messages = [entry.message for entry in client.drain()]
+            print(f"📺 {messages} (محذوف: {client.dropped})")
+            assert messages == ["⚠️ [المهمة #2] فشل 5", "⚠️ [المهمة #2] فشل 7", "⚠️ [المهمة #2] فشل 9"]
+            assert client.dropped == 2
+
+            page = handler.get_history(LogFilter({'q': 'فشل'}), limit=4)
+            assert [entry.message for entry in page][-1] == "⚠️ [المهمة #1] فشل 6"
+            older = handler.get_history(LogFilter({'q': 'فشل'}), before=page[-1].seq, limit=4)
+            assert [entry.message for entry in older][0] == "⚠️ [المهمة #2] فشل 5"
+        finally:
+            log.removeHandler(handler)
+
+    asyncio.run(run())
+
+
+def test_log_level_changes_require_token():
+    async def run():
+        app = web.Application()
+        setup_console_routes(app)
+        client = TestClient(TestServer(app))
+        await client.start_server()
+        original_token, original_level = debug_routes.DEBUG_TOKEN, get_hot_log_levels()['text']
+        try:
+            body = {'subsystem': 'text', 'level': 'DEBUG'}
+            debug_routes.DEBUG_TOKEN = ''
+            assert (await client.post('/console/log-levels', json=body)).status == 404
+            debug_routes.DEBUG_TOKEN = 'secret'
+            assert (await client.post('/console/log-levels', json=body)).status == 403
+
+            headers = {'X-Debug-Token': 'secret'}
+            rejected = [
+                {'subsystem': 'unknown_logger', 'level': 'DEBUG'},
+                {'subsystem': 'text', 'level': 10},
+                {'subsystem': 'text', 'level': 'LOUD'},
+                {'subsystem': 'text'},
+            ]
+            statuses = [(await client.post('/console/log-levels', json=data, headers=headers)).status for data in rejected]
+            assert statuses == [400, 400, 400, 400]
+            assert 'unknown_logger' not in get_hot_log_levels()
+
+            response = await client.post('/console/log-levels', json=body, headers=headers)
+            levels = await response.json()
+            print(f"🎚️ {levels}")
+            assert response.status == 200 and levels['text'] == 'DEBUG' and set(levels) == set(SUBSYSTEMS)
+            assert await (await client.get('/console/log-levels')).json() == levels
+        finally:
+            debug_routes.DEBUG_TOKEN = original_token
+            set_hot_log_level('text', original_level, notify=False)
+            await client.close()
+
+    asyncio.run(run())
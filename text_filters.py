@@ -1,6 +1,12 @@
+import logging
 import re
 from typing import Optional, Tuple, List, Dict
 
+from hot_logging import get_hot_logger
+
+# تفاصيل كل استبدال لكل هدف: تُنسق فقط عند تفعيل DEBUG لنظام text
+text_log = get_hot_logger('text')
+
 class TextFilters:
     @staticmethod
     def apply_whitelist(text: str, whitelist: List[str]) -> Tuple[bool, str]:
@@ -36,8 +42,9 @@ class TextFilters:
             return text, entities or []
 
         from entity_handler import EntityHandler
-        import logging
-        logger = logging.getLogger(__name__)
+
+        # التفاصيل لكل استبدال ولكل entity تُحسب فقط عند تفعيل DEBUG
+        verbose = text_log.enabled(logging.DEBUG)
 
         new_text = text
         new_entities = entities or []
@@ -54,23 +61,14 @@ class TextFilters:
             if not old_word:
                 continue
 
-            logger.info(f"🔄 محاولة استبدال '{old_word}' بـ '{new_word}'")
-            logger.info(f"   old_entities من الملف: {len(old_entities_data)} items")
-            logger.info(f"   new_entities من الملف: {len(new_entities_data)} items")
-            
-            if old_entities_data:
-                logger.info(f"   محتوى old_entities_data:")
-                for i, e in enumerate(old_entities_data):
-                    logger.info(f"      [{i}] type={e.get('type')}, offset={e.get('offset')}, length={e.get('length')}")
-            else:
-                logger.warning(f"   ⚠️ old_entities_data فارغة!")
-            
-            if new_entities_data:
-                logger.info(f"   محتوى new_entities_data:")
-                for i, e in enumerate(new_entities_data):
-                    logger.info(f"      [{i}] type={e.get('type')}, offset={e.get('offset')}, length={e.get('length')}")
-            else:
-                logger.warning(f"   ⚠️ new_entities_data فارغة!")
+            if verbose:
+                text_log.debug("🔄 محاولة استبدال '%s' بـ '%s'", old_word, new_word)
+                text_log.debug("   old_entities من الملف: %d items", len(old_entities_data))
+                text_log.debug("   new_entities من الملف: %d items", len(new_entities_data))
+                for label, entities_data in (('old', old_entities_data), ('new', new_entities_data)):
+                    for i, e in enumerate(entities_data):
+                        text_log.debug("      %s[%d] type=%s, offset=%s, length=%s",
+                                       label, i, e.get('type'), e.get('offset'), e.get('length'))
 
             # البحث عن جميع مواقع النص القديم
             old_word_lower = old_word.lower()
@@ -112,8 +110,9 @@ class TextFilters:
                 
                 diff = new_len_utf16 - old_len_utf16
 
-                logger.info(f"🔄 استبدال '{old_word}' بـ '{new_word}' في الموقع {pos} (UTF-16: {pos_utf16})")
-                logger.info(f"   📏 old_len_utf16={old_len_utf16}, new_len_utf16={new_len_utf16}, diff={diff}")
+                if verbose:
+                    text_log.debug("🔄 استبدال '%s' بـ '%s' في الموقع %d (UTF-16: %d)", old_word, new_word, pos, pos_utf16)
+                    text_log.debug("   📏 old_len_utf16=%d, new_len_utf16=%d, diff=%d", old_len_utf16, new_len_utf16, diff)
 
                 # استبدال النص
                 new_text = new_text[:pos] + new_word + new_text[pos + len(old_word):]
@@ -133,35 +132,42 @@ class TextFilters:
                     # إذا كانت entity قبل موقع الاستبدال، نحافظ عليها كما هي
                     if entity_end <= pos_utf16:
                         updated_entities.append(entity)
-                        logger.info(f"   ✓ حفظ entity قبل الاستبدال: type={entity['type']}, offset={entity_offset}")
+                        if verbose:
+                            text_log.debug("   ✓ حفظ entity قبل الاستبدال: type=%s, offset=%d", entity['type'], entity_offset)
                     # إذا كانت entity بعد موقع الاستبدال، نحرك offset
                     elif entity_offset >= pos_utf16 + old_len_utf16:
                         entity = entity.copy()
                         entity['offset'] += diff
                         updated_entities.append(entity)
-                        logger.info(f"   ↔️ تحريك entity بعد الاستبدال: type={entity['type']}, offset {entity_offset} → {entity['offset']}")
+                        if verbose:
+                            text_log.debug("   ↔️ تحريك entity بعد الاستبدال: type=%s, offset %d → %d",
+                                           entity['type'], entity_offset, entity['offset'])
                     else:
                         # entity تتقاطع مع النص المستبدل، نتجاهلها
-                        logger.info(f"   ✗ تجاهل entity متقاطعة: type={entity['type']}, offset={entity_offset}")
+                        if verbose:
+                            text_log.debug("   ✗ تجاهل entity متقاطعة: type=%s, offset=%d", entity['type'], entity_offset)
 
                 # إضافة entities الجديدة المحفوظة مع تعديل offset
                 if new_entities_data:
-                    logger.info(f"   📝 إضافة {len(new_entities_data)} entities جديدة")
+                    if verbose:
+                        text_log.debug("   📝 إضافة %d entities جديدة", len(new_entities_data))
                     for new_ent in new_entities_data:
                         new_ent_copy = new_ent.copy()
                         # offset الجديد = offset الأصلي + موقع الاستبدال (pos_utf16)
                         original_offset = new_ent_copy['offset']
                         new_ent_copy['offset'] = pos_utf16 + original_offset
                         updated_entities.append(new_ent_copy)
-                        logger.info(f"   ➕ إضافة entity: type={new_ent_copy['type']}, offset {original_offset} → {new_ent_copy['offset']}, length={new_ent_copy['length']}")
+                        if verbose:
+                            text_log.debug("   ➕ إضافة entity: type=%s, offset %d → %d, length=%d", new_ent_copy['type'],
+                                           original_offset, new_ent_copy['offset'], new_ent_copy['length'])
 
                 # ترتيب entities حسب offset
                 updated_entities.sort(key=lambda x: x['offset'])
                 new_entities = updated_entities
 
-            if replacements_made:
-                logger.info(f"✅ تم تطبيق {len(replacements_made)} استبدال لـ '{old_word}'")
-                logger.info(f"   📊 entities نهائية: {len(new_entities)}")
+            if replacements_made and verbose:
+                text_log.debug("✅ تم تطبيق %d استبدال لـ '%s'", len(replacements_made), old_word)
+                text_log.debug("   📊 entities نهائية: %d", len(new_entities))
 
         return new_text, new_entities
 
@@ -1,7 +1,11 @@
 import logging
 from typing import List, Dict, Optional
 
+from hot_logging import get_hot_logger
+
 logger = logging.getLogger(__name__)
+# يُستدعى لكل هدف: تفاصيل التنسيق تُنسق فقط عند تفعيل DEBUG لنظام text
+text_log = get_hot_logger('text')
 
 class TextFormatter:
     """
@@ -67,10 +71,10 @@ class TextFormatter:
             return text, entities
         
         if not text:
-            logger.info(f"ℹ️ لا يوجد نص للتنسيق")
+            text_log.debug("ℹ️ لا يوجد نص للتنسيق")
             return text, entities
         
-        logger.info(f"🎨 [TextFormatter] تطبيق تنسيق '{format_type}' على النص بالكامل")
+        text_log.debug("🎨 [TextFormatter] تطبيق تنسيق '%s' على النص بالكامل", format_type)
         
         # إذا كان التنسيق "عادي"، نزيل جميع التنسيقات
         if format_type == 'normal':
@@ -85,7 +89,7 @@ class TextFormatter:
         إزالة جميع التنسيقات من النص
         الحفاظ فقط على الـ entities المحمية (روابط، منشنات، إلخ)
         """
-        logger.info(f"🧹 [TextFormatter] إزالة جميع التنسيقات")
+        text_log.debug("🧹 [TextFormatter] إزالة جميع التنسيقات")
         
         protected_entities = []
         removed_count = 0
@@ -96,12 +100,12 @@ class TextFormatter:
             # الحفاظ على الـ entities المحمية
             if entity_type in TextFormatter.PROTECTED_TYPES:
                 protected_entities.append(entity)
-                logger.debug(f"   ✅ حماية entity: {entity_type}")
+                text_log.debug("   ✅ حماية entity: %s", entity_type)
             else:
                 removed_count += 1
-                logger.debug(f"   ❌ إزالة entity: {entity_type}")
+                text_log.debug("   ❌ إزالة entity: %s", entity_type)
         
-        logger.info(f"   📊 النتيجة: أزيلت {removed_count} entities، حُفظت {len(protected_entities)} entities")
+        text_log.debug("   📊 النتيجة: أزيلت %s entities، حُفظت %s entities", removed_count, len(protected_entities))
         
         return text, protected_entities
     
@@ -111,7 +115,7 @@ class TextFormatter:
         تطبيق تنسيق موحد على النص بالكامل
         يحول جميع الـ entities القابلة للتنسيق ويضيف تنسيق للأجزاء غير المنسقة
         """
-        logger.info(f"🎨 [TextFormatter] تطبيق تنسيق '{target_format}' على النص بالكامل")
+        text_log.debug("🎨 [TextFormatter] تطبيق تنسيق '%s' على النص بالكامل", target_format)
         
         # حساب طول النص بصيغة UTF-16
         text_length_utf16 = 0
@@ -133,7 +137,7 @@ class TextFormatter:
                 if entity_type in TextFormatter.PROTECTED_TYPES:
                     new_entities.append(entity)
                     protected_count += 1
-                    logger.debug(f"   ✅ حماية: {entity_type} at {entity.get('offset')}")
+                    text_log.debug("   ✅ حماية: %s at %s", entity_type, entity.get('offset'))
                 
                 elif entity_type in TextFormatter.FORMATTABLE_TYPES:
                     new_entity = entity.copy()
@@ -142,7 +146,7 @@ class TextFormatter:
                         new_entity['url'] = text_link_url
                     new_entities.append(new_entity)
                     converted_count += 1
-                    logger.debug(f"   🔄 تحويل: {entity_type} → {target_format} at {entity.get('offset')}")
+                    text_log.debug("   🔄 تحويل: %s → %s at %s", entity_type, target_format, entity.get('offset'))
                 
                 else:
                     new_entities.append(entity)
@@ -180,7 +184,7 @@ class TextFormatter:
                         'length': start - current_pos
                     })
                     gap_count += 1
-                    logger.debug(f"   ➕ فجوة: {current_pos}:{start}")
+                    text_log.debug("   ➕ فجوة: %s:%s", current_pos, start)
                 current_pos = max(current_pos, end)
             
             # فجوة في النهاية
@@ -194,9 +198,10 @@ class TextFormatter:
                     gap_entity['url'] = text_link_url
                 new_entities.append(gap_entity)
                 gap_count += 1
-                logger.debug(f"   ➕ فجوة نهائية: {current_pos}:{text_length_utf16}")
+                text_log.debug("   ➕ فجوة نهائية: %s:%s", current_pos, text_length_utf16)
             
-            logger.info(f"   📊 النتيجة: حُوّل {converted_count}، حُفظ {protected_count}، فجوات {gap_count}، المجموع {len(new_entities)}")
+            text_log.debug("   📊 النتيجة: حُوّل %s، حُفظ %s، فجوات %s، المجموع %s",
+                           converted_count, protected_count, gap_count, len(new_entities))
         
         else:
             # لا توجد entities، أضف تنسيق للنص بالكامل
@@ -208,7 +213,7 @@ class TextFormatter:
             if target_format == 'text_link' and text_link_url:
                 full_entity['url'] = text_link_url
             new_entities.append(full_entity)
-            logger.info(f"   ✅ تنسيق كامل: 0:{text_length_utf16}")
+            text_log.debug("   ✅ تنسيق كامل: 0:%s", text_length_utf16)
         
         return text, new_entities
     
@@ -217,7 +222,7 @@ class TextFormatter:
         """
         تحويل جميع التنسيقات القابلة للتحويل إلى التنسيق المطلوب
         """
-        logger.info(f"🔄 [TextFormatter] تحويل التنسيقات إلى '{target_format}'")
+        text_log.debug("🔄 [TextFormatter] تحويل التنسيقات إلى '%s'", target_format)
         
         converted_entities = []
         converted_count = 0
@@ -230,7 +235,7 @@ class TextFormatter:
             if entity_type in TextFormatter.PROTECTED_TYPES:
                 converted_entities.append(entity)
                 protected_count += 1
-                logger.debug(f"   ✅ حماية entity: {entity_type} at {entity.get('offset')}")
+                text_log.debug("   ✅ حماية entity: %s at %s", entity_type, entity.get('offset'))
             
             # تحويل الـ entities القابلة للتحويل
             elif entity_type in TextFormatter.FORMATTABLE_TYPES:
@@ -238,14 +243,15 @@ class TextFormatter:
                 new_entity['type'] = target_format
                 converted_entities.append(new_entity)
                 converted_count += 1
-                logger.debug(f"   🔄 تحويل: {entity_type} → {target_format} at {entity.get('offset')}")
+                text_log.debug("   🔄 تحويل: %s → %s at %s", entity_type, target_format, entity.get('offset'))
             
             # الـ entities الأخرى نتركها كما هي
             else:
                 converted_entities.append(entity)
-                logger.debug(f"   ➡️ ترك entity: {entity_type}")
+                text_log.debug("   ➡️ ترك entity: %s", entity_type)
         
-        logger.info(f"   📊 النتيجة: حُوّل {converted_count} entities، حُفظت {protected_count} entities، المجموع {len(converted_entities)} entities")
+        text_log.debug("   📊 النتيجة: حُوّل %s entities، حُفظت %s entities، المجموع %s entities",
+                       converted_count, protected_count, len(converted_entities))
         
         return text, converted_entities
     
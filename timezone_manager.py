@@ -1,13 +1,24 @@
 import logging
 import json
 import os
-from typing import Dict, List
+from functools import lru_cache
+from typing import Dict, List, Tuple
 from zoneinfo import ZoneInfo, available_timezones
 from datetime import datetime
 from config import USERS_DATA_DIR
 
 logger = logging.getLogger(__name__)
 
+# {مسار الملف: (وقت التعديل, المنطقة الزمنية)} - يُعاد قراءة الملف فقط عند تعديله
+_timezone_cache: Dict[str, Tuple[float, str]] = {}
+
+
+@lru_cache(maxsize=None)
+def get_zoneinfo(timezone: str) -> ZoneInfo:
+    """ZoneInfo مع cache (إنشاؤه يتطلب قراءة وتحليل ملف المنطقة)"""
+    return ZoneInfo(timezone)
+
+
 class TimezoneManager:
     """مدير المنطقة الزمنية للمستخدمين"""
     
@@ -58,9 +69,16 @@ class TimezoneManager:
             اسم المنطقة الزمنية (مثل 'Asia/Riyadh')
         """
         try:
+            mtime = os.stat(self.timezone_file).st_mtime
+            cached = _timezone_cache.get(self.timezone_file)
+            if cached and cached[0] == mtime:
+                return cached[1]
+            
             with open(self.timezone_file, 'r', encoding='utf-8') as f:
                 data = json.load(f)
-                return data.get('timezone', 'UTC')
+            timezone = data.get('timezone', 'UTC')
+            _timezone_cache[self.timezone_file] = (mtime, timezone)
+            return timezone
         except Exception as e:
             logger.error(f"❌ خطأ في قراءة المنطقة الزمنية: {e}")
             return 'UTC'
@@ -77,7 +95,7 @@ class TimezoneManager:
         """
         try:
             # التحقق من صحة المنطقة الزمنية
-            ZoneInfo(timezone)
+            get_zoneinfo(timezone)
             
             data = {
                 'timezone': timezone,
@@ -86,6 +104,9 @@ class TimezoneManager:
             
             with open(self.timezone_file, 'w', encoding='utf-8') as f:
                 json.dump(data, f, ensure_ascii=False, indent=2)
+            _timezone_cache.pop(self.timezone_file, None)
+            from schedule_gate import invalidate_schedule
+            invalidate_schedule(self.user_id)
             
             logger.info(f"✅ تم تعيين المنطقة الزمنية للمستخدم {self.user_id}: {timezone}")
             return True
@@ -102,8 +123,7 @@ class TimezoneManager:
             كائن datetime بالمنطقة الزمنية للمستخدم
         """
         timezone = self.get_timezone()
-        tz = ZoneInfo(timezone)
-        return datetime.now(tz)
+        return datetime.now(get_zoneinfo(timezone))
     
     def get_timezone_info(self) -> Dict:
         """
@@ -161,7 +181,7 @@ class TimezoneManager:
             True إذا كانت صالحة
         """
         try:
-            ZoneInfo(timezone)
+            get_zoneinfo(timezone)
             return True
         except Exception:
             return False
@@ -0,0 +1,197 @@
+"""
+تتبع مسار كل رسالة عبر مراحل التوزيع والمعالجة والإرسال
+كل تحديث وارد يحصل على trace id في contextvar، وتُسجَّل أزمنة كل مرحلة (span)
+لكل هدف، ويُحتفظ بأبطأ N مسارات لعرضها في Web Console
+"""
+import heapq
+import logging
+import random
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from config import TRACE_SAMPLE_RATE, TRACE_KEEP_SLOWEST
+
+logger = logging.getLogger(__name__)
+
+# المسار النشط في السياق الحالي (ينتقل تلقائياً للـ tasks المنشأة منه)
+current_trace: ContextVar[Optional['Trace']] = ContextVar('current_trace', default=None)
+
+
+class Span:
+    """مرحلة واحدة داخل مسار الرسالة"""
+    __slots__ = ('name', 'target', 'start', 'end')
+
+    def __init__(self, name: str, target, start: float, end: float):
+        self.name = name
+        self.target = target
+        self.start = start
+        self.end = end
+
+    def to_dict(self, origin: float) -> Dict:
+        return {
+            'name': self.name,
+            'target': self.target,
+            'start_ms': round((self.start - origin) * 1000, 3),
+            'duration_ms': round((self.end - self.start) * 1000, 3)
+        }
+
+
+class Trace:
+    """مسار رسالة واحدة من الاستقبال حتى آخر إرسال"""
+    __slots__ = ('trace_id', 'source_chat_id', 'message_id', 'started_at', 'start', 'end', 'spans', 'pending')
+
+    def __init__(self, source_chat_id: int, message_id: int):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.source_chat_id = source_chat_id
+        self.message_id = message_id
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.end = self.start
+        self.spans: List[Span] = []
+        # عدد المراحل التي ما زالت تعمل على الرسالة (ينتهي المسار عند الصفر)
+        self.pending = 0
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+    def add_span(self, name: str, start: float, end: float, target=None):
+        self.spans.append(Span(name, target, start, end))
+        if end > self.end:
+            self.end = end
+
+    def to_dict(self, include_spans: bool = True) -> Dict:
+        data = {
+            'trace_id': self.trace_id,
+            'source_chat_id': self.source_chat_id,
+            'message_id': self.message_id,
+            'started_at': self.started_at,
+            'duration_ms': round(self.duration * 1000, 3),
+            'num_spans': len(self.spans),
+        }
+        if include_spans:
+            data['spans'] = [span.to_dict(self.start) for span in self.spans]
+        return data
+
+
+class _SpanContext:
+    """context manager يسجل span في المسار عند الخروج"""
+    __slots__ = ('trace', 'name', 'target', 'start')
+
+    def __init__(self, trace: Trace, name: str, target):
+        self.trace = trace
+        self.name = name
+        self.target = target
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.trace.add_span(self.name, self.start, time.perf_counter(), self.target)
+        return False
+
+
+class _NoopSpan:
+    """span فارغ للرسائل غير المختارة في العينة - بدون أي تكلفة تقريباً"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """مدير المسارات: أخذ العينات وحفظ أبطأ N مسارات"""
+
+    def __init__(self, sample_rate: float = 0.05, keep_slowest: int = 50):
+        self.sample_rate = sample_rate
+        self.keep_slowest = keep_slowest
+        # min-heap من (المدة, رقم تسلسلي, trace) - أسرع مسار في القمة ليُستبدل أولاً
+        self._slowest: List = []
+        self._recent = deque(maxlen=keep_slowest)
+        self._counter = 0
+        self.finished_traces = 0
+
+    def set_sample_rate(self, sample_rate: float):
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        logger.info(f"🔍 نسبة عينات التتبع: {self.sample_rate * 100:.1f}%")
+
+    def start_trace(self, source_chat_id: int, message_id: int) -> Optional[Trace]:
+        """بدء مسار جديد لتحديث وارد (أو None إذا لم يُختر في العينة)"""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        trace = Trace(source_chat_id, message_id)
+        trace.pending = 1
+        return trace
+
+    def activate(self, trace: Optional[Trace]):
+        """تعيين المسار النشط في السياق الحالي"""
+        current_trace.set(trace)
+
+    def span(self, name: str, target=None):
+        """قياس مرحلة ضمن المسار النشط: with tracer.span('send', target_id): ..."""
+        trace = current_trace.get()
+        if trace is None:
+            return _NOOP_SPAN
+        return _SpanContext(trace, name, target)
+
+    def record(self, name: str, start: float, end: float, target=None, trace: Optional[Trace] = None):
+        """تسجيل span بأزمنة معروفة مسبقاً (مثل زمن الانتظار في قائمة)"""
+        trace = trace or current_trace.get()
+        if trace is not None:
+            trace.add_span(name, start, end, target)
+
+    def acquire(self, trace: Optional[Trace]):
+        """مرحلة جديدة بدأت العمل على الرسالة"""
+        if trace is not None:
+            trace.pending += 1
+
+    def release(self, trace: Optional[Trace]):
+        """انتهت مرحلة - عند انتهاء جميع المراحل يُحفظ المسار"""
+        if trace is None:
+            return
+        trace.pending -= 1
+        if trace.pending <= 0:
+            self._finish(trace)
+
+    def _finish(self, trace: Trace):
+        self.finished_traces += 1
+        self._counter += 1
+        self._recent.append(trace)
+        entry = (trace.duration, self._counter, trace)
+        if len(self._slowest) < self.keep_slowest:
+            heapq.heappush(self._slowest, entry)
+        elif entry[0] > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    def get_slowest(self) -> List[Trace]:
+        return [entry[2] for entry in sorted(self._slowest, key=lambda e: e[0], reverse=True)]
+
+    def get_recent(self) -> List[Trace]:
+        return list(reversed(self._recent))
+
+    def find(self, trace_id: str) -> Optional[Trace]:
+        for trace in list(self._recent) + [entry[2] for entry in self._slowest]:
+            if trace.trace_id == trace_id:
+                return trace
+        return None
+
+    def get_stats(self) -> Dict:
+        return {
+            'sample_rate': self.sample_rate,
+            'keep_slowest': self.keep_slowest,
+            'finished_traces': self.finished_traces,
+        }
+
+
+# مثيل عام
+tracer = Tracer(sample_rate=TRACE_SAMPLE_RATE, keep_slowest=TRACE_KEEP_SLOWEST)
@@ -0,0 +1,97 @@
+"""
+مراحل تحويل النص (روابط، استبدالات، هيدر/فوتر، تنسيق) كدوال نقية: نص + entities ← نص + entities
+تعمل داخل حلقة الأحداث أو في عمليات pipeline_offload. الوحدة خفيفة عمداً: عملية العمل تستورد هذه
+الوحدة فقط (بدون البوت أو المعالجات أو مديري الإعدادات والقوائم)
+"""
+import logging
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional, Tuple
+
+from entity_handler import EntityHandler
+from hot_logging import get_hot_logger
+from link_filters import LinkFilters
+from text_filters import TextFilters
+from text_formatter import TextFormatter
+
+text_log = get_hot_logger('text')
+
+
+def wrap_with_header_footer(text: str, entities: List[Dict],
+                            header: Optional[Dict], footer: Optional[Dict]) -> Tuple[str, List[Dict]]:
+    """إحاطة النص بالهيدر والفوتر بدمج كتل entities بإزاحات UTF-16
+
+    أطوال الهيدر/الفوتر محسوبة مسبقاً عند الحفظ (utf16_length)، وطول نص الرسالة
+    يُحسب مرة واحدة هنا؛ الإعدادات القديمة بدون الطول تُحسب عند الحاجة
+    """
+    blocks = []
+    parts = []
+    shift = 0
+
+    if header:
+        header_length = header.get('utf16_length')
+        if header_length is None:
+            header_length = EntityHandler.utf16_length(header['text'])
+        blocks.append((header.get('entities', []), 0))
+        parts.append(header['text'])
+        # الهيدر + سطر جديد
+        shift = header_length + 1
+
+    blocks.append((entities, shift))
+    parts.append(text)
+
+    if footer:
+        # النص الحالي + سطر جديد
+        shift += EntityHandler.utf16_length(text) + 1
+        blocks.append((footer.get('entities', []), shift))
+        parts.append(footer['text'])
+
+    return '\n'.join(parts), EntityHandler.splice_entities(blocks)
+
+
+def run_transform_stages(text: str, entities: List[Dict], stages: Tuple,
+                         stage_timer: Optional[Callable] = None) -> Tuple[bool, Optional[str], List[Dict], str]:
+    """تنفيذ خطة مراحل التحويل بنفس النتيجة داخل الحلقة أو في عملية منفصلة
+
+    stage_timer: مقياس زمن كل مرحلة داخل الحلقة (FILTER_STAGE_SECONDS.time)؛ عمليات العمل لا تقيس
+    """
+    for stage in stages:
+        name = stage[0]
+        with stage_timer(name) if stage_timer is not None else nullcontext():
+            if name == 'link_filter':
+                allowed, text, entities = LinkFilters.apply_link_filter(text, stage[1], entities, stage[2])
+                if not allowed:
+                    return False, None, [], text
+            elif name == 'replacements':
+                text, entities = TextFilters.apply_replacements(text, stage[1], entities)
+            elif name == 'header_footer':
+                text, entities = wrap_with_header_footer(text, entities, stage[1], stage[2])
+                text_log.debug("📋 بعد إضافة الهيدر/الفوتر: %d entities", len(entities))
+            elif name == 'text_format':
+                text_log.debug("🎨 [TextFormat] تطبيق تنسيق '%s' على النص النهائي", stage[1])
+                text_log.debug("   📊 قبل التنسيق: %d entities", len(entities) if entities else 0)
+                text, entities = TextFormatter.apply_format(text, entities, stage[1], stage[2])
+                text_log.debug("   📊 بعد التنسيق: %d entities", len(entities) if entities else 0)
+
+    return True, text, entities, ""
+
+
+# ========== عملية العمل (pipeline_offload) ==========
+
+def init_worker(log_level: int):
+    """تهيئة عملية العمل: إعداد السجلات وتسخين الأنماط المجمعة"""
+    logging.basicConfig(
+        level=log_level,
+        format='%(asctime)s - offload - %(name)s - %(levelname)s - %(message)s',
+        force=True
+    )
+    run_transform_stages(
+        "warmup https://t.me/example\nسطر عربي",
+        [{'type': 'bold', 'offset': 0, 'length': 6}],
+        (('link_filter', 'remove', None),
+         ('replacements', [{'old': 'سطر', 'new': 'نص'}]),
+         ('text_format', 'bold', ''))
+    )
+
+
+def run_in_worker(text: str, entities: Tuple[Dict, ...], stages: Tuple) -> Tuple[bool, Optional[str], List[Dict], str]:
+    return run_transform_stages(text, list(entities), stages)
@@ -0,0 +1,456 @@
+"""
+بوابة الترجمة: كل طلب لمزود الترجمة يمر من هنا مع مهلة لكل ترجمة، وقاطع دائرة
+يُفتح عند ارتفاع نسبة الأخطاء أو الطلبات البطيئة ثم يرسل طلبات تجريبية (half-open)،
+وطلب ثانٍ احتياطي اختياري بعد زمن p95. عند تعذر الترجمة تُرفع TranslationUnavailable
+ويقرر المستدعي: إرسال النص الأصلي أو تأجيل الرسالة (TRANSLATION_FALLBACK).
+الترجمات تُحفظ في LRU، والأجزاء المتعددة تُجمع في أقل عدد طلبات بالتوازي (translate_many)
+"""
+import abc
+import asyncio
+import hashlib
+import logging
+import random
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+
+from config import (
+    TRANSLATION_PROVIDER, TRANSLATION_TIMEOUT_SECONDS,
+    TRANSLATION_BREAKER_WINDOW, TRANSLATION_BREAKER_MIN_CALLS, TRANSLATION_BREAKER_FAILURE_RATE,
+    TRANSLATION_BREAKER_SLOW_SECONDS, TRANSLATION_BREAKER_OPEN_SECONDS,
+    TRANSLATION_HEDGE, TRANSLATION_FALLBACK, TRANSLATION_DEFER_MAX_SECONDS,
+    TRANSLATION_STUB_LATENCY_SECONDS, TRANSLATION_STUB_FAILURE_RATE,
+    TRANSLATION_PROVIDER_CONCURRENCY, TRANSLATION_CACHE_SIZE
+)
+from executors import translation_executor
+from metrics import TRANSLATION_SECONDS, TRANSLATION_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# أقل عدد طلبات ناجحة لحساب p95 قبل تفعيل الطلب الاحتياطي، وأقل تأخير له
+_HEDGE_MIN_SAMPLES = 20
+_HEDGE_MIN_DELAY = 0.05
+_LATENCY_SAMPLES = 200
+
+
+class TranslationUnavailable(Exception):
+    """المزود غير متاح (قاطع مفتوح، انتهاء المهلة، أو خطأ من المزود)"""
+
+    def __init__(self, reason: str, retry_after: float = 0.0):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class ProviderInputError(Exception):
+    """خطأ في المدخلات (لغة غير مدعومة، نص غير صالح) - لا يُحسب فشلاً للمزود"""
+
+
+# فاصل الأجزاء داخل طلب واحد: المزودون يحافظون على الأسطر، والأجزاء التي تحتوي على سطر جديد تُرسل منفردة
+_BATCH_DELIMITER = '\n'
+
+
+class TranslationCache:
+    """LRU للترجمات بمفتاح blake2b من (المصدر، الهدف، النص)"""
+
+    def __init__(self, max_entries: int = TRANSLATION_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.items: 'OrderedDict[bytes, str]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(text: str, source: str, target: str) -> bytes:
+        return hashlib.blake2b(f"{source}\x00{target}\x00{text}".encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+    def get(self, text: str, source: str, target: str) -> Optional[str]:
+        key = self._key(text, source, target)
+        cached = self.items.get(key)
+        if cached is None:
+            self.misses += 1
+            return None
+        self.items.move_to_end(key)
+        self.hits += 1
+        return cached
+
+    def put(self, text: str, source: str, target: str, translated: str):
+        self.items[self._key(text, source, target)] = translated
+        if len(self.items) > self.max_entries:
+            self.items.popitem(last=False)
+
+    def get_stats(self) -> Dict:
+        return {'entries': len(self.items), 'hits': self.hits, 'misses': self.misses}
+
+
+def _with_edges(original: str, translated: str) -> str:
+    """إعادة المسافات المحيطة بالجزء الأصلي حول ترجمته"""
+    core_start = len(original) - len(original.lstrip())
+    core_end = len(original.rstrip())
+    return original[:core_start] + translated + original[core_end:]
+
+
+def _pack_batches(cores: List[str], max_chars: int) -> List[List[str]]:
+    """تجميع الأجزاء بالترتيب في دفعات لا يتجاوز نصها المجمّع max_chars"""
+    batches: List[List[str]] = []
+    current: List[str] = []
+    size = 0
+    for core in cores:
+        if _BATCH_DELIMITER in core or len(core) >= max_chars:
+            batches.append([core])
+            continue
+        added = len(core) + (len(_BATCH_DELIMITER) if current else 0)
+        if current and size + added > max_chars:
+            batches.append(current)
+            current, size = [], 0
+            added = len(core)
+        current.append(core)
+        size += added
+    if current:
+        batches.append(current)
+    return batches
+
+
+# ========== المزودون ==========
+
+class TranslationProvider(abc.ABC):
+    """واجهة مزود الترجمة: دالة متزامنة تُنفذ في منفذ الترجمة"""
+    name = 'base'
+    # أقصى طول لنص طلب واحد (تُجمع الأجزاء في دفعات ضمنه)
+    max_chars = 5000
+
+    @abc.abstractmethod
+    def translate(self, text: str, source: str, target: str) -> str:
+        ...
+
+
+class GoogleTranslateProvider(TranslationProvider):
+    name = 'google'
+
+    def translate(self, text: str, source: str, target: str) -> str:
+        from deep_translator import GoogleTranslator
+        from deep_translator.exceptions import (
+            InvalidSourceOrTargetLanguage, LanguageNotSupportedException, NotValidLength, NotValidPayload
+        )
+
+        try:
+            return GoogleTranslator(source=source, target=target).translate(text)
+        except (InvalidSourceOrTargetLanguage, LanguageNotSupportedException, NotValidLength, NotValidPayload) as e:
+            raise ProviderInputError(str(e)) from e
+
+
+class StubTranslationProvider(TranslationProvider):
+    """مزود تجريبي بدون شبكة: "[target] النص" بعد زمن استجابة محدد ونسبة فشل عشوائية"""
+    name = 'stub'
+
+    def __init__(self, latency: float = TRANSLATION_STUB_LATENCY_SECONDS,
+                 failure_rate: float = TRANSLATION_STUB_FAILURE_RATE):
+        self.latency = latency
+        self.failure_rate = failure_rate
+
+    def translate(self, text: str, source: str, target: str) -> str:
+        time.sleep(self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise ConnectionError("stub provider failure")
+        return f"[{target}] {text}"
+
+
+_PROVIDERS = {
+    GoogleTranslateProvider.name: GoogleTranslateProvider,
+    StubTranslationProvider.name: StubTranslationProvider,
+}
+
+
+def create_provider(name: str) -> TranslationProvider:
+    provider_class = _PROVIDERS.get(name)
+    if provider_class is None:
+        logger.warning(f"⚠️ مزود ترجمة غير معروف '{name}' - استخدام google")
+        provider_class = GoogleTranslateProvider
+    return provider_class()
+
+
+# ========== قاطع الدائرة ==========
+
+class CircuitBreaker:
+    """closed ← open عند تجاوز نسبة الفشل في نافذة آخر الطلبات؛ بعد مدة الفتح half-open يسمح
+    بطلب تجريبي واحد: نجاحه يغلق القاطع وفشله يعيد فتحه"""
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, window: int = TRANSLATION_BREAKER_WINDOW, min_calls: int = TRANSLATION_BREAKER_MIN_CALLS,
+                 failure_rate: float = TRANSLATION_BREAKER_FAILURE_RATE,
+                 slow_seconds: float = TRANSLATION_BREAKER_SLOW_SECONDS,
+                 open_seconds: float = TRANSLATION_BREAKER_OPEN_SECONDS):
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_seconds = slow_seconds
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.times_opened = 0
+
+    def retry_after(self) -> float:
+        if self.state != self.OPEN:
+            return 0.0
+        return max(self.opened_at + self.open_seconds - time.monotonic(), 0.0)
+
+    def allow(self) -> bool:
+        """هل يُسمح بطلب الآن (كل طلب مسموح يجب أن يُتبع بـ record)"""
+        if self.state == self.OPEN:
+            if self.retry_after() > 0:
+                return False
+            self.state = self.HALF_OPEN
+            self.probe_in_flight = False
+            logger.info("🔌 قاطع الترجمة: half-open - إرسال طلب تجريبي")
+
+        if self.state == self.HALF_OPEN:
+            if self.probe_in_flight:
+                return False
+            self.probe_in_flight = True
+        return True
+
+    def record(self, ok: bool, elapsed: float):
+        failed = not ok or elapsed >= self.slow_seconds
+
+        if self.state == self.HALF_OPEN:
+            self.probe_in_flight = False
+            if failed:
+                self._open()
+            else:
+                self.state = self.CLOSED
+                self.outcomes.clear()
+                logger.info("✅ قاطع الترجمة: مغلق - المزود يعمل مجدداً")
+            return
+
+        if self.state == self.OPEN:
+            # طلب بدأ قبل الفتح وانتهى بعده
+            return
+
+        self.outcomes.append(failed)
+        if len(self.outcomes) >= self.min_calls and self.current_failure_rate() >= self.failure_rate:
+            self._open()
+
+    def current_failure_rate(self) -> float:
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+        logger.warning(
+            f"🔌 قاطع الترجمة: مفتوح لمدة {self.open_seconds:.0f}s "
+            f"(نسبة الفشل {self.current_failure_rate() * 100:.0f}%)"
+        )
+
+
+# ========== البوابة ==========
+
+class TranslationGateway:
+    def __init__(self, provider: TranslationProvider, breaker: Optional[CircuitBreaker] = None,
+                 timeout: float = TRANSLATION_TIMEOUT_SECONDS, hedge: bool = TRANSLATION_HEDGE,
+                 concurrency: int = TRANSLATION_PROVIDER_CONCURRENCY):
+        self.provider = provider
+        self.breaker = breaker or CircuitBreaker()
+        self.timeout = timeout
+        self.hedge = hedge
+        self.latencies: Deque[float] = deque(maxlen=_LATENCY_SAMPLES)
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.batch_mismatches = 0
+        self.concurrency = asyncio.Semaphore(concurrency)
+        self.cache = TranslationCache()
+        self.in_flight: Dict[bytes, asyncio.Task] = {}
+        self.coalesced = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        """تأخير الطلب الاحتياطي = p95 لآخر الطلبات الناجحة (None قبل توفر عينات كافية)"""
+        if not self.hedge or len(self.latencies) < _HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return max(ordered[int(0.95 * (len(ordered) - 1))], _HEDGE_MIN_DELAY)
+
+    async def _call(self, text: str, source: str, target: str) -> str:
+        started = time.monotonic()
+        result = await translation_executor.run(self.provider.translate, text, source, target)
+        self.latencies.append(time.monotonic() - started)
+        return result
+
+    async def _hedged(self, text: str, source: str, target: str) -> str:
+        first = asyncio.ensure_future(self._call(text, source, target))
+        hedge = None
+        attempts = {first}
+        try:
+            delay = self.hedge_delay()
+            if delay is not None:
+                done, _ = await asyncio.wait(attempts, timeout=delay)
+                if not done:
+                    self.hedges += 1
+                    TRANSLATION_REQUESTS.inc('hedge')
+                    hedge = asyncio.ensure_future(self._call(text, source, target))
+                    attempts.add(hedge)
+
+            error: Optional[BaseException] = None
+            while attempts:
+                done, attempts = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        if attempt is hedge:
+                            self.hedge_wins += 1
+                        return attempt.result()
+                    error = attempt.exception()
+            raise error
+        finally:
+            # الطلب الخاسر يكمل في خيطه لكن نتيجته تُهمل
+            for attempt in attempts:
+                attempt.cancel()
+
+    async def _request(self, text: str, source: str, target: str) -> str:
+        """طلب واحد للمزود؛ TranslationUnavailable عند تعذر الترجمة، و ProviderInputError لأخطاء المدخلات"""
+        if not self.breaker.allow():
+            TRANSLATION_REQUESTS.inc('open')
+            raise TranslationUnavailable("قاطع الترجمة مفتوح", self.breaker.retry_after())
+
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(self._hedged(text, source, target), self.timeout)
+        except ProviderInputError:
+            self.breaker.record(True, time.monotonic() - started)
+            TRANSLATION_REQUESTS.inc('error')
+            raise
+        except asyncio.TimeoutError:
+            self.breaker.record(False, time.monotonic() - started)
+            TRANSLATION_REQUESTS.inc('timeout')
+            raise TranslationUnavailable(f"انتهت مهلة الترجمة ({self.timeout:.0f}s)", self.breaker.retry_after())
+        except asyncio.CancelledError:
+            self.breaker.record(False, time.monotonic() - started)
+            raise
+        except Exception as e:
+            self.breaker.record(False, time.monotonic() - started)
+            TRANSLATION_REQUESTS.inc('error')
+            raise TranslationUnavailable(f"خطأ من مزود الترجمة: {e}", self.breaker.retry_after()) from e
+
+        elapsed = time.monotonic() - started
+        self.breaker.record(True, elapsed)
+        TRANSLATION_SECONDS.observe(elapsed)
+        TRANSLATION_REQUESTS.inc('ok')
+        return result
+
+    async def _translate_uncached(self, text: str, source: str, target: str) -> str:
+        async with self.concurrency:
+            result = await self._request(text, source, target)
+        self.cache.put(text, source, target, result)
+        return result
+
+    def _forget(self, key: bytes, task: asyncio.Task):
+        if self.in_flight.get(key) is task:
+            del self.in_flight[key]
+        # الفشل لا يُحفظ (المحاولة التالية قد تنجح)، ويُعلم كمُسترجع إذا أُلغي جميع المنتظرين
+        if not task.cancelled():
+            task.exception()
+
+    async def translate(self, text: str, source: str, target: str) -> str:
+        """ترجمة نص واحد (نفس النص لكل الأهداف يُترجم مرة واحدة: من الـ cache، أو بانتظار
+        الطلب الجاري لنفس المفتاح بدلاً من طلب جديد للمزود)"""
+        cached = self.cache.get(text, source, target)
+        if cached is not None:
+            return cached
+
+        key = self.cache._key(text, source, target)
+        pending = self.in_flight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+        else:
+            # مهمة مستقلة: إلغاء المستدعي الأول (مهلة التوجيه) لا يلغي الترجمة للبقية
+            pending = asyncio.ensure_future(self._translate_uncached(text, source, target))
+            self.in_flight[key] = pending
+            pending.add_done_callback(lambda task: self._forget(key, task))
+        return await asyncio.shield(pending)
+
+    async def translate_many(self, fragments: List[str], source: str, target: str) -> List[str]:
+        """ترجمة عدة أجزاء بأقل عدد طلبات: الأجزاء غير الموجودة في الـ cache تُجمع في دفعات
+        (مفصولة بسطر جديد، بحد المزود للأحرف) تُرسل بالتوازي ثم تُقسم من جديد
+
+        المسافات في طرفي كل جزء تُحفظ وتُعاد كما هي؛ الجزء الذي فشلت ترجمته يبقى بدون ترجمة،
+        و TranslationUnavailable تُرفع إذا تعذرت الترجمة
+        """
+        results: List[Optional[str]] = [None] * len(fragments)
+        # النص المجرد ← مواقعه (الأجزاء المكررة تُترجم مرة واحدة)
+        pending: Dict[str, List[int]] = {}
+        for index, fragment in enumerate(fragments):
+            core = fragment.strip()
+            if not core:
+                results[index] = fragment
+                continue
+            cached = self.cache.get(core, source, target)
+            if cached is not None:
+                results[index] = _with_edges(fragment, cached)
+            else:
+                pending.setdefault(core, []).append(index)
+
+        batches = _pack_batches(list(pending), self.provider.max_chars)
+        outcomes = await asyncio.gather(
+            *(self._translate_batch(batch, source, target) for batch in batches),
+            return_exceptions=True
+        )
+
+        for batch, outcome in zip(batches, outcomes):
+            if isinstance(outcome, TranslationUnavailable):
+                raise outcome
+            if isinstance(outcome, BaseException):
+                logger.warning(f"⚠️ فشلت ترجمة دفعة من {len(batch)} جزء: {outcome}")
+                outcome = batch
+            for core, translated in zip(batch, outcome):
+                for index in pending[core]:
+                    results[index] = _with_edges(fragments[index], translated)
+        return results
+
+    async def _translate_batch(self, batch: List[str], source: str, target: str) -> List[str]:
+        if len(batch) == 1:
+            return [await self.translate(batch[0], source, target)]
+
+        async with self.concurrency:
+            joined = await self._request(_BATCH_DELIMITER.join(batch), source, target)
+        parts = joined.split(_BATCH_DELIMITER)
+        if len(parts) != len(batch):
+            # المزود دمج أو قسم الأسطر - ترجمة كل جزء على حدة
+            logger.warning(f"⚠️ عدد الأجزاء بعد الترجمة ({len(parts)}) لا يطابق الدفعة ({len(batch)}) - ترجمة منفصلة")
+            self.batch_mismatches += 1
+            return list(await asyncio.gather(*(self.translate(core, source, target) for core in batch)))
+
+        parts = [part.strip() for part in parts]
+        for core, translated in zip(batch, parts):
+            self.cache.put(core, source, target, translated)
+        return parts
+
+    def get_stats(self) -> Dict:
+        return {
+            'provider': self.provider.name,
+            'state': self.breaker.state,
+            'failure_rate': round(self.breaker.current_failure_rate(), 3),
+            'retry_after': round(self.breaker.retry_after(), 1),
+            'times_opened': self.breaker.times_opened,
+            'hedge_delay': self.hedge_delay(),
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'batch_mismatches': self.batch_mismatches,
+            'coalesced': self.coalesced,
+            'cache': self.cache.get_stats(),
+        }
+
+
+def deferral_window(message_date: Optional[datetime], error: TranslationUnavailable) -> Optional[Tuple[int, int]]:
+    """نافذة إعادة المحاولة (فتح, إغلاق) لوضع التأجيل، أو None للإرسال بدون ترجمة
+    (الوضع untranslated، أو الرسالة أقدم من الحد الأقصى للتأجيل)"""
+    if TRANSLATION_FALLBACK != 'defer':
+        return None
+    now = time.time()
+    if message_date is not None and now - message_date.timestamp() > TRANSLATION_DEFER_MAX_SECONDS:
+        return None
+    opens_at = now + max(error.retry_after, 5.0)
+    return int(opens_at), int(opens_at + TRANSLATION_BREAKER_OPEN_SECONDS)
+
+
+# البوابة المشتركة
+translation_gateway = TranslationGateway(create_provider(TRANSLATION_PROVIDER))
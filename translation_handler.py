@@ -1,7 +1,10 @@
 import logging
 from typing import Dict, List, Tuple, Optional
-from deep_translator import GoogleTranslator, single_detection
+from deep_translator import single_detection
 from deep_translator.constants import GOOGLE_LANGUAGES_TO_CODES
+from script_histogram import ScriptHistogram
+from language_detection import language_detector
+from translation_gateway import translation_gateway, TranslationUnavailable
 
 logger = logging.getLogger(__name__)
 
@@ -56,63 +59,34 @@ class TranslationHandler:
                 source_lang = 'zh-CN'
             
             # كشف اللغة المصدر إذا كان source_lang='auto'
+            # (نظام الكتابة عندما يكون حاسماً، وإلا langdetect مرة واحدة لكل نص لجميع الأهداف)
             detected_lang = source_lang
             if source_lang == 'auto':
                 try:
-                    from langdetect import detect
-                    import asyncio
-                    loop = asyncio.get_event_loop()
-                    detected_lang = await loop.run_in_executor(
-                        None,
-                        detect,
-                        text
-                    )
+                    detected_lang = await language_detector.detect(text) or 'auto'
                     logger.info(f"🔍 تم كشف اللغة: {detected_lang}")
                 except Exception as e:
                     logger.warning(f"⚠️ فشل كشف اللغة، سيتم استخدام 'auto': {e}")
                     detected_lang = 'auto'
             
-            # إذا طُلب تقسيم النص، نقسمه ونترجم كل جزء على حدة
+            # إذا طُلب تقسيم النص، نقسمه ونترجم الأجزاء في أقل عدد طلبات (دفعات متوازية)
             if split_by_sentence:
                 import re
                 # تقسيم النص على الجمل والمسافات الكبيرة
                 sentences = re.split(r'([.!?،؛\n]+)', text)
-                translated_parts = []
                 
-                import asyncio
-                loop = asyncio.get_event_loop()
-                translator = GoogleTranslator(source=source_lang, target=target_lang)
-                
-                for part in sentences:
-                    if part.strip():
-                        try:
-                            translated_part = await loop.run_in_executor(
-                                None,
-                                translator.translate,
-                                part
-                            )
-                            translated_parts.append(translated_part)
-                        except:
-                            translated_parts.append(part)  # في حالة الفشل، نستخدم الأصلي
-                    else:
-                        translated_parts.append(part)
-                
-                translated_text = ''.join(translated_parts)
-            else:
-                # الترجمة العادية - تشغيل في executor لأن deep-translator ليس async
-                import asyncio
-                loop = asyncio.get_event_loop()
-                
-                # استخدام GoogleTranslator من deep-translator
-                translator = GoogleTranslator(source=source_lang, target=target_lang)
-                
-                result = await loop.run_in_executor(
-                    None,
-                    translator.translate,
-                    text
+                # الأجزاء بدون حروف أو المكتوبة أصلاً باللغة الهدف تبقى كما هي
+                indices = [i for i, part in enumerate(sentences) if self._needs_translation(part, target_lang)]
+                translated_parts = await translation_gateway.translate_many(
+                    [sentences[i] for i in indices], source_lang, target_lang
                 )
+                for i, translated_part in zip(indices, translated_parts):
+                    sentences[i] = translated_part
                 
-                translated_text = result
+                translated_text = ''.join(sentences)
+            else:
+                # الترجمة العادية عبر بوابة الترجمة (مهلة + قاطع دائرة + طلب احتياطي)
+                translated_text = await translation_gateway.translate(text, source_lang, target_lang)
             
             logger.info(
                 f"✅ تمت الترجمة من {detected_lang} إلى {target_lang}: "
@@ -121,10 +95,24 @@ class TranslationHandler:
             
             return True, translated_text, detected_lang
             
+        except TranslationUnavailable:
+            # قرار الإرسال بدون ترجمة أو التأجيل للمستدعي
+            raise
         except Exception as e:
             logger.error(f"❌ خطأ في الترجمة: {e}")
             return False, None, None
     
+    @staticmethod
+    def _needs_translation(part: str, target_lang: str) -> bool:
+        """هل يحتاج جزء من النص للترجمة (نفس حد الـ 95% المستخدم في process_translation)"""
+        histogram = ScriptHistogram(part)
+        if histogram.dominant_script()[0] is None:
+            # أرقام وعلامات ترقيم ورموز فقط
+            return False
+        if ScriptHistogram.supports(target_lang) and histogram.language_ratio(target_lang) >= 0.95:
+            return False
+        return True
+    
     async def translate_with_entities(
         self,
         text: str,
@@ -201,6 +189,8 @@ class TranslationHandler:
             
             return True, translated_text, new_entities, detected_lang
             
+        except TranslationUnavailable:
+            raise
         except Exception as e:
             logger.error(f"❌ خطأ في الترجمة مع entities: {e}")
             # في حالة الفشل، نرجع الترجمة العادية بدون entities
@@ -1,27 +1,178 @@
-
 from aiohttp import web
 import logging
+import re
+import time
+import itertools
 from collections import deque
+from typing import Deque, Dict, List, Optional
 import asyncio
+from tracing import tracer
+from hot_logging import SUBSYSTEMS, get_hot_log_levels, set_hot_log_level
+from debug_routes import debug_only
+from loop_monitor import loop_monitor
+from config import CONSOLE_HISTORY_SIZE, CONSOLE_CLIENT_BUFFER, CONSOLE_HISTORY_PAGE_SIZE
+
+# رقم المهمة داخل نص السجل ("[المهمة #12]" أو "[User:1 Task:3]")
+_TASK_ID_PATTERN = re.compile(r'(?:المهمة #|Task:)\s*(\d+)')
+
+
+# معاملات آمنة للتنسيق المؤجل (لا تتغير بعد التسجيل)
+_IMMUTABLE_ARGS = (str, int, float, bool, type(None))
+
+
+class LogEntry:
+    """سجل مخزن بدون تنسيق: الرسالة تُبنى (msg % args) عند أول قراءة فقط
+
+    المعاملات القابلة للتغيير (قوائم، قواميس، كائنات) تُنسق فوراً حتى يظهر السجل كما كان لحظة كتابته
+    """
+    __slots__ = ('seq', 'created', 'levelno', 'levelname', 'name', 'msg', 'args', 'exc_text', 'task_id', '_message')
+
+    def __init__(self, seq: int, record: logging.LogRecord, exc_text: Optional[str]):
+        self.seq = seq
+        self.created = record.created
+        self.levelno = record.levelno
+        self.levelname = record.levelname
+        self.name = record.name
+        self.msg = record.msg
+        self.args = record.args
+        self.exc_text = exc_text
+        self.task_id = getattr(record, 'task_id', None)
+        self._message = None
+        if self.args and not (isinstance(self.args, tuple) and all(isinstance(arg, _IMMUTABLE_ARGS) for arg in self.args)):
+            self._format_message()
+
+    def _format_message(self) -> str:
+        try:
+            message = str(self.msg) % self.args if self.args else str(self.msg)
+        except Exception:
+            message = f"{self.msg} {self.args}"
+        if self.exc_text:
+            message = f"{message}\n{self.exc_text}"
+        self._message = message
+        return message
+
+    @property
+    def message(self) -> str:
+        return self._message if self._message is not None else self._format_message()
+
+    def get_task_id(self) -> Optional[int]:
+        if self.task_id is None:
+            match = _TASK_ID_PATTERN.search(self.message)
+            self.task_id = int(match.group(1)) if match else 0
+        return self.task_id or None
+
+    def render(self) -> str:
+        clock = time.strftime('%H:%M:%S', time.localtime(self.created))
+        return f"{clock} - {self.name} - {self.levelname} - {self.message}"
+
+    def to_dict(self) -> Dict:
+        return {
+            'seq': self.seq,
+            'time': self.created,
+            'level': self.levelname,
+            'logger': self.name,
+            'message': self.message,
+        }
+
+
+class LogFilter:
+    """فلتر من معاملات الطلب: level (أدنى مستوى)، logger (بادئة الاسم)، task_id، q (نص جزئي)"""
+    __slots__ = ('min_level', 'logger', 'task_id', 'query')
+
+    def __init__(self, query: Dict[str, str]):
+        level = logging.getLevelName(query.get('level', '').upper()) if query.get('level') else 0
+        self.min_level = level if isinstance(level, int) else 0
+        self.logger = query.get('logger') or None
+        task_id = query.get('task_id', '')
+        self.task_id = int(task_id) if task_id.isdigit() else None
+        self.query = (query.get('q') or '').lower() or None
+
+    def matches(self, entry: LogEntry) -> bool:
+        # الفحوص الرخيصة أولاً؛ تنسيق الرسالة فقط عند الحاجة لفلتر المهمة أو النص
+        if entry.levelno < self.min_level:
+            return False
+        if self.logger and not entry.name.startswith(self.logger):
+            return False
+        if self.task_id is not None and entry.get_task_id() != self.task_id:
+            return False
+        if self.query and self.query not in entry.message.lower():
+            return False
+        return True
+
+
+class ConsoleClient:
+    """عميل SSE: حلقة محدودة تحذف الأقدم عند الامتلاء وتعد المحذوف
+
+    emit قد تُستدعى من أي خيط (المنفذات تسجل أيضاً) فالإيقاظ عبر call_soon_threadsafe
+    ومرة واحدة فقط حتى يقرأ العميل
+    """
+
+    def __init__(self, log_filter: LogFilter, maxlen: int = CONSOLE_CLIENT_BUFFER):
+        self.filter = log_filter
+        self.ring: Deque[LogEntry] = deque(maxlen=maxlen)
+        self.dropped = 0
+        self.loop = asyncio.get_running_loop()
+        self.ready = asyncio.Event()
+        self.wakeup_pending = False
+
+    def offer(self, entry: LogEntry):
+        if not self.filter.matches(entry):
+            return
+        if len(self.ring) == self.ring.maxlen:
+            self.dropped += 1
+        self.ring.append(entry)
+        if not self.wakeup_pending:
+            self.wakeup_pending = True
+            self.loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        self.wakeup_pending = False
+        self.ready.set()
+
+    def drain(self) -> List[LogEntry]:
+        entries = []
+        while self.ring:
+            entries.append(self.ring.popleft())
+        return entries
+
 
 class ConsoleHandler(logging.Handler):
-    def __init__(self, maxlen=1000):
+    def __init__(self, maxlen=CONSOLE_HISTORY_SIZE):
         super().__init__()
-        self.logs = deque(maxlen=maxlen)
+        self.logs: Deque[LogEntry] = deque(maxlen=maxlen)
         self.clients = set()
+        self.sequence = itertools.count(1)
         
     def emit(self, record):
-        log_entry = self.format(record)
-        self.logs.append(log_entry)
-        
-        for client in self.clients.copy():
-            try:
-                client.put_nowait(log_entry)
-            except:
-                self.clients.discard(client)
+        try:
+            # تتبع الاستثناء يُنسق الآن (لا يُحتفظ بالإطارات)، والرسالة عند القراءة
+            exc_text = None
+            if record.exc_info:
+                exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            entry = LogEntry(next(self.sequence), record, exc_text)
+            self.logs.append(entry)
+
+            for client in self.clients.copy():
+                try:
+                    client.offer(entry)
+                except RuntimeError:
+                    # حلقة العميل أُغلقت
+                    self.clients.discard(client)
+        except Exception:
+            self.handleError(record)
     
-    def get_all_logs(self):
-        return list(self.logs)
+    def get_history(self, log_filter: LogFilter, before: Optional[int] = None,
+                    limit: int = CONSOLE_HISTORY_PAGE_SIZE) -> List[LogEntry]:
+        """صفحة من السجل (الأحدث أولاً) قبل الرقم التسلسلي before"""
+        page = []
+        for entry in reversed(self.logs.copy()):
+            if before is not None and entry.seq >= before:
+                continue
+            if log_filter.matches(entry):
+                page.append(entry)
+                if len(page) >= limit:
+                    break
+        return page
 
 console_handler = ConsoleHandler()
 
@@ -100,6 +251,18 @@ async def console_page(request):
             .log-debug {
                 color: #9cdcfe;
             }
+            .filters {
+                margin-bottom: 10px;
+            }
+            .filters input, .filters select, .filters button {
+                background: #2d2d30;
+                color: #d4d4d4;
+                border: 1px solid #3c3c3c;
+                padding: 5px;
+            }
+            #dropped {
+                color: #ce9178;
+            }
             .status {
                 display: inline-block;
                 width: 10px;
@@ -119,16 +282,35 @@ async def console_page(request):
         <div class="header">
             <h1>🖥️ لوحة عرض Console</h1>
             <div>
+                <span id="levels"></span>
                 <span class="status"></span>
                 <button class="clear-btn" onclick="clearConsole()">مسح السجل</button>
             </div>
         </div>
+        <div class="filters">
+            <select id="f-level">
+                <option value="">كل المستويات</option>
+                <option value="INFO">INFO+</option>
+                <option value="WARNING">WARNING+</option>
+                <option value="ERROR">ERROR+</option>
+            </select>
+            <input id="f-logger" placeholder="logger (بادئة)">
+            <input id="f-task" placeholder="task_id" size="6">
+            <input id="f-q" placeholder="بحث في النص">
+            <button onclick="applyFilters()">تطبيق</button>
+            <button onclick="loadOlder()">تحميل الأقدم</button>
+            <span id="dropped"></span>
+        </div>
         <div class="console" id="console"></div>
         
         <script>
             const consoleDiv = document.getElementById('console');
             
-            function addLog(text) {
+            let filterQuery = '';
+            let nextBefore = null;
+            let stream = null;
+            
+            function logElement(text) {
                 const entry = document.createElement('div');
                 entry.className = 'log-entry';
                 
@@ -143,7 +325,11 @@ async def console_page(request):
                 }
                 
                 entry.textContent = text;
-                consoleDiv.appendChild(entry);
+                return entry;
+            }
+            
+            function addLog(text) {
+                consoleDiv.appendChild(logElement(text));
                 consoleDiv.scrollTop = consoleDiv.scrollHeight;
             }
             
@@ -151,40 +337,104 @@ async def console_page(request):
                 consoleDiv.innerHTML = '';
             }
             
+            // مستويات سجلات المسار الساخن لكل نظام فرعي (تُغيّر أثناء التشغيل)
+            const debugToken = new URLSearchParams(location.search).get('token') || '';
+            function renderLevels(levels) {
+                const container = document.getElementById('levels');
+                container.innerHTML = '';
+                Object.entries(levels).forEach(([subsystem, level]) => {
+                    const select = document.createElement('select');
+                    ['DEBUG', 'INFO', 'WARNING', 'ERROR'].forEach(name => {
+                        const option = document.createElement('option');
+                        option.value = name;
+                        option.textContent = `${subsystem}: ${name}`;
+                        option.selected = name === level;
+                        select.appendChild(option);
+                    });
+                    // التغيير يتطلب رمز التشخيص: /console?token=...
+                    select.onchange = () => fetch('/console/log-levels', {
+                        method: 'POST',
+                        headers: {'Content-Type': 'application/json', 'X-Debug-Token': debugToken},
+                        body: JSON.stringify({subsystem: subsystem, level: select.value})
+                    }).then(async response => {
+                        const data = await response.json();
+                        if (response.ok) return renderLevels(data);
+                        addLog(`❌ تعذر تغيير مستوى ${subsystem}: ${data.error}`);
+                        fetch('/console/log-levels').then(response => response.json()).then(renderLevels);
+                    });
+                    container.appendChild(select);
+                });
+            }
+            
+            fetch('/console/log-levels').then(response => response.json()).then(renderLevels);
+            
+            function buildQuery() {
+                const params = new URLSearchParams();
+                const fields = {level: 'f-level', logger: 'f-logger', task_id: 'f-task', q: 'f-q'};
+                Object.entries(fields).forEach(([name, id]) => {
+                    const value = document.getElementById(id).value.trim();
+                    if (value) params.set(name, value);
+                });
+                return params.toString();
+            }
+            
             async function connectSSE() {
+                const controller = new AbortController();
+                stream = controller;
                 try {
-                    const response = await fetch('/console/stream');
+                    const response = await fetch('/console/stream?' + filterQuery, {signal: controller.signal});
                     const reader = response.body.getReader();
                     const decoder = new TextDecoder();
+                    let buffer = '';
                     
                     while (true) {
                         const {value, done} = await reader.read();
                         if (done) break;
                         
-                        const text = decoder.decode(value);
-                        const lines = text.split('\\n\\n');
+                        // الحدث قد يصل مقسماً على عدة قراءات
+                        buffer += decoder.decode(value, {stream: true});
+                        const events = buffer.split('\\n\\n');
+                        buffer = events.pop();
                         
-                        for (let line of lines) {
-                            if (line.startsWith('data: ')) {
-                                const log = line.substring(6);
-                                if (log.trim()) {
-                                    addLog(log);
-                                }
+                        for (let event of events) {
+                            const lines = event.split('\\n');
+                            const data = lines.filter(line => line.startsWith('data: ')).map(line => line.substring(6)).join('\\n');
+                            if (lines[0] === 'event: dropped') {
+                                document.getElementById('dropped').textContent = `⚠️ سجلات محذوفة (عميل بطيء): ${data}`;
+                            } else if (data.trim()) {
+                                addLog(data);
                             }
                         }
                     }
                 } catch (error) {
+                    if (controller.signal.aborted) return;
                     console.error('Connection error:', error);
                     setTimeout(connectSSE, 3000);
                 }
             }
             
-            fetch('/console/history')
-                .then(response => response.json())
-                .then(logs => {
-                    logs.forEach(log => addLog(log));
-                    connectSSE();
-                });
+            async function loadOlder() {
+                if (nextBefore === null) return;
+                const response = await fetch(`/console/history?before=${nextBefore}&${filterQuery}`);
+                const page = await response.json();
+                nextBefore = page.next_before;
+                // الصفحة مرتبة من الأحدث للأقدم
+                page.entries.forEach(entry => consoleDiv.insertBefore(logElement(entry.text), consoleDiv.firstChild));
+            }
+            
+            async function applyFilters() {
+                if (stream) stream.abort();
+                filterQuery = buildQuery();
+                clearConsole();
+                document.getElementById('dropped').textContent = '';
+                const response = await fetch('/console/history?' + filterQuery);
+                const page = await response.json();
+                nextBefore = page.next_before;
+                page.entries.reverse().forEach(entry => addLog(entry.text));
+                connectSSE();
+            }
+            
+            applyFilters();
         </script>
     </body>
     </html>
@@ -192,8 +442,19 @@ async def console_page(request):
     return web.Response(text=html, content_type='text/html')
 
 async def console_history(request):
-    logs = console_handler.get_all_logs()
-    return web.json_response(logs)
+    """صفحات السجل: ?before=<seq>&limit=N مع نفس فلاتر البث (level, logger, task_id, q)"""
+    before = request.query.get('before', '')
+    limit = request.query.get('limit', '')
+    page = console_handler.get_history(
+        LogFilter(request.query),
+        int(before) if before.isdigit() else None,
+        min(int(limit), CONSOLE_HISTORY_SIZE) if limit.isdigit() and int(limit) > 0 else CONSOLE_HISTORY_PAGE_SIZE
+    )
+    return web.json_response({
+        'entries': [dict(entry.to_dict(), text=entry.render()) for entry in page],
+        # رقم الصفحة التالية (الأقدم)، None عند الوصول لبداية السجل المحفوظ
+        'next_before': page[-1].seq if page else None,
+    })
 
 async def console_stream(request):
     response = web.StreamResponse()
@@ -202,21 +463,325 @@ async def console_stream(request):
     response.headers['Connection'] = 'keep-alive'
     await response.prepare(request)
     
-    queue = asyncio.Queue()
-    console_handler.clients.add(queue)
+    client = ConsoleClient(LogFilter(request.query))
+    console_handler.clients.add(client)
+    reported_dropped = 0
     
     try:
         while True:
-            log_entry = await queue.get()
-            await response.write(f'data: {log_entry}\n\n'.encode('utf-8'))
+            await client.ready.wait()
+            client.ready.clear()
+            # التنسيق هنا فقط - للسجلات التي وصلت للعميل فعلاً
+            # الأسطر المتعددة (تتبع الاستثناءات) كسطور data متتالية في نفس الحدث
+            chunks = ['data: ' + entry.render().replace('\n', '\ndata: ') + '\n\n' for entry in client.drain()]
+            if client.dropped != reported_dropped:
+                chunks.append(f'event: dropped\ndata: {client.dropped}\n\n')
+                reported_dropped = client.dropped
+            await response.write(''.join(chunks).encode('utf-8'))
     except Exception:
         pass
     finally:
-        console_handler.clients.discard(queue)
+        console_handler.clients.discard(client)
     
     return response
 
+def _subsystem_levels():
+    levels = get_hot_log_levels()
+    return {subsystem: levels[subsystem] for subsystem in SUBSYSTEMS}
+
+async def log_levels(request):
+    """مستويات سجلات المسار الساخن القابلة للتغيير من اللوحة"""
+    return web.json_response(_subsystem_levels())
+
+@debug_only
+async def set_log_level(request):
+    """تغيير مستوى نظام فرعي بـ {"subsystem": "delivery", "level": "DEBUG"} (يتطلب DEBUG_TOKEN مثل /debug/*)"""
+    try:
+        data = await request.json()
+        subsystem, level = data['subsystem'], data['level']
+    except Exception:
+        return web.json_response({'error': 'expected {"subsystem": ..., "level": ...}'}, status=400)
+    if subsystem not in SUBSYSTEMS:
+        return web.json_response({'error': f'unknown subsystem: {subsystem}'}, status=400)
+    if not isinstance(level, str) or not set_hot_log_level(subsystem, level):
+        return web.json_response({'error': f'unknown level: {level}'}, status=400)
+    return web.json_response(_subsystem_levels())
+
+async def traces_page(request):
+    html = """
+    <!DOCTYPE html>
+    <html dir="rtl">
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <title>Traces - مسارات الرسائل</title>
+        <style>
+            body {
+                font-family: 'Courier New', monospace;
+                background: #1e1e1e;
+                color: #d4d4d4;
+                padding: 20px;
+                margin: 0;
+            }
+            h1 {
+                color: #4ec9b0;
+                font-size: 24px;
+                margin-bottom: 10px;
+            }
+            .stats {
+                color: #9cdcfe;
+                margin-bottom: 20px;
+            }
+            .trace {
+                background: #252526;
+                border: 1px solid #3c3c3c;
+                border-radius: 5px;
+                padding: 10px;
+                margin-bottom: 15px;
+            }
+            .trace-title {
+                color: #dcdcaa;
+                margin-bottom: 8px;
+            }
+            .row {
+                display: flex;
+                align-items: center;
+                height: 18px;
+                font-size: 12px;
+            }
+            .label {
+                width: 260px;
+                white-space: nowrap;
+                overflow: hidden;
+                text-overflow: ellipsis;
+            }
+            .lane {
+                position: relative;
+                flex: 1;
+                height: 12px;
+                background: #1e1e1e;
+                direction: ltr;
+            }
+            .bar {
+                position: absolute;
+                height: 12px;
+                background: #569cd6;
+                min-width: 1px;
+            }
+            .bar.wait { background: #ce9178; }
+            .bar.api { background: #4ec9b0; }
+        </style>
+    </head>
+    <body>
+        <h1>🔍 أبطأ مسارات الرسائل</h1>
+        <div class="stats" id="stats"></div>
+        <div id="traces"></div>
+        <script>
+            function barClass(name) {
+                if (name.endsWith('_wait')) return 'bar wait';
+                if (name.startsWith('api:')) return 'bar api';
+                return 'bar';
+            }
+            
+            function renderTrace(trace) {
+                const total = Math.max(trace.duration_ms, 0.001);
+                const div = document.createElement('div');
+                div.className = 'trace';
+                const title = document.createElement('div');
+                title.className = 'trace-title';
+                title.textContent = `#${trace.trace_id} | chat ${trace.source_chat_id} | msg ${trace.message_id} | ${trace.duration_ms.toFixed(1)}ms`;
+                div.appendChild(title);
+                
+                trace.spans
+                    .sort((a, b) => a.start_ms - b.start_ms)
+                    .forEach(span => {
+                        const row = document.createElement('div');
+                        row.className = 'row';
+                        const label = document.createElement('div');
+                        label.className = 'label';
+                        const target = span.target !== null ? ` → ${span.target}` : '';
+                        label.textContent = `${span.name}${target} (${span.duration_ms.toFixed(1)}ms)`;
+                        const lane = document.createElement('div');
+                        lane.className = 'lane';
+                        const bar = document.createElement('div');
+                        bar.className = barClass(span.name);
+                        bar.style.left = (span.start_ms / total * 100) + '%';
+                        bar.style.width = (span.duration_ms / total * 100) + '%';
+                        lane.appendChild(bar);
+                        row.appendChild(label);
+                        row.appendChild(lane);
+                        div.appendChild(row);
+                    });
+                return div;
+            }
+            
+            fetch('/console/traces/data')
+                .then(response => response.json())
+                .then(data => {
+                    document.getElementById('stats').textContent =
+                        `نسبة العينات: ${(data.stats.sample_rate * 100).toFixed(1)}% | المسارات المكتملة: ${data.stats.finished_traces}`;
+                    const container = document.getElementById('traces');
+                    data.slowest.forEach(trace => container.appendChild(renderTrace(trace)));
+                });
+        </script>
+    </body>
+    </html>
+    """
+    return web.Response(text=html, content_type='text/html')
+
+async def traces_data(request):
+    trace_id = request.query.get('id')
+    if trace_id:
+        trace = tracer.find(trace_id)
+        if not trace:
+            return web.json_response({'error': 'trace not found'}, status=404)
+        return web.json_response(trace.to_dict())
+    
+    return web.json_response({
+        'stats': tracer.get_stats(),
+        'slowest': [trace.to_dict() for trace in tracer.get_slowest()],
+        'recent': [trace.to_dict(include_spans=False) for trace in tracer.get_recent()]
+    })
+
+async def loop_lag_page(request):
+    html = """
+    <!DOCTYPE html>
+    <html dir="rtl">
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <title>Loop Lag - توقفات event loop</title>
+        <style>
+            body {
+                font-family: 'Courier New', monospace;
+                background: #1e1e1e;
+                color: #d4d4d4;
+                padding: 20px;
+                margin: 0;
+            }
+            h1 {
+                color: #4ec9b0;
+                font-size: 24px;
+                margin-bottom: 10px;
+            }
+            h2 {
+                color: #dcdcaa;
+                font-size: 16px;
+            }
+            .stats {
+                color: #9cdcfe;
+                margin-bottom: 20px;
+            }
+            table {
+                width: 100%;
+                border-collapse: collapse;
+                margin-bottom: 25px;
+                font-size: 13px;
+            }
+            th, td {
+                border: 1px solid #3c3c3c;
+                padding: 6px;
+                text-align: left;
+                direction: ltr;
+                vertical-align: top;
+            }
+            th {
+                background: #2d2d30;
+                color: #4ec9b0;
+            }
+            details {
+                color: #808080;
+                white-space: pre;
+            }
+        </style>
+    </head>
+    <body>
+        <h1>🐢 أكثر مواقع توقف event loop</h1>
+        <div id="processes"></div>
+        <script>
+            function cell(row, text) {
+                const td = document.createElement('td');
+                td.textContent = text;
+                row.appendChild(td);
+                return td;
+            }
+            
+            function renderProcess(title, stats) {
+                const section = document.createElement('div');
+                const heading = document.createElement('h2');
+                heading.textContent = title;
+                section.appendChild(heading);
+                const summary = document.createElement('div');
+                summary.className = 'stats';
+                summary.textContent = `التوقفات: ${stats.stalls} | بدون موقع: ${stats.unattributed} | ` +
+                    `أقصى تأخر: ${(stats.max_lag_seconds * 1000).toFixed(0)}ms | ` +
+                    `متوسط التأخر: ${(stats.lag.avg * 1000).toFixed(1)}ms | حد التوقف: ${stats.threshold_seconds * 1000}ms`;
+                section.appendChild(summary);
+                
+                const table = document.createElement('table');
+                const header = table.insertRow();
+                ['site', 'blocking', 'count', 'total ms', 'max ms', 'stack'].forEach(name => {
+                    const th = document.createElement('th');
+                    th.textContent = name;
+                    header.appendChild(th);
+                });
+                stats.top.forEach(entry => {
+                    const row = table.insertRow();
+                    cell(row, entry.site);
+                    cell(row, entry.blocking);
+                    cell(row, entry.count);
+                    cell(row, (entry.total_seconds * 1000).toFixed(0));
+                    cell(row, (entry.max_seconds * 1000).toFixed(0));
+                    const details = document.createElement('details');
+                    const label = document.createElement('summary');
+                    label.textContent = `${entry.stack.length} إطار`;
+                    details.appendChild(label);
+                    details.appendChild(document.createTextNode(entry.stack.join('\\n')));
+                    cell(row, '').appendChild(details);
+                });
+                section.appendChild(table);
+                return section;
+            }
+            
+            function refresh() {
+                fetch('/console/loop-lag/data')
+                    .then(response => response.json())
+                    .then(data => {
+                        const container = document.getElementById('processes');
+                        container.replaceChildren(renderProcess('🌐 عملية الـ webhook', data.process));
+                        data.shards.forEach((stats, index) => {
+                            if (stats) {
+                                container.appendChild(renderProcess(`⚙️ عملية التوجيه #${index}`, stats));
+                            }
+                        });
+                    });
+            }
+            
+            refresh();
+            setInterval(refresh, 5000);
+        </script>
+    </body>
+    </html>
+    """
+    return web.Response(text=html, content_type='text/html')
+
+async def loop_lag_data(request):
+    import parallel_forwarding_system
+
+    # وضع العمليات المتعددة: آخر تقرير من كل عملية توجيه
+    shard_stats = getattr(parallel_forwarding_system.parallel_system, 'shard_stats', None) or []
+    return web.json_response({
+        'process': loop_monitor.get_stats(),
+        'shards': [stats.get('loop_lag') for stats in shard_stats]
+    })
+
 def setup_console_routes(app):
     app.router.add_get('/console', console_page)
     app.router.add_get('/console/history', console_history)
     app.router.add_get('/console/stream', console_stream)
+    app.router.add_get('/console/log-levels', log_levels)
+    app.router.add_post('/console/log-levels', set_log_level)
+    app.router.add_get('/console/traces', traces_page)
+    app.router.add_get('/console/traces/data', traces_data)
+    app.router.add_get('/console/loop-lag', loop_lag_page)
+    app.router.add_get('/console/loop-lag/data', loop_lag_data)